@@ -0,0 +1,71 @@
+"""
+Benchmark del borrado seguro
+============================
+
+Compara la sobrescritura anterior (os.urandom del tamaño completo en un solo
+bloque) con la sobrescritura por bloques con flujo AES-CTR de
+titansend.borrado_seguro: tiempo y memoria máxima asignada.
+
+Uso:
+  python benchmarks/bench_borrado_seguro.py --mb 100 --bloque-kb 1024
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from titansend.borrado_seguro import sobrescribir
+
+def sobrescribir_urandom_completo(ruta, bloque):
+    # Variante anterior, pero en modo r+b para que sobrescriba en lugar de añadir
+    with open(ruta, 'r+b', buffering=0) as f:
+        f.write(os.urandom(os.path.getsize(ruta)))
+        os.fsync(f.fileno())
+
+def sobrescribir_urandom_bloques(ruta, bloque):
+    with open(ruta, 'r+b', buffering=0) as f:
+        restante = os.path.getsize(ruta)
+        while restante:
+            n = min(bloque, restante)
+            f.write(os.urandom(n))
+            restante -= n
+        os.fsync(f.fileno())
+
+def sobrescribir_aes_ctr(ruta, bloque):
+    sobrescribir(ruta, bloque=bloque)
+
+def medir(nombre, funcion, ruta, bloque):
+    tracemalloc.start()
+    inicio = time.perf_counter()
+    funcion(ruta, bloque)
+    elapsed = time.perf_counter() - inicio
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    mb = os.path.getsize(ruta) / (1024 * 1024)
+    print(f"{nombre:<22} {elapsed * 1000:9.1f} ms | {mb / elapsed:8.1f} MB/s | pico memoria {pico / (1024 * 1024):8.2f} MB")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del borrado seguro')
+    parser.add_argument('--mb', type=int, default=100, help='Tamaño del archivo de prueba en MB')
+    parser.add_argument('--bloque-kb', type=int, default=1024, help='Tamaño de bloque en KB')
+    parser.add_argument('--dir', default=None, help='Directorio del archivo de prueba (disco a medir)')
+    args = parser.parse_args()
+
+    bloque = args.bloque_kb * 1024
+    fd, ruta = tempfile.mkstemp(dir=args.dir)
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            for _ in range(args.mb):
+                f.write(b'\0' * 1024 * 1024)
+        print(f"Archivo: {args.mb} MB | bloque {args.bloque_kb} KB")
+        medir('urandom completo', sobrescribir_urandom_completo, ruta, bloque)
+        medir('urandom por bloques', sobrescribir_urandom_bloques, ruta, bloque)
+        medir('AES-CTR por bloques', sobrescribir_aes_ctr, ruta, bloque)
+    finally:
+        os.remove(ruta)
+
+if __name__ == '__main__':
+    main()
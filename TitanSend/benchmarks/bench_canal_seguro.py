@@ -0,0 +1,72 @@
+"""
+Benchmark del handshake del canal seguro P2P
+============================================
+
+Mide el coste de un handshake completo (X25519 + firmas RSA) frente a uno
+reanudado con ticket (X25519 + PSK, sin RSA) sobre un socketpair local.
+
+Uso:
+  python benchmarks/bench_canal_seguro.py --iteraciones 50 --bits 2048
+"""
+import os
+import sys
+import time
+import socket
+import argparse
+import threading
+import statistics
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from cryptography.hazmat.primitives.asymmetric import rsa
+from titansend.canal_seguro import IdentidadCanal, ServidorCanal, ClienteCanal
+
+def handshake(servidor, cliente, destino):
+    a, b = socket.socketpair()
+    t = threading.Thread(target=servidor.aceptar, args=(a,))
+    inicio = time.perf_counter()
+    t.start()
+    canal = cliente.conectar(b, destino)
+    t.join()
+    elapsed = time.perf_counter() - inicio
+    a.close()
+    b.close()
+    return elapsed, canal.reanudado
+
+def resumen(nombre, tiempos):
+    tiempos_ms = sorted(t * 1000 for t in tiempos)
+    p95 = tiempos_ms[int(len(tiempos_ms) * 0.95) - 1] if len(tiempos_ms) > 1 else tiempos_ms[0]
+    print(f"{nombre:<12} media {statistics.mean(tiempos_ms):7.3f} ms | mediana {statistics.median(tiempos_ms):7.3f} ms | p95 {p95:7.3f} ms")
+    return statistics.mean(tiempos_ms)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del handshake del canal seguro')
+    parser.add_argument('--iteraciones', type=int, default=50, help='Handshakes por modo')
+    parser.add_argument('--bits', type=int, default=2048, help='Tamaño de las claves RSA de identidad')
+    args = parser.parse_args()
+
+    id_servidor = IdentidadCanal(rsa.generate_private_key(public_exponent=65537, key_size=args.bits))
+    id_cliente = IdentidadCanal(rsa.generate_private_key(public_exponent=65537, key_size=args.bits))
+    servidor = ServidorCanal(id_servidor)
+
+    completos = []
+    for i in range(args.iteraciones):
+        # Un cliente nuevo por iteración: sin ticket, siempre handshake completo
+        elapsed, reanudado = handshake(servidor, ClienteCanal(id_cliente, id_servidor.fingerprint), ('bench', i))
+        assert not reanudado
+        completos.append(elapsed)
+
+    cliente = ClienteCanal(id_cliente, id_servidor.fingerprint)
+    handshake(servidor, cliente, ('bench', 0))
+    reanudados = []
+    for _ in range(args.iteraciones):
+        elapsed, reanudado = handshake(servidor, cliente, ('bench', 0))
+        assert reanudado
+        reanudados.append(elapsed)
+
+    print(f"Handshakes por modo: {args.iteraciones} | RSA-{args.bits}")
+    media_completo = resumen('Completo', completos)
+    media_reanudado = resumen('Reanudado', reanudados)
+    print(f"Aceleración por reanudación: x{media_completo / media_reanudado:.1f}")
+
+if __name__ == '__main__':
+    main()
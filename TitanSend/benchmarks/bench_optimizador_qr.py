@@ -0,0 +1,128 @@
+"""
+Benchmark del optimizador de versión y corrección de los QR
+===========================================================
+
+Simula sesiones de captura completas (apuntar, intentar leer hasta que el
+QR decodifica, pasar al siguiente) para cada perfil de escáner y compara la
+configuración fija anterior (v40-L) con la que elige optimizador_qr.
+
+Cada intento de lectura se simula a nivel de codeword: la cámara resuelve
+o no los módulos del QR y cada codeword se daña con la probabilidad del
+perfil; el intento decodifica si ningún bloque Reed-Solomon supera los
+errores que corrige. Con --real se dibujan QR de verdad, se reducen a la
+resolución del perfil con ruido gaussiano y se decodifican con pyzbar u
+OpenCV para medir la tasa de lectura de cada versión.
+
+Uso:
+  python benchmarks/bench_optimizador_qr.py --kb 256 --sesiones 20
+  python benchmarks/bench_optimizador_qr.py --kb 64 --perfil pantalla --real --ruido 40
+"""
+import os
+import sys
+import math
+import time
+import random
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from qrcode.base import rs_blocks
+from titansend.optimizador_qr import PERFILES_ESCANER, NIVELES_ECC, evaluar, optimizar, modulos
+from titansend.transport_qr import renderizar_qr, decodificar_imagen, QR_CONFIG, CV2_AVAILABLE
+
+CABECERA = 13
+
+def intento(version, error_correction, perfil, rng):
+    """Un intento de lectura simulado: True si el QR decodifica"""
+    exponente = (modulos(version) - perfil['modulos_max']) / perfil['escala']
+    if rng.random() * (1.0 + math.exp(min(exponente, 700))) > 1.0:
+        return False  # La cámara no resuelve los módulos
+    for bloque in rs_blocks(version, error_correction):
+        corregibles = (bloque.total_count - bloque.data_count) // 2
+        errores = sum(rng.random() < perfil['error_codeword'] for _ in range(bloque.total_count))
+        if errores > corregibles:
+            return False
+    return True
+
+def sesion(opcion, perfil, rng):
+    """Segundos de una sesión de captura de todos los fragmentos"""
+    segundos = 0.0
+    for _ in range(opcion['fragmentos']):
+        segundos += perfil['sobrecoste']
+        while True:
+            segundos += perfil['intento']
+            if intento(opcion['version'], opcion['error_correction'], perfil, rng):
+                break
+    return segundos
+
+def medir(nombre, opcion, perfil, sesiones, rng):
+    inicio = time.perf_counter()
+    tiempos = sorted(sesion(opcion, perfil, rng) for _ in range(sesiones))
+    media = sum(tiempos) / len(tiempos)
+    p95 = tiempos[min(len(tiempos) - 1, int(len(tiempos) * 0.95))]
+    print(f"  {nombre:<12} v{opcion['version']:<2} {opcion['nivel']} | {opcion['fragmentos']:5d} QR | "
+          f"lectura {opcion['probabilidad']:6.1%} | modelo {opcion['segundos']:9.1f} s | "
+          f"simulado {media:9.1f} s (p95 {p95:.1f}) [{time.perf_counter() - inicio:.1f} s]")
+    return media
+
+def tasa_real(version, nivel, perfil, intentos, ruido, rng):
+    """Fracción de QR reales que se decodifican a la resolución del perfil"""
+    import cv2
+    import numpy as np
+    config = dict(QR_CONFIG, version=version, error_correction=NIVELES_ECC[nivel], box_size=4, border=2)
+    capacidad = evaluar(0, version, nivel, perfil)['max_data_bytes']
+    # ~2,5 píxeles por módulo a `modulos_max` módulos: ahí OpenCV lee ~la mitad, como en el modelo
+    lado = int(2.5 * perfil['modulos_max'])
+    directorio = tempfile.mkdtemp()
+    aciertos = 0
+    try:
+        for i in range(intentos):
+            contenido = bytes(rng.getrandbits(8) for _ in range(capacidad))
+            ruta = renderizar_qr(contenido, os.path.join(directorio, f'qr_{i}.png'), config)
+            imagen = cv2.resize(cv2.imread(ruta, cv2.IMREAD_GRAYSCALE), (lado, lado), interpolation=cv2.INTER_AREA)
+            ruido_np = np.random.default_rng(rng.getrandbits(32)).normal(0, ruido, imagen.shape)
+            imagen = np.clip(imagen + ruido_np, 0, 255).astype(np.uint8)
+            aciertos += contenido in decodificar_imagen(imagen, validar=False)
+    finally:
+        shutil.rmtree(directorio)
+    return aciertos / intentos
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark del optimizador de versión y corrección de los QR')
+    parser.add_argument('--kb', type=int, default=256, help='Tamaño del contenedor (comprimido) en KB')
+    parser.add_argument('--perfil', choices=sorted(PERFILES_ESCANER), help='Solo este perfil (por defecto, todos)')
+    parser.add_argument('--sesiones', type=int, default=20, help='Sesiones de captura simuladas por configuración')
+    parser.add_argument('--semilla', type=int, default=1, help='Semilla de la simulación')
+    parser.add_argument('--real', action='store_true', help='Medir también la lectura de QR reales degradados')
+    parser.add_argument('--intentos', type=int, default=10, help='QR reales por versión con --real')
+    parser.add_argument('--ruido', type=float, default=30.0, help='Desviación del ruido gaussiano con --real (0-255)')
+    args = parser.parse_args()
+
+    rng = random.Random(args.semilla)
+    tamano = args.kb * 1024
+    perfiles = [args.perfil] if args.perfil else sorted(PERFILES_ESCANER)
+    print(f"Datos: {args.kb} KB | {args.sesiones} sesiones por configuración")
+    for nombre in perfiles:
+        perfil = PERFILES_ESCANER[nombre]
+        print(f"Perfil {nombre}:")
+        fijo = evaluar(tamano, 40, 'L', perfil, CABECERA)
+        elegido = optimizar(tamano, nombre, CABECERA)
+        if fijo['probabilidad'] < 1e-3:
+            print(f"  {'v40-L':<12} lectura {fijo['probabilidad']:.1e} por intento: no termina en la práctica")
+            medir('optimizado', elegido, perfil, args.sesiones, rng)
+        else:
+            anterior = medir('v40-L', fijo, perfil, args.sesiones, rng)
+            optimo = medir('optimizado', elegido, perfil, args.sesiones, rng)
+            print(f"  Tiempo de captura: x{anterior / optimo:.1f} menos")
+
+        if args.real:
+            if not CV2_AVAILABLE:
+                print("  ❌ --real necesita OpenCV para degradar las imágenes")
+                continue
+            for version in sorted({max(1, elegido['version'] - 8), elegido['version'], min(40, elegido['version'] + 8), 40}):
+                tasa = tasa_real(version, elegido['nivel'], perfil, args.intentos, args.ruido, rng)
+                print(f"  real v{version:<2} {elegido['nivel']} ({modulos(version)} módulos): {tasa:6.1%} leídos")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Benchmark de la generación de QR múltiples
+==========================================
+
+Compara la generación anterior (cada fragmento volvía a comprimir el archivo
+completo y se dibujaba en serie) con titansend.transport_qr: compresión
+única y dibujo en serie o en un pool de procesos. Con --leer mide también
+la decodificación (pyzbar u OpenCV) en fragmentos por segundo.
+
+Uso:
+  python benchmarks/bench_qr.py --kb 1024 --procesos 4
+  python benchmarks/bench_qr.py --kb 256 --sin-anterior --leer
+"""
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from titansend.transport_qr import (comprimir_datos, preparar_fragmentos, renderizar_qr, nombre_fragmento,
+                                    generar_qr_multiple, decodificar_frames)
+
+def generar_anterior(datos, ruta, procesos):
+    # Variante anterior: O(n) compresiones del archivo completo, una por fragmento
+    total = len(preparar_fragmentos(datos))
+    for i in range(total):
+        contenido = preparar_fragmentos(datos, comprimidos=comprimir_datos(datos))[i]
+        renderizar_qr(contenido, nombre_fragmento(ruta, i + 1, total))
+    return total
+
+def generar_serie(datos, ruta, procesos):
+    return len(generar_qr_multiple(datos, ruta, procesos=1))
+
+def generar_pool(datos, ruta, procesos):
+    return len(generar_qr_multiple(datos, ruta, procesos=procesos))
+
+def medir(nombre, funcion, datos, procesos):
+    directorio = tempfile.mkdtemp()
+    try:
+        inicio = time.perf_counter()
+        with open(os.devnull, 'w') as nulo:
+            salida, sys.stdout = sys.stdout, nulo
+            try:
+                total = funcion(datos, os.path.join(directorio, 'qr.png'), procesos)
+            finally:
+                sys.stdout = salida
+        elapsed = time.perf_counter() - inicio
+    finally:
+        shutil.rmtree(directorio)
+    print(f"{nombre:<24} {elapsed:8.2f} s | {total} QR | {total / elapsed:7.1f} QR/s")
+    return elapsed
+
+def medir_lectura(datos, procesos):
+    directorio = tempfile.mkdtemp()
+    try:
+        with open(os.devnull, 'w') as nulo:
+            salida, sys.stdout = sys.stdout, nulo
+            try:
+                generar_qr_multiple(datos, os.path.join(directorio, 'qr.png'), procesos=procesos)
+            finally:
+                sys.stdout = salida
+        for n in sorted({1, procesos}):
+            reensamblador, estadisticas = decodificar_frames(directorio, procesos=n)
+            estado = 'OK' if reensamblador.completo and reensamblador.resultado() == datos else 'INCOMPLETO'
+            print(f"{'lectura, ' + str(n) + ' proceso(s)':<24} {estadisticas['segundos']:8.2f} s | "
+                  f"{estadisticas['fragmentos']} QR | {estadisticas['fragmentos_por_segundo']:7.1f} fragmentos/s | {estado}")
+    finally:
+        shutil.rmtree(directorio)
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la generación de QR múltiples')
+    parser.add_argument('--kb', type=int, default=1024, help='Tamaño del contenedor de prueba en KB')
+    parser.add_argument('--procesos', type=int, default=os.cpu_count() or 1, help='Procesos del pool')
+    parser.add_argument('--sin-anterior', action='store_true', help='No medir la variante anterior (lenta)')
+    parser.add_argument('--leer', action='store_true', help='Medir también la decodificación de los QR')
+    args = parser.parse_args()
+
+    # Contenedor cifrado: incompresible
+    datos = os.urandom(args.kb * 1024)
+    print(f"Datos: {args.kb} KB | {len(preparar_fragmentos(datos))} fragmentos | {args.procesos} procesos")
+    if not args.sin_anterior:
+        medir('anterior (recomprime)', generar_anterior, datos, args.procesos)
+    serie = medir('compresión única, serie', generar_serie, datos, args.procesos)
+    pool = medir('compresión única, pool', generar_pool, datos, args.procesos)
+    print(f"Aceleración del pool: x{serie / pool:.2f}")
+    if args.leer:
+        medir_lectura(datos, args.procesos)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,53 @@
+"""
+Benchmark de la paridad Reed-Solomon
+====================================
+
+Mide la codificación y la reconstrucción (con m fragmentos de datos
+perdidos) de titansend.reed_solomon, con NumPy y con la variante en Python
+puro (bytes.translate + XOR de enteros).
+
+Uso:
+  python benchmarks/bench_reed_solomon.py --mb 64 --k 10 --m 4
+"""
+import os
+import sys
+import time
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from titansend.reed_solomon import CodigoRS, NUMPY_AVAILABLE
+
+def medir(nombre, codigo, fragmentos):
+    mb = sum(len(f) for f in fragmentos) / (1024 * 1024)
+    codigo.codificar([f[:4096] for f in fragmentos])  # Tablas de multiplicar ya construidas
+    inicio = time.perf_counter()
+    paridad = codigo.codificar(fragmentos)
+    codificar = time.perf_counter() - inicio
+    # Se pierden los m primeros fragmentos de datos
+    disponibles = {i: f for i, f in enumerate(fragmentos) if i >= codigo.m}
+    disponibles.update({codigo.k + i: p for i, p in enumerate(paridad)})
+    inicio = time.perf_counter()
+    recuperados = codigo.reconstruir(disponibles)
+    reconstruir = time.perf_counter() - inicio
+    estado = 'OK' if recuperados == fragmentos else 'ERROR'
+    print(f"{nombre:<8} codificar {mb / codificar:8.1f} MB/s | reconstruir {mb / reconstruir:8.1f} MB/s | {estado}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark de la paridad Reed-Solomon')
+    parser.add_argument('--mb', type=int, default=64, help='Datos a codificar en MB')
+    parser.add_argument('--k', type=int, default=10, help='Fragmentos de datos')
+    parser.add_argument('--m', type=int, default=4, help='Fragmentos de paridad')
+    args = parser.parse_args()
+
+    datos = os.urandom(args.mb * 1024 * 1024)
+    tamano = len(datos) // args.k
+    fragmentos = [datos[i * tamano:(i + 1) * tamano] for i in range(args.k)]
+    print(f"Datos: {args.mb} MB | k={args.k} m={args.m} | fragmentos de {tamano / (1024 * 1024):.1f} MB")
+    if NUMPY_AVAILABLE:
+        medir('numpy', CodigoRS(args.k, args.m, vectorizado=True), fragmentos)
+    else:
+        print("numpy    no disponible")
+    medir('python', CodigoRS(args.k, args.m, vectorizado=False), fragmentos)
+
+if __name__ == '__main__':
+    main()
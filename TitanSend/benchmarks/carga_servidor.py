@@ -0,0 +1,88 @@
+"""
+Prueba de carga del servidor HTTP de TitanSend
+==============================================
+
+Lanza N clientes concurrentes con conexiones keep-alive contra un servidor
+en marcha (por ejemplo `titansend serve`) y mide peticiones/s y latencias.
+
+Uso:
+  titansend serve --port 5000 &
+  python benchmarks/carga_servidor.py --url http://127.0.0.1:5000/health --clientes 32 --duracion 10
+  # Subidas de 64 KB (requiere TSEND_MULTIARCHIVO=1 en el servidor)
+  python benchmarks/carga_servidor.py --url http://127.0.0.1:5000/upload --metodo POST --cuerpo 65536
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+import statistics
+import http.client
+from urllib.parse import urlsplit
+
+def cliente(url, metodo, cuerpo, cabeceras, fin, latencias, errores):
+    partes = urlsplit(url)
+    ruta = partes.path + (f"?{partes.query}" if partes.query else '')
+    conexion = None
+    while time.perf_counter() < fin:
+        if conexion is None:
+            conexion = http.client.HTTPConnection(partes.hostname, partes.port or 80, timeout=30)
+        inicio = time.perf_counter()
+        try:
+            conexion.request(metodo, ruta, body=cuerpo, headers=cabeceras)
+            respuesta = conexion.getresponse()
+            respuesta.read()
+            if respuesta.status >= 400:
+                errores.append(respuesta.status)
+            else:
+                latencias.append(time.perf_counter() - inicio)
+            if respuesta.getheader('Connection', '').lower() == 'close':
+                conexion.close()
+                conexion = None
+        except (OSError, http.client.HTTPException) as e:
+            errores.append(type(e).__name__)
+            conexion.close()
+            conexion = None
+    if conexion is not None:
+        conexion.close()
+
+def percentil(valores, p):
+    return valores[min(len(valores) - 1, int(len(valores) * p))]
+
+def main():
+    parser = argparse.ArgumentParser(description='Prueba de carga del servidor HTTP de TitanSend')
+    parser.add_argument('--url', default='http://127.0.0.1:5000/health', help='URL a solicitar')
+    parser.add_argument('--metodo', default='GET', help='Método HTTP')
+    parser.add_argument('--cuerpo', type=int, default=0, help='Bytes aleatorios a enviar en cada petición')
+    parser.add_argument('--clientes', type=int, default=16, help='Clientes concurrentes')
+    parser.add_argument('--duracion', type=float, default=10, help='Segundos de prueba')
+    parser.add_argument('--token', help='Token Bearer del servidor (TSEND_TOKEN)')
+    args = parser.parse_args()
+
+    cuerpo = os.urandom(args.cuerpo) if args.cuerpo else None
+    cabeceras = {'Authorization': f"Bearer {args.token}"} if args.token else {}
+    latencias, errores = [], []
+    fin = time.perf_counter() + args.duracion
+    hilos = [threading.Thread(target=cliente, args=(args.url, args.metodo, cuerpo, cabeceras, fin, latencias, errores))
+             for _ in range(args.clientes)]
+    inicio = time.perf_counter()
+    for h in hilos:
+        h.start()
+    for h in hilos:
+        h.join()
+    elapsed = time.perf_counter() - inicio
+
+    if not latencias:
+        print(f"❌ Ninguna petición correcta ({len(errores)} errores: {sorted(set(map(str, errores)))[:5]})")
+        sys.exit(1)
+    ms = sorted(t * 1000 for t in latencias)
+    print(f"{args.metodo} {args.url} | {args.clientes} clientes | {elapsed:.1f} s")
+    print(f"Peticiones: {len(ms)} correctas, {len(errores)} errores")
+    print(f"Rendimiento: {len(ms) / elapsed:.1f} req/s")
+    if cuerpo:
+        print(f"Caudal: {len(ms) * len(cuerpo) / elapsed / (1024 * 1024):.1f} MB/s")
+    print(f"Latencia: media {statistics.mean(ms):.2f} ms | p50 {percentil(ms, 0.50):.2f} ms | "
+          f"p99 {percentil(ms, 0.99):.2f} ms | máx {ms[-1]:.2f} ms")
+
+if __name__ == '__main__':
+    main()
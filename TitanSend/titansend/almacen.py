@@ -0,0 +1,195 @@
+"""
+Almacén fragmentado para el modo multiarchivo
+=============================================
+
+Guarda cada archivo en subdirectorios por prefijo de hash del identificador
+(`ab/cd/<id>.bin`) para que ningún directorio crezca sin límite, y mantiene
+un índice en memoria id -> ruta, tamaño, fecha de creación y descargas.
+Las búsquedas y listados no recorren el disco.
+
+El índice puede persistirse en SQLite; es lo recomendable con varios
+procesos (gunicorn), ya que así todos ven las subidas de los demás.
+"""
+
+import os
+import re
+import time
+import sqlite3
+import hashlib
+import threading
+from typing import Dict, List, Optional
+
+NIVELES = 2  # Subdirectorios de 2 caracteres hex: 65536 directorios hoja
+EXTENSION = '.bin'
+_PATRON_ID = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+_PATRON_UUID = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+
+def id_valido(file_id: str) -> bool:
+    """Acepta solo identificadores sin separadores ni caracteres especiales."""
+    return bool(file_id) and bool(_PATRON_ID.match(file_id))
+
+
+class AlmacenFragmentado:
+    """Directorio de archivos fragmentado por prefijo de hash con índice en memoria."""
+
+    def __init__(self, directorio: str = '.', indice_sqlite: Optional[str] = None):
+        self.directorio = os.path.abspath(directorio)
+        os.makedirs(self.directorio, exist_ok=True)
+        self._lock = threading.Lock()
+        self._indice: Dict[str, dict] = {}
+        self.indice_sqlite = indice_sqlite
+        self._conexion = None
+        self._pid = None
+        if indice_sqlite:
+            self._db.execute("CREATE TABLE IF NOT EXISTS archivos (id TEXT PRIMARY KEY, ruta TEXT NOT NULL, "
+                             "tamano INTEGER NOT NULL, creado REAL NOT NULL, descargas INTEGER NOT NULL DEFAULT 0)")
+            for fila in self._db.execute("SELECT id, ruta, tamano, creado, descargas FROM archivos"):
+                self._indice[fila[0]] = self._entrada(*fila[1:])
+        else:
+            self._reconstruir()
+
+    @property
+    def _db(self) -> Optional[sqlite3.Connection]:
+        """Conexión SQLite de este proceso (None sin índice persistente)."""
+        if not self.indice_sqlite:
+            return None
+        if self._pid != os.getpid():
+            # Una conexión SQLite no puede cruzar un fork (gunicorn importa la app
+            # en el proceso maestro): cada worker abre la suya y no toca la heredada
+            self._conexion = sqlite3.connect(self.indice_sqlite, check_same_thread=False, isolation_level=None)
+            self._conexion.execute("PRAGMA journal_mode=WAL")
+            self._conexion.execute("PRAGMA synchronous=NORMAL")
+            self._pid = os.getpid()
+        return self._conexion
+
+    @staticmethod
+    def _entrada(ruta: str, tamano: int, creado: float, descargas: int = 0) -> dict:
+        return {'ruta': ruta, 'tamano': tamano, 'creado': creado, 'descargas': descargas}
+
+    def ruta(self, file_id: str, crear: bool = False) -> str:
+        """Ruta fragmentada de un identificador; con crear=True crea sus subdirectorios."""
+        if not id_valido(file_id):
+            raise ValueError(f"Identificador inválido: {file_id!r}")
+        resumen = hashlib.sha256(file_id.encode()).hexdigest()
+        partes = [resumen[2 * i:2 * i + 2] for i in range(NIVELES)]
+        carpeta = os.path.join(self.directorio, *partes)
+        if crear:
+            os.makedirs(carpeta, exist_ok=True)
+        return os.path.join(carpeta, file_id + EXTENSION)
+
+    def _reconstruir(self):
+        """Rehace el índice desde disco (solo al arrancar y sin SQLite)."""
+        encontrados = []
+        for raiz, _, nombres in os.walk(self.directorio):
+            for nombre in nombres:
+                file_id = nombre[:-len(EXTENSION)]
+                if not nombre.endswith(EXTENSION) or not id_valido(file_id):
+                    continue
+                actual = os.path.join(raiz, nombre)
+                if raiz == self.directorio and _PATRON_UUID.match(file_id):
+                    # Subida de la versión sin fragmentar: se mueve a su subdirectorio
+                    destino = self.ruta(file_id, crear=True)
+                    os.replace(actual, destino)
+                    actual = destino
+                elif actual != self.ruta(file_id):
+                    continue
+                st = os.stat(actual)
+                encontrados.append((file_id, self._entrada(actual, st.st_size, st.st_mtime)))
+        # El índice conserva el orden de creación
+        for file_id, entrada in sorted(encontrados, key=lambda par: par[1]['creado']):
+            self._indice[file_id] = entrada
+
+    def registrar(self, file_id: str, tamano: int) -> dict:
+        """Añade al índice un archivo ya escrito en su ruta fragmentada."""
+        entrada = self._entrada(self.ruta(file_id), tamano, time.time())
+        with self._lock:
+            self._indice[file_id] = entrada
+            if self._db:
+                self._db.execute("INSERT OR REPLACE INTO archivos (id, ruta, tamano, creado, descargas) "
+                                 "VALUES (?, ?, ?, ?, 0)", (file_id, entrada['ruta'], tamano, entrada['creado']))
+        return dict(entrada)
+
+    def _buscar(self, file_id: str) -> Optional[dict]:
+        """Busca en memoria y, si no está, en SQLite o en su ruta fragmentada (otro proceso)."""
+        entrada = self._indice.get(file_id)
+        if entrada is not None or not id_valido(file_id):
+            return entrada
+        if self._db:
+            fila = self._db.execute("SELECT ruta, tamano, creado, descargas FROM archivos WHERE id = ?",
+                                    (file_id,)).fetchone()
+            if fila:
+                entrada = self._entrada(*fila)
+        else:
+            ruta = self.ruta(file_id)
+            try:
+                st = os.stat(ruta)
+                entrada = self._entrada(ruta, st.st_size, st.st_mtime)
+            except FileNotFoundError:
+                return None
+        if entrada is not None:
+            self._indice[file_id] = entrada
+        return entrada
+
+    def obtener(self, file_id: str) -> Optional[dict]:
+        """Entrada del índice (copia) o None si el archivo no existe."""
+        with self._lock:
+            entrada = self._buscar(file_id)
+            if entrada is None:
+                return None
+            if not os.path.exists(entrada['ruta']):
+                # Borrado por otro proceso o fuera del servidor
+                self._olvidar(file_id)
+                return None
+            return dict(entrada)
+
+    def contar_descarga(self, file_id: str):
+        """Incrementa el contador de descargas de un archivo."""
+        with self._lock:
+            entrada = self._indice.get(file_id)
+            if entrada is None:
+                return
+            entrada['descargas'] += 1
+            if self._db:
+                self._db.execute("UPDATE archivos SET descargas = descargas + 1 WHERE id = ?", (file_id,))
+
+    def _olvidar(self, file_id: str) -> Optional[dict]:
+        entrada = self._indice.pop(file_id, None)
+        if self._db:
+            # La fila puede ser de otro proceso: su ruta sale de SQLite, y solo quien
+            # borra la fila recibe la entrada (el archivo se borra una sola vez)
+            fila = self._db.execute("SELECT ruta, tamano, creado, descargas FROM archivos WHERE id = ?",
+                                    (file_id,)).fetchone()
+            borradas = self._db.execute("DELETE FROM archivos WHERE id = ?", (file_id,)).rowcount
+            entrada = self._entrada(*fila) if fila and borradas else None
+        return entrada
+
+    def eliminar(self, file_id: str) -> Optional[dict]:
+        """Quita un archivo del índice (el borrado en disco lo hace el llamador)."""
+        with self._lock:
+            return self._olvidar(file_id)
+
+    def listar(self) -> List[str]:
+        """Identificadores indexados, del más antiguo al más reciente."""
+        with self._lock:
+            if self._db:
+                return [fila[0] for fila in self._db.execute("SELECT id FROM archivos ORDER BY creado")]
+            return list(self._indice)
+
+    def entradas(self) -> Dict[str, dict]:
+        """Copia del índice (con SQLite, el de todos los procesos)."""
+        with self._lock:
+            if self._db:
+                return {fila[0]: self._entrada(*fila[1:]) for fila in self._db.execute(
+                    "SELECT id, ruta, tamano, creado, descargas FROM archivos ORDER BY creado")}
+            return {i: dict(e) for i, e in self._indice.items()}
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._indice)
+
+    def cerrar(self):
+        if self._conexion is not None and self._pid == os.getpid():
+            self._conexion.close()
+        self._conexion = None
+        self.indice_sqlite = None
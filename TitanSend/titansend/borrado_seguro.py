@@ -0,0 +1,93 @@
+"""
+Borrado seguro de archivos para TitanSend
+=========================================
+
+Sobrescribe el archivo en el sitio (modo 'r+b') por bloques de tamaño fijo
+con un flujo pseudoaleatorio AES-256-CTR de clave aleatoria, hace fsync y
+lo elimina. La memoria usada es la de un bloque, sea cual sea el tamaño.
+
+En SSD y almacenamiento con wear leveling la sobrescritura no garantiza
+tocar los bloques físicos originales; el modo `trim` libera los bloques con
+FALLOC_FL_PUNCH_HOLE (que el sistema de archivos traduce a discard/TRIM si
+está montado con esa opción) en lugar de sobrescribir.
+"""
+
+import os
+import ctypes
+import ctypes.util
+from cryptography.hazmat.primitives.ciphers import Cipher, algorithms, modes
+
+BLOQUE = 1024 * 1024  # Bytes por escritura
+_FALLOC_FL_KEEP_SIZE = 0x01
+_FALLOC_FL_PUNCH_HOLE = 0x02
+
+_libc = None
+
+
+def _fallocate():
+    """fallocate(2) de la libc (solo Linux) o None."""
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+            _libc.fallocate.argtypes = [ctypes.c_int, ctypes.c_int, ctypes.c_int64, ctypes.c_int64]
+        except (OSError, AttributeError):
+            _libc = False
+    return _libc.fallocate if _libc else None
+
+
+def sobrescribir(ruta: str, pasadas: int = 1, bloque: int = BLOQUE) -> int:
+    """
+    Sobrescribe el contenido de `ruta` en el sitio con datos pseudoaleatorios,
+    con fsync tras cada pasada. Devuelve los bytes escritos en total.
+    """
+    ceros = bytes(bloque)
+    salida = bytearray(bloque + 15)  # update_into necesita margen de un bloque AES
+    escritos = 0
+    with open(ruta, 'r+b', buffering=0) as f:
+        tam = os.fstat(f.fileno()).st_size
+        for _ in range(pasadas):
+            cifrador = Cipher(algorithms.AES(os.urandom(32)), modes.CTR(os.urandom(16))).encryptor()
+            f.seek(0)
+            restante = tam
+            while restante:
+                n = min(bloque, restante)
+                cifrador.update_into(ceros[:n] if n < bloque else ceros, salida)
+                f.write(memoryview(salida)[:n])
+                restante -= n
+            os.fsync(f.fileno())
+            escritos += tam
+    return escritos
+
+
+def liberar_bloques(ruta: str) -> bool:
+    """
+    Descarta los bloques del archivo (punch hole) para que el sistema de
+    archivos emita TRIM. Si no está soportado, trunca a cero.
+    Devuelve True si se pudo perforar el archivo.
+    """
+    fallocate = _fallocate()
+    with open(ruta, 'r+b', buffering=0) as f:
+        tam = os.fstat(f.fileno()).st_size
+        if fallocate and tam:
+            if fallocate(f.fileno(), _FALLOC_FL_PUNCH_HOLE | _FALLOC_FL_KEEP_SIZE, 0, tam) == 0:
+                os.fsync(f.fileno())
+                return True
+        f.truncate(0)
+        os.fsync(f.fileno())
+    return False
+
+
+def borrar_archivo_seguro(ruta: str, pasadas: int = 1, trim: bool = False) -> bool:
+    """
+    Borra un archivo de forma segura: sobrescribe en el sitio (o libera sus
+    bloques con trim=True) y lo elimina. Devuelve False si no existía.
+    """
+    if not os.path.isfile(ruta):
+        return False
+    if trim:
+        liberar_bloques(ruta)
+    else:
+        sobrescribir(ruta, pasadas)
+    os.remove(ruta)
+    return True
@@ -0,0 +1,392 @@
+"""
+Canal cifrado y autenticado para P2P en TitanSend
+=================================================
+
+Handshake de estilo Noise/SIGMA sobre un socket TCP ya conectado:
+- Intercambio efímero X25519 (secreto hacia adelante)
+- Autenticación mutua con las identidades RSA de `auth.AutenticadorAvanzado`
+  (firma del transcript y fingerprint de la clave pública)
+- Tickets de sesión: tras un handshake completo el servidor entrega un ticket
+  cifrado con el que las reconexiones al mismo peer se saltan las firmas RSA
+  (PSK + X25519, similar a la reanudación de TLS 1.3)
+- Registros AES-GCM con nonce por contador. La longitud real va dentro del
+  cifrado y el texto claro se rellena hasta el siguiente tramo (potencia de
+  dos, como máximo MAX_REGISTRO): la cabecera de longitud, que viaja en
+  claro, sólo revela el tramo y no el tamaño exacto de los datos
+
+El objeto CanalSeguro expone sendall/send/recv/settimeout/close, de modo que
+el protocolo P2P funciona igual sobre el canal que sobre un socket.
+"""
+
+import os
+import json
+import time
+import hmac
+import base64
+import struct
+import hashlib
+import threading
+from typing import Dict, Iterable, Optional, Tuple
+
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey, X25519PublicKey
+from cryptography.hazmat.primitives.ciphers.aead import AESGCM
+from cryptography.hazmat.primitives.kdf.hkdf import HKDF
+
+try:
+    from .auth import AutenticadorAvanzado
+except ImportError:
+    from auth import AutenticadorAvanzado
+
+DOMINIO = b'titansend-canal-v1'
+MAX_HANDSHAKE = 16 * 1024
+MAX_REGISTRO = 64 * 1024  # Bytes de texto claro por registro
+MIN_TRAMO = 256  # Tamaño mínimo de un registro rellenado
+VIDA_TICKET = 3600  # Segundos
+# Fingerprints de servidor fijados en el primer uso (TOFU), por destino host:puerto
+ARCHIVO_CONOCIDOS = os.environ.get('TSEND_PEERS_CONOCIDOS',
+                                   os.path.join(os.path.expanduser('~'), '.titansend', 'peers_conocidos.json'))
+
+
+class ErrorAutenticacion(ValueError):
+    """El peer no pudo autenticarse o no está autorizado."""
+
+
+def _b64(datos: bytes) -> str:
+    return base64.b64encode(datos).decode()
+
+
+def _unb64(texto: str) -> bytes:
+    return base64.b64decode(texto)
+
+
+def _rellenar(datos: bytes) -> bytes:
+    """Antepone la longitud real y rellena con ceros hasta el tramo."""
+    necesario = 4 + len(datos)
+    tramo = MIN_TRAMO
+    while tramo < necesario:
+        tramo *= 2
+    tramo = min(tramo, 4 + MAX_REGISTRO)
+    return struct.pack('>I', len(datos)) + datos + b'\x00' * (tramo - necesario)
+
+
+def _quitar_relleno(claro: bytes) -> bytes:
+    longitud = struct.unpack('>I', claro[:4])[0]
+    if longitud > len(claro) - 4:
+        raise ErrorAutenticacion("Longitud de registro inválida")
+    return claro[4:4 + longitud]
+
+
+def _recv_exacto(sock, n: int) -> bytes:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Conexión cerrada durante el canal seguro")
+        buf += chunk
+    return bytes(buf)
+
+
+def _enviar_handshake(sock, mensaje: Dict) -> bytes:
+    datos = json.dumps(mensaje).encode()
+    sock.sendall(struct.pack('>I', len(datos)) + datos)
+    return datos
+
+
+def _recibir_handshake(sock) -> Tuple[Dict, bytes]:
+    longitud = struct.unpack('>I', _recv_exacto(sock, 4))[0]
+    if longitud > MAX_HANDSHAKE:
+        raise ErrorAutenticacion(f"Mensaje de handshake demasiado grande ({longitud} bytes)")
+    datos = _recv_exacto(sock, longitud)
+    return json.loads(datos.decode()), datos
+
+
+def _derivar(ikm: bytes, salt: bytes) -> Tuple[bytes, bytes, bytes, bytes]:
+    """Deriva (clave cliente→servidor, servidor→cliente, confirmación, secreto de reanudación)."""
+    material = HKDF(algorithm=hashes.SHA256(), length=128, salt=salt, info=DOMINIO).derive(ikm)
+    return material[:32], material[32:64], material[64:96], material[96:]
+
+
+class IdentidadCanal:
+    """Par de claves RSA que identifica a un extremo del canal."""
+
+    def __init__(self, clave_privada):
+        self.clave_privada = clave_privada
+        self.clave_publica = clave_privada.public_key()
+        self.pem_publica = self.clave_publica.public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+        self.autenticador = AutenticadorAvanzado()
+        self.fingerprint = self.autenticador.generar_fingerprint_clave(self.clave_publica)
+
+    @classmethod
+    def desde_pem(cls, ruta: str, password: Optional[str] = None) -> 'IdentidadCanal':
+        """Carga la identidad desde una clave privada PEM."""
+        with open(ruta, 'rb') as f:
+            clave = serialization.load_pem_private_key(f.read(), password=password.encode() if password else None)
+        return cls(clave)
+
+    def firmar(self, datos: bytes) -> bytes:
+        return self.autenticador.firmar_archivo(datos, self.clave_privada)
+
+    def verificar_peer(self, pem_peer: bytes, datos: bytes, firma: bytes) -> str:
+        """Verifica la firma del peer y devuelve su fingerprint."""
+        clave_peer = serialization.load_pem_public_key(pem_peer)
+        if not self.autenticador.verificar_firma_archivo(datos, firma, clave_peer):
+            raise ErrorAutenticacion("Firma del handshake inválida")
+        return self.autenticador.generar_fingerprint_clave(clave_peer)
+
+
+class CanalSeguro:
+    """Socket cifrado resultante de un handshake completo o reanudado."""
+
+    def __init__(self, sock, clave_envio: bytes, clave_recepcion: bytes, fingerprint_peer: str, reanudado: bool):
+        self.sock = sock
+        self.fingerprint_peer = fingerprint_peer
+        self.reanudado = reanudado
+        self._aead_envio = AESGCM(clave_envio)
+        self._aead_recepcion = AESGCM(clave_recepcion)
+        self._contador_envio = 0
+        self._contador_recepcion = 0
+        self._buffer = b''
+        self._cerrado_peer = False
+        self._lock_envio = threading.Lock()
+
+    def _nonce(self, contador: int) -> bytes:
+        return b'\x00\x00\x00\x00' + struct.pack('>Q', contador)
+
+    def _enviar_registro(self, datos: bytes):
+        with self._lock_envio:
+            cifrado = self._aead_envio.encrypt(self._nonce(self._contador_envio), _rellenar(datos), None)
+            self._contador_envio += 1
+            self.sock.sendall(struct.pack('>I', len(cifrado)) + cifrado)
+
+    def _recibir_registro(self) -> bytes:
+        cabecera = self.sock.recv(4)
+        if not cabecera:
+            return b''
+        if len(cabecera) < 4:
+            cabecera += _recv_exacto(self.sock, 4 - len(cabecera))
+        longitud = struct.unpack('>I', cabecera)[0]
+        if longitud > 4 + MAX_REGISTRO + 16:
+            raise ErrorAutenticacion("Registro cifrado demasiado grande")
+        cifrado = _recv_exacto(self.sock, longitud)
+        claro = self._aead_recepcion.decrypt(self._nonce(self._contador_recepcion), cifrado, None)
+        self._contador_recepcion += 1
+        return _quitar_relleno(claro)
+
+    def sendall(self, datos):
+        datos = bytes(datos)
+        for i in range(0, len(datos), MAX_REGISTRO):
+            self._enviar_registro(datos[i:i + MAX_REGISTRO])
+
+    def send(self, datos):
+        self.sendall(datos)
+        return len(datos)
+
+    def recv(self, n: int) -> bytes:
+        while not self._buffer and not self._cerrado_peer:
+            registro = self._recibir_registro()
+            if not registro:
+                self._cerrado_peer = True
+                break
+            self._buffer = registro
+        datos, self._buffer = self._buffer[:n], self._buffer[n:]
+        return datos
+
+    def settimeout(self, timeout):
+        self.sock.settimeout(timeout)
+
+    def close(self):
+        self.sock.close()
+
+
+class ServidorCanal:
+    """
+    Lado servidor del canal. Mantiene la clave de tickets, de modo que solo
+    este proceso puede aceptar las reanudaciones que emitió.
+    """
+
+    def __init__(self, identidad: IdentidadCanal, autorizados: Optional[Iterable[str]] = None,
+                 vida_ticket: int = VIDA_TICKET):
+        self.identidad = identidad
+        self.autorizados = {f.lower() for f in autorizados} if autorizados else None
+        self.vida_ticket = vida_ticket
+        self._clave_tickets = AESGCM(AESGCM.generate_key(bit_length=256))
+
+    def _emitir_ticket(self, psk: bytes, fingerprint_peer: str) -> Dict:
+        expira = int(time.time()) + self.vida_ticket
+        nonce = os.urandom(12)
+        contenido = json.dumps({'psk': _b64(psk), 'peer': fingerprint_peer, 'expira': expira}).encode()
+        return {'ticket': _b64(nonce + self._clave_tickets.encrypt(nonce, contenido, DOMINIO)), 'expira': expira}
+
+    def _abrir_ticket(self, ticket: str) -> Optional[Dict]:
+        try:
+            blob = _unb64(ticket)
+            contenido = json.loads(self._clave_tickets.decrypt(blob[:12], blob[12:], DOMINIO).decode())
+        except Exception:
+            return None
+        if contenido['expira'] < time.time():
+            return None
+        return contenido
+
+    def _comprobar_autorizado(self, fingerprint: str):
+        if self.autorizados is not None and fingerprint.lower() not in self.autorizados:
+            raise ErrorAutenticacion(f"Peer no autorizado: {fingerprint}")
+
+    def aceptar(self, sock) -> CanalSeguro:
+        """Realiza el handshake como servidor sobre un socket aceptado."""
+        hola, hola_raw = _recibir_handshake(sock)
+        efimera = X25519PrivateKey.generate()
+        efimera_pub = efimera.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        nonce = os.urandom(32)
+        dh = efimera.exchange(X25519PublicKey.from_public_bytes(_unb64(hola['efimera'])))
+        transcript = hashlib.sha256(DOMINIO + hola_raw + efimera_pub + nonce).digest()
+
+        ticket = self._abrir_ticket(hola['ticket']) if hola.get('ticket') else None
+        if ticket:
+            k_c2s, k_s2c, k_conf, secreto = _derivar(dh + _unb64(ticket['psk']), transcript)
+            _enviar_handshake(sock, {
+                'efimera': _b64(efimera_pub), 'nonce': _b64(nonce), 'reanudado': True,
+                'confirmacion': _b64(hmac.new(k_conf, b'R' + transcript, hashlib.sha256).digest()),
+            })
+            final, _ = _recibir_handshake(sock)
+            esperado = hmac.new(k_conf, b'I' + transcript, hashlib.sha256).digest()
+            if not hmac.compare_digest(esperado, _unb64(final.get('confirmacion', ''))):
+                raise ErrorAutenticacion("Confirmación de reanudación inválida")
+            fingerprint_peer = ticket['peer']
+            self._comprobar_autorizado(fingerprint_peer)
+        else:
+            pem = self.identidad.pem_publica
+            _enviar_handshake(sock, {
+                'efimera': _b64(efimera_pub), 'nonce': _b64(nonce), 'reanudado': False,
+                'clave_publica': pem.decode(),
+                'firma': _b64(self.identidad.firmar(b'R' + transcript + pem)),
+            })
+            final, _ = _recibir_handshake(sock)
+            pem_peer = final['clave_publica'].encode()
+            fingerprint_peer = self.identidad.verificar_peer(
+                pem_peer, b'I' + transcript + pem + pem_peer, _unb64(final['firma']))
+            self._comprobar_autorizado(fingerprint_peer)
+            k_c2s, k_s2c, k_conf, secreto = _derivar(dh, hashlib.sha256(transcript + pem + pem_peer).digest())
+
+        canal = CanalSeguro(sock, k_s2c, k_c2s, fingerprint_peer, reanudado=bool(ticket))
+        canal._enviar_registro(json.dumps(self._emitir_ticket(secreto, fingerprint_peer)).encode())
+        return canal
+
+
+class ClienteCanal:
+    """
+    Lado cliente del canal. Guarda en memoria los tickets recibidos por
+    destino para reanudar las siguientes conexiones al mismo peer.
+
+    Sin `fingerprint_servidor` se confía en la clave del primer uso (TOFU):
+    se fija por destino, se avisa mostrando su fingerprint y una clave
+    distinta en conexiones posteriores se rechaza. Con `conocidos` los
+    fingerprints fijados persisten en ese archivo; sin él, sólo en memoria.
+    """
+
+    def __init__(self, identidad: IdentidadCanal, fingerprint_servidor: Optional[str] = None,
+                 conocidos: Optional[str] = None):
+        self.identidad = identidad
+        self.fingerprint_servidor = fingerprint_servidor.lower() if fingerprint_servidor else None
+        self.conocidos = conocidos
+        self._tickets: Dict[Tuple[str, int], Dict] = {}
+        self._lock = threading.Lock()
+        self._fijados = self._cargar_conocidos()  # "host:puerto" -> fingerprint
+
+    def _cargar_conocidos(self) -> Dict[str, str]:
+        if not self.conocidos:
+            return {}
+        try:
+            with open(self.conocidos, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            print(f"⚠️  Archivo de peers conocidos ilegible: {self.conocidos}. Se ignora.")
+            return {}
+
+    def _guardar_conocidos(self):
+        if not self.conocidos:
+            return
+        directorio = os.path.dirname(os.path.abspath(self.conocidos))
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+        temporal = self.conocidos + '.tmp'
+        fd = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._fijados, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.conocidos)
+
+    def _comprobar_servidor(self, destino: Tuple[str, int], fingerprint: str):
+        """Compara la clave del servidor con la esperada o la fijada; la fija en el primer uso."""
+        fingerprint = fingerprint.lower()
+        if self.fingerprint_servidor:
+            if fingerprint != self.fingerprint_servidor:
+                raise ErrorAutenticacion(f"Fingerprint del servidor inesperado: {fingerprint}")
+            return
+        clave = f"{destino[0]}:{destino[1]}"
+        with self._lock:
+            fijado = self._fijados.get(clave)
+            if fijado is None:
+                self._fijados[clave] = fingerprint
+                self._guardar_conocidos()
+        if fijado is None:
+            print(f"⚠️  Primera conexión con {clave}: se confía en su clave sin verificarla (TOFU).")
+            print(f"   Fingerprint: {fingerprint}")
+            print("   Compruébalo con el receptor por otro medio o usa --peer-fingerprint.")
+        elif fijado != fingerprint:
+            donde = f" Si el cambio es legítimo, borra su entrada de {self.conocidos}." if self.conocidos else ""
+            raise ErrorAutenticacion(
+                f"La clave de {clave} ha cambiado (fijada {fijado}, recibida {fingerprint}): "
+                f"posible ataque de intermediario.{donde}")
+
+    def conectar(self, sock, destino: Tuple[str, int]) -> CanalSeguro:
+        """Realiza el handshake como cliente sobre un socket conectado a `destino`."""
+        with self._lock:
+            cache = self._tickets.pop(destino, None)  # Cada ticket se usa una sola vez
+        if cache and cache['expira'] < time.time():
+            cache = None
+
+        efimera = X25519PrivateKey.generate()
+        efimera_pub = efimera.public_key().public_bytes(serialization.Encoding.Raw, serialization.PublicFormat.Raw)
+        hola = {'version': 1, 'efimera': _b64(efimera_pub), 'nonce': _b64(os.urandom(32))}
+        if cache:
+            hola['ticket'] = cache['ticket']
+        hola_raw = _enviar_handshake(sock, hola)
+
+        respuesta, _ = _recibir_handshake(sock)
+        efimera_srv = _unb64(respuesta['efimera'])
+        transcript = hashlib.sha256(DOMINIO + hola_raw + efimera_srv + _unb64(respuesta['nonce'])).digest()
+        dh = efimera.exchange(X25519PublicKey.from_public_bytes(efimera_srv))
+
+        if respuesta.get('reanudado'):
+            if not cache:
+                raise ErrorAutenticacion("El servidor reanudó una sesión que no se solicitó")
+            k_c2s, k_s2c, k_conf, secreto = _derivar(dh + cache['psk'], transcript)
+            esperado = hmac.new(k_conf, b'R' + transcript, hashlib.sha256).digest()
+            if not hmac.compare_digest(esperado, _unb64(respuesta['confirmacion'])):
+                raise ErrorAutenticacion("Confirmación de reanudación del servidor inválida")
+            _enviar_handshake(sock, {'confirmacion': _b64(hmac.new(k_conf, b'I' + transcript, hashlib.sha256).digest())})
+            fingerprint_srv = cache['servidor']
+        else:
+            pem_srv = respuesta['clave_publica'].encode()
+            fingerprint_srv = self.identidad.verificar_peer(
+                pem_srv, b'R' + transcript + pem_srv, _unb64(respuesta['firma']))
+            self._comprobar_servidor(destino, fingerprint_srv)
+            pem = self.identidad.pem_publica
+            _enviar_handshake(sock, {
+                'clave_publica': pem.decode(),
+                'firma': _b64(self.identidad.firmar(b'I' + transcript + pem_srv + pem)),
+            })
+            k_c2s, k_s2c, k_conf, secreto = _derivar(dh, hashlib.sha256(transcript + pem_srv + pem).digest())
+
+        canal = CanalSeguro(sock, k_c2s, k_s2c, fingerprint_srv, reanudado=bool(respuesta.get('reanudado')))
+        nuevo = json.loads(canal._recibir_registro().decode())
+        with self._lock:
+            self._tickets[destino] = {'ticket': nuevo['ticket'], 'expira': nuevo['expira'],
+                                      'psk': secreto, 'servidor': fingerprint_srv}
+        return canal
@@ -3,7 +3,8 @@ import json
 import argparse
 import time
 import getpass
-from . import crypto, shamir, transport
+from . import crypto, shamir, transport, servidor_wsgi
+from .spool import ReceptorSpool
 from cryptography.hazmat.primitives import serialization
 from colorama import Fore, Style
 
@@ -24,6 +25,7 @@ except ImportError:
 # Importar P2P y Onion
 try:
     from . import transport_p2p
+    from . import canal_seguro
     P2P_AVAILABLE = True
 except ImportError:
     P2P_AVAILABLE = False
@@ -176,15 +178,101 @@ def reconstruct(args):
         print(Fore.RED + f"❌ Error inesperado: {e}" + Style.RESET_ALL)
         print(Fore.YELLOW + "Si el problema persiste, reporta el error en https://github.com/tu-repo/titansend/issues" + Style.RESET_ALL)
 
+def canal_cliente(args):
+    """Canal cifrado opcional para enviar por P2P/Onion (--identity)"""
+    if not getattr(args, 'identity', None):
+        return None
+    identidad = canal_seguro.IdentidadCanal.desde_pem(args.identity)
+    print(Fore.CYAN + f"🔒 Canal seguro con identidad {identidad.fingerprint[:16]}..." + Style.RESET_ALL)
+    if not args.peer_fingerprint:
+        print(Fore.YELLOW + f"⚠️  Sin --peer-fingerprint: la clave de cada receptor se fija en el primer uso "
+              f"({canal_seguro.ARCHIVO_CONOCIDOS})" + Style.RESET_ALL)
+    return canal_seguro.ClienteCanal(identidad, fingerprint_servidor=args.peer_fingerprint,
+                                     conocidos=canal_seguro.ARCHIVO_CONOCIDOS)
+
+def canal_servidor(args):
+    """Canal cifrado opcional para recibir por P2P/Onion (--identity)"""
+    if not getattr(args, 'identity', None):
+        return None
+    identidad = canal_seguro.IdentidadCanal.desde_pem(args.identity)
+    print(Fore.CYAN + f"🔒 Canal seguro activo. Fingerprint del receptor: {identidad.fingerprint}" + Style.RESET_ALL)
+    return canal_seguro.ServidorCanal(identidad, autorizados=args.allow_fingerprint)
+
+def spool_receptor(args):
+    """Spool con las cuotas de --quota / --quota-per-sender para recibir por P2P/Onion"""
+    if args.quota is not None or args.quota_per_sender is not None:
+        print(Fore.CYAN + f"📊 Cuotas: global {args.quota or 'sin límite'}, por emisor "
+              f"{args.quota_per_sender or 'sin límite'} bytes" + Style.RESET_ALL)
+    return ReceptorSpool(cuota_global=args.quota, cuota_por_emisor=args.quota_per_sender)
+
+def send_directorio_p2p(args):
+    """Envía todos los archivos de un directorio por una sola sesión P2P/Onion"""
+    if not P2P_AVAILABLE:
+        print(Fore.RED + "Transporte P2P no disponible." + Style.RESET_ALL)
+        return
+    directorio = args.file_path
+    rutas = sorted(os.path.join(directorio, n) for n in os.listdir(directorio)
+                   if os.path.isfile(os.path.join(directorio, n)))
+    if not rutas:
+        print(Fore.RED + f"❌ El directorio '{directorio}' no contiene archivos." + Style.RESET_ALL)
+        return
+    if args.method == 'onion':
+        host = args.onion or input("Dirección Onion del receptor (.onion): ").strip()
+        use_tor = True
+    else:
+        host = args.host or input("Host del receptor: ").strip()
+        use_tor = args.tor
+    port = args.port or 8080
+    print(Fore.YELLOW + f"📦 Enviando {len(rutas)} archivos por una sola conexión a {host}:{port}..." + Style.RESET_ALL)
+    client = transport_p2p.P2PClient(use_tor, canal=canal_cliente(args))
+    resultados = client.send_files(rutas, host, port)
+    fallidos = [ruta for ruta, ok in resultados.items() if not ok]
+    if fallidos:
+        print(Fore.RED + f"❌ {len(fallidos)} archivos no se pudieron enviar:" + Style.RESET_ALL)
+        for ruta in fallidos:
+            print(Fore.RED + f"   - {ruta}" + Style.RESET_ALL)
+    else:
+        print(Fore.GREEN + f"✅ {len(rutas)} archivos enviados por sesión P2P a {host}:{port}" + Style.RESET_ALL)
+
+def send_multiples_peers(args):
+    """Envía el mismo archivo a todos los peers de --hosts en paralelo"""
+    if not P2P_AVAILABLE:
+        print(Fore.RED + "Transporte P2P no disponible." + Style.RESET_ALL)
+        return
+    if not os.path.isfile(args.hosts):
+        print(Fore.RED + f"❌ Lista de peers '{args.hosts}' no encontrada." + Style.RESET_ALL)
+        return
+    peers = transport_p2p.leer_lista_peers(args.hosts, args.port or 8080)
+    if not peers:
+        print(Fore.RED + f"❌ La lista '{args.hosts}' no contiene peers." + Style.RESET_ALL)
+        return
+    use_tor = args.method == 'onion' or args.tor
+    resultados = transport_p2p.enviar_multiples_peers(
+        args.file_path, peers, concurrency=args.concurrency, use_tor=use_tor, canal=canal_cliente(args))
+    fallidos = [r for r in resultados if not r['ok']]
+    if not resultados:
+        print(Fore.RED + "❌ El archivo no se envió a ningún peer" + Style.RESET_ALL)
+    elif fallidos:
+        print(Fore.RED + f"❌ {len(fallidos)}/{len(resultados)} peers fallaron" + Style.RESET_ALL)
+    else:
+        print(Fore.GREEN + f"✅ Archivo enviado a {len(resultados)} peers" + Style.RESET_ALL)
+
 def send(args):
     try:
         file_path = args.file_path
         method = args.method
+        if method in ('p2p', 'onion') and os.path.isdir(file_path):
+            send_directorio_p2p(args)
+            return
+        if method in ('p2p', 'onion') and args.hosts:
+            send_multiples_peers(args)
+            return
         if not os.path.isfile(file_path):
             print(Fore.RED + f"❌ Archivo '{file_path}' no encontrado. Verifica la ruta." + Style.RESET_ALL)
             return
-        with open(file_path, 'rb') as f:
-            datos = f.read()
+        if method in ('usb', 'qr', 'bluetooth'):
+            with open(file_path, 'rb') as f:
+                datos = f.read()
         if method == 'usb':
             out_path = args.output or input("Ruta de salida en USB: ").strip()
             if not confirmar_sobrescritura(out_path):
@@ -198,11 +286,17 @@ def send(args):
                 qr_path = args.output or input("Ruta base para los códigos QR: ").strip()
                 if os.path.exists(qr_path):
                     print(Fore.YELLOW + f"⚠️  El archivo base '{qr_path}' ya existe. Se generarán archivos adicionales." + Style.RESET_ALL)
-                archivos_generados = transport_qr.generar_qr_multiple(datos, qr_path)
-                if len(archivos_generados) == 1:
-                    print(Fore.GREEN + f"✅ QR único generado: {archivos_generados[0]}" + Style.RESET_ALL)
+                if args.fountain:
+                    if transport_qr.generar_qr_fuente(datos, qr_path, redundancia=args.redundancy,
+                                                       perfil=args.qr_profile):
+                        print(Fore.GREEN + "✅ Secuencia fuente generada: el receptor puede perder frames" + Style.RESET_ALL)
                 else:
-                    print(Fore.GREEN + f"✅ {len(archivos_generados)} códigos QR generados para archivo grande" + Style.RESET_ALL)
+                    archivos_generados = transport_qr.generar_qr_multiple(datos, qr_path, paridad=args.parity,
+                                                                          perfil=args.qr_profile)
+                    if len(archivos_generados) == 1:
+                        print(Fore.GREEN + f"✅ QR único generado: {archivos_generados[0]}" + Style.RESET_ALL)
+                    else:
+                        print(Fore.GREEN + f"✅ {len(archivos_generados)} códigos QR generados para archivo grande" + Style.RESET_ALL)
             else:
                 print(Fore.YELLOW + "QR optimizado no disponible. Usando QR simple..." + Style.RESET_ALL)
                 qr_path = args.output or input("Ruta para guardar el código QR: ").strip()
@@ -224,7 +318,7 @@ def send(args):
             host = args.host or input("Host del receptor: ").strip()
             port = args.port or 8080
             use_tor = args.tor
-            client = transport_p2p.P2PClient(use_tor)
+            client = transport_p2p.P2PClient(use_tor, canal=canal_cliente(args))
             if client.send_file(file_path, host, port):
                 print(Fore.GREEN + f"✅ Archivo enviado por P2P a {host}:{port}" + Style.RESET_ALL)
             else:
@@ -235,7 +329,7 @@ def send(args):
                 return
             onion_address = args.onion or input("Dirección Onion del receptor (.onion): ").strip()
             port = args.port or 8080
-            client = transport_p2p.P2PClient(use_tor=True)
+            client = transport_p2p.P2PClient(use_tor=True, canal=canal_cliente(args))
             if client.send_file(file_path, onion_address, port):
                 print(Fore.GREEN + f"✅ Archivo enviado por Onion a {onion_address}:{port}" + Style.RESET_ALL)
             else:
@@ -248,8 +342,12 @@ def send(args):
             if not url.startswith('http'):
                 print(Fore.RED + "❌ La URL debe comenzar con http o https." + Style.RESET_ALL)
                 return
-            respuesta = transport_tor.send_data_tor(url, datos)
-            print(Fore.GREEN + f"Archivo enviado por Tor. Respuesta: {respuesta}" + Style.RESET_ALL)
+            resultado = transport_tor.enviar_archivo_tor(url, file_path, progreso=True)
+            if resultado is None:
+                print(Fore.RED + "❌ Error enviando archivo por Tor" + Style.RESET_ALL)
+                return
+            print(Fore.GREEN + f"Archivo enviado por Tor ({resultado['bytes']} bytes, SHA-256 {resultado['sha256']}). "
+                  f"Respuesta: {resultado['contenido']}" + Style.RESET_ALL)
         else:
             print(Fore.RED + "Método de envío no soportado." + Style.RESET_ALL)
     except Exception as e:
@@ -273,7 +371,7 @@ def receive(args):
         elif method == 'qr':
             if QR_OPTIMIZED_AVAILABLE:
                 print(Fore.YELLOW + "Usando QR optimizado..." + Style.RESET_ALL)
-                qr_files = args.input or input("Rutas de los códigos QR (separadas por espacios): ").strip()
+                qr_files = args.input or input("Rutas de los códigos QR, directorios de frames o vídeos (separados por espacios): ").strip()
                 qr_file_list = qr_files.split()
                 if transport_qr.reconstruir_archivo_multiple_qr(qr_file_list, out_path):
                     print(Fore.GREEN + f"✅ Archivo reconstruido exitosamente" + Style.RESET_ALL)
@@ -307,7 +405,7 @@ def receive(args):
             print(Fore.YELLOW + f"🌐 Iniciando servidor P2P en puerto {port}..." + Style.RESET_ALL)
             if use_tor:
                 print(Fore.CYAN + "🔗 Usando Tor para anonimato" + Style.RESET_ALL)
-            server = transport_p2p.P2PServer(port, use_tor)
+            server = transport_p2p.P2PServer(port, use_tor, spool=spool_receptor(args), canal=canal_servidor(args))
             server.start(out_path)
         elif method == 'onion':
             if not P2P_AVAILABLE:
@@ -316,7 +414,7 @@ def receive(args):
             port = args.port or 8080
             print(Fore.YELLOW + f"🌐 Iniciando servidor Onion en puerto {port}..." + Style.RESET_ALL)
             print(Fore.CYAN + "🔗 Configurando servicio Onion..." + Style.RESET_ALL)
-            server = transport_p2p.P2PServer(port, use_tor=True)
+            server = transport_p2p.P2PServer(port, use_tor=True, spool=spool_receptor(args), canal=canal_servidor(args))
             server.start(out_path)
         elif method == 'tor':
             if not TOR_AVAILABLE:
@@ -326,10 +424,15 @@ def receive(args):
             if not url.startswith('http'):
                 print(Fore.RED + "❌ La URL debe comenzar con http o https." + Style.RESET_ALL)
                 return
-            datos = transport_tor.receive_data_tor(url)
-            with open(out_path, 'wb') as f:
-                f.write(datos)
-            print(Fore.GREEN + f"Archivo recibido por Tor y guardado en {out_path}" + Style.RESET_ALL)
+            if args.circuits > 1:
+                resultado = transport_tor.descargar_archivo_tor(url, out_path, circuitos=args.circuits, progreso=True)
+            else:
+                resultado = transport_tor.recibir_archivo_tor(url, out_path, progreso=True)
+            if resultado is None:
+                print(Fore.RED + "❌ Error recibiendo archivo por Tor" + Style.RESET_ALL)
+                return
+            print(Fore.GREEN + f"Archivo recibido por Tor y guardado en {out_path} "
+                  f"({resultado['bytes']} bytes, SHA-256 {resultado['sha256']})" + Style.RESET_ALL)
         else:
             print(Fore.RED + "Método de recepción no soportado." + Style.RESET_ALL)
     except Exception as e:
@@ -368,10 +471,10 @@ def generate_onion(args):
         print(Fore.RED + "Transporte P2P/Onion no disponible." + Style.RESET_ALL)
         return
     port = args.port or 8080
-    print(Fore.CYAN + f"🔗 Generando nueva dirección Onion para puerto {port}..." + Style.RESET_ALL)
+    print(Fore.CYAN + f"🔗 Obteniendo dirección Onion para puerto {port} (se crea si no existe)..." + Style.RESET_ALL)
     service_id = transport_p2p.generar_direccion_onion(port)
     if service_id:
-        print(Fore.GREEN + f"✅ Nueva dirección Onion: {service_id}.onion" + Style.RESET_ALL)
+        print(Fore.GREEN + f"✅ Dirección Onion: {service_id}.onion" + Style.RESET_ALL)
         print(Fore.BLUE + f"📡 Usa: titansend receive --method onion --port {port}" + Style.RESET_ALL)
     else:
         print(Fore.RED + "❌ Error generando dirección Onion" + Style.RESET_ALL)
@@ -382,7 +485,7 @@ def get_onion_address(args):
         print(Fore.RED + "Transporte P2P/Onion no disponible." + Style.RESET_ALL)
         return
     print(Fore.CYAN + "🔍 Obteniendo dirección Onion actual..." + Style.RESET_ALL)
-    onion_address = transport_p2p.obtener_direccion_onion()
+    onion_address = transport_p2p.obtener_direccion_onion(args.port)
     if onion_address:
         print(Fore.GREEN + f"✅ Dirección Onion actual: {onion_address}" + Style.RESET_ALL)
     else:
@@ -422,18 +525,21 @@ def check_integrity(args):
     else:
         print(Fore.RED + "Integridad NO verificada. El archivo puede estar dañado o manipulado." + Style.RESET_ALL)
 
+def serve(args):
+    """Arranca el servidor Flask/Tor con un servidor WSGI de producción."""
+    try:
+        servidor_wsgi.servir(host=args.host, port=args.port, servidor=args.server, workers=args.workers,
+                             threads=args.threads, keepalive=args.keepalive, gracia=args.graceful_timeout)
+    except ImportError as e:
+        print(Fore.RED + f"❌ Falta una dependencia del servidor: {e}. Instala: pip install flask" + Style.RESET_ALL)
+
 def diagnose(args):
     print(Fore.CYAN + "Diagnóstico del entorno TitanSend:" + Style.RESET_ALL)
     print("Bluetooth:", "OK" if BLUETOOTH_AVAILABLE else "NO DISPONIBLE")
     print("QR optimizado:", "OK" if QR_OPTIMIZED_AVAILABLE else "NO DISPONIBLE")
     print("P2P/Onion:", "OK" if P2P_AVAILABLE else "NO DISPONIBLE")
     print("Tor:", "OK" if TOR_AVAILABLE else "NO DISPONIBLE")
-
-# En main():
-integrity_parser = argparse._SubParsersAction.add_parser('check_integrity', help='Validar integridad de archivo cifrado')
-integrity_parser.add_argument('file_path', help='Ruta del archivo cifrado')
-integrity_parser.add_argument('--key', required=True, help='Clave privada para descifrar (PEM)')
-integrity_parser.set_defaults(func=check_integrity)
+    print("Servidor WSGI:", servidor_wsgi.elegir_servidor())
 
 def main():
     print(WELCOME)
@@ -470,15 +576,28 @@ def main():
 
     send_parser = subparsers.add_parser('send', help='Enviar un archivo cifrado',
         epilog='Ejemplo: python -m titansend.cli send archivo_cifrado.bin --method tor --url http://127.0.0.1:5000/upload')
-    send_parser.add_argument('file_path', help='Ruta del archivo cifrado a enviar')
+    send_parser.add_argument('file_path', help='Ruta del archivo cifrado a enviar (o directorio, para p2p/onion)')
     send_parser.add_argument('--method', choices=['bluetooth', 'qr', 'usb', 'p2p', 'onion', 'tor'], required=True, help='Método de transporte')
     send_parser.add_argument('--output', help='Ruta de salida para USB/QR (opcional)')
+    send_parser.add_argument('--fountain', action='store_true',
+                             help='QR en modo fuente (códigos LT): GIF/vídeo/frames tolerantes a pérdidas')
+    send_parser.add_argument('--redundancy', type=float, default=2.0,
+                             help='Frames generados por bloque de datos en modo fuente; la secuencia es finita (default 2.0)')
+    send_parser.add_argument('--parity', type=int, default=0,
+                             help='QR de paridad Reed-Solomon: se puede perder cualquiera de ese número (default 0)')
+    send_parser.add_argument('--qr-profile', choices=['pantalla', 'impreso', 'webcam'],
+                             help='Escáner del receptor: elige versión y corrección de los QR (default: v40-L)')
     send_parser.add_argument('--address', help='Dirección Bluetooth (opcional)')
-    send_parser.add_argument('--port', type=int, default=3, help='Puerto RFCOMM para Bluetooth (default 3)')
+    send_parser.add_argument('--port', type=int, default=None,
+                             help='Puerto del receptor (default 3 RFCOMM para Bluetooth, 8080 para P2P/Onion)')
     send_parser.add_argument('--host', help='Host del receptor para P2P')
+    send_parser.add_argument('--hosts', help='Archivo con un receptor host[:puerto] por línea (envío simultáneo P2P/Onion)')
+    send_parser.add_argument('--concurrency', type=int, default=16, help='Envíos simultáneos con --hosts (default 16)')
     send_parser.add_argument('--tor', action='store_true', help='Usar TOR para P2P')
     send_parser.add_argument('--onion', help='Dirección Onion del receptor')
     send_parser.add_argument('--url', help='URL del endpoint Tor (para método tor)')
+    send_parser.add_argument('--identity', help='Clave privada PEM propia para cifrar el canal P2P/Onion (opcional)')
+    send_parser.add_argument('--peer-fingerprint', help='Fingerprint esperado del receptor (canal seguro; sin él se fija la clave del primer uso)')
     send_parser.set_defaults(func=send)
 
     receive_parser = subparsers.add_parser('receive', help='Recibir un archivo cifrado',
@@ -487,8 +606,18 @@ def main():
     receive_parser.add_argument('--input', help='Ruta del archivo de entrada (para USB/QR)')
     receive_parser.add_argument('--output', help='Ruta de salida para guardar el archivo recibido')
     receive_parser.add_argument('--address', help='Dirección Bluetooth (opcional)')
-    receive_parser.add_argument('--port', type=int, default=3, help='Puerto RFCOMM para Bluetooth (default 3)')
+    receive_parser.add_argument('--port', type=int, default=None,
+                                help='Puerto de escucha (default 3 RFCOMM para Bluetooth, 8080 para P2P/Onion)')
     receive_parser.add_argument('--url', help='URL del endpoint Tor (para método tor)')
+    receive_parser.add_argument('--circuits', type=int, default=1,
+                                help='Circuitos Tor en paralelo para descargar por rangos (método tor, default 1)')
+    receive_parser.add_argument('--tor', action='store_true', help='Usar TOR para P2P')
+    receive_parser.add_argument('--identity', help='Clave privada PEM propia para cifrar el canal P2P/Onion (opcional)')
+    receive_parser.add_argument('--quota', type=int, default=None,
+                                help='Bytes máximos en disco entre todos los emisores (P2P/Onion, default sin límite)')
+    receive_parser.add_argument('--quota-per-sender', type=int, default=None,
+                                help='Bytes máximos en disco por IP emisora (P2P/Onion, default sin límite)')
+    receive_parser.add_argument('--allow-fingerprint', action='append', help='Fingerprint de emisor autorizado (repetible)')
     receive_parser.set_defaults(func=receive)
 
     scan_parser = subparsers.add_parser('scan', help='Buscar dispositivos Bluetooth cercanos')
@@ -502,6 +631,7 @@ def main():
     generate_onion_parser.set_defaults(func=generate_onion)
 
     get_onion_address_parser = subparsers.add_parser('get_onion_address', help='Obtener dirección Onion actual')
+    get_onion_address_parser.add_argument('--port', type=int, default=None, help='Puerto local del servicio (opcional)')
     get_onion_address_parser.set_defaults(func=get_onion_address)
 
     genkey_parser = subparsers.add_parser('genkey', help='Generar par de claves RSA')
@@ -514,6 +644,19 @@ def main():
     integrity_parser.add_argument('--key', required=True, help='Clave privada para descifrar (PEM)')
     integrity_parser.set_defaults(func=check_integrity)
 
+    serve_parser = subparsers.add_parser('serve', help='Servir el receptor HTTP (Flask/Tor) en modo producción',
+        epilog='La configuración del receptor se toma de las variables TSEND_* (TSEND_FILE, TSEND_MULTIARCHIVO, ...)')
+    serve_parser.add_argument('--host', default='0.0.0.0', help='Interfaz de escucha (127.0.0.1 detrás de un servicio onion)')
+    serve_parser.add_argument('--port', type=int, default=5000, help='Puerto de escucha')
+    serve_parser.add_argument('--server', choices=servidor_wsgi.SERVIDORES, default='auto',
+                              help='Servidor WSGI (auto: gunicorn, si no waitress, si no el de desarrollo)')
+    serve_parser.add_argument('--workers', type=int, default=None, help='Procesos de gunicorn (por defecto, uno por núcleo; uno solo con TSEND_CUOTA_* o multiarchivo sin TSEND_INDICE_SQLITE)')
+    serve_parser.add_argument('--threads', type=int, default=8, help='Hilos por proceso')
+    serve_parser.add_argument('--keepalive', type=int, default=5, help='Segundos que se mantiene abierta una conexión inactiva')
+    serve_parser.add_argument('--graceful-timeout', type=int, default=30,
+                              help='Segundos de espera a las transferencias en curso al apagar')
+    serve_parser.set_defaults(func=serve)
+
     diagnose_parser = subparsers.add_parser('diagnose', help='Diagnóstico rápido del entorno')
     diagnose_parser.set_defaults(func=diagnose)
 
@@ -0,0 +1,249 @@
+"""
+Códigos fuente LT (Luby Transform) para envíos por QR animados
+==============================================================
+
+El codificador puede generar tantos símbolos como se quiera: cada uno es el
+XOR de unos cuantos bloques de los datos, elegidos con un generador
+pseudoaleatorio a partir de la semilla que viaja en el propio símbolo. El receptor reconstruye
+los datos con cualquier subconjunto de símbolos algo mayor que el número de
+bloques, sin importar cuáles se perdieron.
+
+- Distribución de grados: solitón robusta (Luby, 2002).
+- Decodificación por pelado (peeling): cada símbolo con un único bloque
+  desconocido lo resuelve y se propaga a los demás. Cuando el pelado se
+  atasca y ya hay símbolos suficientes, el resto se resuelve por eliminación
+  gaussiana en GF(2), de modo que bastan unos pocos símbolos más que K.
+
+Formato de cada símbolo (big-endian, 19 bytes de cabecera):
+  magia u8 | id u32 | longitud u32 | bloque u16 | semilla u32 | crc32 u32 | datos
+donde id es el CRC32 de los datos completos, longitud su tamaño y crc32 el de
+los datos del símbolo. Un envío tiene como mucho MAX_BLOQUES bloques: el
+decodificador rechaza cabeceras con más antes de reservar memoria para ellos.
+"""
+
+import math
+import zlib
+import struct
+import bisect
+from typing import Dict, Iterator, List, Optional
+
+CABECERA_SIMBOLO = struct.Struct('>BIIHII')
+MAGIA_LT = 0xA6
+MAX_BLOQUES = 0xFFFF  # Igual que el límite de fragmentos de los QR (u16)
+
+
+def _generador(semilla: int) -> Iterator[int]:
+    """xorshift32: mismo resultado en cualquier versión de Python y plataforma"""
+    estado = (semilla * 0x9E3779B1 + 0x7F4A7C15) & 0xFFFFFFFF or 1
+    while True:
+        estado ^= (estado << 13) & 0xFFFFFFFF
+        estado ^= estado >> 17
+        estado ^= (estado << 5) & 0xFFFFFFFF
+        yield estado
+
+
+def distribucion_soliton_robusta(k: int, c: float = 0.1, delta: float = 0.05) -> List[float]:
+    """Función de distribución acumulada de grados 1..k de la solitón robusta"""
+    if k == 1:
+        return [1.0]
+    s = c * math.log(k / delta) * math.sqrt(k)
+    pico = max(1, min(k, int(round(k / s))))
+    rho = [0.0, 1.0 / k] + [1.0 / (d * (d - 1)) for d in range(2, k + 1)]
+    tau = [0.0] * (k + 1)
+    for d in range(1, pico):
+        tau[d] = s / (k * d)
+    tau[pico] = s * math.log(s / delta) / k if s > delta else 0.0
+    pesos = [max(0.0, rho[d] + tau[d]) for d in range(1, k + 1)]
+    total = sum(pesos)
+    acumulada, suma = [], 0.0
+    for peso in pesos:
+        suma += peso / total
+        acumulada.append(suma)
+    acumulada[-1] = 1.0
+    return acumulada
+
+
+def vecinos(semilla: int, k: int, acumulada: List[float]) -> List[int]:
+    """Bloques que combina el símbolo de esta semilla"""
+    aleatorio = _generador(semilla)
+    grado = bisect.bisect_left(acumulada, next(aleatorio) / 0x100000000) + 1
+    elegidos = set()
+    while len(elegidos) < grado:
+        elegidos.add(next(aleatorio) % k)
+    return sorted(elegidos)
+
+
+class CodificadorLT:
+    """Genera símbolos LT de `datos` partidos en bloques de `bloque` bytes."""
+
+    def __init__(self, datos: bytes, bloque: int):
+        if not 0 < bloque <= 0xFFFF:
+            raise ValueError(f"Tamaño de bloque fuera de rango: {bloque}")
+        self.longitud = len(datos)
+        self.bloque = bloque
+        self.k = max(1, -(-len(datos) // bloque))
+        if self.k > MAX_BLOQUES:
+            raise ValueError(f"Los datos necesitan {self.k} bloques; el máximo es {MAX_BLOQUES}")
+        self.id = zlib.crc32(datos) & 0xffffffff
+        relleno = datos.ljust(self.k * bloque, b'\0')
+        # Bloques como enteros: el XOR de enteros grandes es mucho más rápido que byte a byte
+        self._bloques = [int.from_bytes(relleno[i * bloque:(i + 1) * bloque], 'big') for i in range(self.k)]
+        self._acumulada = distribucion_soliton_robusta(self.k)
+
+    def simbolo(self, semilla: int) -> bytes:
+        """Símbolo de la semilla indicada, con su cabecera"""
+        valor = 0
+        for i in vecinos(semilla, self.k, self._acumulada):
+            valor ^= self._bloques[i]
+        datos = valor.to_bytes(self.bloque, 'big')
+        return CABECERA_SIMBOLO.pack(MAGIA_LT, self.id, self.longitud, self.bloque, semilla,
+                                     zlib.crc32(datos) & 0xffffffff) + datos
+
+    def flujo(self, inicio: int = 0, cantidad: Optional[int] = None) -> Iterator[bytes]:
+        """Símbolos consecutivos desde `inicio`; sin `cantidad`, sin fin."""
+        semilla = inicio
+        while cantidad is None or semilla < inicio + cantidad:
+            yield self.simbolo(semilla)
+            semilla += 1
+
+
+def desempaquetar_simbolo(contenido: bytes) -> dict:
+    """Cabecera y datos de un símbolo. Lanza ValueError si no es un símbolo LT íntegro."""
+    if len(contenido) < CABECERA_SIMBOLO.size or contenido[0] != MAGIA_LT:
+        raise ValueError("No es un símbolo LT")
+    _, id_transferencia, longitud, bloque, semilla, crc = CABECERA_SIMBOLO.unpack_from(contenido)
+    datos = contenido[CABECERA_SIMBOLO.size:]
+    if bloque == 0 or len(datos) != bloque:
+        raise ValueError(f"Símbolo LT {semilla} con tamaño inválido")
+    if -(-longitud // bloque) > MAX_BLOQUES:
+        raise ValueError(f"Símbolo LT {semilla} con demasiados bloques ({longitud} bytes en bloques de {bloque})")
+    if zlib.crc32(datos) & 0xffffffff != crc:
+        raise ValueError(f"Símbolo LT {semilla} dañado: CRC32 no coincide")
+    return {'id': id_transferencia, 'longitud': longitud, 'bloque': bloque, 'semilla': semilla, 'datos': datos}
+
+
+class DecodificadorLT:
+    """
+    Decodificador por pelado. agregar() acepta símbolos en cualquier orden
+    (los repetidos y los de otros envíos se ignoran); `completo` indica
+    cuándo se conocen todos los bloques.
+    """
+
+    def __init__(self):
+        self.id = None
+        self.longitud = None
+        self.bloque = None
+        self.k = None
+        self.recibidos = 0
+        self._ultimo_intento = 0
+        self._acumulada = None
+        self._semillas = set()
+        self._bloques: Dict[int, int] = {}
+        self._pendientes: Dict[int, list] = {}   # semilla -> [valor, bloques desconocidos]
+        self._por_bloque: Dict[int, set] = {}    # bloque -> semillas pendientes que lo incluyen
+
+    def agregar(self, contenido: bytes) -> bool:
+        """Añade un símbolo. Devuelve True si era nuevo y de este envío."""
+        simbolo = desempaquetar_simbolo(contenido)
+        if self.id is None:
+            self.id, self.longitud, self.bloque = simbolo['id'], simbolo['longitud'], simbolo['bloque']
+            self.k = max(1, -(-self.longitud // self.bloque))
+            self._acumulada = distribucion_soliton_robusta(self.k)
+        elif (simbolo['id'], simbolo['longitud'], simbolo['bloque']) != (self.id, self.longitud, self.bloque):
+            return False
+        if simbolo['semilla'] in self._semillas:
+            return False
+        self._semillas.add(simbolo['semilla'])
+        self.recibidos += 1
+        if self.completo:
+            return True
+
+        valor = int.from_bytes(simbolo['datos'], 'big')
+        desconocidos = set()
+        for i in vecinos(simbolo['semilla'], self.k, self._acumulada):
+            if i in self._bloques:
+                valor ^= self._bloques[i]
+            else:
+                desconocidos.add(i)
+        if len(desconocidos) == 1:
+            self._resolver(desconocidos.pop(), valor)
+        elif desconocidos:
+            self._pendientes[simbolo['semilla']] = [valor, desconocidos]
+            for i in desconocidos:
+                self._por_bloque.setdefault(i, set()).add(simbolo['semilla'])
+        # Eliminación gaussiana si hay ecuaciones suficientes; como mucho cada ~1% de K símbolos
+        if (not self.completo and len(self._bloques) + len(self._pendientes) >= self.k
+                and self.recibidos - self._ultimo_intento >= max(1, self.k // 100)):
+            self._ultimo_intento = self.recibidos
+            self._eliminacion_gaussiana()
+        return True
+
+    def _resolver(self, indice: int, valor: int):
+        resueltos = [(indice, valor)]
+        while resueltos:
+            indice, valor = resueltos.pop()
+            if indice in self._bloques:
+                continue
+            self._bloques[indice] = valor
+            for semilla in self._por_bloque.pop(indice, ()):
+                pendiente = self._pendientes.get(semilla)
+                if pendiente is None:
+                    continue
+                pendiente[0] ^= valor
+                pendiente[1].discard(indice)
+                if len(pendiente[1]) == 1:
+                    del self._pendientes[semilla]
+                    resueltos.append((pendiente[1].pop(), pendiente[0]))
+                elif not pendiente[1]:
+                    del self._pendientes[semilla]
+
+    def _eliminacion_gaussiana(self):
+        """Resuelve en GF(2) los bloques que el pelado no alcanza, si el sistema tiene rango completo"""
+        desconocidos = sorted(set().union(*(p[1] for p in self._pendientes.values())))
+        if len(self._bloques) + len(desconocidos) < self.k:
+            return  # Algún bloque no aparece en ningún símbolo
+        posicion = {b: j for j, b in enumerate(desconocidos)}
+        pivotes = {}  # bit menor de la fila -> (máscara, valor)
+        for valor, bloques in self._pendientes.values():
+            mascara = 0
+            for b in bloques:
+                mascara |= 1 << posicion[b]
+            while mascara:
+                bit = mascara & -mascara
+                if bit not in pivotes:
+                    pivotes[bit] = (mascara, valor)
+                    break
+                mascara ^= pivotes[bit][0]
+                valor ^= pivotes[bit][1]
+        if len(pivotes) < len(desconocidos):
+            return
+        # Sustitución hacia atrás: el resto de bits de cada fila son pivotes mayores, ya resueltos
+        soluciones = {}
+        for bit in sorted(pivotes, reverse=True):
+            mascara, valor = pivotes[bit]
+            resto = mascara ^ bit
+            while resto:
+                otro = resto & -resto
+                valor ^= soluciones[otro]
+                resto ^= otro
+            soluciones[bit] = valor
+        for bit, valor in soluciones.items():
+            self._resolver(desconocidos[bit.bit_length() - 1], valor)
+
+    @property
+    def completo(self) -> bool:
+        return self.k is not None and len(self._bloques) == self.k
+
+    @property
+    def resueltos(self) -> int:
+        return len(self._bloques)
+
+    def resultado(self) -> bytes:
+        """Datos originales. Lanza ValueError si faltan bloques o no cuadra el CRC32."""
+        if not self.completo:
+            faltan = self.k - len(self._bloques) if self.k else '?'
+            raise ValueError(f"Faltan {faltan} bloques por decodificar")
+        datos = b''.join(self._bloques[i].to_bytes(self.bloque, 'big') for i in range(self.k))[:self.longitud]
+        if zlib.crc32(datos) & 0xffffffff != self.id:
+            raise ValueError("Error de integridad: checksum no coincide")
+        return datos
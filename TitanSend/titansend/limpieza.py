@@ -0,0 +1,156 @@
+"""
+Mantenimiento en segundo plano del servidor Flask
+=================================================
+
+- ColaBorrado: borrados seguros en un pool de hilos de tamaño fijo, con la
+  profundidad de la cola visible (sin crear un hilo por descarga).
+- Conserje: un único hilo que caduca archivos por antigüedad (TTL) y por
+  número máximo de archivos, y los envía a la cola de borrado. También
+  descarta las subidas por partes abandonadas.
+
+Los hilos se crean de forma perezosa en el proceso que los usa, de modo que
+funcionan también en los workers de gunicorn creados con fork.
+"""
+
+import os
+import time
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+
+class ColaBorrado:
+    """Pool fijo de hilos para borrar archivos con la función indicada."""
+
+    def __init__(self, borrar: Callable[[str], bool], workers: int = 2):
+        self._borrar = borrar
+        self.workers = workers
+        self._lock = threading.Lock()
+        self._vacia = threading.Condition(self._lock)
+        self._pendientes = 0
+        self._pool = None
+        self._pid = None
+
+    def _ejecutor(self) -> ThreadPoolExecutor:
+        if self._pid != os.getpid():
+            # Tras un fork los hilos del proceso padre no existen
+            self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='titansend-borrado')
+            self._pid = os.getpid()
+        return self._pool
+
+    @property
+    def pendientes(self) -> int:
+        """Borrados encolados o en curso."""
+        with self._lock:
+            return self._pendientes
+
+    def encolar(self, ruta: str):
+        """Programa el borrado de un archivo."""
+        with self._lock:
+            self._pendientes += 1
+            pool = self._ejecutor()
+        pool.submit(self._ejecutar, ruta)
+
+    def _ejecutar(self, ruta: str):
+        try:
+            self._borrar(ruta)
+        except Exception as e:
+            print(f"[{datetime.now()}] [ERROR] Borrado de '{ruta}' falló: {e}")
+        finally:
+            with self._lock:
+                self._pendientes -= 1
+                if not self._pendientes:
+                    self._vacia.notify_all()
+
+    def esperar(self, timeout: Optional[float] = None) -> bool:
+        """Espera a que se vacíe la cola. Devuelve True si se vació."""
+        with self._lock:
+            return self._vacia.wait_for(lambda: not self._pendientes, timeout)
+
+
+class Conserje:
+    """
+    Caduca archivos por TTL (segundos desde su creación) y mantiene como
+    máximo `max_archivos`, borrando primero los más antiguos.
+    En modo multiarchivo trabaja sobre el índice del almacén; en modo de
+    archivo único, sobre `archivo`. Con `subidas` (GestorSubidas) descarta
+    además las subidas sin actividad durante `inactividad_subidas` segundos.
+    """
+
+    def __init__(self, cola: ColaBorrado, almacen=None, archivo: Optional[str] = None,
+                 ttl: Optional[float] = None, max_archivos: Optional[int] = None, intervalo: float = 60,
+                 subidas=None, inactividad_subidas: Optional[float] = None):
+        self.cola = cola
+        self.almacen = almacen
+        self.archivo = archivo
+        self.ttl = ttl
+        self.max_archivos = max_archivos
+        self.subidas = subidas
+        self.inactividad_subidas = inactividad_subidas
+        self.intervalo = intervalo
+        self._parar = threading.Event()
+        self._pid = None
+        self._lock = threading.Lock()
+
+    @property
+    def activo(self) -> bool:
+        return (self.ttl is not None or self.max_archivos is not None
+                or (self.subidas is not None and self.inactividad_subidas is not None))
+
+    def pasada(self, ahora: Optional[float] = None) -> int:
+        """Ejecuta una ronda de caducidad. Devuelve cuántos archivos se encolaron o descartaron."""
+        ahora = time.time() if ahora is None else ahora
+        abandonadas = 0
+        if self.subidas is not None and self.inactividad_subidas is not None:
+            abandonadas = len(self.subidas.caducar(self.inactividad_subidas, ahora))
+        return abandonadas + self._caducar_archivos(ahora)
+
+    def _caducar_archivos(self, ahora: float) -> int:
+        if self.almacen is not None:
+            caducados = []
+            entradas = self.almacen.entradas()
+            if self.ttl is not None:
+                caducados = [i for i, e in entradas.items() if ahora - e['creado'] >= self.ttl]
+            if self.max_archivos is not None:
+                ya_caducados = set(caducados)
+                restantes = [i for i in self.almacen.listar() if i not in ya_caducados]
+                caducados += restantes[:max(0, len(restantes) - self.max_archivos)]
+            for file_id in caducados:
+                # Fuera del índice primero: deja de poder descargarse
+                entrada = self.almacen.eliminar(file_id)
+                if entrada:
+                    self.cola.encolar(entrada['ruta'])
+            return len(caducados)
+        if self.archivo and self.ttl is not None:
+            try:
+                if ahora - os.path.getmtime(self.archivo) >= self.ttl:
+                    self.cola.encolar(self.archivo)
+                    return 1
+            except FileNotFoundError:
+                pass
+        return 0
+
+    def _bucle(self):
+        while not self._parar.wait(self.intervalo):
+            try:
+                n = self.pasada()
+                if n:
+                    print(f"[{datetime.now()}] [EXPIRE] {n} archivos caducados o subidas abandonadas descartados")
+            except Exception as e:
+                print(f"[{datetime.now()}] [ERROR] Limpieza falló: {e}")
+
+    def iniciar(self):
+        """Arranca el hilo de mantenimiento una vez por proceso (si hay algo que caducar)."""
+        if not self.activo or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._parar.clear()
+            threading.Thread(target=self._bucle, name='titansend-conserje', daemon=True).start()
+            self._pid = os.getpid()
+
+    def detener(self):
+        self._parar.set()
+        self._pid = None
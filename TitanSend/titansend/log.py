@@ -4,6 +4,11 @@ import time
 import json
 from cryptography.hazmat.primitives.ciphers import aead
 
+try:
+    from .borrado_seguro import borrar_archivo_seguro
+except ImportError:
+    from borrado_seguro import borrar_archivo_seguro
+
 # =========================
 # Guardar registro cifrado con longitud, autenticidad y timestamp (AES-GCM)
 # =========================
@@ -114,9 +119,4 @@ def borrar_log_seguro(ruta: str):
     """
     Borra el archivo de log de forma segura (sobrescribe antes de eliminar).
     """
-    if os.path.isfile(ruta):
-        tam = os.path.getsize(ruta)
-        with open(ruta, 'ba+', buffering=0) as f:
-            f.seek(0)
-            f.write(os.urandom(tam))
-        os.remove(ruta)
\ No newline at end of file
+    borrar_archivo_seguro(ruta)
@@ -0,0 +1,292 @@
+"""
+Métricas en formato de texto de Prometheus
+==========================================
+
+Contadores, indicadores e histogramas mínimos, sin dependencias externas.
+Cada métrica protege sus valores con su propio lock, así que actualizarlas
+en el camino caliente cuesta una adquisición de lock y una suma.
+
+Con varios procesos (workers de gunicorn) el registro recibe un directorio
+compartido, como PROMETHEUS_MULTIPROC_DIR del cliente oficial: cada proceso
+vuelca ahí sus valores y /metrics expone la suma de todos.
+"""
+
+import os
+import json
+import time
+import atexit
+import bisect
+import threading
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+TIPO_CONTENIDO = 'text/plain; version=0.0.4; charset=utf-8'
+BUCKETS_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+
+def _formatear(valor: float) -> str:
+    if valor == float('inf'):
+        return '+Inf'
+    return repr(float(valor)) if isinstance(valor, float) else str(valor)
+
+
+def _escapar(valor) -> str:
+    return str(valor).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _vivo(pid: int) -> bool:
+    if os.name == 'nt':
+        return True  # os.kill(pid, 0) terminaría el proceso en Windows
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _etiquetas(nombres: Sequence[str], valores: Tuple, extra: str = '') -> str:
+    partes = [f'{n}="{_escapar(v)}"' for n, v in zip(nombres, valores)]
+    if extra:
+        partes.append(extra)
+    return '{' + ','.join(partes) + '}' if partes else ''
+
+
+class _Metrica:
+    tipo = ''
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.etiquetas = tuple(etiquetas)
+        self._lock = threading.Lock()
+
+    def _reiniciar(self):
+        """Tras un fork: el hijo empieza de cero (y con un lock que nadie retiene)."""
+        self._lock = threading.Lock()
+
+    def _clave(self, etiquetas: Dict[str, str]) -> Tuple:
+        return tuple(str(etiquetas.get(n, '')) for n in self.etiquetas)
+
+    def _cabecera(self) -> List[str]:
+        return [f"# HELP {self.nombre} {self.ayuda}", f"# TYPE {self.nombre} {self.tipo}"]
+
+
+class Contador(_Metrica):
+    """Valor que solo crece (por combinación de etiquetas)."""
+    tipo = 'counter'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()):
+        super().__init__(nombre, ayuda, etiquetas)
+        self._valores: Dict[Tuple, float] = {}
+
+    def inc(self, valor: float = 1, **etiquetas):
+        clave = self._clave(etiquetas)
+        with self._lock:
+            self._valores[clave] = self._valores.get(clave, 0) + valor
+
+    def valor(self, **etiquetas) -> float:
+        with self._lock:
+            return self._valores.get(self._clave(etiquetas), 0)
+
+    def _reiniciar(self):
+        super()._reiniciar()
+        self._valores = {}
+
+    def _estado(self):
+        with self._lock:
+            return [[list(k), v] for k, v in self._valores.items()]
+
+    def exponer(self, otros: Sequence = (), multiproceso: bool = False) -> List[str]:
+        with self._lock:
+            valores = dict(self._valores)
+        # Los contadores de procesos ya terminados siguen sumando
+        for _, _, estado in otros:
+            for clave, valor in estado:
+                clave = tuple(clave)
+                valores[clave] = valores.get(clave, 0) + valor
+        if not valores and not self.etiquetas:
+            valores = {(): 0}
+        return self._cabecera() + [f"{self.nombre}{_etiquetas(self.etiquetas, k)} {_formatear(v)}"
+                                   for k, v in valores.items()]
+
+
+class Indicador(_Metrica):
+    """
+    Valor instantáneo leído de una función al exponer las métricas. Con
+    varios procesos se suman los de los procesos vivos (agregacion='suma') o
+    se expone uno por proceso con la etiqueta pid (agregacion='proceso').
+    """
+    tipo = 'gauge'
+
+    def __init__(self, nombre: str, ayuda: str, funcion: Callable[[], float], agregacion: str = 'suma'):
+        super().__init__(nombre, ayuda)
+        if agregacion not in ('suma', 'proceso'):
+            raise ValueError(f"Agregación desconocida: {agregacion}")
+        self.funcion = funcion
+        self.agregacion = agregacion
+
+    def _estado(self):
+        return self.funcion()
+
+    def exponer(self, otros: Sequence = (), multiproceso: bool = False) -> List[str]:
+        if not multiproceso:
+            return self._cabecera() + [f"{self.nombre} {_formatear(self.funcion())}"]
+        vivos = [(pid, estado) for pid, vivo, estado in otros if vivo]
+        if self.agregacion == 'suma':
+            total = self.funcion() + sum(estado for _, estado in vivos)
+            return self._cabecera() + [f"{self.nombre} {_formatear(total)}"]
+        valores = [(os.getpid(), self.funcion())] + vivos
+        return self._cabecera() + [f"{self.nombre}{_etiquetas(('pid',), (pid,))} {_formatear(v)}"
+                                   for pid, v in sorted(valores)]
+
+
+class Histograma(_Metrica):
+    """Distribución de observaciones en buckets acumulativos."""
+    tipo = 'histogram'
+
+    def __init__(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                 buckets: Sequence[float] = BUCKETS_LATENCIA):
+        super().__init__(nombre, ayuda, etiquetas)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple, list] = {}  # clave -> [cuentas por bucket..., suma, total]
+
+    def observar(self, valor: float, **etiquetas):
+        clave = self._clave(etiquetas)
+        indice = bisect.bisect_left(self.buckets, valor)
+        with self._lock:
+            serie = self._series.get(clave)
+            if serie is None:
+                serie = self._series[clave] = [0] * (len(self.buckets) + 1) + [0.0, 0]
+            serie[indice] += 1
+            serie[-2] += valor
+            serie[-1] += 1
+
+    def _reiniciar(self):
+        super()._reiniciar()
+        self._series = {}
+
+    def _estado(self):
+        with self._lock:
+            return [[list(k), list(s)] for k, s in self._series.items()]
+
+    def exponer(self, otros: Sequence = (), multiproceso: bool = False) -> List[str]:
+        with self._lock:
+            series = {k: list(s) for k, s in self._series.items()}
+        for _, _, estado in otros:
+            for clave, serie in estado:
+                clave = tuple(clave)
+                if len(serie) != len(self.buckets) + 3:
+                    continue  # Otros buckets (versión distinta): no se pueden sumar
+                actual = series.get(clave)
+                series[clave] = serie if actual is None else [a + b for a, b in zip(actual, serie)]
+        lineas = self._cabecera()
+        for clave, serie in series.items():
+            acumulado = 0
+            for limite, cuenta in zip(self.buckets + (float('inf'),), serie):
+                acumulado += cuenta
+                le = f'le="{_formatear(limite)}"'
+                lineas.append(f"{self.nombre}_bucket{_etiquetas(self.etiquetas, clave, le)} {acumulado}")
+            lineas.append(f"{self.nombre}_sum{_etiquetas(self.etiquetas, clave)} {_formatear(serie[-2])}")
+            lineas.append(f"{self.nombre}_count{_etiquetas(self.etiquetas, clave)} {serie[-1]}")
+        return lineas
+
+
+class Registro:
+    """
+    Conjunto de métricas que se exponen juntas.
+
+    Con `directorio`, cada proceso vuelca sus valores a <directorio>/<pid>.json
+    cada `intervalo` segundos (y al salir), y exponer() los suma a los
+    propios. Tras un fork el hijo empieza con los valores a cero.
+    """
+
+    def __init__(self, directorio: Optional[str] = None, intervalo: float = 1.0):
+        self._metricas: List[_Metrica] = []
+        self.directorio = directorio
+        self.intervalo = intervalo
+        self._lock_volcado = threading.Lock()
+        self._volcado = None  # Último contenido escrito (no se reescribe si no cambia)
+        if directorio:
+            os.makedirs(directorio, exist_ok=True)
+            self._arrancar_volcado()
+            atexit.register(self._volcar_al_salir)
+            if hasattr(os, 'register_at_fork'):
+                os.register_at_fork(after_in_child=self._tras_fork)
+
+    def _arrancar_volcado(self):
+        threading.Thread(target=self._bucle_volcado, daemon=True, name='titansend-metricas').start()
+
+    def _bucle_volcado(self):
+        while True:
+            time.sleep(self.intervalo)
+            try:
+                self.volcar()
+            except OSError as e:
+                print(f"⚠️  No se pudieron volcar las métricas: {e}")
+
+    def _volcar_al_salir(self):
+        try:
+            self.volcar()
+        except OSError:
+            pass  # El directorio ya no existe (servidor detenido)
+
+    def _tras_fork(self):
+        for metrica in self._metricas:
+            metrica._reiniciar()
+        self._lock_volcado = threading.Lock()
+        self._volcado = None
+        self._arrancar_volcado()
+
+    def volcar(self):
+        """Escribe los valores de este proceso en el directorio compartido."""
+        if not self.directorio:
+            return
+        with self._lock_volcado:
+            contenido = json.dumps({m.nombre: m._estado() for m in self._metricas}, sort_keys=True)
+            if contenido == self._volcado:
+                return
+            ruta = os.path.join(self.directorio, f'{os.getpid()}.json')
+            with open(ruta + '.tmp', 'w') as f:
+                f.write(contenido)
+            os.replace(ruta + '.tmp', ruta)
+            self._volcado = contenido
+
+    def _leer_otros(self) -> List[Tuple[int, bool, dict]]:
+        """(pid, vivo, valores) de los demás procesos que han volcado métricas."""
+        otros = []
+        for nombre in os.listdir(self.directorio):
+            pid = nombre[:-len('.json')]
+            if not nombre.endswith('.json') or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                with open(os.path.join(self.directorio, nombre), 'r') as f:
+                    valores = json.load(f)
+            except (OSError, ValueError):
+                continue  # Borrado o a medio escribir: se lee en la próxima petición
+            otros.append((int(pid), _vivo(int(pid)), valores))
+        return otros
+
+    def registrar(self, metrica):
+        self._metricas.append(metrica)
+        return metrica
+
+    def contador(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = ()) -> Contador:
+        return self.registrar(Contador(nombre, ayuda, etiquetas))
+
+    def indicador(self, nombre: str, ayuda: str, funcion: Callable[[], float],
+                  agregacion: str = 'suma') -> Indicador:
+        return self.registrar(Indicador(nombre, ayuda, funcion, agregacion))
+
+    def histograma(self, nombre: str, ayuda: str, etiquetas: Sequence[str] = (),
+                   buckets: Optional[Sequence[float]] = None) -> Histograma:
+        return self.registrar(Histograma(nombre, ayuda, etiquetas, buckets or BUCKETS_LATENCIA))
+
+    def exponer(self) -> str:
+        otros = self._leer_otros() if self.directorio else []
+        lineas = []
+        for metrica in self._metricas:
+            suyos = [(pid, vivo, valores[metrica.nombre]) for pid, vivo, valores in otros
+                     if metrica.nombre in valores]
+            lineas.extend(metrica.exponer(suyos, multiproceso=bool(self.directorio)))
+        return '\n'.join(lineas) + '\n'
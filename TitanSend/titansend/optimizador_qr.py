@@ -0,0 +1,135 @@
+"""
+Selección adaptativa de versión y corrección de errores de los QR
+=================================================================
+
+Un QR versión 40 con corrección L lleva el máximo de datos, pero sus 177
+módulos por lado son difíciles de leer con la cámara de un móvil apuntando a
+una pantalla: cada lectura fallida cuesta otro intento. Este módulo elige la
+versión, el nivel de corrección y con ello el tamaño de fragmento que
+minimizan el tiempo total esperado de captura para un perfil de escáner.
+
+Modelo por código:
+- La capacidad sale de las tablas Reed-Solomon de qrcode (rs_blocks): bytes
+  de datos por bloque menos la cabecera del modo byte.
+- La probabilidad de leerlo en un intento es la de resolver sus módulos con
+  la cámara del perfil (logística alrededor de `modulos_max`) por la de que
+  cada bloque tenga como mucho tantos codewords dañados como corrige su
+  Reed-Solomon (binomial con la tasa de error `error_codeword` del perfil).
+- Tiempo esperado = sobrecoste por código (apuntar, pasar al siguiente) +
+  tiempo por intento / probabilidad de éxito.
+"""
+
+import math
+from typing import Dict, Optional
+
+from qrcode.base import rs_blocks
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_M, ERROR_CORRECT_Q, ERROR_CORRECT_H
+
+MAX_FRAGMENTOS = 0xFFFF  # Las cabeceras de fragmento cuentan los QR con un u16
+
+NIVELES_ECC = {'L': ERROR_CORRECT_L, 'M': ERROR_CORRECT_M, 'Q': ERROR_CORRECT_Q, 'H': ERROR_CORRECT_H}
+
+# modulos_max: módulos por lado que la cámara resuelve en la mitad de los intentos
+# escala: suavidad de esa transición; error_codeword: probabilidad de que un codeword llegue dañado
+# (reflejos, desenfoque, moiré); sobrecoste: segundos por código además de los intentos;
+# intento: segundos entre dos intentos de lectura; box_size: píxeles por módulo al dibujar
+PERFILES_ESCANER = {
+    'pantalla': {'modulos_max': 85, 'escala': 8.0, 'error_codeword': 0.05, 'sobrecoste': 0.6,
+                 'intento': 0.1, 'box_size': 4},
+    'impreso': {'modulos_max': 115, 'escala': 10.0, 'error_codeword': 0.02, 'sobrecoste': 2.5,
+                'intento': 0.2, 'box_size': 3},
+    'webcam': {'modulos_max': 65, 'escala': 6.0, 'error_codeword': 0.08, 'sobrecoste': 0.4,
+               'intento': 1 / 15, 'box_size': 5},
+}
+
+
+def modulos(version: int) -> int:
+    """Módulos por lado de un QR de esa versión"""
+    return 17 + 4 * version
+
+
+def capacidad_bytes(version: int, error_correction: int) -> int:
+    """Bytes que caben en modo byte: codewords de datos menos modo (4 bits) y longitud (8 o 16 bits)"""
+    codewords = sum(bloque.data_count for bloque in rs_blocks(version, error_correction))
+    bits_longitud = 8 if version < 10 else 16
+    return (codewords * 8 - 4 - bits_longitud) // 8
+
+
+def _prob_bloque(total: int, datos: int, error_codeword: float) -> float:
+    """P(no más de los errores corregibles) en un bloque Reed-Solomon"""
+    corregibles = (total - datos) // 2
+    return sum(math.comb(total, e) * error_codeword ** e * (1 - error_codeword) ** (total - e)
+               for e in range(corregibles + 1))
+
+
+def probabilidad_lectura(version: int, error_correction: int, perfil: dict) -> float:
+    """Probabilidad de leer un código en un intento con ese perfil de escáner"""
+    exponente = (modulos(version) - perfil['modulos_max']) / perfil['escala']
+    resolucion = 1.0 / (1.0 + math.exp(min(exponente, 700)))
+    bloques = 1.0
+    for bloque in rs_blocks(version, error_correction):
+        bloques *= _prob_bloque(bloque.total_count, bloque.data_count, perfil['error_codeword'])
+    return resolucion * bloques
+
+
+def evaluar(tamano: int, version: int, nivel: str, perfil: dict, cabecera: int = 0, paridad: int = 0,
+            fragmentado: bool = False) -> dict:
+    """
+    Coste esperado de enviar `tamano` bytes (ya comprimidos) con QR de esa
+    versión y nivel. `cabecera` son los bytes por fragmento de un envío
+    múltiple y `paridad` los fragmentos de paridad que se añaden. Si los
+    datos caben en un QR van sin cabecera, salvo con `fragmentado` (modo
+    fuente, paridad).
+    """
+    error_correction = NIVELES_ECC[nivel]
+    capacidad = capacidad_bytes(version, error_correction)
+    if tamano <= capacidad and not (paridad or fragmentado):
+        fragmentos = 1
+    elif capacidad <= cabecera:
+        fragmentos = None
+    else:
+        datos = -(-tamano // (capacidad - cabecera))
+        # Reed-Solomon añade `paridad` fragmentos por cada grupo de hasta 256 - paridad
+        fragmentos = datos + paridad * -(-datos // (256 - paridad))
+        if fragmentos > MAX_FRAGMENTOS:
+            fragmentos = None
+    probabilidad = probabilidad_lectura(version, error_correction, perfil)
+    if not fragmentos or probabilidad <= 0:
+        segundos = math.inf
+    else:
+        segundos = fragmentos * (perfil['sobrecoste'] + perfil['intento'] / probabilidad)
+    return {
+        'version': version,
+        'nivel': nivel,
+        'error_correction': error_correction,
+        'max_data_bytes': capacidad,
+        'fragmentos': fragmentos,
+        'probabilidad': probabilidad,
+        'segundos': segundos,
+        'box_size': perfil.get('box_size', 2),
+    }
+
+
+def optimizar(tamano: int, perfil='pantalla', cabecera: int = 13, paridad: int = 0, fragmentado: bool = False,
+              versiones=range(1, 41), niveles=('L', 'M', 'Q', 'H')) -> Optional[dict]:
+    """
+    Configuración (ver evaluar) con el menor tiempo total esperado de captura
+    para `tamano` bytes comprimidos. `perfil` es el nombre de un perfil de
+    PERFILES_ESCANER o un dict con sus mismas claves.
+    """
+    if isinstance(perfil, str):
+        if perfil not in PERFILES_ESCANER:
+            raise ValueError(f"Perfil desconocido: {perfil}. Disponibles: {', '.join(PERFILES_ESCANER)}")
+        perfil = PERFILES_ESCANER[perfil]
+    mejor = None
+    for version in versiones:
+        for nivel in niveles:
+            opcion = evaluar(tamano, version, nivel, perfil, cabecera, paridad, fragmentado)
+            if mejor is None or opcion['segundos'] < mejor['segundos']:
+                mejor = opcion
+    return mejor if mejor and math.isfinite(mejor['segundos']) else None
+
+
+def tabla(tamano: int, perfil='pantalla', cabecera: int = 13) -> Dict[str, dict]:
+    """Mejor versión para cada nivel de corrección (para mostrar o comparar)"""
+    return {nivel: optimizar(tamano, perfil, cabecera, niveles=(nivel,)) for nivel in NIVELES_ECC}
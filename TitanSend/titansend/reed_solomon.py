@@ -0,0 +1,311 @@
+"""
+Códigos de borrado Reed-Solomon sistemáticos sobre GF(256)
+==========================================================
+
+Los datos se parten en k fragmentos y se añaden m fragmentos de paridad:
+con cualquier k de los k + m se reconstruye todo, es decir, se toleran hasta
+m fragmentos perdidos. Los fragmentos de datos son los datos tal cual
+(código sistemático): si llegan todos no hay nada que decodificar.
+
+La paridad usa una matriz de Cauchy, cuyas submatrices cuadradas son todas
+invertibles, lo que garantiza la reconstrucción con cualquier k fragmentos.
+Con NumPy, cada producto coeficiente × fragmento es una consulta vectorizada
+en una tabla de multiplicar de GF(256) de dos bytes por entrada; sin NumPy
+se usa bytes.translate con la tabla de un byte y XOR de enteros grandes.
+
+Para más de 256 fragmentos los datos se reparten en grupos de como mucho
+256 - m fragmentos de datos, cada uno con sus m de paridad.
+
+Formato de cada fragmento empaquetado (big-endian, 19 bytes de cabecera):
+  magia u8 | índice u16 (desde 1) | k u16 | m u16 | id u32 | longitud u32 | crc32 u32 | datos
+donde k es el total de fragmentos de datos, m la paridad por grupo, id el
+CRC32 de los datos completos y crc32 el del fragmento.
+"""
+
+import zlib
+import struct
+from typing import Dict, Iterable, List, Optional
+
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    NUMPY_AVAILABLE = False
+
+CABECERA_PARTE = struct.Struct('>BHHHIII')
+MAGIA_RS = 0xA7
+TAMANO_GF = 256
+BLOQUE_COLUMNAS = 256 * 1024  # Columnas procesadas a la vez: los operandos caben en caché
+
+# Tablas de GF(2^8) con el polinomio x^8 + x^4 + x^3 + x^2 + 1 (0x11d)
+_EXP = [0] * 512
+_LOG = [0] * 256
+_x = 1
+for _i in range(255):
+    _EXP[_i] = _x
+    _LOG[_x] = _i
+    _x <<= 1
+    if _x & 0x100:
+        _x ^= 0x11d
+for _i in range(255, 512):
+    _EXP[_i] = _EXP[_i - 255]
+
+
+def gf_mul(a: int, b: int) -> int:
+    if a == 0 or b == 0:
+        return 0
+    return _EXP[_LOG[a] + _LOG[b]]
+
+
+def gf_inv(a: int) -> int:
+    if a == 0:
+        raise ZeroDivisionError("0 no tiene inverso en GF(256)")
+    return _EXP[255 - _LOG[a]]
+
+
+# Fila c de la tabla: c × x para todo byte x
+_TRADUCCIONES = [bytes(gf_mul(c, x) for x in range(256)) for c in range(256)]
+if NUMPY_AVAILABLE:
+    _TABLA_MUL = np.frombuffer(b''.join(_TRADUCCIONES), dtype=np.uint8).reshape(256, 256)
+_TABLAS_16 = {}
+
+
+def _tabla16(c: int):
+    """
+    c × (par de bytes) en una sola consulta: 128 KB por coeficiente, cabe en
+    caché y reduce a la mitad las consultas. Cada byte se multiplica en su
+    posición, así que vale con cualquier orden de bytes.
+    """
+    tabla = _TABLAS_16.get(c)
+    if tabla is None:
+        fila = _TABLA_MUL[c].astype(np.uint16)
+        palabras = np.arange(65536, dtype=np.uint32)
+        tabla = fila[palabras & 0xFF] | (fila[palabras >> 8] << 8)
+        _TABLAS_16[c] = tabla
+    return tabla
+
+
+def _invertir(matriz: List[List[int]]) -> List[List[int]]:
+    """Inversa de una matriz cuadrada en GF(256) por Gauss-Jordan"""
+    n = len(matriz)
+    filas = [fila[:] + [int(i == j) for j in range(n)] for i, fila in enumerate(matriz)]
+    for columna in range(n):
+        pivote = next((f for f in range(columna, n) if filas[f][columna]), None)
+        if pivote is None:
+            raise ValueError("Matriz singular")
+        filas[columna], filas[pivote] = filas[pivote], filas[columna]
+        inverso = gf_inv(filas[columna][columna])
+        filas[columna] = [gf_mul(inverso, v) for v in filas[columna]]
+        for f in range(n):
+            factor = filas[f][columna]
+            if f != columna and factor:
+                filas[f] = [v ^ gf_mul(factor, p) for v, p in zip(filas[f], filas[columna])]
+    return [fila[n:] for fila in filas]
+
+
+def _combinar_numpy(filas: List[List[int]], fragmentos: list, longitud: int) -> List[bytes]:
+    """
+    Todas las filas a la vez y por bloques de columnas: cada trozo de un
+    fragmento se lee una vez y se reparte a todas las salidas mientras está en caché.
+    """
+    pares = longitud // 2
+    fuentes = [np.frombuffer(f, dtype=np.uint8) for f in fragmentos]
+    fuentes16 = [f[:pares * 2].view(np.uint16) for f in fuentes]
+    resultados = [np.zeros(longitud, dtype=np.uint8) for _ in filas]
+    destinos16 = [r[:pares * 2].view(np.uint16) for r in resultados]
+    paso = BLOQUE_COLUMNAS // 2
+    temporal = np.empty(paso, dtype=np.uint16)
+    for inicio in range(0, pares, paso):
+        fin = min(pares, inicio + paso)
+        producto = temporal[:fin - inicio]
+        for j, fuente in enumerate(fuentes16):
+            trozo = fuente[inicio:fin]
+            for fila, destino in zip(filas, destinos16):
+                c = fila[j]
+                if not c:
+                    continue
+                salida = destino[inicio:fin]
+                if c == 1:
+                    np.bitwise_xor(salida, trozo, out=salida)
+                else:
+                    # mode='clip' evita la comprobación de índices, que multiplica el coste
+                    np.take(_tabla16(c), trozo, out=producto, mode='clip')
+                    np.bitwise_xor(salida, producto, out=salida)
+    if longitud % 2:
+        for fila, resultado in zip(filas, resultados):
+            ultimo = 0
+            for c, fuente in zip(fila, fuentes):
+                ultimo ^= gf_mul(c, int(fuente[-1]))
+            resultado[-1] = ultimo
+    return [r.tobytes() for r in resultados]
+
+
+def _combinar(filas: List[List[int]], fragmentos: list, longitud: int, vectorizado: bool) -> List[bytes]:
+    """Para cada fila, XOR de coeficiente × fragmento en GF(256)"""
+    if vectorizado:
+        return _combinar_numpy(filas, fragmentos, longitud)
+    resultados = []
+    for fila in filas:
+        acumulado = 0
+        for c, fragmento in zip(fila, fragmentos):
+            if c:
+                producto = bytes(fragmento) if c == 1 else bytes(fragmento).translate(_TRADUCCIONES[c])
+                acumulado ^= int.from_bytes(producto, 'big')
+        resultados.append(acumulado.to_bytes(longitud, 'big'))
+    return resultados
+
+
+class CodigoRS:
+    """
+    Código (k + m, k) sistemático. codificar() calcula la paridad de k
+    fragmentos del mismo tamaño; reconstruir() recupera los k fragmentos
+    de datos a partir de cualquier k fragmentos, indexados 0..k+m-1
+    (primero los de datos, luego los de paridad).
+    """
+
+    def __init__(self, k: int, m: int, vectorizado: Optional[bool] = None):
+        if k < 1 or m < 0 or k + m > TAMANO_GF:
+            raise ValueError(f"Parámetros fuera de rango: k={k}, m={m} (k >= 1, k + m <= {TAMANO_GF})")
+        self.k = k
+        self.m = m
+        self.vectorizado = NUMPY_AVAILABLE if vectorizado is None else vectorizado and NUMPY_AVAILABLE
+        # Matriz de Cauchy: fila i, columna j = 1 / (x_i + y_j) con x_i = k + i, y_j = j (todos distintos)
+        self.paridad = [[gf_inv((k + i) ^ j) for j in range(k)] for i in range(m)]
+
+    def _fila(self, indice: int) -> List[int]:
+        if indice < self.k:
+            return [int(j == indice) for j in range(self.k)]
+        return self.paridad[indice - self.k]
+
+    def codificar(self, fragmentos: List[bytes]) -> List[bytes]:
+        """Los m fragmentos de paridad"""
+        if len(fragmentos) != self.k or len({len(f) for f in fragmentos}) > 1:
+            raise ValueError(f"Se esperan {self.k} fragmentos del mismo tamaño")
+        return _combinar(self.paridad, fragmentos, len(fragmentos[0]), self.vectorizado)
+
+    def reconstruir(self, fragmentos: Dict[int, bytes]) -> List[bytes]:
+        """Los k fragmentos de datos. Lanza ValueError si hay menos de k fragmentos."""
+        if len(fragmentos) < self.k:
+            raise ValueError(f"Hacen falta {self.k} fragmentos y hay {len(fragmentos)}")
+        datos = {i: f for i, f in fragmentos.items() if i < self.k}
+        if len(datos) == self.k:
+            return [datos[i] for i in range(self.k)]
+        # Datos presentes primero; la paridad solo para cubrir los huecos
+        usados = sorted(datos) + sorted(i for i in fragmentos if i >= self.k)[:self.k - len(datos)]
+        inversa = _invertir([self._fila(i) for i in usados])
+        operandos = [fragmentos[i] for i in usados]
+        perdidos = [j for j in range(self.k) if j not in datos]
+        recuperados = dict(zip(perdidos, _combinar([inversa[j] for j in perdidos], operandos,
+                                                   len(operandos[0]), self.vectorizado)))
+        return [datos[j] if j in datos else recuperados[j] for j in range(self.k)]
+
+
+def _grupos(k: int, m: int) -> List[range]:
+    """Fragmentos de datos (índices desde 0) de cada grupo de como mucho 256 - m"""
+    numero = -(-k // (TAMANO_GF - m))
+    tamano = -(-k // numero)
+    return [range(inicio, min(k, inicio + tamano)) for inicio in range(0, k, tamano)]
+
+
+def dividir(datos: bytes, k: int, m: int, vectorizado: Optional[bool] = None) -> List[bytes]:
+    """
+    Parte `datos` en k fragmentos de datos y añade m de paridad por grupo.
+    Devuelve los fragmentos empaquetados (con cabecera), primero los de datos.
+    """
+    if not 1 <= k <= 0xFFFF or not 0 <= m < TAMANO_GF - 1 or len(datos) > 0xFFFFFFFF:
+        raise ValueError(f"Parámetros fuera de rango: k={k}, m={m}")
+    total = k + m * len(_grupos(k, m))
+    if total > 0xFFFF:
+        raise ValueError(f"{k} fragmentos de datos y {total - k} de paridad superan el máximo de 65535 por envío")
+    tamano = max(1, -(-len(datos) // k))
+    relleno = datos.ljust(tamano * k, b'\0')
+    trozos = [relleno[i * tamano:(i + 1) * tamano] for i in range(k)]
+    paridades = []
+    for grupo in _grupos(k, m):
+        paridades += CodigoRS(len(grupo), m, vectorizado).codificar([trozos[i] for i in grupo])
+    id_datos = zlib.crc32(datos) & 0xffffffff
+    return [CABECERA_PARTE.pack(MAGIA_RS, i + 1, k, m, id_datos, len(datos), zlib.crc32(trozo) & 0xffffffff) + trozo
+            for i, trozo in enumerate(trozos + paridades)]
+
+
+def desempaquetar_parte(parte: bytes) -> dict:
+    """Cabecera y datos de un fragmento. Lanza ValueError si está dañado o no es de este formato."""
+    if len(parte) < CABECERA_PARTE.size or parte[0] != MAGIA_RS:
+        raise ValueError("No es un fragmento Reed-Solomon")
+    _, indice, k, m, id_datos, longitud, crc = CABECERA_PARTE.unpack_from(parte)
+    datos = parte[CABECERA_PARTE.size:]
+    if k < 1 or m >= TAMANO_GF - 1:
+        raise ValueError(f"Parámetros fuera de rango: k={k}, m={m}")
+    if not 1 <= indice <= k + m * len(_grupos(k, m)):
+        raise ValueError(f"Índice de fragmento fuera de rango: {indice}")
+    if zlib.crc32(datos) & 0xffffffff != crc:
+        raise ValueError(f"Fragmento {indice} dañado: CRC32 no coincide")
+    return {'indice': indice, 'k': k, 'm': m, 'id': id_datos, 'longitud': longitud, 'datos': datos}
+
+
+class ReensambladorRS:
+    """
+    Junta fragmentos empaquetados en cualquier orden (ignora repetidos y los
+    de otros datos) y reconstruye cuando cada grupo tiene fragmentos suficientes.
+    """
+
+    def __init__(self, vectorizado: Optional[bool] = None):
+        self.vectorizado = vectorizado
+        self.cabecera = None
+        self.fragmentos: Dict[int, bytes] = {}  # índice desde 0 -> datos
+        self._grupos = None
+
+    def agregar(self, parte: bytes) -> bool:
+        """Añade un fragmento. Devuelve True si es nuevo y de estos datos."""
+        info = desempaquetar_parte(parte)
+        clave = (info['k'], info['m'], info['id'], info['longitud'])
+        if self.cabecera is None:
+            self.cabecera = clave
+            self._grupos = _grupos(info['k'], info['m'])
+        elif clave != self.cabecera:
+            return False
+        if info['indice'] - 1 in self.fragmentos:
+            return False
+        self.fragmentos[info['indice'] - 1] = info['datos']
+        return True
+
+    def _indices_grupo(self, numero: int, grupo: range) -> List[int]:
+        k, m = self.cabecera[0], self.cabecera[1]
+        return list(grupo) + [k + numero * m + r for r in range(m)]
+
+    def faltan(self) -> Optional[int]:
+        """Fragmentos que faltan como mínimo para reconstruir (None si aún no llegó ninguno)"""
+        if self.cabecera is None:
+            return None
+        return sum(max(0, len(grupo) - sum(i in self.fragmentos for i in self._indices_grupo(n, grupo)))
+                   for n, grupo in enumerate(self._grupos))
+
+    @property
+    def completo(self) -> bool:
+        return self.faltan() == 0
+
+    def resultado(self) -> bytes:
+        """Datos originales. Lanza ValueError si faltan fragmentos o no cuadra el CRC32."""
+        if not self.completo:
+            raise ValueError(f"Faltan al menos {self.faltan()} fragmentos")
+        k, m, id_datos, longitud = self.cabecera
+        trozos = []
+        for numero, grupo in enumerate(self._grupos):
+            indices = self._indices_grupo(numero, grupo)
+            presentes = {local: self.fragmentos[i] for local, i in enumerate(indices) if i in self.fragmentos}
+            trozos += CodigoRS(len(grupo), m, self.vectorizado).reconstruir(presentes)
+        datos = b''.join(trozos)[:longitud]
+        if zlib.crc32(datos) & 0xffffffff != id_datos:
+            raise ValueError("Error de integridad: checksum no coincide")
+        return datos
+
+
+def unir(partes: Iterable[bytes], vectorizado: Optional[bool] = None) -> bytes:
+    """Reconstruye los datos a partir de fragmentos empaquetados (se ignoran los dañados)"""
+    reensamblador = ReensambladorRS(vectorizado)
+    for parte in partes:
+        try:
+            reensamblador.agregar(parte)
+        except ValueError:
+            continue
+    return reensamblador.resultado()
@@ -2,41 +2,285 @@ from flask import Flask, request, send_file, jsonify
 import os
 from datetime import datetime
 import uuid
+import time
 import threading
+from werkzeug.wsgi import ClosingIterator, FileWrapper
+
+try:
+    from .spool import ReceptorSpool, CuotaExcedida
+    from .almacen import AlmacenFragmentado, id_valido
+    from .limpieza import ColaBorrado, Conserje
+    from .borrado_seguro import borrar_archivo_seguro
+    from .metricas import Registro, TIPO_CONTENIDO
+    from .subidas import GestorSubidas, SubidaNoEncontrada, SubidaInvalida
+except ImportError:
+    from spool import ReceptorSpool, CuotaExcedida
+    from almacen import AlmacenFragmentado, id_valido
+    from limpieza import ColaBorrado, Conserje
+    from borrado_seguro import borrar_archivo_seguro
+    from metricas import Registro, TIPO_CONTENIDO
+    from subidas import GestorSubidas, SubidaNoEncontrada, SubidaInvalida
 
 app = Flask(__name__)
 
+class _ArchivoContado:
+    """Envoltorio de archivo que avisa al cerrarse; conserva fileno() para sendfile."""
+
+    def __init__(self, archivo, al_cerrar):
+        self._archivo = archivo
+        self._al_cerrar = al_cerrar
+
+    def __getattr__(self, nombre):
+        return getattr(self._archivo, nombre)
+
+    def close(self):
+        try:
+            self._archivo.close()
+        finally:
+            if self._al_cerrar:
+                self._al_cerrar()
+                self._al_cerrar = None
+
+class ContadorTransferencias:
+    """
+    Middleware WSGI que cuenta las peticiones en curso hasta que la respuesta
+    termina de enviarse (incluidas las descargas servidas con
+    wsgi.file_wrapper). Permite un apagado ordenado que espera a las
+    transferencias activas.
+    Si se indica `al_completar(environ, estado, cabeceras, segundos)`, se
+    llama al terminar cada respuesta (para métricas).
+    """
+
+    def __init__(self, wsgi_app, al_completar=None):
+        self.wsgi_app = wsgi_app
+        self.al_completar = al_completar
+        self._lock = threading.Lock()
+        self._sin_actividad = threading.Condition(self._lock)
+        self.activas = 0
+
+    def _terminar(self):
+        with self._lock:
+            self.activas -= 1
+            if not self.activas:
+                self._sin_actividad.notify_all()
+
+    def esperar(self, timeout=None):
+        """Espera a que no haya transferencias en curso. Devuelve True si se vació."""
+        with self._lock:
+            return self._sin_actividad.wait_for(lambda: not self.activas, timeout)
+
+    def __call__(self, environ, start_response):
+        inicio = time.perf_counter()
+        with self._lock:
+            self.activas += 1
+        terminada = []
+        respuesta_http = []
+        al_terminar = environ['titansend.al_terminar'] = []
+
+        def iniciar_respuesta(estado, cabeceras, *args):
+            respuesta_http[:] = [estado, cabeceras]
+            return start_response(estado, cabeceras, *args)
+
+        def terminar():
+            if not terminada:
+                terminada.append(True)
+                self._terminar()
+                if self.al_completar:
+                    estado, cabeceras = respuesta_http or ('500 INTERNAL SERVER ERROR', [])
+                    al_terminar.insert(0, lambda: self.al_completar(environ, estado, cabeceras,
+                                                                    time.perf_counter() - inicio))
+                for funcion in al_terminar:
+                    try:
+                        funcion()
+                    except Exception as e:
+                        print(f"[{datetime.now()}] [ERROR] Tarea al terminar la respuesta falló: {e}")
+
+        original = environ.get('wsgi.file_wrapper')
+        envoltorio_servidor = original or FileWrapper
+        entregado = []
+
+        def file_wrapper(archivo, tamano_bloque=8192):
+            # La respuesta pasa al servidor tal cual (sendfile): se cuenta al cerrar el archivo
+            entregado.append(True)
+            return envoltorio_servidor(_ArchivoContado(archivo, terminar), tamano_bloque)
+
+        environ['wsgi.file_wrapper'] = file_wrapper
+        try:
+            respuesta = self.wsgi_app(environ, iniciar_respuesta)
+        except Exception:
+            terminar()
+            raise
+        finally:
+            # Algunos servidores (gunicorn) usan después el valor original como tipo
+            if original is None:
+                environ.pop('wsgi.file_wrapper', None)
+            else:
+                environ['wsgi.file_wrapper'] = original
+        if entregado and not isinstance(respuesta, ClosingIterator):
+            return respuesta
+        return ClosingIterator(respuesta, terminar)
+
+transferencias = ContadorTransferencias(app.wsgi_app)
+app.wsgi_app = transferencias
+
+# Métricas: con PROMETHEUS_MULTIPROC_DIR (lo fija `serve` con gunicorn) se suman las de todos los workers
+metricas = Registro(directorio=os.environ.get('PROMETHEUS_MULTIPROC_DIR') or None)
+m_subidas = metricas.contador('titansend_subidas_total', 'Subidas por código de estado HTTP', ['estado'])
+m_descargas = metricas.contador('titansend_descargas_total', 'Descargas por código de estado HTTP', ['estado'])
+m_bytes_recibidos = metricas.contador('titansend_bytes_recibidos_total', 'Bytes guardados de subidas completadas')
+m_bytes_enviados = metricas.contador('titansend_bytes_enviados_total', 'Bytes de descargas servidas (Content-Length)')
+m_duracion = metricas.histograma('titansend_peticion_duracion_segundos',
+                                 'Duración de las peticiones hasta enviar la respuesta completa', ['ruta'])
+metricas.indicador('titansend_transferencias_en_curso', 'Peticiones con respuesta pendiente de terminar',
+                   lambda: transferencias.activas)
+
+def ruta_metrica(ruta):
+    """Primer segmento de la ruta si es un endpoint conocido (limita la cardinalidad)."""
+    segmento = '/' + ruta.lstrip('/').split('/', 1)[0]
+    return segmento if segmento in RUTAS_CONOCIDAS else 'otra'
+
+def registrar_metricas(environ, estado, cabeceras, segundos):
+    ruta = ruta_metrica(environ.get('PATH_INFO', ''))
+    codigo = estado.split(' ', 1)[0]
+    m_duracion.observar(segundos, ruta=ruta)
+    if ruta == '/upload':
+        m_subidas.inc(estado=codigo)
+    elif ruta == '/download':
+        m_descargas.inc(estado=codigo)
+        if codigo in ('200', '206'):
+            longitud = next((v for k, v in cabeceras if k.lower() == 'content-length'), None)
+            if longitud and environ.get('REQUEST_METHOD') != 'HEAD':
+                m_bytes_enviados.inc(int(longitud))
+
+transferencias.al_completar = registrar_metricas
+
+def al_terminar_respuesta(funcion):
+    """Ejecuta `funcion` cuando la respuesta actual se haya enviado por completo."""
+    request.environ['titansend.al_terminar'].append(funcion)
+
 # Configuración por variables de entorno
 ARCHIVO = os.environ.get('TSEND_FILE', 'archivo_tor.bin')
 MAX_SIZE = int(os.environ.get('TSEND_MAX_SIZE', 100 * 1024 * 1024))  # 100 MB por defecto
 SOLO_LECTURA = os.environ.get('TSEND_SOLO_LECTURA', '0') == '1'
 MULTIARCHIVO = os.environ.get('TSEND_MULTIARCHIVO', '0') == '1'
 TOKEN = os.environ.get('TSEND_TOKEN', None)  # Token opcional para autenticación
+# Modo multiarchivo: directorio fragmentado y, opcionalmente, índice persistente en SQLite
+DIRECTORIO = os.environ.get('TSEND_DIRECTORIO', '.')
+INDICE_SQLITE = os.environ.get('TSEND_INDICE_SQLITE') or None
+# Caducidad opcional: segundos de vida y número máximo de archivos conservados
+TTL = int(os.environ['TSEND_TTL']) if os.environ.get('TSEND_TTL') else None
+MAX_ARCHIVOS = int(os.environ['TSEND_MAX_ARCHIVOS']) if os.environ.get('TSEND_MAX_ARCHIVOS') else None
+INTERVALO_LIMPIEZA = int(os.environ.get('TSEND_INTERVALO_LIMPIEZA', 60))
+# Subidas por partes sin trozos nuevos durante este tiempo se descartan (0 = nunca)
+INACTIVIDAD_SUBIDAS = int(os.environ.get('TSEND_INACTIVIDAD_SUBIDAS', 24 * 3600)) or None
+WORKERS_BORRADO = int(os.environ.get('TSEND_WORKERS_BORRADO', 2))
+# En SSD: liberar bloques (TRIM) en lugar de sobrescribir
+BORRADO_TRIM = os.environ.get('TSEND_BORRADO_TRIM', '0') == '1'
+# Cuotas opcionales en bytes: total en disco y por IP emisora
+CUOTA_GLOBAL = int(os.environ['TSEND_CUOTA_GLOBAL']) if os.environ.get('TSEND_CUOTA_GLOBAL') else None
+CUOTA_EMISOR = int(os.environ['TSEND_CUOTA_EMISOR']) if os.environ.get('TSEND_CUOTA_EMISOR') else None
 
-# Lock para acceso concurrente seguro a archivos
-file_lock = threading.Lock()
+CHUNK_SUBIDA = 256 * 1024  # Bloque de lectura de request.stream
+# Delegar el envío de archivos al proxy inverso (nginx/Apache) con X-Sendfile
+app.use_x_sendfile = os.environ.get('TSEND_X_SENDFILE', '0') == '1'
+
+spool = ReceptorSpool(cuota_global=CUOTA_GLOBAL, cuota_por_emisor=CUOTA_EMISOR)
+almacen = AlmacenFragmentado(DIRECTORIO, INDICE_SQLITE) if MULTIARCHIVO else None
+subidas = GestorSubidas(os.path.join(DIRECTORIO, '.subidas'), spool=spool)
+
+class SubidaDemasiadoGrande(ValueError):
+    """El cuerpo de la subida supera MAX_SIZE."""
+
+class SubidaIncompleta(ValueError):
+    """El cuerpo recibido no coincide con Content-Length."""
 
 def borrar_seguro(path):
     """Borra un archivo sobrescribiéndolo con datos aleatorios antes de eliminarlo."""
-    if os.path.isfile(path):
-        tam = os.path.getsize(path)
-        try:
-            with open(path, 'ba+', buffering=0) as f:
-                f.seek(0)
-                f.write(os.urandom(tam))
-            os.remove(path)
+    try:
+        if borrar_archivo_seguro(path, trim=BORRADO_TRIM):
+            spool.liberar(path)
             return True
-        except Exception as e:
-            print(f"[{datetime.now()}] [ERROR] Borrado seguro falló: {e}")
+    except Exception as e:
+        print(f"[{datetime.now()}] [ERROR] Borrado seguro falló: {e}")
     return False
 
-def validar_nombre_archivo(nombre):
-    """Evita rutas relativas y caracteres peligrosos en nombres de archivo."""
-    if not nombre or '..' in nombre or '/' in nombre or '\\' in nombre:
-        return False
-    if not nombre.endswith('.bin'):
-        return False
-    return True
+cola_borrado = ColaBorrado(borrar_seguro, workers=WORKERS_BORRADO)
+conserje = Conserje(cola_borrado, almacen=almacen, archivo=None if MULTIARCHIVO else ARCHIVO,
+                    ttl=TTL, max_archivos=MAX_ARCHIVOS, intervalo=INTERVALO_LIMPIEZA,
+                    subidas=subidas, inactividad_subidas=INACTIVIDAD_SUBIDAS)
+metricas.indicador('titansend_bytes_en_disco', 'Bytes contabilizados en el spool', spool.uso,
+                   agregacion='proceso')  # Cada worker contabiliza los archivos existentes al arrancar
+metricas.indicador('titansend_borrados_pendientes', 'Borrados seguros encolados o en curso',
+                   lambda: cola_borrado.pendientes)
+
+def guardar_subida(ruta, exclusivo=False):
+    """
+    Copia el cuerpo de la petición al spool por bloques (memoria constante),
+    aplicando MAX_SIZE y las cuotas mientras llegan los datos.
+    Cada subida escribe su propio .part y se publica con un renombrado
+    atómico, así que no hace falta un lock global.
+    Con exclusivo=True lanza FileExistsError si la ruta ya existe o hay
+    otra subida en curso hacia ella.
+    Devuelve el número de bytes guardados.
+    """
+    emisor = request.remote_addr or 'desconocido'
+    esperado = request.content_length
+    tam = 0
+    with spool.abrir(ruta, emisor, tamano=esperado, exclusivo=exclusivo) as f:
+        while True:
+            bloque = request.stream.read(CHUNK_SUBIDA)
+            if not bloque:
+                break
+            tam += len(bloque)
+            if tam > MAX_SIZE:
+                raise SubidaDemasiadoGrande(f"Más de {MAX_SIZE} bytes")
+            f.write(bloque)
+        if esperado is not None and tam != esperado:
+            raise SubidaIncompleta(f"Recibidos {tam} de {esperado} bytes")
+        f.confirmar()
+    m_bytes_recibidos.inc(tam)
+    return tam
+
+def error_subida(e):
+    """Traduce los errores de guardar_subida a respuestas HTTP."""
+    if isinstance(e, SubidaDemasiadoGrande):
+        return jsonify({"error": "Archivo demasiado grande"}), 413
+    if isinstance(e, CuotaExcedida):
+        return jsonify({"error": f"Cuota de almacenamiento excedida: {e}"}), 507
+    return jsonify({"error": f"Subida incompleta: {e}"}), 400
+
+def contabilizar_existentes():
+    """Registra en el spool los archivos que ya estaban en disco al arrancar."""
+    if MULTIARCHIVO:
+        for entrada in almacen.entradas().values():
+            spool.contabilizar(entrada['ruta'])
+    else:
+        spool.contabilizar(ARCHIVO)
+    for subida_id in subidas.pendientes():
+        try:
+            spool.contabilizar(os.path.join(subidas.directorio, subida_id + '.part'),
+                               subidas.estado(subida_id)['emisor'])
+        except (SubidaNoEncontrada, CuotaExcedida):
+            pass
+
+def buscar_archivo(file_id):
+    """
+    Resuelve el parámetro id en el índice del almacén.
+    Devuelve (entrada, None) o (None, respuesta de error).
+    """
+    if not file_id or not id_valido(file_id):
+        return None, (jsonify({"error": "Falta o nombre de archivo inválido en parámetro id"}), 400)
+    entrada = almacen.obtener(file_id)
+    if entrada is None:
+        return None, (jsonify({"error": "Archivo no encontrado"}), 404)
+    return entrada, None
+
+contabilizar_existentes()
+
+@app.before_request
+def iniciar_mantenimiento():
+    # Perezoso para que cada worker de gunicorn arranque su propio hilo
+    conserje.iniciar()
 
 @app.after_request
 def set_headers(response):
@@ -57,25 +301,28 @@ def upload():
         if auth: return auth
     if SOLO_LECTURA:
         return jsonify({"error": "Servidor en modo solo lectura"}), 403
-    tam = len(request.data)
-    if tam > MAX_SIZE:
+    # Rechazo temprano por Content-Length, antes de leer el cuerpo
+    if request.content_length is not None and request.content_length > MAX_SIZE:
         return jsonify({"error": "Archivo demasiado grande"}), 413
     if MULTIARCHIVO:
         file_id = str(uuid.uuid4())
-        fname = f"{file_id}.bin"
-        if not validar_nombre_archivo(fname):
-            return jsonify({"error": "Nombre de archivo inválido"}), 400
-        with file_lock:
-            with open(fname, 'wb') as f:
-                f.write(request.data)
-        print(f"[{datetime.now()}] [UPLOAD] Archivo recibido - {tam} bytes guardados como '{fname}'")
+        try:
+            tam = guardar_subida(almacen.ruta(file_id, crear=True))
+        except (SubidaDemasiadoGrande, SubidaIncompleta, CuotaExcedida) as e:
+            return error_subida(e)
+        almacen.registrar(file_id, tam)
+        print(f"[{datetime.now()}] [UPLOAD] Archivo recibido - {tam} bytes guardados como '{file_id}'")
         return jsonify({"msg": f"Archivo recibido ({tam} bytes)", "id": file_id}), 200
     else:
         if os.path.exists(ARCHIVO):
             return jsonify({"error": "Ya existe un archivo pendiente de descarga. Borra antes de subir uno nuevo."}), 409
-        with file_lock:
-            with open(ARCHIVO, 'wb') as f:
-                f.write(request.data)
+        try:
+            tam = guardar_subida(ARCHIVO, exclusivo=True)
+        except FileExistsError:
+            # Otra subida ganó la carrera entre la comprobación y la creación
+            return jsonify({"error": "Ya existe un archivo pendiente de descarga o una subida en curso."}), 409
+        except (SubidaDemasiadoGrande, SubidaIncompleta, CuotaExcedida) as e:
+            return error_subida(e)
         print(f"[{datetime.now()}] [UPLOAD] Archivo recibido - {tam} bytes guardados en '{ARCHIVO}'")
         return jsonify({"msg": f"Archivo recibido ({tam} bytes)"}), 200
 
@@ -86,28 +333,30 @@ def download():
         if auth: return auth
     if MULTIARCHIVO:
         file_id = request.args.get('id')
-        fname = f"{file_id}.bin" if file_id else None
-        if not file_id or not validar_nombre_archivo(fname):
-            return jsonify({"error": "Falta o nombre de archivo inválido en parámetro id"}), 400
-        if os.path.exists(fname):
-            tam = os.path.getsize(fname)
-            print(f"[{datetime.now()}] [DOWNLOAD] Archivo '{fname}' de {tam} bytes enviado")
-            response = send_file(fname, as_attachment=True)
-            # Descarga de un solo uso: borrar tras enviar
-            if os.environ.get('TSEND_UNICO', '0') == '1':
-                threading.Thread(target=borrar_seguro, args=(fname,)).start()
-            return response
-        else:
-            print(f"[{datetime.now()}] [DOWNLOAD] Solicitud de descarga pero archivo '{fname}' no encontrado")
-            return jsonify({"error": "Archivo no encontrado"}), 404
+        entrada, error = buscar_archivo(file_id)
+        if error:
+            print(f"[{datetime.now()}] [DOWNLOAD] Solicitud de descarga pero archivo '{file_id}' no encontrado")
+            return error
+        print(f"[{datetime.now()}] [DOWNLOAD] Archivo '{file_id}' de {entrada['tamano']} bytes enviado")
+        unico = os.environ.get('TSEND_UNICO', '0') == '1'
+        # conditional=True atiende Range/If-Range (206) y usa wsgi.file_wrapper (sendfile) si el servidor lo ofrece;
+        # una descarga de un solo uso se sirve siempre entera (un rango no debe consumirla)
+        response = send_file(entrada['ruta'], as_attachment=True, download_name=f"{file_id}.bin", conditional=not unico)
+        almacen.contar_descarga(file_id)
+        # Descarga de un solo uso: borrar cuando termine de enviarse
+        if unico:
+            almacen.eliminar(file_id)
+            al_terminar_respuesta(lambda: cola_borrado.encolar(entrada['ruta']))
+        return response
     else:
         if os.path.exists(ARCHIVO):
             tam = os.path.getsize(ARCHIVO)
             print(f"[{datetime.now()}] [DOWNLOAD] Archivo '{ARCHIVO}' de {tam} bytes enviado")
-            response = send_file(ARCHIVO, as_attachment=True)
-            # Descarga de un solo uso: borrar tras enviar
-            if os.environ.get('TSEND_UNICO', '0') == '1':
-                threading.Thread(target=borrar_seguro, args=(ARCHIVO,)).start()
+            unico = os.environ.get('TSEND_UNICO', '0') == '1'
+            response = send_file(os.path.abspath(ARCHIVO), as_attachment=True, conditional=not unico)
+            # Descarga de un solo uso: borrar cuando termine de enviarse
+            if unico:
+                al_terminar_respuesta(lambda: cola_borrado.encolar(ARCHIVO))
             return response
         else:
             print(f"[{datetime.now()}] [DOWNLOAD] Solicitud de descarga pero archivo no encontrado")
@@ -122,14 +371,13 @@ def delete():
         return jsonify({"error": "Servidor en modo solo lectura"}), 403
     if MULTIARCHIVO:
         file_id = request.args.get('id')
-        fname = f"{file_id}.bin" if file_id else None
-        if not file_id or not validar_nombre_archivo(fname):
-            return jsonify({"error": "Falta o nombre de archivo inválido en parámetro id"}), 400
-        if os.path.exists(fname):
-            ok = borrar_seguro(fname)
-            print(f"[{datetime.now()}] [DELETE] Archivo '{fname}' borrado seguro: {ok}")
-            return jsonify({"msg": "Archivo borrado" if ok else "Archivo eliminado sin sobrescribir"}), 200
-        return jsonify({"error": "Archivo no encontrado"}), 404
+        entrada, error = buscar_archivo(file_id)
+        if error:
+            return error
+        almacen.eliminar(file_id)
+        ok = borrar_seguro(entrada['ruta'])
+        print(f"[{datetime.now()}] [DELETE] Archivo '{file_id}' borrado seguro: {ok}")
+        return jsonify({"msg": "Archivo borrado" if ok else "Archivo eliminado sin sobrescribir"}), 200
     else:
         if os.path.exists(ARCHIVO):
             ok = borrar_seguro(ARCHIVO)
@@ -137,20 +385,137 @@ def delete():
             return jsonify({"msg": "Archivo borrado" if ok else "Archivo eliminado sin sobrescribir"}), 200
         return jsonify({"error": "Archivo no encontrado"}), 404
 
+# Subidas por partes reanudables (estilo tus):
+#   POST   /uploads                 Upload-Length: N        -> 201, Location, Upload-Offset
+#   PATCH  /uploads/<id>            Upload-Offset: o + trozo -> 204, Upload-Offset
+#   HEAD   /uploads/<id>  (o GET)                           -> Upload-Offset, Upload-Length, Upload-Ranges
+#   POST   /uploads/<id>/finalizar  Upload-Checksum: sha256 <hex> (opcional)
+#   DELETE /uploads/<id>
+# Los trozos pueden llegar en cualquier orden y en paralelo; Upload-Offset es
+# lo recibido sin huecos y Upload-Ranges lista todos los rangos recibidos.
+
+def cabeceras_subida(estado):
+    return {
+        'Upload-Offset': str(estado['offset']),
+        'Upload-Length': str(estado['tamano']),
+        'Upload-Ranges': ','.join(f"{a}-{b}" for a, b in estado['rangos']),
+    }
+
+def comprobar_escritura():
+    """Token y modo solo lectura; devuelve una respuesta de error o None."""
+    if TOKEN:
+        auth = require_token()
+        if auth: return auth
+    if SOLO_LECTURA:
+        return jsonify({"error": "Servidor en modo solo lectura"}), 403
+    return None
+
+@app.route('/uploads', methods=['POST'])
+def crear_subida():
+    error = comprobar_escritura()
+    if error: return error
+    try:
+        tamano = int(request.headers['Upload-Length'])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Falta o es inválida la cabecera Upload-Length"}), 400
+    if tamano < 0:
+        return jsonify({"error": "Upload-Length inválido"}), 400
+    if tamano > MAX_SIZE:
+        return jsonify({"error": "Archivo demasiado grande"}), 413
+    if not MULTIARCHIVO and os.path.exists(ARCHIVO):
+        return jsonify({"error": "Ya existe un archivo pendiente de descarga. Borra antes de subir uno nuevo."}), 409
+    try:
+        subida_id = subidas.crear(tamano, request.remote_addr or 'desconocido')
+    except CuotaExcedida as e:
+        return error_subida(e)
+    print(f"[{datetime.now()}] [UPLOAD] Subida por partes '{subida_id}' creada ({tamano} bytes)")
+    cabeceras = cabeceras_subida(subidas.estado(subida_id))
+    cabeceras['Location'] = f"/uploads/{subida_id}"
+    return jsonify({"id": subida_id, "offset": 0}), 201, cabeceras
+
+@app.route('/uploads/<subida_id>', methods=['HEAD', 'GET'])
+def estado_subida(subida_id):
+    if TOKEN:
+        auth = require_token()
+        if auth: return auth
+    try:
+        estado = subidas.estado(subida_id)
+    except SubidaNoEncontrada:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    return jsonify({"id": subida_id, "tamano": estado['tamano'], "offset": estado['offset'],
+                    "rangos": estado['rangos'], "completa": estado['completa']}), 200, cabeceras_subida(estado)
+
+@app.route('/uploads/<subida_id>', methods=['PATCH'])
+def escribir_subida(subida_id):
+    error = comprobar_escritura()
+    if error: return error
+    try:
+        offset = int(request.headers['Upload-Offset'])
+    except (KeyError, ValueError):
+        return jsonify({"error": "Falta o es inválida la cabecera Upload-Offset"}), 400
+    if request.content_length is None:
+        return jsonify({"error": "Se requiere Content-Length"}), 411
+    try:
+        estado = subidas.escribir(subida_id, offset, request.stream, request.content_length)
+    except SubidaNoEncontrada:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    except SubidaInvalida as e:
+        return jsonify({"error": str(e)}), 409
+    m_bytes_recibidos.inc(request.content_length)
+    return '', 204, cabeceras_subida(estado)
+
+@app.route('/uploads/<subida_id>/finalizar', methods=['POST'])
+def finalizar_subida(subida_id):
+    error = comprobar_escritura()
+    if error: return error
+    suma = request.headers.get('Upload-Checksum', '')
+    algoritmo, _, valor = suma.partition(' ')
+    if suma and algoritmo.lower() != 'sha256':
+        return jsonify({"error": "Solo se admite Upload-Checksum sha256"}), 400
+    try:
+        if MULTIARCHIVO:
+            estado = subidas.finalizar(subida_id, almacen.ruta(subida_id, crear=True), sha256=valor or None)
+            almacen.registrar(subida_id, estado['tamano'])
+        else:
+            estado = subidas.finalizar(subida_id, ARCHIVO, exclusivo=True, sha256=valor or None)
+    except SubidaNoEncontrada:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    except SubidaInvalida as e:
+        return jsonify({"error": str(e)}), 409
+    except FileExistsError:
+        return jsonify({"error": "Ya existe un archivo pendiente de descarga."}), 409
+    print(f"[{datetime.now()}] [UPLOAD] Subida por partes '{subida_id}' completada ({estado['tamano']} bytes)")
+    respuesta = {"msg": f"Archivo recibido ({estado['tamano']} bytes)"}
+    if MULTIARCHIVO:
+        respuesta["id"] = subida_id
+    return jsonify(respuesta), 200
+
+@app.route('/uploads/<subida_id>', methods=['DELETE'])
+def abortar_subida(subida_id):
+    error = comprobar_escritura()
+    if error: return error
+    try:
+        subidas.abortar(subida_id)
+    except SubidaNoEncontrada:
+        return jsonify({"error": "Subida no encontrada"}), 404
+    return '', 204
+
 @app.route('/status', methods=['GET'])
 def status():
     """
     Endpoint simple para saber si el servidor está listo y si hay archivo disponible.
     Incluye espacio libre en disco.
     """
-    statvfs = os.statvfs('.')
+    statvfs = os.statvfs(almacen.directorio if MULTIARCHIVO else '.')
     espacio_libre = statvfs.f_frsize * statvfs.f_bavail
     if MULTIARCHIVO:
-        archivos = [f for f in os.listdir('.') if f.endswith('.bin')]
+        # Desde el índice: no depende de cuántos archivos haya en disco
+        archivos = [f"{file_id}.bin" for file_id in almacen.listar()]
         return jsonify({
             "status": "ok",
             "archivos": archivos,
             "multiarchivo": True,
+            "borrados_pendientes": cola_borrado.pendientes,
             "espacio_libre_MB": espacio_libre // (1024 * 1024)
         })
     else:
@@ -161,17 +526,33 @@ def status():
             "archivo_disponible": existe,
             "tamano": tam,
             "multiarchivo": False,
+            "borrados_pendientes": cola_borrado.pendientes,
             "espacio_libre_MB": espacio_libre // (1024 * 1024)
         })
 
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    """Métricas en formato de texto de Prometheus."""
+    if TOKEN:
+        auth = require_token()
+        if auth: return auth
+    return app.response_class(metricas.exponer(), mimetype=None, content_type=TIPO_CONTENIDO)
+
 @app.route('/health', methods=['GET'])
 def health():
     """Endpoint de salud para monitoreo."""
     return jsonify({"status": "ok", "hora": datetime.now().isoformat()})
 
-if __name__ == '__main__':
-    print(f"[{datetime.now()}] Servidor Flask iniciado en http://0.0.0.0:5000")
+RUTAS_CONOCIDAS = {'/' + r.rule.lstrip('/').split('/', 1)[0] for r in app.url_map.iter_rules()}
+
+def mostrar_configuracion(host='0.0.0.0', port=5000):
+    print(f"[{datetime.now()}] Servidor Flask iniciado en http://{host}:{port}")
     print(f"Archivo: {ARCHIVO} | Tamaño máximo: {MAX_SIZE // (1024*1024)} MB | Solo lectura: {SOLO_LECTURA} | Multiarchivo: {MULTIARCHIVO}")
+    if MULTIARCHIVO:
+        print(f"Directorio: {almacen.directorio} | Archivos indexados: {len(almacen)} | Índice SQLite: {INDICE_SQLITE or 'no'}")
     if TOKEN:
         print("¡Autenticación por token habilitada!")
+
+if __name__ == '__main__':
+    mostrar_configuracion()
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
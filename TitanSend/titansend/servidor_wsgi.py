@@ -0,0 +1,206 @@
+"""
+Despliegue en producción del servidor Flask de TitanSend
+========================================================
+
+Ejecuta `servidor_flask_tor.app` con un servidor WSGI de producción:
+- gunicorn (Unix): varios procesos con hilos (worker gthread)
+- waitress (multiplataforma): un proceso con un pool de hilos
+- dev: servidor de desarrollo de Flask con hilos, como último recurso
+
+En todos los casos, SIGTERM/SIGINT dejan de aceptar conexiones y esperan a
+que terminen las transferencias en curso (hasta el periodo de gracia).
+"""
+
+import os
+import glob
+import shutil
+import signal
+import tempfile
+import threading
+import _thread
+from typing import Optional
+
+try:
+    from waitress.server import create_server
+    WAITRESS_AVAILABLE = True
+except ImportError:
+    WAITRESS_AVAILABLE = False
+
+try:
+    from gunicorn.app.base import BaseApplication
+    GUNICORN_AVAILABLE = True
+except ImportError:
+    GUNICORN_AVAILABLE = False
+
+SERVIDORES = ('auto', 'gunicorn', 'waitress', 'dev')
+
+
+def _cargar_app():
+    """Importa el servidor Flask (lee la configuración TSEND_* en ese momento)."""
+    try:
+        from . import servidor_flask_tor
+    except ImportError:
+        import servidor_flask_tor
+    return servidor_flask_tor
+
+
+def elegir_servidor(preferido: str = 'auto') -> str:
+    """Resuelve 'auto' al mejor servidor instalado."""
+    if preferido != 'auto':
+        return preferido
+    if GUNICORN_AVAILABLE and os.name != 'nt':
+        return 'gunicorn'
+    if WAITRESS_AVAILABLE:
+        return 'waitress'
+    return 'dev'
+
+
+def workers_gunicorn(workers: Optional[int], con_cuotas: bool, indice_por_proceso: bool = False) -> int:
+    """
+    Procesos de gunicorn. Las cuotas del spool se contabilizan en memoria de
+    cada proceso, así que con cuotas se usa uno solo salvo que se pidan más.
+    En modo multiarchivo sin TSEND_INDICE_SQLITE cada proceso tendría su
+    propio índice (listados, límites y caducidad parciales): siempre uno.
+    """
+    if indice_por_proceso:
+        if workers and workers > 1:
+            print(f"⚠️  Modo multiarchivo sin TSEND_INDICE_SQLITE: se usa un único proceso en vez de {workers}. "
+                  f"Define TSEND_INDICE_SQLITE para varios workers")
+        else:
+            print("ℹ️  Modo multiarchivo sin TSEND_INDICE_SQLITE: gunicorn con un único proceso")
+        return 1
+    if workers:
+        if con_cuotas and workers > 1:
+            print(f"⚠️  Cuotas del spool activas con {workers} procesos: cada proceso aplica la cuota completa")
+        return workers
+    if con_cuotas:
+        print("ℹ️  Cuotas del spool activas: gunicorn con un único proceso para aplicarlas en conjunto")
+        return 1
+    return os.cpu_count() or 1
+
+
+def _preparar_metricas() -> Optional[str]:
+    """
+    Directorio donde los workers de gunicorn vuelcan sus métricas para que
+    /metrics las sume: PROMETHEUS_MULTIPROC_DIR (se vacía al arrancar) o uno
+    temporal. Devuelve el temporal creado, para borrarlo al terminar.
+    """
+    directorio = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directorio:
+        for ruta in glob.glob(os.path.join(directorio, '*.json')):
+            os.remove(ruta)
+        return None
+    directorio = tempfile.mkdtemp(prefix='titansend-metricas-')
+    os.environ['PROMETHEUS_MULTIPROC_DIR'] = directorio
+    return directorio
+
+
+def _servir_gunicorn(app, host, port, workers, threads, keepalive, gracia):
+    class AplicacionGunicorn(BaseApplication):
+        def __init__(self, opciones):
+            self.opciones = opciones
+            super().__init__()
+
+        def load_config(self):
+            for clave, valor in self.opciones.items():
+                self.cfg.set(clave, valor)
+
+        def load(self):
+            return app
+
+    # gunicorn ya implementa el apagado ordenado: con SIGTERM los workers
+    # terminan las peticiones en curso durante graceful_timeout
+    AplicacionGunicorn({
+        'bind': f"{host}:{port}",
+        'workers': workers,
+        'worker_class': 'gthread',
+        'threads': threads,
+        'keepalive': keepalive,
+        'graceful_timeout': gracia,
+    }).run()
+
+
+def _servir_waitress(app, transferencias, host, port, threads, keepalive, gracia):
+    servidor = create_server(app, host=host, port=port, threads=threads, channel_timeout=max(keepalive, 1))
+
+    def drenar():
+        if transferencias.esperar(gracia):
+            print("✅ Transferencias en curso completadas")
+        else:
+            print(f"⚠️  Periodo de gracia agotado con {transferencias.activas} transferencias activas")
+        _thread.interrupt_main()  # waitress termina su bucle con KeyboardInterrupt
+
+    def al_recibir_senal(signum, frame):
+        if getattr(al_recibir_senal, 'apagando', False):
+            raise KeyboardInterrupt
+        al_recibir_senal.apagando = True
+        print(f"🛑 Apagando: esperando {transferencias.activas} transferencias (máx. {gracia}s)...")
+        # Dejar de aceptar: los canales abiertos siguen atendiéndose en el bucle
+        servidor.accepting = False
+        threading.Thread(target=drenar, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, al_recibir_senal)
+    signal.signal(signal.SIGINT, al_recibir_senal)
+    servidor.run()
+    servidor.close()
+
+
+def _servir_dev(app, transferencias, host, port, gracia):
+    from werkzeug.serving import make_server
+
+    servidor = make_server(host, port, app, threaded=True)
+
+    def al_recibir_senal(signum, frame):
+        print(f"🛑 Apagando: esperando {transferencias.activas} transferencias (máx. {gracia}s)...")
+        threading.Thread(target=servidor.shutdown, daemon=True).start()
+
+    signal.signal(signal.SIGTERM, al_recibir_senal)
+    signal.signal(signal.SIGINT, al_recibir_senal)
+    servidor.serve_forever()
+    # Los hilos de las peticiones siguen vivos tras cerrar el bucle de aceptación
+    transferencias.esperar(gracia)
+    servidor.server_close()
+
+
+def servir(host: str = '0.0.0.0', port: int = 5000, servidor: str = 'auto', workers: Optional[int] = None,
+           threads: int = 8, keepalive: int = 5, gracia: int = 30) -> bool:
+    """
+    Arranca el servidor Flask con el servidor WSGI indicado.
+    workers solo aplica a gunicorn (por defecto, un proceso por núcleo, o
+    uno solo si el spool tiene cuotas o el índice multiarchivo no es SQLite).
+    Devuelve False si el servidor pedido no está disponible.
+    """
+    if servidor not in SERVIDORES:
+        raise ValueError(f"Servidor desconocido: {servidor}")
+    servidor = elegir_servidor(servidor)
+    if servidor == 'gunicorn' and not GUNICORN_AVAILABLE:
+        print("❌ gunicorn no disponible. Instala: pip install gunicorn")
+        return False
+    if servidor == 'waitress' and not WAITRESS_AVAILABLE:
+        print("❌ waitress no disponible. Instala: pip install waitress")
+        return False
+
+    # Antes de importar la aplicación, que crea el registro de métricas
+    temporal_metricas = _preparar_metricas() if servidor == 'gunicorn' else None
+    modulo = _cargar_app()
+    modulo.mostrar_configuracion(host, port)
+    if servidor == 'gunicorn':
+        con_cuotas = modulo.spool.cuota_global is not None or modulo.spool.cuota_por_emisor is not None
+        indice_por_proceso = modulo.MULTIARCHIVO and not modulo.INDICE_SQLITE
+        workers = workers_gunicorn(workers, con_cuotas, indice_por_proceso)
+        print(f"🚀 gunicorn: {workers} procesos x {threads} hilos, keep-alive {keepalive}s, gracia {gracia}s")
+        try:
+            _servir_gunicorn(modulo.app, host, port, workers, threads, keepalive, gracia)
+        finally:
+            if temporal_metricas:
+                shutil.rmtree(temporal_metricas, ignore_errors=True)
+    elif servidor == 'waitress':
+        if workers and workers > 1:
+            print("⚠️  waitress usa un único proceso: se ignora el número de workers")
+        print(f"🚀 waitress: {threads} hilos, keep-alive {keepalive}s, gracia {gracia}s")
+        _servir_waitress(modulo.app, modulo.transferencias, host, port, threads, keepalive, gracia)
+    else:
+        print("⚠️  Servidor de desarrollo: instala gunicorn o waitress para producción")
+        _servir_dev(modulo.app, modulo.transferencias, host, port, gracia)
+    print("👋 Servidor detenido")
+    return True
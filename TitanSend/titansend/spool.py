@@ -0,0 +1,235 @@
+"""
+Spool de recepción para TitanSend
+=================================
+
+Componente común a los receptores (P2P y servidor Flask) para escribir a disco
+lo que llega por la red sin agotar disco ni RAM:
+- Cuotas de bytes por emisor y globales, aplicadas mientras llegan los datos
+- Preasignación de espacio (fallocate) en cuanto se conoce el tamaño
+- Escritura en un archivo .part que se renombra al confirmar
+- Limpieza del archivo parcial si la transferencia falla
+"""
+
+import os
+import threading
+from typing import Dict, Optional, Tuple
+
+RESERVA_BLOQUE = 1024 * 1024  # Reserva incremental cuando no se conoce el tamaño
+
+
+class CuotaExcedida(ValueError):
+    """Se lanza cuando una escritura superaría la cuota del emisor o la global."""
+
+
+class ReceptorSpool:
+    """
+    Contabiliza los bytes en disco por emisor y en total, y crea escrituras
+    que respetan las cuotas.
+    """
+
+    def __init__(self, cuota_global: Optional[int] = None, cuota_por_emisor: Optional[int] = None,
+                 preasignar: bool = True):
+        self.cuota_global = cuota_global
+        self.cuota_por_emisor = cuota_por_emisor
+        self.preasignar = preasignar
+        self._lock = threading.Lock()
+        self._uso_global = 0
+        self._uso_emisor: Dict[str, int] = {}
+        self._archivos: Dict[str, Tuple[str, int]] = {}  # ruta -> (emisor, bytes contabilizados)
+
+    def uso(self, emisor: Optional[str] = None) -> int:
+        """Bytes contabilizados en total o para un emisor."""
+        with self._lock:
+            if emisor is None:
+                return self._uso_global
+            return self._uso_emisor.get(emisor, 0)
+
+    def _ajustar(self, ruta: str, emisor: str, total: int):
+        """
+        Fija los bytes contabilizados para una ruta. Si aumenta, comprueba
+        antes las cuotas y lanza CuotaExcedida sin modificar nada.
+        """
+        with self._lock:
+            emisor_previo, previo = self._archivos.get(ruta, (emisor, 0))
+            delta = total - previo
+            if delta > 0:
+                if self.cuota_global is not None and self._uso_global + delta > self.cuota_global:
+                    raise CuotaExcedida(f"Cuota global excedida ({self.cuota_global} bytes)")
+                uso_emisor = self._uso_emisor.get(emisor_previo, 0)
+                if self.cuota_por_emisor is not None and uso_emisor + delta > self.cuota_por_emisor:
+                    raise CuotaExcedida(f"Cuota del emisor {emisor_previo} excedida ({self.cuota_por_emisor} bytes)")
+            self._uso_global += delta
+            self._uso_emisor[emisor_previo] = self._uso_emisor.get(emisor_previo, 0) + delta
+            if not self._uso_emisor[emisor_previo]:
+                del self._uso_emisor[emisor_previo]
+            if total:
+                self._archivos[ruta] = (emisor_previo, total)
+            else:
+                self._archivos.pop(ruta, None)
+
+    def _mover(self, origen: str, destino: str):
+        """Traslada la contabilidad de una ruta a otra (al renombrar .part)."""
+        with self._lock:
+            if origen in self._archivos:
+                self._archivos[destino] = self._archivos.pop(origen)
+
+    def contabilizar(self, ruta: str, emisor: str = 'local'):
+        """Registra un archivo ya existente en disco (por ejemplo, al arrancar)."""
+        if os.path.isfile(ruta):
+            self._ajustar(ruta, emisor, os.path.getsize(ruta))
+
+    def liberar(self, ruta: str):
+        """Deja de contabilizar un archivo (tras borrarlo o entregarlo)."""
+        with self._lock:
+            emisor = self._archivos.get(ruta, (None, 0))[0]
+        if emisor is not None:
+            self._ajustar(ruta, emisor, 0)
+
+    def abrir(self, ruta: str, emisor: str = 'local', tamano: Optional[int] = None,
+              offset: int = 0, exclusivo: bool = False) -> 'EscrituraSpool':
+        """
+        Abre una escritura hacia `ruta` (a través de `ruta`.part).
+        Con offset > 0 continúa un .part existente desde esa posición.
+        Si se indica el tamaño, la cuota se comprueba y reserva de inmediato.
+        Con exclusivo=True el .part se crea con O_EXCL y al confirmar no se
+        sobrescribe `ruta`: ambos casos lanzan FileExistsError.
+        """
+        return EscrituraSpool(self, ruta, emisor, tamano, offset, exclusivo)
+
+
+class EscrituraSpool:
+    """
+    Escritura en curso hacia el spool. Se usa como context manager: si sale
+    con excepción sin haberse confirmado, el archivo parcial se elimina.
+    """
+
+    def __init__(self, spool: ReceptorSpool, ruta: str, emisor: str, tamano: Optional[int], offset: int,
+                 exclusivo: bool = False):
+        self.spool = spool
+        self.ruta = ruta
+        self.ruta_part = ruta + '.part'
+        self.emisor = emisor
+        self.exclusivo = exclusivo
+        self.tamano = None
+        self.posicion = offset
+        self._reservado = 0
+        self._cerrado = False
+        # En modo exclusivo se crea el .part antes de tocar la contabilidad:
+        # si ya existe pertenece a otra escritura en curso
+        self._f = open(self.ruta_part, 'r+b' if offset else ('xb' if exclusivo else 'wb'))
+        reservado = False
+        try:
+            # La parte ya escrita (reanudación) cuenta para la cuota
+            self._reservar(offset)
+            reservado = True
+            self._f.seek(offset)
+            self._f.truncate()
+        except Exception:
+            self._f.close()
+            if reservado:
+                self.spool._ajustar(self.ruta_part, self.emisor, 0)
+            if exclusivo:
+                os.remove(self.ruta_part)
+            raise
+        if tamano is not None:
+            try:
+                self.fijar_tamano(tamano)
+            except Exception:
+                self.abortar()
+                raise
+
+    def _reservar(self, total: int):
+        self.spool._ajustar(self.ruta_part, self.emisor, total)
+        self._reservado = total
+
+    def fijar_tamano(self, tamano: int):
+        """Reserva la cuota del tamaño total y preasigna el espacio en disco."""
+        if tamano < self.posicion:
+            raise ValueError("El tamaño declarado es menor que lo ya escrito")
+        self._reservar(tamano)
+        self.tamano = tamano
+        if self.spool.preasignar and tamano > self.posicion and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(self._f.fileno(), self.posicion, tamano - self.posicion)
+            except OSError:
+                pass  # Sistema de archivos sin soporte: se escribe sin preasignar
+
+    def write(self, datos) -> int:
+        """Escribe datos comprobando el tamaño declarado y las cuotas."""
+        n = len(datos)
+        nueva_posicion = self.posicion + n
+        if self.tamano is not None:
+            if nueva_posicion > self.tamano:
+                raise CuotaExcedida(f"Se recibieron más bytes que los declarados ({self.tamano})")
+        elif nueva_posicion > self._reservado:
+            self._reservar(max(nueva_posicion, self._reservado + RESERVA_BLOQUE))
+        self._f.write(datos)
+        self.posicion = nueva_posicion
+        return n
+
+    def sincronizar(self):
+        """Vuelca a disco lo escrito hasta ahora (fsync)."""
+        self._f.flush()
+        os.fsync(self._f.fileno())
+
+    def cerrar(self):
+        """Cierra conservando el .part para reanudar más tarde."""
+        if self._cerrado:
+            return
+        self._f.truncate(self.posicion)
+        self.sincronizar()
+        self._f.close()
+        self._reservar(self.posicion)
+        self._cerrado = True
+
+    def confirmar(self):
+        """Cierra, vuelca a disco y renombra el .part a la ruta final."""
+        self._f.truncate(self.posicion)
+        self.sincronizar()
+        self._f.close()
+        self._reservar(self.posicion)
+        if self.exclusivo:
+            self._publicar_sin_sobrescribir()
+        else:
+            os.replace(self.ruta_part, self.ruta)
+        self.spool.liberar(self.ruta)  # Un archivo previo con el mismo nombre deja de contar
+        self.spool._mover(self.ruta_part, self.ruta)
+        self._cerrado = True
+
+    def _publicar_sin_sobrescribir(self):
+        """Enlaza el .part en la ruta final solo si no existe (check-and-create atómico)."""
+        try:
+            os.link(self.ruta_part, self.ruta)
+        except FileExistsError:
+            self.abortar()
+            raise
+        except OSError:
+            # Sistema de archivos sin enlaces duros: comprobación no atómica
+            if os.path.exists(self.ruta):
+                self.abortar()
+                raise FileExistsError(self.ruta)
+            os.replace(self.ruta_part, self.ruta)
+            return
+        os.remove(self.ruta_part)
+
+    def abortar(self):
+        """Descarta la escritura y elimina el archivo parcial."""
+        if not self._f.closed:
+            self._f.close()
+        try:
+            os.remove(self.ruta_part)
+        except FileNotFoundError:
+            pass
+        self.spool._ajustar(self.ruta_part, self.emisor, 0)
+        self._cerrado = True
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self._cerrado:
+            if exc_type is not None:
+                self.abortar()
+            else:
+                self.cerrar()
+        return False
@@ -0,0 +1,262 @@
+"""
+Subidas por partes reanudables (estilo tus) para el servidor Flask
+==================================================================
+
+Una subida se crea con su tamaño total, recibe trozos en cualquier orden
+(PATCH con su offset, incluso en paralelo), se puede consultar para saber
+qué rangos faltan y se finaliza cuando está completa.
+
+El estado vive en disco junto al archivo parcial:
+  <directorio>/<id>.part   datos (preasignados al tamaño total)
+  <directorio>/<id>.json   tamaño, rangos recibidos, emisor y fecha
+de modo que una subida sobrevive a reinicios del servidor. Las subidas sin
+actividad durante un tiempo se descartan con caducar() (lo llama el Conserje).
+"""
+
+import os
+import json
+import time
+import uuid
+import hashlib
+import threading
+from contextlib import contextmanager
+from typing import List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: solo exclusión entre hilos
+    fcntl = None
+
+try:
+    from .almacen import id_valido
+except ImportError:
+    from almacen import id_valido
+
+BLOQUE = 256 * 1024
+
+
+class SubidaNoEncontrada(KeyError):
+    """El identificador no corresponde a ninguna subida en curso."""
+
+
+class SubidaInvalida(ValueError):
+    """Offset, longitud o suma de verificación no válidos para la subida."""
+
+
+def fusionar_rangos(rangos: List[List[int]], inicio: int, fin: int) -> List[List[int]]:
+    """Añade [inicio, fin) a una lista ordenada de rangos disjuntos y los une."""
+    resultado = []
+    for a, b in sorted(rangos + [[inicio, fin]]):
+        if resultado and a <= resultado[-1][1]:
+            resultado[-1][1] = max(resultado[-1][1], b)
+        else:
+            resultado.append([a, b])
+    return resultado
+
+
+def offset_contiguo(rangos: List[List[int]]) -> int:
+    """Bytes recibidos sin huecos desde el principio."""
+    return rangos[0][1] if rangos and rangos[0][0] == 0 else 0
+
+
+class GestorSubidas:
+    """Crea, completa y publica subidas por partes en un directorio."""
+
+    def __init__(self, directorio: str, spool=None):
+        self.directorio = os.path.abspath(directorio)  # Se crea con la primera subida
+        self.spool = spool
+        self._locks = {}
+        self._locks_lock = threading.Lock()
+
+    def _rutas(self, subida_id: str):
+        if not id_valido(subida_id):
+            raise SubidaNoEncontrada(subida_id)
+        base = os.path.join(self.directorio, subida_id)
+        return base + '.part', base + '.json'
+
+    @contextmanager
+    def _bloqueo(self, subida_id: str):
+        """Exclusión por subida entre hilos y, con fcntl, entre procesos."""
+        with self._locks_lock:
+            lock = self._locks.setdefault(subida_id, threading.Lock())
+        ruta_part, _ = self._rutas(subida_id)
+        with lock:
+            if fcntl is None:
+                yield
+                return
+            try:
+                fd = os.open(ruta_part, os.O_RDWR)
+            except FileNotFoundError:
+                raise SubidaNoEncontrada(subida_id)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                os.close(fd)
+
+    def _leer(self, subida_id: str) -> dict:
+        _, ruta_estado = self._rutas(subida_id)
+        try:
+            with open(ruta_estado, 'r') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            raise SubidaNoEncontrada(subida_id)
+
+    def _guardar(self, subida_id: str, estado: dict):
+        _, ruta_estado = self._rutas(subida_id)
+        temporal = ruta_estado + '.tmp'
+        with open(temporal, 'w') as f:
+            json.dump(estado, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, ruta_estado)
+
+    def crear(self, tamano: int, emisor: str = 'local', metadatos: Optional[dict] = None) -> str:
+        """
+        Crea una subida de `tamano` bytes y reserva su espacio (y cuota).
+        Lanza CuotaExcedida si el spool no admite el tamaño.
+        """
+        if tamano < 0:
+            raise SubidaInvalida("Tamaño negativo")
+        subida_id = uuid.uuid4().hex
+        ruta_part, _ = self._rutas(subida_id)
+        os.makedirs(self.directorio, exist_ok=True)
+        with open(ruta_part, 'xb') as f:
+            f.truncate(tamano)
+        if self.spool is not None:
+            try:
+                self.spool.contabilizar(ruta_part, emisor)
+            except Exception:
+                os.remove(ruta_part)
+                raise
+        self._guardar(subida_id, {'tamano': tamano, 'rangos': [], 'emisor': emisor,
+                                  'creado': time.time(), 'metadatos': metadatos or {}})
+        return subida_id
+
+    def estado(self, subida_id: str) -> dict:
+        """Estado de la subida: tamano, rangos, offset (contiguo) y completa."""
+        estado = self._leer(subida_id)
+        estado['offset'] = offset_contiguo(estado['rangos'])
+        estado['completa'] = estado['rangos'] == [[0, estado['tamano']]] or estado['tamano'] == 0
+        return estado
+
+    def escribir(self, subida_id: str, offset: int, flujo, longitud: int) -> dict:
+        """
+        Escribe `longitud` bytes leídos de `flujo` a partir de `offset`.
+        Si el flujo se corta, se conserva y registra lo ya escrito.
+        Devuelve el estado actualizado.
+        """
+        ruta_part, _ = self._rutas(subida_id)
+        tamano = self._leer(subida_id)['tamano']
+        if offset < 0 or longitud < 0 or offset + longitud > tamano:
+            raise SubidaInvalida(f"Rango {offset}+{longitud} fuera del tamaño {tamano}")
+        escritos = 0
+        try:
+            with open(ruta_part, 'r+b') as f:
+                f.seek(offset)
+                while escritos < longitud:
+                    bloque = flujo.read(min(BLOQUE, longitud - escritos))
+                    if not bloque:
+                        break
+                    f.write(bloque)
+                    escritos += len(bloque)
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            if escritos:
+                with self._bloqueo(subida_id):
+                    estado = self._leer(subida_id)
+                    estado['rangos'] = fusionar_rangos(estado['rangos'], offset, offset + escritos)
+                    self._guardar(subida_id, estado)
+        if escritos < longitud:
+            raise SubidaInvalida(f"Trozo incompleto: {escritos} de {longitud} bytes")
+        return self.estado(subida_id)
+
+    def finalizar(self, subida_id: str, destino: str, exclusivo: bool = False,
+                  sha256: Optional[str] = None) -> dict:
+        """
+        Publica una subida completa en `destino` (renombrado atómico; con
+        exclusivo=True falla con FileExistsError si el destino existe).
+        Devuelve el estado final de la subida.
+        """
+        ruta_part, ruta_estado = self._rutas(subida_id)
+        with self._bloqueo(subida_id):
+            estado = self.estado(subida_id)
+            if not estado['completa']:
+                raise SubidaInvalida(f"Subida incompleta: {estado['rangos']} de {estado['tamano']} bytes")
+            if sha256:
+                h = hashlib.sha256()
+                with open(ruta_part, 'rb') as f:
+                    for bloque in iter(lambda: f.read(BLOQUE), b''):
+                        h.update(bloque)
+                if h.hexdigest() != sha256.lower():
+                    raise SubidaInvalida("La suma SHA-256 no coincide")
+            with open(ruta_part, 'rb') as f:
+                os.fsync(f.fileno())
+            if exclusivo:
+                self._publicar_sin_sobrescribir(ruta_part, destino)
+            else:
+                os.replace(ruta_part, destino)
+            os.remove(ruta_estado)
+        if self.spool is not None:
+            self.spool.liberar(ruta_part)
+            self.spool.contabilizar(destino, estado['emisor'])
+        with self._locks_lock:
+            self._locks.pop(subida_id, None)
+        return estado
+
+    @staticmethod
+    def _publicar_sin_sobrescribir(ruta_part: str, destino: str):
+        """Mueve el .part a `destino` solo si no existe (FileExistsError si existe)."""
+        try:
+            os.link(ruta_part, destino)
+        except FileExistsError:
+            raise
+        except OSError:
+            # Sistema de archivos sin enlaces duros: se reserva el nombre con O_EXCL y se sustituye
+            with open(destino, 'xb'):
+                pass
+            os.replace(ruta_part, destino)
+            return
+        os.remove(ruta_part)
+
+    def abortar(self, subida_id: str):
+        """Descarta una subida y su archivo parcial."""
+        ruta_part, ruta_estado = self._rutas(subida_id)
+        self._leer(subida_id)
+        for ruta in (ruta_estado, ruta_part):
+            try:
+                os.remove(ruta)
+            except FileNotFoundError:
+                pass
+        if self.spool is not None:
+            self.spool.liberar(ruta_part)
+        with self._locks_lock:
+            self._locks.pop(subida_id, None)
+
+    def pendientes(self) -> List[str]:
+        """Identificadores de las subidas en curso."""
+        try:
+            return [n[:-5] for n in os.listdir(self.directorio) if n.endswith('.json')]
+        except FileNotFoundError:
+            return []
+
+    def caducar(self, inactividad: float, ahora: Optional[float] = None) -> List[str]:
+        """
+        Descarta las subidas sin trozos nuevos desde hace `inactividad`
+        segundos (la fecha de su .json), liberando su archivo parcial y su
+        cuota. Devuelve los identificadores descartados.
+        """
+        ahora = time.time() if ahora is None else ahora
+        caducadas = []
+        for subida_id in self.pendientes():
+            _, ruta_estado = self._rutas(subida_id)
+            try:
+                with self._bloqueo(subida_id):
+                    if ahora - os.path.getmtime(ruta_estado) < inactividad:
+                        continue
+                    self.abortar(subida_id)
+            except (SubidaNoEncontrada, FileNotFoundError):
+                continue  # Finalizada o descartada entretanto
+            caducadas.append(subida_id)
+        return caducadas
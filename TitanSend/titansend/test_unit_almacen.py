@@ -0,0 +1,80 @@
+import unittest
+import os
+import tempfile
+import uuid
+from almacen import AlmacenFragmentado
+
+class TestAlmacenFragmentado(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def escribir(self, almacen, file_id, datos=b'datos'):
+        with open(almacen.ruta(file_id, crear=True), 'wb') as f:
+            f.write(datos)
+        return almacen.registrar(file_id, len(datos))
+
+    def test_rutas_fragmentadas_e_indice(self):
+        almacen = AlmacenFragmentado(self.tmp)
+        ids = [str(uuid.uuid4()) for _ in range(20)]
+        for file_id in ids:
+            self.escribir(almacen, file_id)
+        # Nada en la raíz salvo los subdirectorios de prefijo
+        self.assertTrue(all(len(n) == 2 for n in os.listdir(self.tmp)))
+        self.assertEqual(almacen.listar(), ids)
+        almacen.contar_descarga(ids[0])
+        self.assertEqual(almacen.obtener(ids[0])['descargas'], 1)
+        os.remove(almacen.eliminar(ids[1])['ruta'])
+        self.assertIsNone(almacen.obtener(ids[1]))
+        with self.assertRaises(ValueError):
+            almacen.ruta('../fuera')
+
+    def test_reconstruye_y_migra_archivos_planos(self):
+        almacen = AlmacenFragmentado(self.tmp)
+        file_id = str(uuid.uuid4())
+        self.escribir(almacen, file_id)
+        plano = str(uuid.uuid4())
+        with open(os.path.join(self.tmp, plano + '.bin'), 'wb') as f:
+            f.write(b'antiguo')
+        nuevo = AlmacenFragmentado(self.tmp)
+        self.assertEqual(set(nuevo.listar()), {file_id, plano})
+        self.assertEqual(nuevo.obtener(plano)['ruta'], nuevo.ruta(plano))
+
+    def test_indice_sqlite_compartido(self):
+        db = os.path.join(self.tmp, 'indice.db')
+        a = AlmacenFragmentado(self.tmp, db)
+        b = AlmacenFragmentado(self.tmp, db)
+        file_id = str(uuid.uuid4())
+        self.escribir(a, file_id, b'12345')
+        # Otro proceso lo encuentra sin reiniciar
+        self.assertEqual(b.obtener(file_id)['tamano'], 5)
+        a.contar_descarga(file_id)
+        a.cerrar()
+        c = AlmacenFragmentado(self.tmp, db)
+        self.assertEqual(c.obtener(file_id)['descargas'], 1)
+        b.cerrar()
+        c.cerrar()
+    @unittest.skipUnless(hasattr(os, 'fork'), "Necesita fork")
+    def test_indice_sqlite_tras_fork(self):
+        db = os.path.join(self.tmp, 'indice.db')
+        almacen = AlmacenFragmentado(os.path.join(self.tmp, 'datos'), db)
+        self.escribir(almacen, 'del_maestro')
+        conexion_padre = almacen._db
+        pid = os.fork()
+        if pid == 0:
+            # Como un worker de gunicorn: usa el almacén creado antes del fork
+            codigo = 1
+            try:
+                if almacen._db is not conexion_padre and almacen.obtener('del_maestro'):
+                    self.escribir(almacen, 'del_worker')
+                    codigo = 0
+            finally:
+                os._exit(codigo)
+        _, estado = os.waitpid(pid, 0)
+        self.assertEqual(os.WEXITSTATUS(estado), 0)
+        self.assertIs(almacen._db, conexion_padre)
+        self.assertIsNotNone(almacen.obtener('del_worker'))
+        self.assertEqual(almacen.listar(), ['del_maestro', 'del_worker'])
+        almacen.cerrar()
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,38 @@
+import unittest
+import os
+import tempfile
+from borrado_seguro import sobrescribir, borrar_archivo_seguro, liberar_bloques
+
+class TestBorradoSeguro(unittest.TestCase):
+    def setUp(self):
+        fd, self.ruta = tempfile.mkstemp()
+        self.original = b'secreto' * 50000
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.original)
+
+    def tearDown(self):
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+
+    def test_sobrescribe_en_el_sitio_sin_crecer(self):
+        escritos = sobrescribir(self.ruta, pasadas=2, bloque=64 * 1024)
+        self.assertEqual(escritos, 2 * len(self.original))
+        with open(self.ruta, 'rb') as f:
+            datos = f.read()
+        # Mismo tamaño (no se añade al final) y sin rastro del contenido
+        self.assertEqual(len(datos), len(self.original))
+        self.assertNotIn(b'secreto', datos)
+
+    def test_borrar_elimina_el_archivo(self):
+        self.assertTrue(borrar_archivo_seguro(self.ruta))
+        self.assertFalse(os.path.exists(self.ruta))
+        self.assertFalse(borrar_archivo_seguro(self.ruta))
+
+    def test_modo_trim_libera_bloques(self):
+        liberar_bloques(self.ruta)
+        with open(self.ruta, 'rb') as f:
+            self.assertNotIn(b'secreto', f.read())
+        self.assertTrue(borrar_archivo_seguro(self.ruta, trim=True))
+
+if __name__ == '__main__':
+    unittest.main()
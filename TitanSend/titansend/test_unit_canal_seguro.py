@@ -0,0 +1,129 @@
+import os
+import json
+import shutil
+import tempfile
+import unittest
+import socket
+import threading
+from cryptography.hazmat.primitives.asymmetric import rsa
+from canal_seguro import IdentidadCanal, ServidorCanal, ClienteCanal, CanalSeguro, ErrorAutenticacion, MAX_REGISTRO
+
+def nueva_identidad():
+    return IdentidadCanal(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+
+class TestCanalSeguro(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls):
+        cls.id_servidor = nueva_identidad()
+        cls.id_cliente = nueva_identidad()
+
+    def handshake(self, servidor, cliente, destino=('peer', 1)):
+        a, b = socket.socketpair()
+        resultado = {}
+
+        def lado_servidor():
+            try:
+                resultado['servidor'] = servidor.aceptar(a)
+            except Exception as e:
+                resultado['error'] = e
+                a.close()
+
+        t = threading.Thread(target=lado_servidor)
+        t.start()
+        try:
+            canal_cliente = cliente.conectar(b, destino)
+        finally:
+            t.join(timeout=5)
+        if 'error' in resultado:
+            raise resultado['error']
+        return canal_cliente, resultado['servidor']
+
+    def test_handshake_completo_y_datos(self):
+        servidor = ServidorCanal(self.id_servidor)
+        cliente = ClienteCanal(self.id_cliente, fingerprint_servidor=self.id_servidor.fingerprint)
+        c, s = self.handshake(servidor, cliente)
+        self.assertFalse(c.reanudado)
+        self.assertEqual(s.fingerprint_peer, self.id_cliente.fingerprint)
+        datos = b'x' * 200000
+        t = threading.Thread(target=c.sendall, args=(datos,))
+        t.start()
+        recibido = b''
+        while len(recibido) < len(datos):
+            recibido += s.recv(65536)
+        t.join()
+        self.assertEqual(recibido, datos)
+
+    def test_reanudacion_con_ticket(self):
+        servidor = ServidorCanal(self.id_servidor)
+        cliente = ClienteCanal(self.id_cliente)
+        self.handshake(servidor, cliente)
+        c, s = self.handshake(servidor, cliente)
+        self.assertTrue(c.reanudado)
+        self.assertTrue(s.reanudado)
+        self.assertEqual(s.fingerprint_peer, self.id_cliente.fingerprint)
+        self.assertEqual(c.fingerprint_peer, self.id_servidor.fingerprint)
+        c.sendall(b'hola')
+        self.assertEqual(s.recv(10), b'hola')
+
+    def test_ticket_de_otro_servidor_hace_handshake_completo(self):
+        cliente = ClienteCanal(self.id_cliente)
+        self.handshake(ServidorCanal(self.id_servidor), cliente)
+        c, _ = self.handshake(ServidorCanal(self.id_servidor), cliente)
+        self.assertFalse(c.reanudado)
+
+    def test_fingerprint_servidor_incorrecto(self):
+        cliente = ClienteCanal(self.id_cliente, fingerprint_servidor='00' * 32)
+        with self.assertRaises(ErrorAutenticacion):
+            self.handshake(ServidorCanal(self.id_servidor), cliente)
+
+    def test_clave_fijada_en_el_primer_uso(self):
+        otro_servidor = nueva_identidad()
+        cliente = ClienteCanal(self.id_cliente)
+        self.handshake(ServidorCanal(self.id_servidor), cliente)
+        cliente._tickets.clear()  # Fuerza un handshake completo
+        with self.assertRaises(ErrorAutenticacion):
+            self.handshake(ServidorCanal(otro_servidor), cliente)
+        # Otro destino se fija por separado
+        c, _ = self.handshake(ServidorCanal(otro_servidor), cliente, destino=('otro', 1))
+        self.assertEqual(c.fingerprint_peer, otro_servidor.fingerprint)
+
+    def test_claves_fijadas_persisten(self):
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        archivo = os.path.join(directorio, 'conocidos.json')
+        self.handshake(ServidorCanal(self.id_servidor), ClienteCanal(self.id_cliente, conocidos=archivo))
+        with open(archivo) as f:
+            self.assertEqual(json.load(f), {'peer:1': self.id_servidor.fingerprint.lower()})
+        self.assertEqual(os.stat(archivo).st_mode & 0o777, 0o600)
+        # Un cliente nuevo (otro proceso) rechaza una clave distinta para el mismo destino
+        with self.assertRaises(ErrorAutenticacion):
+            self.handshake(ServidorCanal(nueva_identidad()), ClienteCanal(self.id_cliente, conocidos=archivo))
+        c, _ = self.handshake(ServidorCanal(self.id_servidor), ClienteCanal(self.id_cliente, conocidos=archivo))
+        self.assertEqual(c.fingerprint_peer, self.id_servidor.fingerprint)
+
+    def test_registros_no_revelan_la_longitud_exacta(self):
+        a, b = socket.socketpair()
+        self.addCleanup(a.close)
+        self.addCleanup(b.close)
+        clave = os.urandom(32)
+        emisor = CanalSeguro(a, clave, clave, 'x', reanudado=False)
+        receptor = CanalSeguro(b, clave, clave, 'x', reanudado=False)
+        tamanos = []
+        for datos in (b'a', b'b' * 200, b'c' * 1000, b'd' * 1020):
+            emisor._enviar_registro(datos)
+            cabecera = b.recv(4, socket.MSG_PEEK)
+            tamanos.append(int.from_bytes(cabecera, 'big'))
+            self.assertEqual(receptor._recibir_registro(), datos)
+        # Mismo tramo para 1 y 200 bytes, y para 1000 y 1020
+        self.assertEqual(tamanos[0], tamanos[1])
+        self.assertEqual(tamanos[2], tamanos[3])
+        emisor._enviar_registro(b'e' * MAX_REGISTRO)
+        self.assertEqual(len(receptor._recibir_registro()), MAX_REGISTRO)
+
+    def test_cliente_no_autorizado(self):
+        servidor = ServidorCanal(self.id_servidor, autorizados=['ab' * 32])
+        with self.assertRaises(Exception):
+            self.handshake(servidor, ClienteCanal(self.id_cliente))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,68 @@
+import unittest
+import os
+import random
+import zlib
+from codigo_lt import CodificadorLT, DecodificadorLT, distribucion_soliton_robusta, vecinos, CABECERA_SIMBOLO, MAGIA_LT
+
+
+class TestCodigoLT(unittest.TestCase):
+    def decodificar(self, datos, bloque, perdida, semilla=0):
+        codificador = CodificadorLT(datos, bloque)
+        decodificador = DecodificadorLT()
+        aleatorio = random.Random(semilla)
+        usados = 0
+        for simbolo in codificador.flujo():
+            if aleatorio.random() < perdida:
+                continue
+            usados += 1
+            decodificador.agregar(simbolo)
+            if decodificador.completo:
+                return decodificador.resultado(), usados, codificador.k
+
+    def test_reconstruye_con_perdidas(self):
+        datos = os.urandom(300 * 64 - 7)
+        for perdida in (0.0, 0.3, 0.6):
+            resultado, usados, k = self.decodificar(datos, 64, perdida)
+            self.assertEqual(resultado, datos)
+            # Casi óptimo: pocos símbolos más que bloques, sin importar cuáles se pierden
+            self.assertLessEqual(usados, k * 1.1)
+
+    def test_datos_pequenos(self):
+        for datos in (b'', b'x', os.urandom(100)):
+            resultado, _, _ = self.decodificar(datos, 64, 0.2)
+            self.assertEqual(resultado, datos)
+
+    def test_ignora_repetidos_otros_envios_y_danados(self):
+        codificador = CodificadorLT(os.urandom(1000), 100)
+        decodificador = DecodificadorLT()
+        simbolo = codificador.simbolo(5)
+        self.assertTrue(decodificador.agregar(simbolo))
+        self.assertFalse(decodificador.agregar(simbolo))
+        self.assertFalse(decodificador.agregar(CodificadorLT(os.urandom(1000), 100).simbolo(6)))
+        danado = bytearray(codificador.simbolo(7))
+        danado[-1] ^= 0xFF
+        with self.assertRaises(ValueError):
+            decodificador.agregar(bytes(danado))
+        self.assertEqual(decodificador.recibidos, 1)
+
+    def test_rechaza_cabecera_con_demasiados_bloques(self):
+        datos = b'\0'
+        simbolo = CABECERA_SIMBOLO.pack(MAGIA_LT, 1, 0xFFFFFFFF, 1, 0, zlib.crc32(datos)) + datos
+        decodificador = DecodificadorLT()
+        with self.assertRaises(ValueError):
+            decodificador.agregar(simbolo)
+        self.assertIsNone(decodificador.k)
+        with self.assertRaises(ValueError):
+            CodificadorLT(b'x' * 70000, 1)
+
+    def test_vecinos_deterministas(self):
+        acumulada = distribucion_soliton_robusta(500)
+        self.assertAlmostEqual(acumulada[-1], 1.0)
+        self.assertEqual(vecinos(1234, 500, acumulada), vecinos(1234, 500, acumulada))
+        grados = [len(vecinos(s, 500, acumulada)) for s in range(2000)]
+        self.assertTrue(all(1 <= g <= 500 for g in grados))
+        self.assertLess(sum(grados) / len(grados), 20)
+
+
+if __name__ == '__main__':
+    unittest.main()
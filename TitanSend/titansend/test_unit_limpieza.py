@@ -0,0 +1,80 @@
+import unittest
+import os
+import tempfile
+import threading
+import uuid
+from almacen import AlmacenFragmentado
+from limpieza import ColaBorrado, Conserje
+
+class TestColaBorrado(unittest.TestCase):
+    def test_pool_fijo_y_profundidad(self):
+        liberar = threading.Event()
+        hilos = set()
+
+        def borrar(ruta):
+            hilos.add(threading.current_thread().name)
+            liberar.wait(5)
+
+        cola = ColaBorrado(borrar, workers=2)
+        for i in range(10):
+            cola.encolar(f"archivo{i}")
+        self.assertEqual(cola.pendientes, 10)
+        liberar.set()
+        self.assertTrue(cola.esperar(5))
+        self.assertEqual(cola.pendientes, 0)
+        self.assertLessEqual(len(hilos), 2)
+
+class TestConserje(unittest.TestCase):
+    def setUp(self):
+        self.almacen = AlmacenFragmentado(tempfile.mkdtemp())
+        self.borrados = []
+        self.cola = ColaBorrado(self.borrados.append, workers=1)
+        self.ids = []
+        for i in range(5):
+            file_id = str(uuid.uuid4())
+            with open(self.almacen.ruta(file_id, crear=True), 'wb') as f:
+                f.write(b'x')
+            self.almacen.registrar(file_id, 1)
+            self.ids.append(file_id)
+
+    def test_caducidad_por_ttl(self):
+        conserje = Conserje(self.cola, almacen=self.almacen, ttl=3600)
+        self.assertEqual(conserje.pasada(), 0)
+        self.assertEqual(conserje.pasada(ahora=self.almacen.obtener(self.ids[-1])['creado'] + 3600), 5)
+        self.cola.esperar(5)
+        self.assertEqual(len(self.borrados), 5)
+        self.assertEqual(len(self.almacen), 0)
+
+    def test_maximo_de_archivos_borra_los_mas_antiguos(self):
+        conserje = Conserje(self.cola, almacen=self.almacen, max_archivos=2)
+        self.assertEqual(conserje.pasada(), 3)
+        self.cola.esperar(5)
+        self.assertEqual(self.almacen.listar(), self.ids[3:])
+        self.assertEqual(sorted(self.borrados), sorted(self.almacen.ruta(i) for i in self.ids[:3]))
+
+
+class TestConserjeVariosProcesos(unittest.TestCase):
+    def test_caduca_archivos_de_otro_worker(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            db = os.path.join(tmp, 'indice.db')
+            otro, propio = AlmacenFragmentado(tmp, db), AlmacenFragmentado(tmp, db)
+            self.addCleanup(otro.cerrar)
+            self.addCleanup(propio.cerrar)
+            ids = []
+            for i in range(4):
+                file_id = str(uuid.uuid4())
+                with open(otro.ruta(file_id, crear=True), 'wb') as f:
+                    f.write(b'x')
+                otro.registrar(file_id, 1)
+                ids.append(file_id)
+            borrados = []
+            cola = ColaBorrado(borrados.append, workers=1)
+            self.assertEqual(Conserje(cola, almacen=propio, max_archivos=1).pasada(), 3)
+            self.assertEqual(Conserje(cola, almacen=propio, ttl=0).pasada(), 1)
+            cola.esperar(5)
+            self.assertEqual(sorted(borrados), sorted(otro.ruta(i) for i in ids))
+            # El worker que subió los archivos no vuelve a encolarlos
+            self.assertIsNone(otro.eliminar(ids[0]))
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,52 @@
+import unittest
+import os
+import tempfile
+from metricas import Registro
+
+class TestMetricas(unittest.TestCase):
+    def test_formato_de_texto(self):
+        registro = Registro()
+        contador = registro.contador('peticiones_total', 'Peticiones', ['estado'])
+        histograma = registro.histograma('latencia_segundos', 'Latencia', buckets=(0.1, 1))
+        registro.indicador('en_curso', 'En curso', lambda: 3)
+        contador.inc(estado='200')
+        contador.inc(2, estado='404')
+        for valor in (0.05, 0.5, 5):
+            histograma.observar(valor)
+        texto = registro.exponer()
+        self.assertIn('# TYPE peticiones_total counter', texto)
+        self.assertIn('peticiones_total{estado="404"} 2', texto)
+        self.assertIn('latencia_segundos_bucket{le="0.1"} 1', texto)
+        self.assertIn('latencia_segundos_bucket{le="1"} 2', texto)
+        self.assertIn('latencia_segundos_bucket{le="+Inf"} 3', texto)
+        self.assertIn('latencia_segundos_count 3', texto)
+        self.assertIn('en_curso 3', texto)
+
+    @unittest.skipUnless(hasattr(os, 'fork'), "Necesita fork")
+    def test_suma_de_varios_procesos(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        registro = Registro(directorio=directorio.name, intervalo=60)
+        contador = registro.contador('subidas_total', 'Subidas', ['estado'])
+        histograma = registro.histograma('latencia_segundos', 'Latencia', buckets=(1,))
+        registro.indicador('en_curso', 'En curso', lambda: 2)
+        contador.inc(estado='200')
+        pid = os.fork()
+        if pid == 0:
+            # El worker empieza a cero: solo cuenta lo suyo
+            try:
+                contador.inc(3, estado='200')
+                histograma.observar(0.5)
+                registro.volcar()
+            finally:
+                os._exit(0)
+        os.waitpid(pid, 0)
+        histograma.observar(5)
+        texto = registro.exponer()
+        self.assertIn('subidas_total{estado="200"} 4', texto)
+        self.assertIn('latencia_segundos_bucket{le="1"} 1', texto)
+        self.assertIn('latencia_segundos_count 2', texto)
+        self.assertIn('en_curso 2', texto)  # El otro proceso ya terminó
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,73 @@
+import unittest
+import os
+import tempfile
+import qrcode
+from qrcode.constants import ERROR_CORRECT_L, ERROR_CORRECT_H
+from optimizador_qr import (capacidad_bytes, probabilidad_lectura, evaluar, optimizar, modulos,
+                            PERFILES_ESCANER, NIVELES_ECC)
+from transport_qr import configuracion_qr, generar_qr_multiple, preparar_fragmentos, comprimir_datos, QR_CONFIG
+
+
+class TestOptimizadorQR(unittest.TestCase):
+    def test_capacidad_coincide_con_qrcode(self):
+        self.assertEqual(capacidad_bytes(40, ERROR_CORRECT_L), QR_CONFIG['max_data_bytes'])
+        for version in (1, 9, 10, 25, 40):
+            for error_correction in NIVELES_ECC.values():
+                capacidad = capacidad_bytes(version, error_correction)
+                qr = qrcode.QRCode(version=version, error_correction=error_correction)
+                qr.add_data(b'\xff' * capacidad)
+                qr.make(fit=False)  # Cabe justo
+                qr = qrcode.QRCode(version=version, error_correction=error_correction)
+                qr.add_data(b'\xff' * (capacidad + 1))
+                with self.assertRaises(qrcode.exceptions.DataOverflowError):
+                    qr.make(fit=False)
+
+    def test_probabilidad(self):
+        perfil = PERFILES_ESCANER['pantalla']
+        # Más módulos, peor resolución; más corrección, más errores tolerados
+        self.assertGreater(probabilidad_lectura(10, ERROR_CORRECT_L, perfil), probabilidad_lectura(40, ERROR_CORRECT_L, perfil))
+        self.assertGreater(probabilidad_lectura(10, ERROR_CORRECT_H, perfil), probabilidad_lectura(10, ERROR_CORRECT_L, perfil))
+
+    def test_mejor_que_v40_en_pantalla(self):
+        for nombre, perfil in PERFILES_ESCANER.items():
+            opcion = optimizar(200000, nombre)
+            self.assertLess(modulos(opcion['version']), modulos(40))
+            self.assertLess(opcion['segundos'], evaluar(200000, 40, 'L', perfil, 13)['segundos'])
+            self.assertEqual(opcion['fragmentos'], -(-200000 // (opcion['max_data_bytes'] - 13)))
+
+    def test_sobrecoste_por_codigo(self):
+        # Con mucho coste fijo por código compensan QR más grandes
+        barato = dict(PERFILES_ESCANER['pantalla'], sobrecoste=0.0)
+        caro = dict(PERFILES_ESCANER['pantalla'], sobrecoste=30.0)
+        self.assertGreater(optimizar(200000, caro)['max_data_bytes'], optimizar(200000, barato)['max_data_bytes'])
+
+    def test_un_solo_qr_sin_cabecera(self):
+        opcion = optimizar(100, 'pantalla')
+        self.assertEqual(opcion['fragmentos'], 1)
+        self.assertEqual(optimizar(100, 'pantalla', paridad=1)['fragmentos'], 2)
+        self.assertIsNone(optimizar(10 ** 9, 'webcam', versiones=[1]))
+        with self.assertRaises(ValueError):
+            optimizar(100, 'prismáticos')
+
+    def test_paridad_por_grupo(self):
+        perfil = PERFILES_ESCANER['pantalla']
+        capacidad = capacidad_bytes(10, ERROR_CORRECT_L)
+        # 500 fragmentos de datos en grupos de hasta 246: 3 grupos con 10 de paridad cada uno
+        opcion = evaluar(500 * (capacidad - 19), 10, 'L', perfil, cabecera=19, paridad=10)
+        self.assertEqual(opcion['fragmentos'], 500 + 3 * 10)
+
+    def test_generar_con_perfil(self):
+        datos = os.urandom(5000)
+        config = configuracion_qr(len(comprimir_datos(datos)), 'pantalla')
+        self.assertLess(config['version'], QR_CONFIG['version'])
+        self.assertEqual(configuracion_qr(len(datos), None), QR_CONFIG)
+        contenidos = preparar_fragmentos(datos, config['max_data_bytes'])
+        self.assertTrue(all(len(c) <= config['max_data_bytes'] for c in contenidos))
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        archivos = generar_qr_multiple(datos, os.path.join(directorio.name, 'qr.png'), procesos=1, perfil='pantalla')
+        self.assertEqual(len(archivos), len(contenidos))
+
+
+if __name__ == '__main__':
+    unittest.main()
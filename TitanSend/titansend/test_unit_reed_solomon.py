@@ -0,0 +1,97 @@
+import unittest
+import os
+import random
+import tempfile
+import itertools
+from unittest import mock
+from reed_solomon import CodigoRS, dividir, unir, ReensambladorRS, NUMPY_AVAILABLE
+import transport
+from transport import enviar_usb_partes, recibir_usb_partes, enviar_bluetooth_partes, recibir_bluetooth_partes
+
+
+class TestReedSolomon(unittest.TestCase):
+    def modos(self):
+        return (True, False) if NUMPY_AVAILABLE else (False,)
+
+    def test_cualquier_k_de_k_mas_m(self):
+        datos = os.urandom(6 * 1001 + 3)
+        for vectorizado in self.modos():
+            partes = dividir(datos, 6, 3, vectorizado)
+            self.assertEqual(len(partes), 9)
+            for perdidas in itertools.combinations(range(9), 3):
+                recibidas = [p for i, p in enumerate(partes) if i not in perdidas]
+                self.assertEqual(unir(recibidas, vectorizado), datos)
+
+    def test_numpy_y_python_son_compatibles(self):
+        if not NUMPY_AVAILABLE:
+            self.skipTest("NumPy no disponible")
+        datos = os.urandom(50001)
+        self.assertEqual(dividir(datos, 10, 4, True), dividir(datos, 10, 4, False))
+        self.assertEqual(unir(dividir(datos, 10, 4, True)[4:], False), datos)
+
+    def test_mas_de_256_fragmentos_en_grupos(self):
+        datos = os.urandom(600 * 20)
+        partes = dividir(datos, 600, 2)
+        self.assertEqual(len(partes), 606)  # 3 grupos de 200 + 2
+        # Se pierden 2 fragmentos de cada grupo (datos y paridad)
+        perdidos = {0, 199, 200, 602, 403, 605}
+        self.assertEqual(unir(p for i, p in enumerate(partes) if i not in perdidos), datos)
+
+    def test_insuficientes_danados_y_otros_datos(self):
+        partes = dividir(os.urandom(1000), 4, 2)
+        reensamblador = ReensambladorRS()
+        for parte in partes[:3]:
+            self.assertTrue(reensamblador.agregar(parte))
+        self.assertFalse(reensamblador.agregar(partes[0]))
+        self.assertFalse(reensamblador.agregar(dividir(os.urandom(1000), 4, 2)[4]))
+        self.assertEqual(reensamblador.faltan(), 1)
+        with self.assertRaises(ValueError):
+            reensamblador.resultado()
+        danada = bytearray(partes[5])
+        danada[-1] ^= 1
+        with self.assertRaises(ValueError):
+            reensamblador.agregar(bytes(danada))
+
+    def test_codigo_directo(self):
+        codigo = CodigoRS(3, 2)
+        fragmentos = [os.urandom(16) for _ in range(3)]
+        paridad = codigo.codificar(fragmentos)
+        self.assertEqual(codigo.reconstruir({1: fragmentos[1], 3: paridad[0], 4: paridad[1]}), fragmentos)
+        with self.assertRaises(ValueError):
+            CodigoRS(200, 57)
+
+    def test_limite_de_indices(self):
+        with self.assertRaises(ValueError):
+            dividir(b'x' * 65535, 65535, 1)  # 65535 de datos + 257 de paridad no caben en u16
+
+    def test_usb_dividido(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        rutas = [os.path.join(directorio.name, f'usb{i}', 'envio.bin') for i in range(5)]
+        for ruta in rutas:
+            os.makedirs(os.path.dirname(ruta))
+        datos = os.urandom(100000)
+        enviar_usb_partes(datos, rutas, paridad=2)
+        for ruta in random.sample(rutas, 2):
+            os.remove(ruta)
+        self.assertEqual(recibir_usb_partes(rutas), datos)
+        os.remove(next(r for r in rutas if os.path.exists(r)))
+        self.assertEqual(recibir_usb_partes(rutas), b"")
+
+    def test_bluetooth_dividido(self):
+        datos = os.urandom(5000)
+        enviados = []
+        with mock.patch.object(transport, 'enviar_bluetooth', lambda parte, direccion: enviados.append(parte)):
+            enviar_bluetooth_partes(datos, '00:11:22:33:44:55', partes=4, paridad=2)
+        self.assertEqual(len(enviados), 6)
+        danado = bytearray(enviados[3])
+        danado[-1] ^= 0xFF
+        recibidos = [b'', enviados[5], bytes(danado), enviados[0], enviados[4], enviados[2], enviados[1]]
+        with mock.patch.object(transport, 'recibir_bluetooth', side_effect=recibidos):
+            self.assertEqual(recibir_bluetooth_partes('00:11:22:33:44:55', 6), datos)
+        with mock.patch.object(transport, 'recibir_bluetooth', side_effect=[b'', enviados[0], b'', enviados[1], b'', b'']):
+            self.assertEqual(recibir_bluetooth_partes('00:11:22:33:44:55', 6), b"")
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,123 @@
+import unittest
+import io
+import os
+import tempfile
+import servidor_flask_tor as srv
+import servidor_wsgi
+from almacen import AlmacenFragmentado
+
+class TestServidorFlask(unittest.TestCase):
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmp = tempfile.mkdtemp()
+        os.chdir(self.tmp)
+        self.max_size = srv.MAX_SIZE
+        srv.MULTIARCHIVO = False
+        srv.TOKEN = None
+        self.client = srv.app.test_client()
+
+    def tearDown(self):
+        srv.MAX_SIZE = self.max_size
+        if os.path.exists(srv.ARCHIVO):
+            os.remove(srv.ARCHIVO)
+        srv.spool.liberar(srv.ARCHIVO)
+        os.chdir(self.cwd)
+
+    def test_subida_por_bloques_y_descarga_parcial(self):
+        datos = os.urandom(3 * srv.CHUNK_SUBIDA + 17)
+        r = self.client.post('/upload', data=io.BytesIO(datos),
+                             headers={'Content-Length': str(len(datos))})
+        self.assertEqual(r.status_code, 200)
+        r = self.client.get('/download', headers={'Range': 'bytes=100-199'})
+        self.assertEqual(r.status_code, 206)
+        self.assertEqual(r.data, datos[100:200])
+        r = self.client.get('/download')
+        self.assertEqual(r.data, datos)
+
+    def test_rechazo_por_content_length(self):
+        srv.MAX_SIZE = 1024
+        r = self.client.post('/upload', data=b'x' * 2048)
+        self.assertEqual(r.status_code, 413)
+        self.assertFalse(os.path.exists(srv.ARCHIVO))
+
+    def test_rechazo_sin_content_length(self):
+        srv.MAX_SIZE = 1024
+        # Cuerpo sin longitud declarada: el límite se aplica mientras se lee
+        r = self.client.post('/upload', input_stream=io.BytesIO(b'x' * 4096),
+                             environ_overrides={'wsgi.input_terminated': True})
+        self.assertEqual(r.status_code, 413)
+        self.assertFalse(os.path.exists(srv.ARCHIVO))
+        self.assertFalse(os.path.exists(srv.ARCHIVO + '.part'))
+    def test_subida_en_curso_devuelve_conflicto(self):
+        # Un .part existente indica otra subida en curso hacia el mismo archivo
+        open(srv.ARCHIVO + '.part', 'wb').close()
+        try:
+            r = self.client.post('/upload', data=b'datos')
+            self.assertEqual(r.status_code, 409)
+        finally:
+            os.remove(srv.ARCHIVO + '.part')
+        self.assertFalse(os.path.exists(srv.ARCHIVO))
+    def test_descarga_cuenta_como_transferencia_hasta_cerrar(self):
+        with open(srv.ARCHIVO, 'wb') as f:
+            f.write(b'x' * 100000)
+        r = self.client.get('/download', buffered=False)
+        self.assertEqual(srv.transferencias.activas, 1)
+        self.assertFalse(srv.transferencias.esperar(0.01))
+        r.close()
+        self.assertTrue(srv.transferencias.esperar(1))
+        self.assertEqual(srv.transferencias.activas, 0)
+    def test_multiarchivo_en_almacen_fragmentado(self):
+        srv.MULTIARCHIVO = True
+        srv.almacen = AlmacenFragmentado(os.path.join(self.tmp, 'datos'))
+        try:
+            r = self.client.post('/upload', data=b'contenido')
+            file_id = r.get_json()['id']
+            self.assertEqual(self.client.get('/status').get_json()['archivos'], [f"{file_id}.bin"])
+            self.assertEqual(self.client.get(f'/download?id={file_id}').data, b'contenido')
+            self.assertEqual(srv.almacen.obtener(file_id)['descargas'], 1)
+            self.assertEqual(self.client.get('/download?id=../x').status_code, 400)
+            self.assertEqual(self.client.post(f'/delete?id={file_id}').status_code, 200)
+            self.assertEqual(self.client.get(f'/download?id={file_id}').status_code, 404)
+        finally:
+            srv.MULTIARCHIVO = False
+            srv.almacen = None
+    def test_descarga_unica_borra_al_terminar_el_envio(self):
+        with open(srv.ARCHIVO, 'wb') as f:
+            f.write(b'y' * 100000)
+        os.environ['TSEND_UNICO'] = '1'
+        try:
+            r = self.client.get('/download', buffered=False)
+            # Mientras se envía, el archivo sigue intacto
+            self.assertEqual(srv.cola_borrado.pendientes, 0)
+            self.assertEqual(b''.join(r.response), b'y' * 100000)
+            r.close()
+            self.assertTrue(srv.cola_borrado.esperar(5))
+            self.assertFalse(os.path.exists(srv.ARCHIVO))
+        finally:
+            del os.environ['TSEND_UNICO']
+    def test_un_worker_por_defecto_con_cuotas(self):
+        self.assertEqual(servidor_wsgi.workers_gunicorn(None, con_cuotas=True), 1)
+        self.assertEqual(servidor_wsgi.workers_gunicorn(None, con_cuotas=False), os.cpu_count() or 1)
+        self.assertEqual(servidor_wsgi.workers_gunicorn(4, con_cuotas=True), 4)
+        # Multiarchivo sin índice SQLite: cada worker vería solo sus subidas
+        self.assertEqual(servidor_wsgi.workers_gunicorn(None, con_cuotas=False, indice_por_proceso=True), 1)
+        self.assertEqual(servidor_wsgi.workers_gunicorn(4, con_cuotas=False, indice_por_proceso=True), 1)
+
+    def test_metricas_prometheus(self):
+        subidas = srv.m_subidas.valor(estado='200')
+        enviados = srv.m_bytes_enviados.valor()
+        self.client.post('/upload', data=b'z' * 1000).close()
+        self.client.get('/download').close()
+        texto = self.client.get('/metrics').get_data(as_text=True)
+        self.assertEqual(srv.m_subidas.valor(estado='200'), subidas + 1)
+        self.assertEqual(srv.m_bytes_enviados.valor(), enviados + 1000)
+        self.assertIn('titansend_peticion_duracion_segundos_bucket{ruta="/upload",le="+Inf"}', texto)
+        self.assertIn('titansend_transferencias_en_curso 1', texto)  # la propia petición /metrics
+        self.assertIn('# TYPE titansend_bytes_en_disco gauge', texto)
+        srv.TOKEN = 'secreto'
+        self.assertEqual(self.client.get('/metrics').status_code, 401)
+        r = self.client.get('/metrics', headers={'Authorization': 'Bearer secreto'})
+        self.assertEqual(r.status_code, 200)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,83 @@
+import unittest
+import os
+import tempfile
+from spool import ReceptorSpool, CuotaExcedida
+
+class TestReceptorSpool(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+
+    def ruta(self, nombre):
+        return os.path.join(self.tmp, nombre)
+
+    def test_confirmar_renombra_y_contabiliza(self):
+        spool = ReceptorSpool()
+        with spool.abrir(self.ruta('a.bin'), 'peer1', tamano=10) as f:
+            f.write(b'0123456789')
+            f.confirmar()
+        self.assertTrue(os.path.exists(self.ruta('a.bin')))
+        self.assertFalse(os.path.exists(self.ruta('a.bin.part')))
+        self.assertEqual(spool.uso('peer1'), 10)
+        spool.liberar(self.ruta('a.bin'))
+        self.assertEqual(spool.uso(), 0)
+
+    def test_cuota_por_emisor_con_tamano_conocido(self):
+        spool = ReceptorSpool(cuota_por_emisor=100)
+        with self.assertRaises(CuotaExcedida):
+            spool.abrir(self.ruta('grande.bin'), 'peer1', tamano=101)
+        self.assertFalse(os.path.exists(self.ruta('grande.bin.part')))
+        # Otro emisor no se ve afectado
+        with spool.abrir(self.ruta('ok.bin'), 'peer2', tamano=100) as f:
+            f.write(b'x' * 100)
+            f.confirmar()
+
+    def test_cuota_global_mientras_llegan_datos(self):
+        spool = ReceptorSpool(cuota_global=3 * 1024 * 1024)
+        with self.assertRaises(CuotaExcedida):
+            with spool.abrir(self.ruta('flujo.bin'), 'peer1') as f:
+                for _ in range(10):
+                    f.write(b'x' * 1024 * 1024)
+        # El parcial se limpia y la cuota se libera
+        self.assertFalse(os.path.exists(self.ruta('flujo.bin.part')))
+        self.assertEqual(spool.uso(), 0)
+
+    def test_mas_bytes_que_los_declarados(self):
+        spool = ReceptorSpool()
+        with self.assertRaises(CuotaExcedida):
+            with spool.abrir(self.ruta('mentira.bin'), 'peer1', tamano=4) as f:
+                f.write(b'12345')
+
+    def test_cerrar_conserva_parcial_para_reanudar(self):
+        spool = ReceptorSpool()
+        f = spool.abrir(self.ruta('r.bin'), 'peer1', tamano=8)
+        f.write(b'abcd')
+        f.cerrar()
+        self.assertEqual(os.path.getsize(self.ruta('r.bin.part')), 4)
+        self.assertEqual(spool.uso(), 4)
+        f = spool.abrir(self.ruta('r.bin'), 'peer1', tamano=8, offset=4)
+        f.write(b'efgh')
+        f.confirmar()
+        with open(self.ruta('r.bin'), 'rb') as fh:
+            self.assertEqual(fh.read(), b'abcdefgh')
+        self.assertEqual(spool.uso(), 8)
+    def test_exclusivo_no_pisa_escrituras_ni_archivos(self):
+        spool = ReceptorSpool()
+        primera = spool.abrir(self.ruta('unico.bin'), 'peer1', tamano=4, exclusivo=True)
+        # Una segunda subida concurrente no comparte el .part ni su cuota
+        with self.assertRaises(FileExistsError):
+            spool.abrir(self.ruta('unico.bin'), 'peer2', tamano=4, exclusivo=True)
+        self.assertEqual(spool.uso('peer1'), 4)
+        primera.write(b'abcd')
+        primera.confirmar()
+        # La ruta final ya existe: la nueva escritura se descarta al confirmar
+        f = spool.abrir(self.ruta('unico.bin'), 'peer2', tamano=4, exclusivo=True)
+        f.write(b'wxyz')
+        with self.assertRaises(FileExistsError):
+            f.confirmar()
+        self.assertFalse(os.path.exists(self.ruta('unico.bin.part')))
+        with open(self.ruta('unico.bin'), 'rb') as fh:
+            self.assertEqual(fh.read(), b'abcd')
+        self.assertEqual(spool.uso(), 4)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+import unittest
+import io
+import os
+import hashlib
+import tempfile
+from unittest import mock
+from subidas import GestorSubidas, SubidaInvalida, SubidaNoEncontrada, fusionar_rangos
+
+class TestGestorSubidas(unittest.TestCase):
+    def setUp(self):
+        directorio = tempfile.TemporaryDirectory()
+        self.addCleanup(directorio.cleanup)
+        self.tmp = directorio.name
+        self.gestor = GestorSubidas(os.path.join(self.tmp, 'subidas'))
+
+    def test_fusionar_rangos(self):
+        self.assertEqual(fusionar_rangos([[0, 10], [20, 30]], 10, 20), [[0, 30]])
+        self.assertEqual(fusionar_rangos([[5, 10]], 0, 3), [[0, 3], [5, 10]])
+
+    def test_trozos_desordenados_y_finalizar(self):
+        datos = os.urandom(1000)
+        subida_id = self.gestor.crear(len(datos))
+        self.gestor.escribir(subida_id, 600, io.BytesIO(datos[600:]), 400)
+        estado = self.gestor.escribir(subida_id, 0, io.BytesIO(datos[:300]), 300)
+        self.assertEqual(estado['offset'], 300)
+        destino = os.path.join(self.tmp, 'final.bin')
+        with self.assertRaises(SubidaInvalida):
+            self.gestor.finalizar(subida_id, destino)
+        self.gestor.escribir(subida_id, 300, io.BytesIO(datos[300:600]), 300)
+        with self.assertRaises(SubidaInvalida):
+            self.gestor.finalizar(subida_id, destino, sha256='00' * 32)
+        self.gestor.finalizar(subida_id, destino, sha256=hashlib.sha256(datos).hexdigest())
+        with open(destino, 'rb') as f:
+            self.assertEqual(f.read(), datos)
+        self.assertEqual(self.gestor.pendientes(), [])
+        with self.assertRaises(SubidaNoEncontrada):
+            self.gestor.estado(subida_id)
+
+    def test_trozo_cortado_conserva_lo_escrito(self):
+        subida_id = self.gestor.crear(100)
+        with self.assertRaises(SubidaInvalida):
+            self.gestor.escribir(subida_id, 0, io.BytesIO(b'x' * 40), 60)
+        self.assertEqual(self.gestor.estado(subida_id)['rangos'], [[0, 40]])
+        with self.assertRaises(SubidaInvalida):
+            self.gestor.escribir(subida_id, 90, io.BytesIO(b'x' * 20), 20)
+
+    def test_directorio_perezoso_y_subidas_abandonadas(self):
+        self.assertFalse(os.path.exists(self.gestor.directorio))
+        self.assertEqual(self.gestor.pendientes(), [])
+        vieja = self.gestor.crear(100)
+        nueva = self.gestor.crear(100)
+        ruta_vieja = os.path.join(self.gestor.directorio, vieja + '.json')
+        os.utime(ruta_vieja, (0, 1000))
+        self.gestor.escribir(nueva, 0, io.BytesIO(b'x' * 10), 10)
+        self.assertEqual(self.gestor.caducar(3600), [vieja])
+        self.assertEqual(self.gestor.pendientes(), [nueva])
+        self.assertFalse(os.path.exists(os.path.join(self.gestor.directorio, vieja + '.part')))
+
+    def test_finalizar_exclusivo_sin_enlaces_duros(self):
+        datos = b'y' * 50
+        destino = os.path.join(self.tmp, 'final.bin')
+        with mock.patch('os.link', side_effect=OSError(1, 'Operation not permitted')):
+            subida_id = self.gestor.crear(len(datos))
+            self.gestor.escribir(subida_id, 0, io.BytesIO(datos), len(datos))
+            self.gestor.finalizar(subida_id, destino, exclusivo=True)
+            otra = self.gestor.crear(len(datos))
+            self.gestor.escribir(otra, 0, io.BytesIO(datos), len(datos))
+            with self.assertRaises(FileExistsError):
+                self.gestor.finalizar(otra, destino, exclusivo=True)
+        with open(destino, 'rb') as f:
+            self.assertEqual(f.read(), datos)
+
+if __name__ == '__main__':
+    unittest.main()
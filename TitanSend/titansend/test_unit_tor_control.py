@@ -0,0 +1,183 @@
+import unittest
+import os
+import stat
+import itertools
+import tempfile
+import threading
+import time
+from tor_control import GestorControlador, GestorServiciosOnion
+from transport_p2p import verificar_tor, generar_direccion_onion, obtener_direccion_onion, P2PServer
+
+
+class RespuestaOnion:
+    def __init__(self, service_id, private_key=None, private_key_type=None):
+        self.service_id = service_id
+        self.private_key = private_key
+        self.private_key_type = private_key_type
+
+
+class ControladorFalso:
+    """
+    Controller de stem simulado: cuenta operaciones y puede fallar una vez.
+    `publicados` representa los servicios onion vivos en el proceso Tor.
+    """
+    _claves = itertools.count()
+
+    def __init__(self, fallar=False, publicados=None):
+        self.vivo = True
+        self.fallar = fallar
+        self.operaciones = 0
+        self.publicados = publicados if publicados is not None else {}
+        self.creaciones = []
+
+    def is_alive(self):
+        return self.vivo
+
+    def close(self):
+        self.vivo = False
+
+    def get_version(self):
+        self.operaciones += 1
+        if self.fallar:
+            self.vivo = False
+            raise ConnectionResetError("conexión de control cerrada")
+        return '0.4.8.10'
+
+    def create_ephemeral_hidden_service(self, ports, key_type='NEW', key_content='BEST', detached=False,
+                                        await_publication=False):
+        self.creaciones.append((ports, key_type))
+        if key_type == 'NEW':
+            service_id = f"{next(self._claves):02d}" + 'a' * 54
+            respuesta = RespuestaOnion(service_id, f"clave-{service_id}", 'ED25519-V3')
+        else:
+            service_id = key_content[len('clave-'):]
+            respuesta = RespuestaOnion(service_id)
+        self.publicados[service_id] = ports
+        return respuesta
+
+    def list_ephemeral_hidden_services(self, default=None, our_services=True, detached=False):
+        return list(self.publicados)
+
+    def remove_ephemeral_hidden_service(self, service_id):
+        return self.publicados.pop(service_id, None) is not None
+
+
+class TestGestorControlador(unittest.TestCase):
+    def setUp(self):
+        self.creados = []
+
+    def fabrica(self, fallar_primero=False):
+        def crear():
+            time.sleep(0.01)  # Conectar y autenticar cuesta un viaje de ida y vuelta
+            controlador = ControladorFalso(fallar=fallar_primero and not self.creados)
+            self.creados.append(controlador)
+            return controlador
+        return crear
+
+    def test_reutiliza_una_sola_conexion(self):
+        gestor = GestorControlador(fabrica=self.fabrica())
+        for _ in range(100):
+            ok, mensaje = verificar_tor(gestor=gestor)
+            self.assertTrue(ok)
+        servicios = GestorServiciosOnion(gestor, os.path.join(tempfile.mkdtemp(), 'claves.json'))
+        service_id = generar_direccion_onion(9000, servicios=servicios)
+        self.assertEqual(generar_direccion_onion(9000, servicios=servicios), service_id)
+        self.assertEqual(len(self.creados), 1)
+        self.assertEqual(self.creados[0].operaciones, 100)
+
+    def test_reconecta_tras_un_fallo(self):
+        gestor = GestorControlador(fabrica=self.fabrica(fallar_primero=True))
+        self.assertEqual(gestor.ejecutar(lambda c: c.get_version()), '0.4.8.10')
+        self.assertEqual(gestor.conexiones, 2)
+        self.assertFalse(self.creados[0].is_alive())
+        # La conexión nueva se mantiene
+        gestor.ejecutar(lambda c: c.get_version())
+        self.assertEqual(len(self.creados), 2)
+
+    def test_reconecta_si_la_conexion_murio(self):
+        gestor = GestorControlador(fabrica=self.fabrica())
+        gestor.ejecutar(lambda c: c.get_version())
+        self.creados[0].vivo = False
+        gestor.ejecutar(lambda c: c.get_version())
+        self.assertEqual(len(self.creados), 2)
+
+    def test_hilos_comparten_la_conexion(self):
+        gestor = GestorControlador(fabrica=self.fabrica())
+        hilos = [threading.Thread(target=lambda: [gestor.ejecutar(lambda c: c.get_version()) for _ in range(20)])
+                 for _ in range(8)]
+        for hilo in hilos:
+            hilo.start()
+        for hilo in hilos:
+            hilo.join()
+        self.assertEqual(len(self.creados), 1)
+
+    def test_cerrar(self):
+        gestor = GestorControlador(fabrica=self.fabrica())
+        gestor.ejecutar(lambda c: c.get_version())
+        gestor.cerrar()
+        self.assertFalse(self.creados[0].is_alive())
+
+
+class TestServiciosOnion(unittest.TestCase):
+    def setUp(self):
+        self.tor = {}  # Servicios vivos en el proceso Tor simulado
+        self.controladores = []
+        self.archivo = os.path.join(tempfile.mkdtemp(), 'onion', 'claves.json')
+
+        def fabrica():
+            controlador = ControladorFalso(publicados=self.tor)
+            self.controladores.append(controlador)
+            return controlador
+        self.gestor = GestorControlador(fabrica=fabrica)
+
+    def test_crea_reutiliza_y_persiste(self):
+        servicios = GestorServiciosOnion(self.gestor, self.archivo)
+        a = servicios.servicio(8080)
+        b = servicios.servicio(8081)
+        self.assertNotEqual(a, b)
+        self.assertEqual(servicios.servicio(8080), a)
+        self.assertEqual(len(self.controladores[0].creaciones), 2)
+        self.assertEqual(self.tor[a], {8080: 8080})
+        self.assertEqual(stat.S_IMODE(os.stat(self.archivo).st_mode), 0o600)
+        self.assertEqual(obtener_direccion_onion(8081, servicios=servicios), f"{b}.onion")
+
+    def test_misma_direccion_tras_reiniciar_tor(self):
+        a = GestorServiciosOnion(self.gestor, self.archivo).servicio(8080)
+        self.tor.clear()
+        self.controladores[0].vivo = False
+        # Un proceso nuevo lee las claves guardadas y recrea el servicio con la misma dirección
+        self.assertEqual(GestorServiciosOnion(self.gestor, self.archivo).servicio(8080), a)
+        self.assertEqual(self.controladores[1].creaciones, [({8080: 8080}, 'ED25519-V3')])
+        self.assertIn(a, self.tor)
+
+    def test_eliminar(self):
+        servicios = GestorServiciosOnion(self.gestor, self.archivo)
+        a = servicios.servicio(8080)
+        self.assertTrue(servicios.eliminar(8080))
+        self.assertNotIn(a, self.tor)
+        # Sin olvidar la clave, la dirección se recupera
+        self.assertEqual(servicios.servicio(8080), a)
+        servicios.eliminar(8080, olvidar_clave=True)
+        self.assertEqual(servicios.servicios(), {})
+        self.assertNotEqual(servicios.servicio(8080), a)
+
+    def test_receptor_retira_su_servicio_al_detenerse(self):
+        servicios = GestorServiciosOnion(self.gestor, self.archivo)
+        servidor = P2PServer(5080, servicios_onion=servicios)
+        servidor.use_tor = True
+        hilo = threading.Thread(target=servidor.start, args=(os.path.dirname(self.archivo),), daemon=True)
+        hilo.start()
+        limite = time.monotonic() + 5
+        while not self.tor and time.monotonic() < limite:
+            time.sleep(0.01)
+        direccion = servicios.servicios()[5080]
+        servidor.stop()
+        hilo.join(5)
+        self.assertFalse(hilo.is_alive())
+        self.assertEqual(self.tor, {})
+        # La clave se conserva: el próximo receptor del puerto recupera la dirección
+        self.assertEqual(f"{servicios.servicio(5080)}.onion", direccion)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,167 @@
+import unittest
+import socket
+import threading
+import time
+import tempfile
+from pathlib import Path
+from tor_setup import ClienteControl, TorSetup, esperar_bootstrap, sondear_socks
+
+PORT = 5070
+
+
+class PuertoControlFalso:
+    """
+    Puerto de control de Tor simulado: autenticación NULL, GETINFO del estado
+    de bootstrap y eventos STATUS_CLIENT emitidos con los retrasos indicados.
+    """
+
+    def __init__(self, puerto, fases, retraso=0.1, inicial=5):
+        self.fases = fases
+        self.retraso = retraso
+        self.inicial = inicial
+        self.comandos = []
+        self.servidor = socket.create_server(('127.0.0.1', puerto))
+        threading.Thread(target=self._atender, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.close()
+
+    def _atender(self):
+        try:
+            while True:
+                conn, _ = self.servidor.accept()
+                threading.Thread(target=self._sesion, args=(conn,), daemon=True).start()
+        except OSError:
+            pass
+
+    def _sesion(self, conn):
+        lock = threading.Lock()
+
+        def enviar(texto):
+            with lock:
+                conn.sendall(texto.encode())
+
+        def emitir_eventos():
+            for progreso in self.fases:
+                time.sleep(self.retraso)
+                enviar(f'650 STATUS_CLIENT NOTICE BOOTSTRAP PROGRESS={progreso} TAG=t SUMMARY="Fase {progreso}"\r\n')
+
+        with conn, conn.makefile('rb') as f:
+            for linea in f:
+                comando = linea.decode().strip()
+                self.comandos.append(comando)
+                if comando == 'PROTOCOLINFO 1':
+                    enviar('250-PROTOCOLINFO 1\r\n250-AUTH METHODS=NULL\r\n250-VERSION Tor="0.4.8.10"\r\n250 OK\r\n')
+                elif comando == 'GETINFO status/bootstrap-phase':
+                    enviar(f'250-status/bootstrap-phase=NOTICE BOOTSTRAP PROGRESS={self.inicial} TAG=conn '
+                           f'SUMMARY="Conectando"\r\n250 OK\r\n')
+                elif comando == 'GETINFO status/circuit-established':
+                    enviar(f'250-status/circuit-established={1 if self.inicial == 100 else 0}\r\n250 OK\r\n')
+                elif comando == 'SETEVENTS STATUS_CLIENT':
+                    enviar('250 OK\r\n')
+                    threading.Thread(target=emitir_eventos, daemon=True).start()
+                else:
+                    enviar('250 OK\r\n')
+
+
+class TestBootstrapTor(unittest.TestCase):
+    def test_termina_en_cuanto_llega_al_100(self):
+        falso = PuertoControlFalso(PORT, [40, 85, 100], retraso=0.1)
+        try:
+            fases = []
+            segundos = esperar_bootstrap(puerto=PORT, timeout=5, al_progresar=lambda p, r: fases.append(p))
+        finally:
+            falso.cerrar()
+        self.assertIsNotNone(segundos)
+        self.assertGreaterEqual(segundos, 0.25)
+        self.assertLess(segundos, 1.5)
+        self.assertEqual(fases, [5, 40, 85, 100])
+        # Se suscribe a los eventos antes de consultar el estado
+        self.assertLess(falso.comandos.index('SETEVENTS STATUS_CLIENT'),
+                        falso.comandos.index('GETINFO status/bootstrap-phase'))
+
+    def test_timeout_si_no_completa(self):
+        falso = PuertoControlFalso(PORT + 1, [10, 20], retraso=0.05)
+        try:
+            inicio = time.monotonic()
+            self.assertIsNone(esperar_bootstrap(puerto=PORT + 1, timeout=0.5))
+            self.assertLess(time.monotonic() - inicio, 1.5)
+        finally:
+            falso.cerrar()
+
+    def test_espera_a_que_se_abra_el_puerto(self):
+        resultado = {}
+        hilo = threading.Thread(target=lambda: resultado.update(s=esperar_bootstrap(puerto=PORT + 2, timeout=5)))
+        hilo.start()
+        time.sleep(0.3)
+        falso = PuertoControlFalso(PORT + 2, [100], retraso=0.01)
+        try:
+            hilo.join(timeout=5)
+        finally:
+            falso.cerrar()
+        self.assertGreaterEqual(resultado['s'], 0.3)
+
+    def test_verificar_conectividad_sin_parchear_socket(self):
+        original = socket.socket
+        falso = PuertoControlFalso(PORT + 3, [], inicial=100)
+        try:
+            self.assertTrue(TorSetup(control_port=PORT + 3).verificar_conectividad_tor(timeout=2))
+        finally:
+            falso.cerrar()
+        self.assertIs(socket.socket, original)
+
+    def test_tor_del_sistema_sin_puerto_de_control(self):
+        servidor = socket.create_server(('127.0.0.1', PORT + 5))
+
+        def atender():
+            # Proxy SOCKS5 mínimo: acepta el saludo sin autenticación
+            try:
+                while True:
+                    conn, _ = servidor.accept()
+                    with conn:
+                        conn.recv(16)
+                        conn.sendall(b'\x05\x00')
+            except OSError:
+                pass
+
+        threading.Thread(target=atender, daemon=True).start()
+        try:
+            self.assertTrue(sondear_socks(puerto=PORT + 5, timeout=2))
+            self.assertTrue(TorSetup(control_port=PORT + 6, socks_port=PORT + 5).verificar_conectividad_tor(timeout=2))
+        finally:
+            servidor.close()
+        self.assertFalse(TorSetup(control_port=PORT + 6, socks_port=PORT + 7).verificar_conectividad_tor(timeout=2))
+
+    def test_respuesta_multilinea(self):
+        falso = PuertoControlFalso(PORT + 4, [])
+        try:
+            with ClienteControl(puerto=PORT + 4, timeout=2) as control:
+                control._buffer += b'250+config-text=\r\nSocksPort 9050\r\n..oculto\r\n.\r\n250 OK\r\n'
+                self.assertEqual(control._leer_respuesta(), ('250', ['config-text=SocksPort 9050\n.oculto', 'OK']))
+        finally:
+            falso.cerrar()
+
+
+class TestServicioHidden(unittest.TestCase):
+    def test_configurar_servicio_hidden_es_idempotente(self):
+        setup = TorSetup()
+        setup.directorio_tor = Path(tempfile.mkdtemp())
+        setup.config_tor = setup.directorio_tor / 'torrc'
+        hidden_dir = setup.directorio_tor / 'data' / 'hidden_service'
+        # torrc de versiones anteriores con el bloque añadido dos veces
+        setup.config_tor.write_text(f"SocksPort 9050\n\nHiddenServiceDir {hidden_dir}\nHiddenServicePort 8080 127.0.0.1:8080\n"
+                                    f"\nHiddenServiceDir {hidden_dir}\nHiddenServicePort 8080 127.0.0.1:8080\n")
+        for puerto in (8080, 8080, 9000, 8080):
+            self.assertTrue(setup.configurar_servicio_hidden(puerto))
+        torrc = setup.config_tor.read_text()
+        self.assertEqual(torrc.count('HiddenServiceDir'), 1)
+        self.assertEqual(torrc.count('HiddenServicePort 8080'), 1)
+        self.assertEqual(torrc.count('HiddenServicePort 9000'), 1)
+        self.assertTrue(torrc.startswith('SocksPort 9050\n'))
+        antes = setup.config_tor.stat().st_mtime_ns
+        setup.configurar_servicio_hidden(9000)
+        self.assertEqual(setup.config_tor.stat().st_mtime_ns, antes)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,17 @@
 import unittest
 import threading
 import time
+import os
+import json
+import socket
+import hashlib
+import tempfile
 from transport_p2p import send_data_p2p, receive_data_p2p
+from transport_p2p import P2PServer, P2PClient, PROTO_MAGIC, _enviar_mensaje, _recibir_mensaje
+from transport_p2p import enviar_multiples_peers, leer_lista_peers
+from spool import ReceptorSpool
+from canal_seguro import IdentidadCanal, ServidorCanal, ClienteCanal
+from cryptography.hazmat.primitives.asymmetric import rsa
 
 PORT = 5051
 DATA = b'Prueba automatica P2P'
@@ -44,5 +54,157 @@ class TestTransportP2P(unittest.TestCase):
         t.join(timeout=2)
         self.assertIsNotNone(self.exception)
 
+class TestTransferenciaReanudable(unittest.TestCase):
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.origen = os.path.join(self.tmp, 'origen.bin')
+        self.destino = os.path.join(self.tmp, 'destino.bin')
+        self.datos = os.urandom(3 * 1024 * 1024)
+        with open(self.origen, 'wb') as f:
+            f.write(self.datos)
+
+    def test_reanuda_tras_corte(self):
+        puerto = PORT + 3
+        server = P2PServer(puerto)
+        t = threading.Thread(target=server.start, args=(self.destino,), daemon=True)
+        t.start()
+        time.sleep(0.3)
+
+        # Primer intento que se corta a los 2 MB
+        cabecera = {'tipo': 'archivo', 'id': 'prueba', 'tamano': len(self.datos),
+                    'sha256': hashlib.sha256(self.datos).hexdigest()}
+        sock = socket.create_connection(('127.0.0.1', puerto))
+        sock.sendall(PROTO_MAGIC)
+        _enviar_mensaje(sock, cabecera)
+        self.assertEqual(_recibir_mensaje(sock)['offset'], 0)
+        sock.sendall(self.datos[:2 * 1024 * 1024])
+        sock.close()
+        time.sleep(0.5)
+        with open(self.destino + '.part.json') as f:
+            self.assertEqual(json.load(f)['offset'], 2 * 1024 * 1024)
+
+        ok = P2PClient().send_file(self.origen, '127.0.0.1', puerto, transfer_id='prueba')
+        t.join(timeout=5)
+        self.assertTrue(ok)
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.datos)
+        self.assertFalse(os.path.exists(self.destino + '.part'))
+
+    def test_reintento_con_backoff(self):
+        puerto = PORT + 4
+        # Nadie escucha todavía: el cliente debe reintentar hasta que el receptor arranque
+        server = P2PServer(puerto)
+        threading.Timer(0.5, server.start, args=(self.destino,)).start()
+        ok = P2PClient(timeout=5).send_file(self.origen, '127.0.0.1', puerto, retries=4, backoff=0.3)
+        self.assertTrue(ok)
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.datos)
+
+class TestCanalSeguroP2P(unittest.TestCase):
+    def test_envio_cifrado_y_reanudacion_de_sesion(self):
+        tmp = tempfile.mkdtemp()
+        origen = os.path.join(tmp, 'origen.bin')
+        datos = os.urandom(300 * 1024)
+        with open(origen, 'wb') as f:
+            f.write(datos)
+        id_servidor = IdentidadCanal(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        id_cliente = IdentidadCanal(rsa.generate_private_key(public_exponent=65537, key_size=2048))
+        servidor_canal = ServidorCanal(id_servidor, autorizados=[id_cliente.fingerprint])
+        aceptar = servidor_canal.aceptar
+        reanudados = []
+        servidor_canal.aceptar = lambda sock: reanudados.append(aceptar(sock)) or reanudados[-1]
+        cliente = P2PClient(canal=ClienteCanal(id_cliente, fingerprint_servidor=id_servidor.fingerprint))
+
+        puerto = PORT + 6
+        for i in range(2):
+            destino = os.path.join(tmp, f'destino_{i}.bin')
+            server = P2PServer(puerto, canal=servidor_canal)
+            t = threading.Thread(target=server.start, args=(destino,), daemon=True)
+            t.start()
+            time.sleep(0.3)
+            self.assertTrue(cliente.send_file(origen, '127.0.0.1', puerto))
+            t.join(timeout=5)
+            with open(destino, 'rb') as f:
+                self.assertEqual(f.read(), datos)
+        # La segunda conexión al mismo destino reutiliza el ticket de sesión
+        self.assertEqual([c.reanudado for c in reanudados], [False, True])
+
+class TestSesionP2P(unittest.TestCase):
+    def test_varios_archivos_una_conexion(self):
+        tmp = tempfile.mkdtemp()
+        origen = os.path.join(tmp, 'origen')
+        destino = os.path.join(tmp, 'destino')
+        os.makedirs(origen)
+        contenidos = {}
+        for i in range(40):
+            nombre = f'contenedor_{i:03d}.bin'
+            contenidos[nombre] = os.urandom(i * 997)
+            with open(os.path.join(origen, nombre), 'wb') as f:
+                f.write(contenidos[nombre])
+
+        puerto = PORT + 5
+        server = P2PServer(puerto)
+        t = threading.Thread(target=server.start, args=(destino,), daemon=True)
+        t.start()
+        time.sleep(0.3)
+        rutas = [os.path.join(origen, n) for n in sorted(contenidos)]
+        resultados = P2PClient().send_files(rutas, '127.0.0.1', puerto, ventana=8, lote=16)
+        t.join(timeout=5)
+        self.assertTrue(all(resultados.values()))
+        self.assertEqual(len(resultados), 40)
+        for nombre, datos in contenidos.items():
+            with open(os.path.join(destino, nombre), 'rb') as f:
+                self.assertEqual(f.read(), datos)
+
+    def test_lote_invalido_no_deja_reservas(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            spool = ReceptorSpool()
+            server = P2PServer(PORT + 6, spool=spool)
+            valido = {'nombre': 'a.bin', 'id': 'x' * 32, 'sha256': '0' * 64, 'tamano': 10 ** 6}
+            lotes = [[valido, dict(valido, nombre='..')],                      # Nombre inválido
+                     [valido, {'nombre': 'b.bin', 'sha256': '0' * 64, 'tamano': 10 ** 6}]]  # Sin id
+            for archivos in lotes:
+                a, b = socket.socketpair()
+                with a, b, self.assertRaises((ValueError, KeyError)):
+                    server._recibir_sesion(a, tmp, {'tipo': 'lote', 'archivos': archivos}, 'emisor')
+                self.assertEqual(spool.uso(), 0)
+                parcial = os.path.join(tmp, 'a.bin.part')
+                self.assertFalse(os.path.exists(parcial) and os.path.getsize(parcial))
+
+class TestEnvioMultiplesPeers(unittest.TestCase):
+    def test_fanout_a_varios_receptores(self):
+        tmp = tempfile.mkdtemp()
+        origen = os.path.join(tmp, 'bundle.bin')
+        datos = os.urandom(2 * 1024 * 1024 + 123)
+        with open(origen, 'wb') as f:
+            f.write(datos)
+        lista = os.path.join(tmp, 'hosts.txt')
+        puertos = [PORT + 10 + i for i in range(4)]
+        with open(lista, 'w') as f:
+            f.write('# receptores\n')
+            for p in puertos:
+                f.write(f'127.0.0.1:{p}\n')
+            f.write('127.0.0.1:1\n')  # Peer caído
+        hilos = []
+        for p in puertos:
+            t = threading.Thread(target=P2PServer(p).start, args=(os.path.join(tmp, f'rx_{p}.bin'),), daemon=True)
+            t.start()
+            hilos.append(t)
+        time.sleep(0.3)
+
+        peers = leer_lista_peers(lista)
+        self.assertEqual(len(peers), 5)
+        resultados = enviar_multiples_peers(origen, peers, concurrency=8, retries=2, backoff=0.1, timeout=5)
+        for t in hilos:
+            t.join(timeout=5)
+        por_puerto = {r['port']: r for r in resultados}
+        self.assertFalse(por_puerto[1]['ok'])
+        self.assertIsNotNone(por_puerto[1]['error'])
+        for p in puertos:
+            self.assertTrue(por_puerto[p]['ok'])
+            self.assertGreater(por_puerto[p]['mbps'], 0)
+            with open(os.path.join(tmp, f'rx_{p}.bin'), 'rb') as f:
+                self.assertEqual(f.read(), datos)
+
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,223 @@
+import unittest
+import os
+import json
+import zlib
+import random
+import tempfile
+from transport_qr import (preparar_fragmentos, calcular_fragmentos, generar_qr_multiple, comprimir_datos,
+                          desempaquetar_contenido, CABECERA_FRAGMENTO, QR_CONFIG, Reensamblador, decodificar_frames,
+                          reconstruir_archivo_multiple_qr, _candidatos_bytes, contenido_valido,
+                          preparar_simbolos, generar_qr_fuente, generar_qr_optimizado, renderizar_qr, _unir_frames,
+                          PYZBAR_AVAILABLE, CV2_AVAILABLE)
+
+
+def separar(contenido):
+    resultado = desempaquetar_contenido(contenido)
+    return resultado['metadata'], resultado['datos']
+
+
+def directorio_temporal(test):
+    """Directorio temporal que se borra al terminar el test"""
+    directorio = tempfile.TemporaryDirectory()
+    test.addCleanup(directorio.cleanup)
+    return directorio.name
+
+
+class TestFragmentacionQR(unittest.TestCase):
+    def test_fragmentos_cubren_todos_los_datos(self):
+        # Datos incompresibles justo por encima de lo que cabe en 3 fragmentos
+        datos = os.urandom(3 * 2940 + 100)
+        contenidos = preparar_fragmentos(datos)
+        self.assertEqual(len(contenidos), calcular_fragmentos(datos))
+        comprimidos = b''.join(separar(c)[1] for c in contenidos)
+        self.assertEqual(comprimidos, comprimir_datos(datos))
+        for i, contenido in enumerate(contenidos, 1):
+            metadata, _ = separar(contenido)
+            self.assertEqual((metadata['fragmento'], metadata['total']), (i, len(contenidos)))
+            self.assertEqual(metadata['id'], zlib.crc32(comprimidos) & 0xffffffff)
+            self.assertLessEqual(len(contenido), QR_CONFIG['max_data_bytes'])
+
+    def test_cabecera_binaria_compacta(self):
+        self.assertEqual(CABECERA_FRAGMENTO.size, 13)
+        # Casi 3 × 2940 bytes de datos caben en 3 QR (con metadatos JSON hacían falta 4)
+        datos = os.urandom(3 * 2940 - 50)
+        self.assertEqual(len(preparar_fragmentos(datos)), 3)
+
+    def test_datos_con_separador_y_fragmento_danado(self):
+        datos = b'|' * 10 + os.urandom(6000)
+        contenidos = preparar_fragmentos(datos, comprimidos=datos)
+        self.assertEqual(b''.join(separar(c)[1] for c in contenidos), datos)
+        danado = bytearray(contenidos[1])
+        danado[-1] ^= 1
+        with self.assertRaises(ValueError):
+            desempaquetar_contenido(bytes(danado))
+
+    def test_lee_fragmentos_json_antiguos(self):
+        metadata = {'fragmento': 2, 'total': 3, 'tamaño_original': 10, 'tamaño_comprimido': 9, 'checksum': 1234}
+        resultado = desempaquetar_contenido(json.dumps(metadata).encode() + b'|a|b')
+        self.assertEqual(resultado['tipo'], 'fragmento')
+        self.assertEqual((resultado['metadata']['fragmento'], resultado['metadata']['id']), (2, 1234))
+        self.assertEqual(resultado['datos'], b'a|b')
+        self.assertEqual(desempaquetar_contenido(comprimir_datos(b'x'))['tipo'], 'completo')
+
+    def test_un_solo_qr_si_cabe(self):
+        datos = b'TitanSend ' * 1000
+        self.assertEqual(preparar_fragmentos(datos), [comprimir_datos(datos)])
+
+    def test_generacion_en_paralelo(self):
+        ruta = os.path.join(directorio_temporal(self), 'qr.png')
+        archivos = generar_qr_multiple(os.urandom(2 * 2940 + 100), ruta, procesos=2)
+        self.assertEqual(len(archivos), 3)
+        self.assertTrue(archivos[0].endswith('qr_parte_01_de_03.png'))
+        for archivo in archivos:
+            self.assertGreater(os.path.getsize(archivo), 0)
+
+    def test_fragmento_suelto_con_contenidos_preparados(self):
+        datos = os.urandom(2 * 2940 + 100)
+        contenidos = preparar_fragmentos(datos)
+        ruta = generar_qr_optimizado(None, os.path.join(directorio_temporal(self), 'qr.png'), 2, 3, contenidos=contenidos)
+        self.assertTrue(ruta.endswith('qr_parte_02_de_03.png'))
+        with self.assertRaises(ValueError):
+            generar_qr_optimizado(None, ruta, 1, 2, contenidos=contenidos)
+
+
+def decodificador_volcado(ruta):
+    # Sustituye al lector de QR: cada "frame" contiene el contenido del QR en crudo
+    with open(ruta, 'rb') as f:
+        return [f.read()]
+
+
+class TestLecturaQR(unittest.TestCase):
+    def setUp(self):
+        self.datos = os.urandom(20000)
+        self.contenidos = preparar_fragmentos(self.datos)
+        self.directorio = directorio_temporal(self)
+
+    def volcar(self, contenidos):
+        for i, contenido in enumerate(contenidos):
+            with open(os.path.join(self.directorio, f'frame_{i:04d}.png'), 'wb') as f:
+                f.write(contenido)
+
+    def test_reensamblado_incremental_y_duplicados(self):
+        reensamblador = Reensamblador()
+        otro_envio = preparar_fragmentos(os.urandom(20000))
+        orden = self.contenidos[1:] + self.contenidos + otro_envio
+        random.shuffle(orden)
+        # El reensamblador sigue al primer envío que ve
+        orden.insert(0, self.contenidos[0])
+        nuevos = sum(reensamblador.agregar(c) for c in orden if not reensamblador.completo)
+        self.assertEqual(nuevos, len(self.contenidos))
+        self.assertEqual(reensamblador.faltantes(), set())
+        self.assertEqual(reensamblador.resultado(), self.datos)
+
+    def test_directorio_de_frames_en_paralelo(self):
+        # Volcado de vídeo: cada QR aparece en varios frames seguidos
+        self.volcar([c for c in self.contenidos for _ in range(3)] + [b'ruido'] * 5)
+        for procesos in (1, 2):
+            reensamblador, estadisticas = decodificar_frames(self.directorio, procesos=procesos,
+                                                             decodificador=decodificador_volcado)
+            self.assertEqual(reensamblador.resultado(), self.datos)
+            self.assertEqual(estadisticas['fragmentos'], len(self.contenidos))
+            self.assertGreater(estadisticas['fragmentos_por_segundo'], 0)
+            # Se detiene al completar el envío, sin leer el ruido del final
+            self.assertLessEqual(estadisticas['frames'], len(self.contenidos) * 3 - 2 + procesos * 2)
+
+    def test_faltan_fragmentos(self):
+        self.volcar(self.contenidos[1:])
+        reensamblador, _ = decodificar_frames(self.directorio, procesos=1, decodificador=decodificador_volcado)
+        self.assertFalse(reensamblador.completo)
+        self.assertEqual(reensamblador.faltantes(), {1})
+
+    def test_deshace_la_conversion_a_texto_del_lector(self):
+        for contenido in self.contenidos + [comprimir_datos(b'x' * 100)]:
+            # zbar entrega los bytes de modo binario reinterpretados como ISO-8859-1 y en UTF-8
+            como_texto = contenido.decode('latin-1').encode('utf-8')
+            validos = [c for c in _candidatos_bytes(como_texto) if contenido_valido(c)]
+            self.assertEqual(validos[0], contenido)
+
+    @unittest.skipUnless(PYZBAR_AVAILABLE or CV2_AVAILABLE, "Sin decodificador QR (pyzbar/zbar u OpenCV)")
+    def test_generar_y_reconstruir(self):
+        datos = os.urandom(6500)
+        generar_qr_multiple(datos, os.path.join(self.directorio, 'qr.png'), procesos=1)
+        salida = os.path.join(directorio_temporal(self), 'salida.bin')
+        self.assertTrue(reconstruir_archivo_multiple_qr([self.directorio], salida, procesos=1))
+        with open(salida, 'rb') as f:
+            self.assertEqual(f.read(), datos)
+
+    @unittest.skipUnless(PYZBAR_AVAILABLE or CV2_AVAILABLE, "Sin decodificador QR (pyzbar/zbar u OpenCV)")
+    def test_generar_y_reconstruir_con_perfil(self):
+        datos = os.urandom(3000)
+        generar_qr_multiple(datos, os.path.join(self.directorio, 'qr.png'), procesos=1, perfil='webcam')
+        salida = os.path.join(directorio_temporal(self), 'salida.bin')
+        self.assertTrue(reconstruir_archivo_multiple_qr([self.directorio], salida, procesos=1))
+        with open(salida, 'rb') as f:
+            self.assertEqual(f.read(), datos)
+
+
+class TestParidadQR(unittest.TestCase):
+    def test_se_pueden_perder_m_fragmentos(self):
+        datos = os.urandom(20000)
+        contenidos = preparar_fragmentos(datos, paridad=2)
+        self.assertTrue(all(len(c) <= QR_CONFIG['max_data_bytes'] for c in contenidos))
+        self.assertEqual(len(contenidos), len(preparar_fragmentos(datos)) + 2)
+        reensamblador = Reensamblador()
+        for contenido in contenidos[1:3] + contenidos[4:] + contenidos[4:]:
+            reensamblador.agregar(contenido)
+        self.assertTrue(reensamblador.completo)
+        self.assertEqual(reensamblador.duplicados, len(contenidos) - 4)
+        self.assertEqual(reensamblador.resultado(), datos)
+
+
+class TestModoFuente(unittest.TestCase):
+    def test_reconstruye_con_frames_perdidos(self):
+        datos = os.urandom(300000)
+        simbolos = preparar_simbolos(datos)
+        self.assertTrue(all(len(s) <= QR_CONFIG['max_data_bytes'] for s in simbolos))
+        random.Random(1).shuffle(simbolos)
+        reensamblador = Reensamblador()
+        # Un tercio de los frames se pierde y el resto llega repetido
+        for simbolo in simbolos[:len(simbolos) * 2 // 3] * 2:
+            reensamblador.agregar(simbolo)
+        self.assertTrue(reensamblador.completo)
+        self.assertIsNone(reensamblador.faltantes())
+        self.assertEqual(reensamblador.resultado(), datos)
+
+    def test_volcado_de_frames(self):
+        directorio = directorio_temporal(self)
+        datos = os.urandom(30000)
+        for i, simbolo in enumerate(preparar_simbolos(datos)):
+            if i % 3:  # Se pierde uno de cada tres frames
+                with open(os.path.join(directorio, f'frame_{i:04d}.png'), 'wb') as f:
+                    f.write(simbolo)
+        reensamblador, estadisticas = decodificar_frames(directorio, procesos=1, decodificador=decodificador_volcado)
+        self.assertEqual(reensamblador.resultado(), datos)
+        self.assertEqual(estadisticas['fragmentos'], reensamblador.lt.recibidos)
+
+    @unittest.skipUnless(PYZBAR_AVAILABLE or CV2_AVAILABLE, "Sin decodificador QR (pyzbar/zbar u OpenCV)")
+    def test_gif_animado(self):
+        directorio = directorio_temporal(self)
+        datos = os.urandom(6000)
+        gif = os.path.join(directorio, 'envio.gif')
+        self.assertEqual(generar_qr_fuente(datos, gif, procesos=1), [gif])
+        salida = os.path.join(directorio, 'salida.bin')
+        self.assertTrue(reconstruir_archivo_multiple_qr(gif, salida, procesos=1))
+        with open(salida, 'rb') as f:
+            self.assertEqual(f.read(), datos)
+
+    @unittest.skipUnless(CV2_AVAILABLE, "Sin OpenCV")
+    def test_video_escalado_segun_version(self):
+        import cv2
+        directorio = directorio_temporal(self)
+        config = dict(QR_CONFIG, version=5, max_data_bytes=100)
+        frames = [renderizar_qr(bytes([i]) * 50, os.path.join(directorio, f'f{i}.png'), config) for i in range(2)]
+        video = os.path.join(directorio, 'envio.avi')
+        _unir_frames(frames, video, 250, config)
+        captura = cv2.VideoCapture(video)
+        ancho = captura.get(cv2.CAP_PROP_FRAME_WIDTH)
+        captura.release()
+        # v5: 37 módulos + borde; 2 px por módulo ampliados hasta MODULOS_MIN_OPENCV
+        self.assertEqual(ancho, (37 + 2 * QR_CONFIG['border']) * QR_CONFIG['box_size'] * 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,8 +1,10 @@
 import unittest
+import os
 import threading
 import time
 from flask import Flask, request
-from transport_tor import send_data_tor, receive_data_tor
+from transport_tor import (send_data_tor, receive_data_tor, subir_archivo_tor, _huecos, ClienteTor,
+                           enviar_archivo_tor, recibir_archivo_tor, descargar_archivo_tor)
 
 PORT = 5050
 URL_POST = f'http://127.0.0.1:{PORT}/upload'
@@ -40,5 +42,279 @@ class TestTransportTor(unittest.TestCase):
         recibido = receive_data_tor(URL_GET)
         self.assertEqual(data, recibido)
 
+class TestSubidaPorPartes(unittest.TestCase):
+    """Subidas por partes y en streaming contra el servidor TitanSend real (sin Tor: proxy=None)."""
+
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        from werkzeug.serving import make_server
+        import servidor_flask_tor as srv
+        cls.srv = srv
+        cls.tmp = tempfile.mkdtemp()
+        srv.MULTIARCHIVO = False
+        srv.TOKEN = None
+        srv.ARCHIVO = os.path.join(cls.tmp, 'recibido.bin')
+        srv.subidas = srv.GestorSubidas(os.path.join(cls.tmp, '.subidas'), spool=srv.spool)
+        cls.server = make_server('127.0.0.1', PORT + 1, srv.app, threaded=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{PORT + 1}'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def setUp(self):
+        self.origen = os.path.join(self.tmp, 'origen.bin')
+        self.datos = os.urandom(300 * 1024 + 7)
+        with open(self.origen, 'wb') as f:
+            f.write(self.datos)
+
+    def tearDown(self):
+        for ruta in (self.srv.ARCHIVO, self.origen + '.subida.json', self.origen + '.copia'):
+            if os.path.exists(ruta):
+                os.remove(ruta)
+
+    def test_subida_en_paralelo(self):
+        r = subir_archivo_tor(self.url, self.origen, tamano_trozo=64 * 1024, paralelos=4, proxy=None)
+        self.assertIsNotNone(r)
+        with open(self.srv.ARCHIVO, 'rb') as f:
+            self.assertEqual(f.read(), self.datos)
+        self.assertFalse(os.path.exists(self.origen + '.subida.json'))
+
+    def test_reanuda_solo_lo_que_falta(self):
+        import json
+        import requests
+        # Subida interrumpida: solo llegaron los bytes 100000-200000
+        r = requests.post(f'{self.url}/uploads', headers={'Upload-Length': str(len(self.datos))})
+        url_subida = f"{self.url}{r.headers['Location']}"
+        requests.patch(url_subida, data=self.datos[100000:200000], headers={'Upload-Offset': '100000'})
+        with open(self.origen + '.subida.json', 'w') as f:
+            json.dump({'url': url_subida, 'tamano': len(self.datos), 'mtime': os.path.getmtime(self.origen)}, f)
+        self.assertEqual(requests.head(url_subida).headers['Upload-Ranges'], '100000-200000')
+        r = subir_archivo_tor(self.url, self.origen, tamano_trozo=64 * 1024, proxy=None)
+        self.assertIsNotNone(r)
+        with open(self.srv.ARCHIVO, 'rb') as f:
+            self.assertEqual(f.read(), self.datos)
+
+    def test_envio_y_descarga_en_streaming(self):
+        import io
+        import hashlib
+        esperado = hashlib.sha256(self.datos).hexdigest()
+        avances = []
+        with ClienteTor(proxy=None) as cliente:
+            r = enviar_archivo_tor(f'{self.url}/upload', self.origen, cliente=cliente,
+                                   progreso=lambda n, total: avances.append((n, total)))
+            self.assertEqual((r['bytes'], r['sha256']), (len(self.datos), esperado))
+            self.assertEqual(avances[-1], (len(self.datos), len(self.datos)))
+            copia = self.origen + '.copia'
+            r = recibir_archivo_tor(f'{self.url}/download', copia, cliente=cliente, sha256=esperado)
+            self.assertEqual((r['bytes'], r['sha256']), (len(self.datos), esperado))
+            with open(copia, 'rb') as f:
+                self.assertEqual(f.read(), self.datos)
+            self.assertFalse(os.path.exists(copia + '.part'))
+            # A un archivo abierto, y con suma incorrecta no se deja nada a medias
+            buffer = io.BytesIO()
+            self.assertEqual(recibir_archivo_tor(f'{self.url}/download', buffer, cliente=cliente)['sha256'], esperado)
+            self.assertEqual(buffer.getvalue(), self.datos)
+            os.remove(copia)
+            self.assertIsNone(recibir_archivo_tor(f'{self.url}/download', copia, cliente=cliente, sha256='0' * 64))
+            self.assertFalse(os.path.exists(copia) or os.path.exists(copia + '.part'))
+
+    def test_huecos(self):
+        self.assertEqual(_huecos([(0, 10), (20, 25)], 40, 8), [(10, 18), (18, 20), (25, 33), (33, 40)])
+
+class ProxySocks5:
+    """SOCKS5 mínimo (CONNECT, sin auth o usuario/contraseña) que registra el usuario de cada conexión."""
+
+    def __init__(self, puerto):
+        import socketserver
+        usuarios = self.usuarios = []
+
+        class Manejador(socketserver.BaseRequestHandler):
+            def leer(self, n):
+                datos = b''
+                while len(datos) < n:
+                    trozo = self.request.recv(n - len(datos))
+                    if not trozo:
+                        raise ConnectionError
+                    datos += trozo
+                return datos
+
+            def handle(self):
+                import socket
+                _, n = self.leer(2)
+                if 2 in self.leer(n):
+                    self.request.sendall(b'\x05\x02')
+                    _, n = self.leer(2)
+                    usuario = self.leer(n).decode()
+                    self.leer(self.leer(1)[0])
+                    self.request.sendall(b'\x01\x00')
+                else:
+                    self.request.sendall(b'\x05\x00')
+                    usuario = None
+                _, _, _, tipo = self.leer(4)
+                if tipo == 3:
+                    host = self.leer(self.leer(1)[0]).decode()
+                else:
+                    host = socket.inet_ntop(socket.AF_INET if tipo == 1 else socket.AF_INET6,
+                                            self.leer(4 if tipo == 1 else 16))
+                destino = socket.create_connection((host, int.from_bytes(self.leer(2), 'big')))
+                usuarios.append(usuario)
+                self.request.sendall(b'\x05\x00\x00\x01' + bytes(6))
+
+                def copiar(origen, hacia):
+                    try:
+                        for trozo in iter(lambda: origen.recv(65536), b''):
+                            hacia.sendall(trozo)
+                        hacia.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        pass
+
+                hilo = threading.Thread(target=copiar, args=(destino, self.request), daemon=True)
+                hilo.start()
+                copiar(self.request, destino)
+                hilo.join()
+                destino.close()
+
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.servidor = socketserver.ThreadingTCPServer(('127.0.0.1', puerto), Manejador)
+        self.servidor.daemon_threads = True
+        threading.Thread(target=self.servidor.serve_forever, daemon=True).start()
+
+    def cerrar(self):
+        self.servidor.shutdown()
+        self.servidor.server_close()
+
+class TestAislamientoCircuitos(unittest.TestCase):
+    """Credenciales SOCKS por conexión y descarga repartida en varios circuitos, contra un SOCKS5 local."""
+
+    @classmethod
+    def setUpClass(cls):
+        import tempfile
+        from werkzeug.serving import make_server
+        import servidor_flask_tor as srv
+        cls.srv = srv
+        cls.tmp = tempfile.mkdtemp()
+        srv.MULTIARCHIVO = False
+        srv.TOKEN = None
+        srv.ARCHIVO = os.path.join(cls.tmp, 'publicado.bin')
+        cls.server = make_server('127.0.0.1', PORT + 3, srv.app, threaded=True)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.socks = ProxySocks5(PORT + 4)
+        cls.proxy = f'socks5h://127.0.0.1:{PORT + 4}'
+        cls.url = f'http://127.0.0.1:{PORT + 3}/download'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.socks.cerrar()
+
+    def setUp(self):
+        self.datos = os.urandom(300 * 1024 + 11)
+        with open(self.srv.ARCHIVO, 'wb') as f:
+            f.write(self.datos)
+        self.destino = os.path.join(self.tmp, 'descargado.bin')
+        del self.socks.usuarios[:]
+
+    def test_descarga_por_rangos_en_varios_circuitos(self):
+        import hashlib
+        r = descargar_archivo_tor(self.url, self.destino, circuitos=3, tamano_trozo=64 * 1024, proxy=self.proxy,
+                                  sha256=hashlib.sha256(self.datos).hexdigest())
+        self.assertIsNotNone(r)
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.datos)
+        # Sondeo + un circuito por hilo, cada uno con sus propias credenciales
+        self.assertGreater(r['circuitos'], 1)
+        self.assertEqual(len(set(self.socks.usuarios)), r['circuitos'] + 1)
+        self.assertTrue(all(u.startswith('titansend-') for u in self.socks.usuarios))
+
+    def test_descarga_de_un_solo_uso_no_se_reparte(self):
+        os.environ['TSEND_UNICO'] = '1'
+        try:
+            r = descargar_archivo_tor(self.url, self.destino, circuitos=3, tamano_trozo=64 * 1024, proxy=self.proxy)
+        finally:
+            del os.environ['TSEND_UNICO']
+        self.assertEqual(r['circuitos'], 1)
+        with open(self.destino, 'rb') as f:
+            self.assertEqual(f.read(), self.datos)
+        self.srv.cola_borrado.esperar(5)
+
+    def test_p2p_un_circuito_por_conexion(self):
+        from transport_p2p import P2PServer, P2PClient
+        for i in range(2):
+            destino = os.path.join(self.tmp, f'p2p_{i}.bin')
+            hilo = threading.Thread(target=P2PServer(PORT + 5 + i).start, args=(destino,), daemon=True)
+            hilo.start()
+            time.sleep(0.3)
+            cliente = P2PClient(use_tor=True, timeout=5, proxy=('127.0.0.1', PORT + 4))
+            self.assertTrue(cliente.send_file(self.srv.ARCHIVO, '127.0.0.1', PORT + 5 + i, retries=1))
+            hilo.join(timeout=5)
+            with open(destino, 'rb') as f:
+                self.assertEqual(f.read(), self.datos)
+        self.assertEqual(len(set(self.socks.usuarios)), 2)
+
+class TestClienteTor(unittest.TestCase):
+    """Reutilización de conexiones del cliente (sin Tor: proxy=None)."""
+
+    @classmethod
+    def setUpClass(cls):
+        from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+        class Manejador(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # keep-alive
+
+            def responder(self, recibidos):
+                cuerpo = f"{self.client_address[1]}:{recibidos}".encode()
+                self.send_response(200)
+                self.send_header('Content-Length', str(len(cuerpo)))
+                self.end_headers()
+                self.wfile.write(cuerpo)
+
+            def do_GET(self):
+                self.responder(0)
+
+            def do_POST(self):
+                recibidos = 0
+                if self.headers.get('Transfer-Encoding') == 'chunked':
+                    while True:
+                        n = int(self.rfile.readline().strip(), 16)
+                        recibidos += len(self.rfile.read(n + 2)) - 2
+                        if not n:
+                            break
+                else:
+                    recibidos = len(self.rfile.read(int(self.headers.get('Content-Length', 0))))
+                self.responder(recibidos)
+
+            def log_message(self, *args):
+                pass
+
+        cls.server = ThreadingHTTPServer(('127.0.0.1', PORT + 2), Manejador)
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.url = f'http://127.0.0.1:{PORT + 2}/puerto'
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+
+    def test_conexion_reutilizada_y_cuerpo_en_streaming(self):
+        with ClienteTor(proxy=None) as cliente:
+            puertos = {receive_data_tor(self.url, cliente=cliente).split(b':')[0] for _ in range(5)}
+            self.assertEqual(len(puertos), 1)
+            # Un generador se envía en streaming (chunked) sin reunirlo en memoria
+            resp = send_data_tor(self.url, (b'x' * 1000 for _ in range(10)), cliente=cliente)
+            self.assertTrue(resp.endswith(b':10000'))
+            contenido, info = receive_data_tor(self.url, cliente=cliente, return_response_info=True)
+            self.assertEqual(info['status_code'], 200)
+
+    def test_archivo_de_tamano_desconocido_va_en_chunked(self):
+        lectura, escritura = os.pipe()
+        with os.fdopen(escritura, 'wb') as f:
+            f.write(b'y' * 5000)
+        with os.fdopen(lectura, 'rb') as f, ClienteTor(proxy=None) as cliente:
+            r = enviar_archivo_tor(self.url, f, cliente=cliente, bloque=1024)
+        self.assertTrue(r['contenido'].endswith(b':5000'))
+        self.assertEqual(r['bytes'], 5000)
+
 if __name__ == '__main__':
-    unittest.main() 
\ No newline at end of file
+    unittest.main()
@@ -0,0 +1,234 @@
+"""
+Conexión persistente al puerto de control de Tor
+=================================================
+
+Un único Controller de stem por proceso, conectado y autenticado una vez y
+compartido por todas las operaciones de control (dirección onion, servicios
+onion, verificación). Si la conexión se cae, la siguiente operación
+reconecta y se reintenta una vez. Tras un fork se abre una conexión nueva.
+
+GestorServiciosOnion crea, reutiliza y elimina servicios onion efímeros
+(ADD_ONION) por puerto local sobre esa misma conexión. Las claves se guardan
+en un JSON con permisos 0600, de modo que tras reiniciar Tor o el programa
+cada puerto recupera su misma dirección .onion.
+"""
+
+import os
+import json
+import threading
+from typing import Callable, Dict, Optional
+
+try:
+    import stem
+    from stem.control import Controller
+    STEM_AVAILABLE = True
+    _ERRORES_CONEXION = (stem.SocketError, OSError)
+except ImportError:
+    STEM_AVAILABLE = False
+    _ERRORES_CONEXION = (OSError,)
+
+CONTROL_PORT = 9051
+ARCHIVO_CLAVES = os.environ.get('TSEND_ONION_CLAVES',
+                                os.path.join(os.path.expanduser('~'), '.titansend', 'onion_servicios.json'))
+
+
+class GestorControlador:
+    """
+    Mantiene abierta la conexión de control. `fabrica` (opcional) crea y
+    devuelve un controlador ya autenticado; por defecto se usa
+    Controller.from_port + authenticate de stem.
+    Las operaciones no se serializan: stem ya protege cada petición.
+    """
+
+    def __init__(self, puerto: int = CONTROL_PORT, host: str = '127.0.0.1', password: Optional[str] = None,
+                 fabrica: Optional[Callable[[], object]] = None):
+        self.puerto = puerto
+        self.host = host
+        self.password = password
+        self._fabrica = fabrica or self._conectar_stem
+        self._controlador = None
+        self._pid = None
+        self._lock = threading.Lock()
+        self.conexiones = 0  # Conexiones abiertas en total (reconexiones incluidas)
+
+    def _conectar_stem(self):
+        if not STEM_AVAILABLE:
+            raise RuntimeError("Tor no está disponible. Instala: pip install stem")
+        controlador = Controller.from_port(address=self.host, port=self.puerto)
+        try:
+            controlador.authenticate(password=self.password)
+        except Exception:
+            controlador.close()
+            raise
+        return controlador
+
+    def controlador(self):
+        """Devuelve el controlador abierto, conectando si hace falta."""
+        with self._lock:
+            if (self._controlador is None or self._pid != os.getpid()
+                    or not self._controlador.is_alive()):
+                self._descartar()
+                self._controlador = self._fabrica()
+                self._pid = os.getpid()
+                self.conexiones += 1
+            return self._controlador
+
+    def _descartar(self):
+        # El controlador heredado de otro proceso no se cierra: el socket es del padre
+        if self._controlador is not None and self._pid == os.getpid():
+            try:
+                self._controlador.close()
+            except Exception:
+                pass
+        self._controlador = None
+
+    def ejecutar(self, operacion: Callable):
+        """
+        Ejecuta operacion(controlador). Ante un error de conexión, descarta la
+        conexión, reconecta y reintenta una vez.
+        """
+        controlador = self.controlador()
+        try:
+            return operacion(controlador)
+        except _ERRORES_CONEXION:
+            with self._lock:
+                if self._controlador is controlador:
+                    self._descartar()
+            return operacion(self.controlador())
+
+    def cerrar(self):
+        with self._lock:
+            self._descartar()
+
+
+_gestor = None
+_gestor_lock = threading.Lock()
+
+
+def gestor_por_defecto() -> GestorControlador:
+    """Gestor compartido por todo el proceso (puerto de control 9051)."""
+    global _gestor
+    with _gestor_lock:
+        if _gestor is None:
+            _gestor = GestorControlador()
+        return _gestor
+
+
+class GestorServiciosOnion:
+    """
+    Servicios onion efímeros indexados por puerto local, todos sobre un único
+    proceso Tor. servicio(puerto) devuelve la dirección del servicio de ese
+    puerto: lo reutiliza si sigue publicado, lo recrea con su clave guardada
+    si Tor se reinició, o lo crea con una clave nueva que se persiste.
+    """
+
+    def __init__(self, gestor: Optional[GestorControlador] = None, archivo_claves: str = ARCHIVO_CLAVES):
+        self.gestor = gestor or gestor_por_defecto()
+        self.archivo_claves = archivo_claves
+        self._lock = threading.Lock()
+        self._servicios = self._cargar()  # puerto (str) -> {service_id, key_type, key_content, puerto_virtual}
+
+    def _cargar(self) -> Dict[str, dict]:
+        try:
+            with open(self.archivo_claves, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except ValueError:
+            print(f"⚠️  Archivo de claves onion ilegible: {self.archivo_claves}. Se generarán claves nuevas.")
+            return {}
+
+    def _guardar(self):
+        directorio = os.path.dirname(os.path.abspath(self.archivo_claves))
+        os.makedirs(directorio, mode=0o700, exist_ok=True)
+        temporal = self.archivo_claves + '.tmp'
+        fd = os.open(temporal, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(self._servicios, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporal, self.archivo_claves)
+
+    def _publicados(self, controlador) -> set:
+        return set(controlador.list_ephemeral_hidden_services(default=[], our_services=True, detached=True))
+
+    def servicio(self, puerto: int, puerto_virtual: Optional[int] = None, esperar_publicacion: bool = False) -> str:
+        """Dirección .onion (sin el sufijo) del servicio que expone `puerto` local."""
+        puerto_virtual = puerto_virtual or puerto
+        with self._lock:
+            guardado = self._servicios.get(str(puerto))
+            if guardado and guardado.get('puerto_virtual') != puerto_virtual:
+                self._eliminar(str(puerto), olvidar_clave=False)
+
+            def publicar(controlador):
+                if guardado and guardado['service_id'] in self._publicados(controlador):
+                    return None
+                if guardado:
+                    clave = {'key_type': guardado['key_type'], 'key_content': guardado['key_content']}
+                else:
+                    clave = {'key_type': 'NEW', 'key_content': 'ED25519-V3'}
+                # detached: el servicio sigue publicado aunque se reconecte el puerto de control
+                return controlador.create_ephemeral_hidden_service(
+                    {puerto_virtual: puerto}, detached=True, await_publication=esperar_publicacion, **clave)
+
+            respuesta = self.gestor.ejecutar(publicar)
+            if respuesta is None:
+                return guardado['service_id']
+            if guardado:
+                guardado['puerto_virtual'] = puerto_virtual
+                self._guardar()
+                print(f"🔁 Servicio onion del puerto {puerto} restaurado: {respuesta.service_id}.onion")
+            else:
+                self._servicios[str(puerto)] = {
+                    'service_id': respuesta.service_id,
+                    'key_type': respuesta.private_key_type,
+                    'key_content': respuesta.private_key,
+                    'puerto_virtual': puerto_virtual,
+                }
+                self._guardar()
+                print(f"🌐 Servicio onion creado para el puerto {puerto}: {respuesta.service_id}.onion")
+            return respuesta.service_id
+
+    def _eliminar(self, clave: str, olvidar_clave: bool) -> bool:
+        guardado = self._servicios.get(clave)
+        if not guardado:
+            return False
+        try:
+            self.gestor.ejecutar(lambda c: c.remove_ephemeral_hidden_service(guardado['service_id']))
+        except Exception as e:
+            print(f"⚠️  No se pudo retirar {guardado['service_id']}.onion: {e}")
+        if olvidar_clave:
+            del self._servicios[clave]
+            self._guardar()
+        return True
+
+    def eliminar(self, puerto: int, olvidar_clave: bool = False) -> bool:
+        """
+        Retira el servicio del puerto. Con olvidar_clave=True se borra también
+        su clave y la dirección no se podrá recuperar.
+        """
+        with self._lock:
+            return self._eliminar(str(puerto), olvidar_clave)
+
+    def eliminar_todos(self, olvidar_claves: bool = False):
+        with self._lock:
+            for clave in list(self._servicios):
+                self._eliminar(clave, olvidar_claves)
+
+    def servicios(self) -> Dict[int, str]:
+        """Puerto local -> dirección .onion de los servicios conocidos."""
+        with self._lock:
+            return {int(p): f"{s['service_id']}.onion" for p, s in self._servicios.items()}
+
+
+_servicios_onion = None
+
+
+def servicios_por_defecto() -> GestorServiciosOnion:
+    """Gestor de servicios onion compartido por todo el proceso."""
+    global _servicios_onion
+    gestor = gestor_por_defecto()
+    with _gestor_lock:
+        if _servicios_onion is None:
+            _servicios_onion = GestorServiciosOnion(gestor)
+        return _servicios_onion
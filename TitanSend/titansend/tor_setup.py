@@ -6,26 +6,219 @@ Scripts para automatizar la descarga, configuración y arranque del cliente Tor.
 """
 
 import os
+import re
 import sys
+import time
+import socket
 import subprocess
 import platform
 import urllib.request
 import zipfile
 import tarfile
-import json
+from collections import deque
 from pathlib import Path
-from typing import Optional, Dict, List
+from typing import Callable, Optional, Dict, List
+
+SOCKS_PORT = 9050
+CONTROL_PORT = 9051
+TIMEOUT_ARRANQUE = 120  # Segundos máximos esperando a que Tor complete el bootstrap
+
+
+class ErrorControlTor(Exception):
+    """Respuesta de error o cierre inesperado del puerto de control de Tor."""
+
+
+class ClienteControl:
+    """
+    Cliente mínimo del protocolo de control de Tor (sin stem) sobre un socket
+    propio con timeout: autenticación, comandos y eventos asíncronos (650).
+    No toca el socket global del proceso.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', puerto: int = CONTROL_PORT, timeout: float = 10):
+        self.sock = socket.create_connection((host, puerto), timeout)
+        self.timeout = timeout
+        self._buffer = bytearray()
+        self.eventos = deque()
+
+    def cerrar(self):
+        try:
+            self.sock.close()
+        except OSError:
+            pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+    def _leer_linea(self) -> str:
+        # Buffer propio en lugar de makefile(): tras un timeout el buffer sigue siendo válido
+        while b'\r\n' not in self._buffer:
+            datos = self.sock.recv(4096)
+            if not datos:
+                raise ErrorControlTor("El puerto de control cerró la conexión")
+            self._buffer += datos
+        linea, _, resto = bytes(self._buffer).partition(b'\r\n')
+        self._buffer = bytearray(resto)
+        return linea.decode('utf-8', 'replace')
+
+    def _leer_respuesta(self):
+        """Lee una respuesta completa y devuelve (código, líneas); 'NNN+' trae datos hasta '.'."""
+        lineas = []
+        while True:
+            linea = self._leer_linea()
+            codigo, separador, resto = linea[:3], linea[3:4], linea[4:]
+            if separador == '+':
+                datos = []
+                while True:
+                    dato = self._leer_linea()
+                    if dato == '.':
+                        break
+                    datos.append(dato[1:] if dato.startswith('..') else dato)
+                resto += '\n'.join(datos)
+            lineas.append(resto)
+            if separador == ' ':
+                return codigo, lineas
+
+    def comando(self, linea: str) -> List[str]:
+        """Envía un comando y devuelve las líneas de la respuesta (los eventos que lleguen se encolan)."""
+        self.sock.settimeout(self.timeout)
+        self.sock.sendall(linea.encode() + b'\r\n')
+        while True:
+            codigo, lineas = self._leer_respuesta()
+            if codigo != '650':
+                break
+            self.eventos.append(lineas[0])
+        if not codigo.startswith('2'):
+            raise ErrorControlTor(f"{linea.split()[0]}: {codigo} {' '.join(lineas)}")
+        return lineas
+
+    def autenticar(self, password: Optional[str] = None):
+        """Autentica con el primer método que ofrezca Tor: NULL, contraseña o cookie."""
+        info = ' '.join(self.comando('PROTOCOLINFO 1'))
+        metodos = re.search(r'METHODS=(\S+)', info)
+        metodos = metodos.group(1).split(',') if metodos else []
+        if 'NULL' in metodos:
+            self.comando('AUTHENTICATE')
+        elif password is not None and 'HASHEDPASSWORD' in metodos:
+            escapada = password.replace('\\', '\\\\').replace('"', '\\"')
+            self.comando(f'AUTHENTICATE "{escapada}"')
+        elif 'COOKIE' in metodos and 'COOKIEFILE=' in info:
+            ruta = re.search(r'COOKIEFILE="((?:[^"\\]|\\.)*)"', info).group(1)
+            with open(re.sub(r'\\(.)', r'\1', ruta), 'rb') as f:
+                self.comando(f'AUTHENTICATE {f.read().hex()}')
+        else:
+            raise ErrorControlTor(f"Ningún método de autenticación utilizable: {metodos}")
+
+    def getinfo(self, clave: str) -> str:
+        for linea in self.comando(f'GETINFO {clave}'):
+            if linea.startswith(clave + '='):
+                return linea[len(clave) + 1:]
+        raise ErrorControlTor(f"GETINFO {clave}: respuesta sin valor")
+
+    def siguiente_evento(self, timeout: float) -> str:
+        """Espera el siguiente evento asíncrono. Lanza socket.timeout si no llega a tiempo."""
+        if self.eventos:
+            return self.eventos.popleft()
+        self.sock.settimeout(max(timeout, 0.001))
+        while True:
+            codigo, lineas = self._leer_respuesta()
+            if codigo == '650':
+                return lineas[0]
+
+
+def _progreso_bootstrap(texto: str) -> Optional[int]:
+    """PROGRESS=N de un estado o evento BOOTSTRAP, o None si no lo es."""
+    coincidencia = re.search(r'BOOTSTRAP\b.*?\bPROGRESS=(\d+)', texto)
+    return int(coincidencia.group(1)) if coincidencia else None
+
+
+def esperar_bootstrap(host: str = '127.0.0.1', puerto: int = CONTROL_PORT, timeout: float = TIMEOUT_ARRANQUE,
+                      password: Optional[str] = None, proceso: Optional[subprocess.Popen] = None,
+                      al_progresar: Optional[Callable[[int, str], None]] = None) -> Optional[float]:
+    """
+    Espera a que Tor complete el bootstrap escuchando los eventos
+    STATUS_CLIENT del puerto de control, y termina en cuanto informa del 100%.
+    Si se pasa `proceso` y Tor termina antes, se deja de esperar.
+    Devuelve los segundos que tardó o None si no llegó al 100% a tiempo.
+    """
+    inicio = time.monotonic()
+    limite = inicio + timeout
+    cliente = None
+    try:
+        # El puerto de control se abre poco después de lanzar tor
+        while cliente is None:
+            try:
+                cliente = ClienteControl(host, puerto, timeout=max(0.1, min(10, limite - time.monotonic())))
+            except OSError:
+                if proceso is not None and proceso.poll() is not None:
+                    print(f"❌ Tor terminó durante el arranque (código {proceso.returncode})")
+                    return None
+                if time.monotonic() >= limite:
+                    print(f"❌ El puerto de control {host}:{puerto} no respondió en {timeout}s")
+                    return None
+                time.sleep(0.05)
+        cliente.autenticar(password)
+        # Suscribirse antes de consultar el estado: no se pierde el 100% si llega entre medias
+        cliente.comando('SETEVENTS STATUS_CLIENT')
+        estado = cliente.getinfo('status/bootstrap-phase')
+        ultimo = -1
+        while True:
+            progreso = _progreso_bootstrap(estado)
+            if progreso is not None and progreso != ultimo:
+                ultimo = progreso
+                resumen = re.search(r'SUMMARY="([^"]*)"', estado)
+                if al_progresar:
+                    al_progresar(progreso, resumen.group(1) if resumen else '')
+            if ultimo >= 100:
+                return time.monotonic() - inicio
+            restante = limite - time.monotonic()
+            if restante <= 0:
+                raise socket.timeout
+            estado = cliente.siguiente_evento(restante)
+    except socket.timeout:
+        print(f"❌ Tor no completó el bootstrap en {timeout}s")
+        return None
+    except (OSError, ErrorControlTor) as e:
+        print(f"❌ Error esperando el arranque de Tor: {e}")
+        return None
+    finally:
+        if cliente is not None:
+            cliente.cerrar()
+
+def sondear_socks(host: str = '127.0.0.1', puerto: int = SOCKS_PORT, timeout: float = 5) -> bool:
+    """
+    True si en host:puerto responde un proxy SOCKS5 (saludo con los métodos
+    sin autenticación y usuario/contraseña). No abre ningún circuito.
+    """
+    try:
+        with socket.create_connection((host, puerto), timeout) as sock:
+            sock.settimeout(timeout)
+            sock.sendall(b'\x05\x02\x00\x02')
+            respuesta = sock.recv(2)
+    except OSError:
+        return False
+    return len(respuesta) == 2 and respuesta[0] == 5 and respuesta[1] in (0, 2)
+
 
 class TorSetup:
     """
     Clase para manejar la configuración automática de Tor.
     """
     
-    def __init__(self):
+    def __init__(self, control_port: int = CONTROL_PORT, timeout_arranque: float = TIMEOUT_ARRANQUE,
+                 socks_port: int = SOCKS_PORT):
         self.sistema = platform.system().lower()
         self.arquitectura = platform.machine().lower()
         self.directorio_tor = self._obtener_directorio_tor()
         self.config_tor = self.directorio_tor / "torrc"
+        self.control_port = control_port
+        self.socks_port = socks_port
+        self.timeout_arranque = timeout_arranque
+        self.proceso = None
+        self.segundos_arranque = None  # Duración del último bootstrap
         
     def _obtener_directorio_tor(self) -> Path:
         """Obtiene el directorio donde se instalará Tor."""
@@ -124,12 +317,15 @@ class TorSetup:
         """Configura Tor con parámetros básicos."""
         try:
             # Crear configuración básica
+            # Tor corre como proceso hijo (sin RunAsDaemon) y el arranque se sigue por el puerto de control
             config = f"""# Configuración básica de Tor para TitanSend
-SocksPort 9050
+SocksPort {self.socks_port}
+ControlPort 127.0.0.1:{self.control_port}
+CookieAuthentication 1
 DataDirectory {self.directorio_tor / "data"}
 PidFile {self.directorio_tor / "tor.pid"}
 Log notice file {self.directorio_tor / "tor.log"}
-RunAsDaemon 1
+RunAsDaemon 0
 """
             
             # Escribir configuración
@@ -142,7 +338,10 @@ RunAsDaemon 1
             return False
     
     def iniciar_tor(self) -> bool:
-        """Inicia el servicio Tor."""
+        """
+        Inicia Tor como proceso hijo y espera (como máximo timeout_arranque)
+        a que su puerto de control informe del bootstrap al 100%.
+        """
         try:
             # Buscar ejecutable de Tor
             tor_exe = self._buscar_ejecutable_tor()
@@ -150,18 +349,19 @@ RunAsDaemon 1
                 print("❌ No se encontró el ejecutable de Tor.")
                 return False
             
-            # Iniciar Tor como daemon
-            subprocess.Popen([
+            self.proceso = subprocess.Popen([
                 str(tor_exe),
                 "-f", str(self.config_tor),
-                "--runasdaemon", "1"
-            ])
-            
-            # Esperar un poco para que inicie
-            import time
-            time.sleep(3)
+                "--runasdaemon", "0"
+            ], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
             
-            return self.verificar_conectividad_tor()
+            self.segundos_arranque = esperar_bootstrap(
+                puerto=self.control_port, timeout=self.timeout_arranque, proceso=self.proceso,
+                al_progresar=lambda progreso, resumen: print(f"🔄 Tor {progreso}%: {resumen}"))
+            if self.segundos_arranque is None:
+                return False
+            print(f"✅ Tor listo en {self.segundos_arranque:.1f}s")
+            return True
         except Exception as e:
             print(f"❌ Error iniciando Tor: {e}")
             return False
@@ -190,29 +390,28 @@ RunAsDaemon 1
         
         return None
     
-    def verificar_conectividad_tor(self) -> bool:
-        """Verifica si Tor está funcionando correctamente."""
+    def verificar_conectividad_tor(self, timeout: float = 10) -> bool:
+        """
+        Verifica por el puerto de control que Tor completó el bootstrap y
+        tiene un circuito establecido (sin peticiones a servicios externos).
+        Si el puerto de control no está disponible (el Tor del sistema suele
+        tenerlo desactivado), basta con que responda el puerto SOCKS.
+        """
         try:
-            import socket
-            import socks
-            
-            # Configurar proxy SOCKS
-            socks.set_default_proxy(socks.SOCKS5, "127.0.0.1", 9050)
-            socket.socket = socks.socksocket
-            
-            # Intentar conectar a un sitio web
-            import urllib.request
-            respuesta = urllib.request.urlopen("http://httpbin.org/ip", timeout=10)
-            datos = respuesta.read()
-            
-            # Verificar que la IP no es la local
-            ip_info = json.loads(datos.decode())
-            if "origin" in ip_info:
-                print(f"✅ Tor funcionando. IP externa: {ip_info['origin']}")
+            with ClienteControl(puerto=self.control_port, timeout=timeout) as control:
+                control.autenticar()
+                progreso = _progreso_bootstrap(control.getinfo('status/bootstrap-phase'))
+                circuito = control.getinfo('status/circuit-established') == '1'
+            if progreso == 100 and circuito:
+                print("✅ Tor funcionando (bootstrap 100%, circuito establecido)")
                 return True
-            
+            print(f"⚠️  Tor en arranque: bootstrap {progreso}%, circuito {'sí' if circuito else 'no'}")
             return False
-        except Exception as e:
+        except (OSError, ErrorControlTor) as e:
+            if sondear_socks(puerto=self.socks_port, timeout=timeout):
+                print(f"✅ Tor escuchando en el puerto SOCKS {self.socks_port} "
+                      f"(sin puerto de control: no se comprueba el bootstrap)")
+                return True
             print(f"❌ Error verificando conectividad Tor: {e}")
             return False
     
@@ -229,20 +428,42 @@ RunAsDaemon 1
         return None
     
     def configurar_servicio_hidden(self, puerto: int = 8080) -> bool:
-        """Configura un servicio hidden en Tor."""
+        """
+        Configura un servicio hidden persistente en el torrc. Es idempotente:
+        el bloque del servicio aparece una sola vez y cada puerto una sola
+        vez dentro de él. Para muchos receptores sin reiniciar Tor, usa los
+        servicios efímeros de tor_control.GestorServiciosOnion.
+        """
         try:
             # Crear directorio del servicio
             hidden_dir = self.directorio_tor / "data" / "hidden_service"
             hidden_dir.mkdir(parents=True, exist_ok=True)
             
-            # Agregar configuración al torrc
-            config_hidden = f"""
-HiddenServiceDir {hidden_dir}
-HiddenServicePort {puerto} 127.0.0.1:{puerto}
-"""
-            
-            with open(self.config_tor, 'a') as f:
-                f.write(config_hidden)
+            lineas = self.config_tor.read_text().splitlines() if self.config_tor.exists() else []
+            cabecera = f"HiddenServiceDir {hidden_dir}"
+            linea_puerto = f"HiddenServicePort {puerto} 127.0.0.1:{puerto}"
+            # Puertos ya configurados en el bloque del servicio (hasta el siguiente HiddenServiceDir)
+            puertos, resto, en_bloque = [], [], False
+            for linea in lineas:
+                if linea.strip().startswith("HiddenServiceDir"):
+                    en_bloque = linea.strip() == cabecera
+                    if en_bloque:
+                        continue
+                if en_bloque and linea.strip().startswith("HiddenServicePort"):
+                    puertos.append(linea.strip())
+                    continue
+                resto.append(linea)
+            # Sin repeticiones (los torrc antiguos podían tener el bloque añadido varias veces)
+            eliminadas = len(lineas) - len(resto)
+            puertos = list(dict.fromkeys(puertos))
+            if linea_puerto in puertos and eliminadas == len(puertos) + 1:
+                return True
+            if linea_puerto not in puertos:
+                puertos.append(linea_puerto)
+            while resto and not resto[-1].strip():
+                resto.pop()
+            with open(self.config_tor, 'w') as f:
+                f.write("\n".join(resto + ["", cabecera] + puertos) + "\n")
             
             return True
         except Exception as e:
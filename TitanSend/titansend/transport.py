@@ -1,6 +1,13 @@
 import qrcode
 import os
 
+try:
+    from .transport_qr import decodificar_imagen
+    from . import reed_solomon
+except ImportError:
+    from transport_qr import decodificar_imagen
+    import reed_solomon
+
 # Importar pyudev de forma opcional
 try:
     import pyudev # type: ignore
@@ -36,11 +43,14 @@ def generar_qr(datos: bytes, ruta: str):
 
 def leer_qr(ruta: str) -> bytes:
     """
-    Lee los datos de un archivo QR (binario).
+    Decodifica la imagen QR indicada y devuelve sus datos (binario).
     """
     try:
-        with open(ruta, 'rb') as f:
-            return f.read()
+        contenidos = decodificar_imagen(ruta, validar=False)
+        if not contenidos:
+            print(f"[QR] No se encontró ningún código QR en {ruta}")
+            return b""
+        return contenidos[0]
     except Exception as e:
         print(f"[QR] Error leyendo QR: {e}")
         return b""
@@ -68,6 +78,82 @@ def recibir_usb(ruta_usb: str) -> bytes:
         print(f"[USB] Error leyendo datos de USB: {e}")
         return b""
 
+# Envíos divididos con paridad Reed-Solomon (USB y Bluetooth)
+def dividir_con_paridad(datos: bytes, partes: int, paridad: int) -> list:
+    """
+    Divide los datos en `partes` fragmentos más `paridad` fragmentos de
+    paridad. Con cualquier `partes` de ellos se reconstruyen los datos.
+    """
+    return reed_solomon.dividir(datos, partes, paridad)
+
+def unir_partes(partes) -> bytes:
+    """
+    Reconstruye los datos a partir de los fragmentos recibidos (en cualquier
+    orden; los dañados se descartan). Devuelve b"" si no hay suficientes.
+    """
+    try:
+        return reed_solomon.unir(partes)
+    except ValueError as e:
+        print(f"[Paridad] No se pudieron reconstruir los datos: {e}")
+        return b""
+
+def enviar_usb_partes(datos: bytes, rutas_usb: list, paridad: int = 1):
+    """
+    Reparte los datos entre varias rutas (p. ej. un archivo en cada memoria
+    USB) de modo que se pueden perder `paridad` de ellas.
+    """
+    if not 0 <= paridad < len(rutas_usb):
+        print(f"[USB] Se necesitan más rutas ({len(rutas_usb)}) que fragmentos de paridad ({paridad})")
+        return
+    for ruta, parte in zip(rutas_usb, dividir_con_paridad(datos, len(rutas_usb) - paridad, paridad)):
+        enviar_usb(parte, ruta)
+
+def recibir_usb_partes(rutas_usb: list) -> bytes:
+    """
+    Reconstruye los datos a partir de las rutas disponibles; las que no
+    existen o están dañadas cuentan como perdidas.
+    """
+    partes = []
+    for ruta in rutas_usb:
+        if os.path.exists(ruta):
+            partes.append(recibir_usb(ruta))
+        else:
+            print(f"[USB] Fragmento no disponible: {ruta}")
+    return unir_partes(partes)
+
+def enviar_bluetooth_partes(datos: bytes, direccion: str, partes: int, paridad: int):
+    """
+    Envía los datos en `partes` + `paridad` mensajes Bluetooth; el receptor
+    (recibir_bluetooth_partes) reconstruye aunque se pierdan hasta `paridad`.
+    """
+    for parte in dividir_con_paridad(datos, partes, paridad):
+        enviar_bluetooth(parte, direccion)
+
+def recibir_bluetooth_partes(direccion: str, mensajes: int) -> bytes:
+    """
+    Recibe hasta `mensajes` mensajes Bluetooth (partes + paridad del envío)
+    y reconstruye los datos en cuanto llegan fragmentos suficientes; los
+    mensajes perdidos (vacíos) o dañados se descartan. Devuelve b"" si no
+    bastan los recibidos.
+    """
+    reensamblador = reed_solomon.ReensambladorRS()
+    for _ in range(mensajes):
+        parte = recibir_bluetooth(direccion)
+        if not parte:
+            continue
+        try:
+            reensamblador.agregar(parte)
+        except ValueError as e:
+            print(f"[Bluetooth] Fragmento descartado: {e}")
+            continue
+        if reensamblador.completo:
+            break
+    try:
+        return reensamblador.resultado()
+    except ValueError as e:
+        print(f"[Paridad] No se pudieron reconstruir los datos: {e}")
+        return b""
+
 def detectar_usb(callback):
     if not PYUDEV_AVAILABLE:
         print("pyudev no disponible. La detección automática de USB no funcionará.")
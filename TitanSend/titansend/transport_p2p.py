@@ -7,6 +7,12 @@ import socket
 import threading
 import time
 import json
+import struct
+import hashlib
+import itertools
+import mmap
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
 from colorama import Fore, Style
 
 # Intentar importar Tor (opcional)
@@ -24,15 +30,86 @@ try:
 except ImportError:
     SOCKS_AVAILABLE = False
 
+# Spool común de recepción y canal cifrado (importables también como módulos sueltos en los tests)
+try:
+    from .spool import ReceptorSpool, CuotaExcedida
+    from .canal_seguro import ErrorAutenticacion
+    from .tor_control import gestor_por_defecto, servicios_por_defecto, GestorServiciosOnion
+except ImportError:
+    from spool import ReceptorSpool, CuotaExcedida
+    from canal_seguro import ErrorAutenticacion
+    from tor_control import gestor_por_defecto, servicios_por_defecto, GestorServiciosOnion
+
 DEFAULT_PORT = 8080
 CHUNK_SIZE = 4096
+TOR_SOCKS = ('127.0.0.1', 9050)
+# Credenciales SOCKS por conexión: Tor (IsolateSOCKSAuth) lleva cada par
+# usuario/contraseña distinto por su propio circuito
+_SESION_AISLAMIENTO = os.urandom(4).hex()
+_aislamientos = itertools.count()
+
+# Protocolo reanudable: MAGIC + mensajes JSON con prefijo de longitud (4 bytes big-endian)
+PROTO_MAGIC = b'TSR1'
+MAX_MENSAJE = 64 * 1024
+CHECKPOINT_BYTES = 1024 * 1024  # Persistir el offset confirmado cada 1 MB
+BACKOFF_MAX = 30
+LOTE_SESION = 256  # Archivos anunciados por mensaje en modo sesión
+MAX_RECEPCION_MEMORIA = 64 * 1024 * 1024  # Límite de receive_data_p2p cuando devuelve bytes
+FANOUT_CHUNK = 256 * 1024  # Bloque de escritura por peer en el envío múltiple
+
+def credenciales_aislamiento():
+    """Usuario y contraseña SOCKS únicos para aislar una conexión en su propio circuito"""
+    return f"titansend-{_SESION_AISLAMIENTO}-{next(_aislamientos)}", 'x'
+
+def _recv_exacto(sock, n):
+    """Lee exactamente n bytes del socket o lanza ConnectionError si se corta"""
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            raise ConnectionError("Conexión cerrada por el peer")
+        buf += chunk
+    return bytes(buf)
+
+def _enviar_mensaje(sock, mensaje):
+    """Envía un mensaje de control JSON con prefijo de longitud"""
+    datos = json.dumps(mensaje).encode()
+    sock.sendall(struct.pack('>I', len(datos)) + datos)
+
+def _recibir_mensaje(sock):
+    """Recibe un mensaje de control JSON con prefijo de longitud"""
+    longitud = struct.unpack('>I', _recv_exacto(sock, 4))[0]
+    if longitud > MAX_MENSAJE:
+        raise ValueError(f"Mensaje de control demasiado grande ({longitud} bytes)")
+    return json.loads(_recv_exacto(sock, longitud).decode())
+
+def _hash_prefijo(ruta, longitud):
+    """Devuelve un objeto SHA256 alimentado con los primeros `longitud` bytes del archivo"""
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        restante = longitud
+        while restante > 0:
+            bloque = f.read(min(1024 * 1024, restante))
+            if not bloque:
+                break
+            h.update(bloque)
+            restante -= len(bloque)
+    return h
+
+def hash_archivo(ruta):
+    """Calcula el SHA256 (hex) de un archivo leyendo por bloques"""
+    return _hash_prefijo(ruta, os.path.getsize(ruta)).hexdigest()
 
 class P2PServer:
     """Servidor P2P para recibir archivos cifrados"""
     
-    def __init__(self, port=DEFAULT_PORT, use_tor=False):
+    def __init__(self, port=DEFAULT_PORT, use_tor=False, spool=None, canal=None, servicios_onion=None):
         self.port = port
         self.use_tor = use_tor and TOR_AVAILABLE
+        self.spool = spool or ReceptorSpool()
+        self.canal = canal  # canal_seguro.ServidorCanal opcional
+        self.servicios_onion = servicios_onion  # tor_control.GestorServiciosOnion (por defecto, el compartido)
+        self._onion_publicado = None  # Gestor con el que se publicó el servicio, para retirarlo en stop()
         self.server_socket = None
         self.running = False
         
@@ -47,7 +124,14 @@ class P2PServer:
             
             if self.use_tor:
                 print(f"🌐 Servidor P2P iniciado en puerto {self.port} (con Tor)")
-                print("🔗 Dirección Onion disponible (si Tor está configurado)")
+                # Un servicio onion por puerto sobre el mismo Tor; se reutiliza entre arranques
+                try:
+                    servicios = self.servicios_onion or servicios_por_defecto()
+                    service_id = servicios.servicio(self.port)
+                    self._onion_publicado = servicios
+                    print(f"🔗 Dirección Onion: {service_id}.onion:{self.port}")
+                except Exception as e:
+                    print(f"⚠️  No se pudo publicar el servicio Onion: {e}")
             else:
                 print(f"🌐 Servidor P2P iniciado en puerto {self.port}")
                 print(f"📡 Esperando conexiones en 0.0.0.0:{self.port}")
@@ -56,63 +140,464 @@ class P2PServer:
                 try:
                     client_socket, address = self.server_socket.accept()
                     print(f"✅ Conexión aceptada de {address}")
-                    
-                    # Recibir archivo cifrado
-                    with open(output_file, 'wb') as f:
-                        total_received = 0
-                        while True:
-                            data = client_socket.recv(CHUNK_SIZE)
-                            if not data:
-                                break
-                            f.write(data)
-                            total_received += len(data)
-                            print(f"📥 Recibidos {total_received} bytes...")
-                    
-                    print(f"✅ Archivo recibido y guardado en {output_file}")
-                    print(f"📊 Tamaño total: {total_received} bytes")
-                    client_socket.close()
-                    break
-                    
                 except Exception as e:
                     print(f"❌ Error en conexión: {e}")
                     break
+                
+                try:
+                    emisor = address[0]
+                    if self.canal:
+                        client_socket = self.canal.aceptar(client_socket)
+                        emisor = client_socket.fingerprint_peer
+                        print(f"🔒 Canal seguro {'reanudado' if client_socket.reanudado else 'establecido'} con {emisor[:16]}...")
+                    prefijo = self._leer_prefijo(client_socket)
+                    if prefijo == PROTO_MAGIC:
+                        completo = self._recibir_reanudable(client_socket, output_file, emisor)
+                    else:
+                        completo = self._recibir_legacy(client_socket, output_file, prefijo, emisor)
+                except (CuotaExcedida, ErrorAutenticacion) as e:
+                    print(f"❌ Transferencia rechazada: {e}")
+                    completo = False
+                except Exception as e:
+                    # La transferencia parcial queda guardada para reanudarse
+                    print(f"⚠️  Conexión interrumpida: {e}")
+                    completo = False
+                finally:
+                    client_socket.close()
+                
+                if completo:
+                    break
+                print("🔁 Esperando reconexión para reanudar la transferencia...")
                     
         except Exception as e:
             print(f"❌ Error iniciando servidor P2P: {e}")
         finally:
             self.stop()
     
+    def _leer_prefijo(self, client_socket):
+        """Lee los primeros bytes para distinguir el protocolo reanudable del envío directo"""
+        prefijo = b''
+        while len(prefijo) < len(PROTO_MAGIC):
+            data = client_socket.recv(len(PROTO_MAGIC) - len(prefijo))
+            if not data:
+                break
+            prefijo += data
+        return prefijo
+    
+    def _recibir_legacy(self, client_socket, output_file, prefijo, emisor):
+        """Recibe un flujo crudo (clientes antiguos) hasta que el emisor cierra"""
+        with self.spool.abrir(output_file, emisor) as f:
+            f.write(prefijo)
+            total_received = len(prefijo)
+            while True:
+                data = client_socket.recv(CHUNK_SIZE)
+                if not data:
+                    break
+                f.write(data)
+                total_received += len(data)
+                print(f"📥 Recibidos {total_received} bytes...")
+            f.confirmar()
+        
+        print(f"✅ Archivo recibido y guardado en {output_file}")
+        print(f"📊 Tamaño total: {total_received} bytes")
+        return True
+    
+    def _cargar_estado(self, ruta_estado):
+        """Carga el estado de una transferencia parcial (id, hash, tamaño, offset)"""
+        try:
+            with open(ruta_estado, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def _guardar_estado(self, ruta_estado, estado):
+        """Guarda el estado de forma atómica (escritura temporal + rename)"""
+        tmp = ruta_estado + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(estado, f)
+        os.replace(tmp, ruta_estado)
+    
+    def _recibir_reanudable(self, client_socket, output_file, emisor):
+        """
+        Recibe con el protocolo reanudable. El primer mensaje indica si es
+        un único archivo ('archivo') o una sesión con varios ('lote'/'fin').
+        """
+        mensaje = _recibir_mensaje(client_socket)
+        if mensaje.get('tipo') == 'archivo':
+            return self._recibir_archivo(client_socket, output_file, mensaje, emisor)
+        return self._recibir_sesion(client_socket, output_file, mensaje, emisor)
+    
+    def _recibir_archivo(self, client_socket, output_file, cabecera, emisor):
+        """
+        Recibe un único archivo. Informa al emisor cuántos bytes ya están
+        confirmados en disco para ese id de transferencia y hash, y continúa desde ahí.
+        """
+        try:
+            transferencia = self._preparar_transferencia(output_file, cabecera, emisor)
+        except CuotaExcedida as e:
+            _enviar_mensaje(client_socket, {'error': 'cuota', 'detalle': str(e)})
+            raise
+        _enviar_mensaje(client_socket, {'offset': transferencia['estado']['offset']})
+        if not self._recibir_datos(client_socket, transferencia):
+            _enviar_mensaje(client_socket, {'estado': 'error', 'motivo': 'hash'})
+            return False
+        _enviar_mensaje(client_socket, {'estado': 'completo', 'offset': transferencia['estado']['tamano']})
+        print(f"✅ Archivo recibido y guardado en {output_file}")
+        print(f"📊 Tamaño total: {transferencia['estado']['tamano']} bytes")
+        return True
+    
+    def _recibir_sesion(self, client_socket, directorio, mensaje, emisor):
+        """
+        Recibe varios archivos por una sola conexión. Cada lote anuncia sus
+        archivos, se responden todos los offsets de una vez y los datos llegan
+        seguidos; el ack de cada archivo se envía en cuanto termina (el emisor
+        no espera a cada ack para continuar). Los archivos que no caben en la
+        cuota se anuncian con offset None y no se esperan sus datos.
+        """
+        os.makedirs(directorio, exist_ok=True)
+        recibidos = 0
+        while mensaje.get('tipo') == 'lote':
+            # Se validan todos los nombres antes de abrir ninguna escritura del lote
+            rutas = []
+            for cabecera in mensaje['archivos']:
+                nombre = os.path.basename(cabecera.get('nombre', ''))
+                if nombre in ('', '.', '..'):
+                    raise ValueError(f"Nombre de archivo inválido en la sesión: {cabecera.get('nombre')!r}")
+                rutas.append(os.path.join(directorio, nombre))
+            transferencias = []
+            try:
+                for ruta, cabecera in zip(rutas, mensaje['archivos']):
+                    try:
+                        transferencias.append(self._preparar_transferencia(ruta, cabecera, emisor))
+                    except CuotaExcedida as e:
+                        print(f"❌ {os.path.basename(ruta)} rechazado: {e}")
+                        transferencias.append({'estado': {'id': cabecera['id']}, 'rechazado': True})
+                _enviar_mensaje(client_socket, {'offsets': [None if t.get('rechazado') else t['estado']['offset']
+                                                            for t in transferencias]})
+            except Exception:
+                # Libera la cuota reservada por las escrituras ya abiertas, conservando su estado
+                self._cerrar_escrituras(transferencias)
+                raise
+            
+            for i, transferencia in enumerate(transferencias):
+                if transferencia.get('rechazado'):
+                    _enviar_mensaje(client_socket, {'id': transferencia['estado']['id'],
+                                                    'estado': 'error', 'motivo': 'cuota'})
+                    continue
+                try:
+                    ok = self._recibir_datos(client_socket, transferencia)
+                except Exception:
+                    # Las escrituras del lote que no llegaron a empezar se cierran conservando su estado
+                    self._cerrar_escrituras(transferencias[i + 1:])
+                    raise
+                _enviar_mensaje(client_socket, {'id': transferencia['estado']['id'],
+                                                'estado': 'completo' if ok else 'error'})
+                if ok:
+                    recibidos += 1
+                    print(f"✅ {transferencia['ruta']} ({transferencia['estado']['tamano']} bytes)")
+            mensaje = _recibir_mensaje(client_socket)
+        
+        if mensaje.get('tipo') != 'fin':
+            raise ValueError(f"Mensaje inesperado en la sesión: {mensaje.get('tipo')!r}")
+        print(f"✅ Sesión finalizada: {recibidos} archivos recibidos en {directorio}")
+        return True
+    
+    @staticmethod
+    def _cerrar_escrituras(transferencias):
+        """Cierra las escrituras abiertas de un lote (el .part se conserva para reanudar)"""
+        for transferencia in transferencias:
+            if not transferencia.get('rechazado'):
+                transferencia['escritura'].cerrar()
+    
+    def _preparar_transferencia(self, output_file, cabecera, emisor):
+        """
+        Carga o crea el estado de la transferencia, calcula el offset desde el
+        que reanudar y abre la escritura en el spool (reservando la cuota).
+        """
+        tamano = int(cabecera['tamano'])
+        ruta_part = output_file + '.part'
+        ruta_estado = output_file + '.part.json'
+        
+        estado = self._cargar_estado(ruta_estado)
+        offset = 0
+        if (estado and os.path.exists(ruta_part)
+                and estado.get('id') == cabecera['id']
+                and estado.get('sha256') == cabecera['sha256']
+                and estado.get('tamano') == tamano):
+            offset = min(int(estado.get('offset', 0)), os.path.getsize(ruta_part))
+        estado = {'id': cabecera['id'], 'sha256': cabecera['sha256'], 'tamano': tamano, 'offset': offset}
+        escritura = self.spool.abrir(output_file, emisor, tamano=tamano, offset=offset)
+        try:
+            self._guardar_estado(ruta_estado, estado)
+        except Exception:
+            escritura.cerrar()
+            raise
+        if offset:
+            print(f"🔁 Reanudando transferencia {cabecera['id']} desde {offset}/{tamano} bytes")
+        return {'ruta': output_file, 'ruta_estado': ruta_estado, 'estado': estado, 'escritura': escritura}
+    
+    def _recibir_datos(self, client_socket, transferencia):
+        """
+        Recibe los bytes que faltan de una transferencia, confirmando el offset
+        en disco periódicamente. Devuelve False si el hash final no coincide.
+        Si la conexión se corta, el .part se conserva para reanudar; ante
+        cualquier otro error (cuota, tamaño) se elimina.
+        """
+        estado = transferencia['estado']
+        escritura = transferencia['escritura']
+        ruta_estado = transferencia['ruta_estado']
+        tamano = estado['tamano']
+        offset = estado['offset']
+        hasher = _hash_prefijo(escritura.ruta_part, offset) if offset else hashlib.sha256()
+        
+        ultimo_checkpoint = offset
+        try:
+            while offset < tamano:
+                data = client_socket.recv(min(CHUNK_SIZE, tamano - offset))
+                if not data:
+                    raise ConnectionError("Conexión cerrada por el emisor")
+                escritura.write(data)
+                hasher.update(data)
+                offset += len(data)
+                if offset - ultimo_checkpoint >= CHECKPOINT_BYTES:
+                    escritura.sincronizar()
+                    estado['offset'] = ultimo_checkpoint = offset
+                    self._guardar_estado(ruta_estado, estado)
+                    print(f"📥 Recibidos {offset}/{tamano} bytes...")
+        except (ConnectionError, socket.timeout):
+            # Solo se confirma lo que ya está en disco
+            escritura.cerrar()
+            estado['offset'] = offset
+            self._guardar_estado(ruta_estado, estado)
+            raise
+        except Exception:
+            escritura.abortar()
+            os.remove(ruta_estado)
+            raise
+        
+        os.remove(ruta_estado)
+        if hasher.hexdigest() != estado['sha256']:
+            print(f"❌ Error de integridad en {transferencia['ruta']}: el hash SHA256 no coincide. Se descarta.")
+            escritura.abortar()
+            return False
+        escritura.confirmar()
+        return True
+    
     def stop(self):
-        """Detiene el servidor"""
+        """Detiene el servidor y retira su servicio onion (la clave se conserva)"""
         self.running = False
         if self.server_socket:
+            try:
+                self.server_socket.shutdown(socket.SHUT_RDWR)  # Despierta el accept() de otro hilo
+            except OSError:
+                pass
             self.server_socket.close()
+        servicios, self._onion_publicado = self._onion_publicado, None
+        if servicios is not None:
+            # El servicio es detached: seguiría publicado en Tor tras cerrar el receptor
+            servicios.eliminar(self.port)
 
 class P2PClient:
     """Cliente P2P para enviar archivos cifrados"""
     
-    def __init__(self, use_tor=False):
+    def __init__(self, use_tor=False, timeout=60, canal=None, proxy=TOR_SOCKS, aislar=True):
         self.use_tor = use_tor and SOCKS_AVAILABLE
+        self.timeout = timeout
+        self.canal = canal  # canal_seguro.ClienteCanal opcional (reanuda sesiones por destino)
+        self.proxy = proxy
+        self.aislar = aislar  # Un circuito Tor distinto por conexión
+    
+    def _conectar(self, target_host, target_port):
+        """Abre la conexión TCP (directa o a través del proxy SOCKS de Tor)"""
+        if self.use_tor:
+            # Configurar proxy SOCKS para Tor
+            sock = socks.socksocket()
+            usuario, clave = (credenciales_aislamiento() if self.aislar else (None, None))
+            sock.set_proxy(socks.SOCKS5, self.proxy[0], self.proxy[1], rdns=True, username=usuario, password=clave)
+            print(f"🌐 Conectando a {target_host}:{target_port} a través de Tor...")
+        else:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            print(f"🌐 Conectando a {target_host}:{target_port}...")
+        sock.settimeout(self.timeout)
+        sock.connect((target_host, target_port))
+        if self.canal:
+            try:
+                sock = self.canal.conectar(sock, (target_host, target_port))
+            except Exception:
+                sock.close()
+                raise
+            print(f"🔒 Canal seguro {'reanudado' if sock.reanudado else 'establecido'} con {sock.fingerprint_peer[:16]}...")
+        print("✅ Conexión establecida")
+        return sock
         
-    def send_file(self, file_path, target_host, target_port=DEFAULT_PORT):
-        """Envía archivo cifrado por P2P"""
+    def send_file(self, file_path, target_host, target_port=DEFAULT_PORT,
+                  reanudable=True, retries=5, backoff=1.0, transfer_id=None):
+        """
+        Envía archivo cifrado por P2P.
+        Con reanudable=True negocia con el receptor el offset ya confirmado y,
+        si la conexión se corta, reintenta con backoff exponencial continuando
+        desde donde quedó. reanudable=False envía el flujo crudo (receptores antiguos).
+        """
         if not os.path.isfile(file_path):
             print(f"❌ Archivo '{file_path}' no encontrado")
             return False
-            
+        
+        if not reanudable:
+            return self._send_legacy(file_path, target_host, target_port)
+        
+        file_size = os.path.getsize(file_path)
+        sha256 = hash_archivo(file_path)
+        cabecera = {
+            'tipo': 'archivo',
+            'id': transfer_id or sha256[:32],
+            'sha256': sha256,
+            'tamano': file_size,
+        }
+        
+        attempt = 0
+        while attempt < retries:
+            try:
+                if self._enviar_reanudable(file_path, target_host, target_port, cabecera):
+                    print(f"✅ Archivo enviado correctamente a {target_host}:{target_port}")
+                    return True
+                print("❌ El receptor rechazó el archivo (hash no coincide)")
+            except (CuotaExcedida, ErrorAutenticacion) as e:
+                print(f"❌ El receptor rechazó la transferencia: {e}")
+                return False
+            except Exception as e:
+                print(f"❌ Error enviando archivo (intento {attempt+1}/{retries}): {e}")
+            attempt += 1
+            if attempt < retries:
+                espera = min(backoff * (2 ** (attempt - 1)), BACKOFF_MAX)
+                print(f"⏳ Reintentando en {espera:.1f}s...")
+                time.sleep(espera)
+        print("❌ No se pudo enviar el archivo tras varios intentos.")
+        return False
+    
+    def _enviar_reanudable(self, file_path, target_host, target_port, cabecera):
+        """Un intento de envío: handshake de offset, envío del resto y confirmación final"""
+        sock = self._conectar(target_host, target_port)
         try:
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            
-            if self.use_tor:
-                # Configurar proxy SOCKS para Tor
-                sock = socks.socksocket()
-                sock.set_proxy(socks.SOCKS5, "127.0.0.1", 9050)
-                print(f"🌐 Conectando a {target_host}:{target_port} a través de Tor...")
+            sock.sendall(PROTO_MAGIC)
+            _enviar_mensaje(sock, cabecera)
+            respuesta = _recibir_mensaje(sock)
+            if 'error' in respuesta:
+                raise CuotaExcedida(respuesta.get('detalle', respuesta['error']))
+            offset = int(respuesta['offset'])
+            file_size = cabecera['tamano']
+            if offset:
+                print(f"🔁 El receptor ya tiene {offset}/{file_size} bytes. Reanudando...")
             else:
-                print(f"🌐 Conectando a {target_host}:{target_port}...")
-            
-            sock.connect((target_host, target_port))
-            print("✅ Conexión establecida")
+                print(f"📤 Enviando archivo de {file_size} bytes...")
+            self._enviar_contenido(sock, file_path, offset, file_size, progreso=True)
+            respuesta = _recibir_mensaje(sock)
+            return respuesta.get('estado') == 'completo'
+        finally:
+            sock.close()
+    
+    def _enviar_contenido(self, sock, file_path, offset, file_size, progreso=False):
+        """Envía el contenido del archivo desde offset hasta el final"""
+        with open(file_path, 'rb') as f:
+            f.seek(offset)
+            total_sent = offset
+            while total_sent < file_size:
+                chunk = f.read(min(CHUNK_SIZE, file_size - total_sent))
+                if not chunk:
+                    raise ValueError(f"El archivo '{file_path}' cambió de tamaño durante el envío")
+                sock.sendall(chunk)
+                total_sent += len(chunk)
+                if progreso:
+                    print(f"📤 Enviados {total_sent}/{file_size} bytes...")
+    
+    def send_files(self, file_paths, target_host, target_port=DEFAULT_PORT,
+                   ventana=64, lote=LOTE_SESION, retries=5, backoff=1.0):
+        """
+        Envía varios archivos reutilizando una sola conexión (modo sesión).
+        Los archivos se anuncian por lotes, el receptor responde los offsets
+        de todo el lote y los acks se procesan con una ventana de hasta
+        `ventana` archivos sin confirmar. Si la conexión se corta, se reconecta
+        con backoff exponencial y solo se reenvía lo pendiente (los archivos
+        rechazados por cuota no se reintentan).
+        Devuelve un dict {ruta: True/False}.
+        """
+        resultados = {}
+        rechazados = set()
+        pendientes = []
+        for ruta in file_paths:
+            if not os.path.isfile(ruta):
+                print(f"❌ Archivo '{ruta}' no encontrado")
+                resultados[ruta] = False
+                continue
+            sha256 = hash_archivo(ruta)
+            pendientes.append((ruta, {
+                'id': sha256[:32],
+                'sha256': sha256,
+                'tamano': os.path.getsize(ruta),
+                'nombre': os.path.basename(ruta),
+            }))
+        
+        attempt = 0
+        while pendientes and attempt < retries:
+            try:
+                self._enviar_sesion(pendientes, target_host, target_port, ventana, lote, resultados, rechazados)
+            except ErrorAutenticacion as e:
+                print(f"❌ No se pudo autenticar al receptor: {e}")
+                break
+            except Exception as e:
+                print(f"❌ Error en la sesión P2P (intento {attempt+1}/{retries}): {e}")
+            pendientes = [p for p in pendientes if not resultados.get(p[0]) and p[0] not in rechazados]
+            attempt += 1
+            if pendientes and attempt < retries:
+                espera = min(backoff * (2 ** (attempt - 1)), BACKOFF_MAX)
+                print(f"⏳ {len(pendientes)} archivos pendientes. Reintentando en {espera:.1f}s...")
+                time.sleep(espera)
+        
+        for ruta, _ in pendientes:
+            resultados[ruta] = False
+        enviados = sum(1 for ok in resultados.values() if ok)
+        print(f"📊 Sesión P2P: {enviados}/{len(resultados)} archivos enviados a {target_host}:{target_port}")
+        return resultados
+    
+    def _enviar_sesion(self, pendientes, target_host, target_port, ventana, lote, resultados, rechazados):
+        """Una conexión de sesión: envía todos los lotes pendientes y registra los acks"""
+        sock = self._conectar(target_host, target_port)
+        try:
+            sock.sendall(PROTO_MAGIC)
+            for i in range(0, len(pendientes), lote):
+                bloque = pendientes[i:i + lote]
+                _enviar_mensaje(sock, {'tipo': 'lote', 'archivos': [cab for _, cab in bloque]})
+                offsets = _recibir_mensaje(sock)['offsets']
+                
+                en_vuelo = []
+                for (ruta, cabecera), offset in zip(bloque, offsets):
+                    if offset is not None:
+                        self._enviar_contenido(sock, ruta, int(offset), cabecera['tamano'])
+                    en_vuelo.append((ruta, cabecera))
+                    if len(en_vuelo) >= ventana:
+                        self._procesar_ack(sock, en_vuelo.pop(0), resultados, rechazados)
+                for pendiente in en_vuelo:
+                    self._procesar_ack(sock, pendiente, resultados, rechazados)
+            _enviar_mensaje(sock, {'tipo': 'fin'})
+        finally:
+            sock.close()
+    
+    def _procesar_ack(self, sock, pendiente, resultados, rechazados):
+        """Lee el ack del siguiente archivo en vuelo (llegan en orden de envío)"""
+        ruta, cabecera = pendiente
+        ack = _recibir_mensaje(sock)
+        if ack.get('id') != cabecera['id']:
+            raise ValueError(f"Ack fuera de orden para '{ruta}'")
+        resultados[ruta] = ack.get('estado') == 'completo'
+        if ack.get('motivo') == 'cuota':
+            rechazados.add(ruta)
+            print(f"❌ El receptor rechazó '{ruta}' (cuota excedida)")
+        elif not resultados[ruta]:
+            print(f"❌ El receptor rechazó '{ruta}' (hash no coincide)")
+    
+    def _send_legacy(self, file_path, target_host, target_port):
+        """Envía el archivo como flujo crudo, sin handshake"""
+        try:
+            sock = self._conectar(target_host, target_port)
             
             file_size = os.path.getsize(file_path)
             print(f"📤 Enviando archivo de {file_size} bytes...")
@@ -123,7 +608,7 @@ class P2PClient:
                     chunk = f.read(CHUNK_SIZE)
                     if not chunk:
                         break
-                    sock.send(chunk)
+                    sock.sendall(chunk)
                     total_sent += len(chunk)
                     print(f"📤 Enviados {total_sent}/{file_size} bytes...")
             
@@ -135,51 +620,181 @@ class P2PClient:
             print(f"❌ Error enviando archivo: {e}")
             return False
 
-def obtener_direccion_onion():
-    """Obtiene la dirección Onion actual (si Tor está disponible)"""
+def leer_lista_peers(ruta, puerto_defecto=DEFAULT_PORT):
+    """
+    Lee un archivo de peers con una entrada 'host' o 'host:puerto' por línea.
+    Ignora líneas vacías y comentarios (#).
+    """
+    peers = []
+    with open(ruta, 'r') as f:
+        for linea in f:
+            linea = linea.split('#', 1)[0].strip()
+            if not linea:
+                continue
+            host, sep, puerto = linea.rpartition(':')
+            if sep and puerto.isdigit():
+                peers.append((host, int(puerto)))
+            else:
+                peers.append((linea, puerto_defecto))
+    return peers
+
+async def _enviar_peer_directo(vista, cabecera, host, port, timeout):
+    """Envía el contenido (ya mapeado en memoria) a un peer con asyncio"""
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    try:
+        datos = json.dumps(cabecera).encode()
+        writer.write(PROTO_MAGIC + struct.pack('>I', len(datos)) + datos)
+        await writer.drain()
+        
+        async def leer_mensaje():
+            longitud = struct.unpack('>I', await asyncio.wait_for(reader.readexactly(4), timeout))[0]
+            if longitud > MAX_MENSAJE:
+                raise ValueError(f"Mensaje de control demasiado grande ({longitud} bytes)")
+            return json.loads((await asyncio.wait_for(reader.readexactly(longitud), timeout)).decode())
+        
+        respuesta = await leer_mensaje()
+        if 'error' in respuesta:
+            raise CuotaExcedida(respuesta.get('detalle', respuesta['error']))
+        offset = int(respuesta['offset'])
+        for i in range(offset, len(vista), FANOUT_CHUNK):
+            writer.write(vista[i:i + FANOUT_CHUNK])
+            await asyncio.wait_for(writer.drain(), timeout)
+        respuesta = await leer_mensaje()
+        if respuesta.get('estado') != 'completo':
+            raise ValueError("El receptor rechazó el archivo (hash no coincide)")
+        return len(vista) - offset
+    finally:
+        writer.close()
+
+async def _enviar_multiples_async(file_path, vista, cabecera, peers, concurrency, client,
+                                  retries, backoff, timeout):
+    """Lanza los envíos a todos los peers limitando la concurrencia"""
+    semaforo = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    # Tor y el canal seguro usan sockets bloqueantes: se ejecutan en un pool de hilos
+    pool = ThreadPoolExecutor(max_workers=concurrency) if client else None
+    
+    async def enviar(host, port):
+        resultado = {'host': host, 'port': port, 'ok': False, 'bytes': 0,
+                     'segundos': 0.0, 'intentos': 0, 'error': None}
+        async with semaforo:
+            inicio = time.perf_counter()
+            for intento in range(retries):
+                resultado['intentos'] = intento + 1
+                try:
+                    if client:
+                        ok = await loop.run_in_executor(
+                            pool, client._enviar_reanudable, file_path, host, port, cabecera)
+                        if not ok:
+                            raise ValueError("El receptor rechazó el archivo (hash no coincide)")
+                        resultado['bytes'] = cabecera['tamano']
+                    else:
+                        resultado['bytes'] = await _enviar_peer_directo(vista, cabecera, host, port, timeout)
+                    resultado['ok'] = True
+                    resultado['error'] = None
+                    break
+                except (CuotaExcedida, ErrorAutenticacion) as e:
+                    resultado['error'] = str(e)
+                    break
+                except Exception as e:
+                    resultado['error'] = str(e) or type(e).__name__
+                    if intento + 1 < retries:
+                        await asyncio.sleep(min(backoff * (2 ** intento), BACKOFF_MAX))
+            resultado['segundos'] = time.perf_counter() - inicio
+        return resultado
+    
+    try:
+        return await asyncio.gather(*(enviar(host, port) for host, port in peers))
+    finally:
+        if pool:
+            pool.shutdown(wait=False)
+
+def enviar_multiples_peers(file_path, peers, concurrency=16, use_tor=False, canal=None,
+                           retries=3, backoff=1.0, timeout=60):
+    """
+    Envía el mismo archivo a varios receptores P2P en paralelo.
+    El archivo se lee una sola vez (mmap) y se transmite a cada peer con el
+    protocolo reanudable, hasta `concurrency` envíos simultáneos.
+    Devuelve una lista de resultados por peer (ok, bytes, segundos, MB/s, error).
+    """
+    if not os.path.isfile(file_path):
+        print(f"❌ Archivo '{file_path}' no encontrado")
+        return []
+    
+    file_size = os.path.getsize(file_path)
+    client = P2PClient(use_tor=use_tor, timeout=timeout, canal=canal) if (use_tor or canal) else None
+    with open(file_path, 'rb') as f:
+        mapa = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if file_size else None
+        try:
+            vista = memoryview(mapa) if mapa else memoryview(b'')
+            sha256 = hashlib.sha256(vista).hexdigest()
+            cabecera = {'tipo': 'archivo', 'id': sha256[:32], 'sha256': sha256, 'tamano': file_size}
+            print(f"📡 Enviando {file_size} bytes a {len(peers)} peers (concurrencia {concurrency})...")
+            inicio = time.perf_counter()
+            resultados = asyncio.run(_enviar_multiples_async(
+                file_path, vista, cabecera, peers, concurrency, client, retries, backoff, timeout))
+            total = time.perf_counter() - inicio
+            vista.release()
+        finally:
+            if mapa:
+                mapa.close()
+    
+    for r in resultados:
+        r['mbps'] = (r['bytes'] / (1024 * 1024)) / r['segundos'] if r['ok'] and r['segundos'] else 0.0
+        if r['ok']:
+            print(f"✅ {r['host']}:{r['port']} - {r['bytes']} bytes en {r['segundos']:.2f}s ({r['mbps']:.2f} MB/s)")
+        else:
+            print(f"❌ {r['host']}:{r['port']} - {r['error']} (intentos: {r['intentos']})")
+    correctos = sum(1 for r in resultados if r['ok'])
+    print(f"📊 {correctos}/{len(resultados)} peers completados en {total:.2f}s")
+    return resultados
+
+def obtener_direccion_onion(port=None, gestor=None, servicios=None):
+    """
+    Obtiene la dirección Onion del servicio de `port` o, sin puerto, la del
+    primer servicio publicado en Tor (si Tor está disponible)
+    """
     if not TOR_AVAILABLE:
         return None
     
     try:
-        with Controller.from_port(port=9051) as controller:
-            controller.authenticate()
-            return controller.get_info("onion")
+        servicios = servicios or (GestorServiciosOnion(gestor) if gestor else servicios_por_defecto())
+        if port is not None:
+            return servicios.servicios().get(port)
+        publicados = servicios.gestor.ejecutar(
+            lambda controller: controller.list_ephemeral_hidden_services(default=[], our_services=True, detached=True))
+        return f"{publicados[0]}.onion" if publicados else None
     except Exception as e:
         print(f"⚠️  No se pudo obtener dirección Onion: {e}")
         return None
 
-def generar_direccion_onion(port=DEFAULT_PORT):
-    """Genera una nueva dirección Onion (requiere Tor configurado)"""
+def generar_direccion_onion(port=DEFAULT_PORT, gestor=None, servicios=None):
+    """
+    Devuelve la dirección Onion del servicio del puerto, creándolo si no
+    existe (requiere Tor configurado). Llamadas repetidas reutilizan el mismo
+    servicio y su clave persistida.
+    """
     if not TOR_AVAILABLE:
         print("❌ Tor no está disponible. Instala: pip install stem")
         return None
     
     try:
-        with Controller.from_port(port=9051) as controller:
-            controller.authenticate()
-            
-            # Crear servicio Onion
-            service = controller.create_onion_service(
-                ports=[(port, port)],
-                detached=True
-            )
-            
-            print(f"🌐 Nueva dirección Onion generada: {service.service_id}.onion")
-            return service.service_id
+        servicios = servicios or (GestorServiciosOnion(gestor) if gestor else servicios_por_defecto())
+        service_id = servicios.servicio(port)
+        print(f"🌐 Dirección Onion del puerto {port}: {service_id}.onion")
+        return service_id
     except Exception as e:
         print(f"❌ Error generando dirección Onion: {e}")
         return None
 
-def verificar_tor():
+def verificar_tor(gestor=None):
     """Verifica si Tor está disponible y funcionando"""
     if not TOR_AVAILABLE:
         return False, "Tor no está disponible. Instala: pip install stem"
     
     try:
-        with Controller.from_port(port=9051) as controller:
-            controller.authenticate()
-            version = controller.get_version()
-            return True, f"Tor disponible: {version}"
+        version = (gestor or gestor_por_defecto()).ejecutar(lambda controller: controller.get_version())
+        return True, f"Tor disponible: {version}"
     except Exception as e:
         return False, f"Tor no está funcionando: {e}"
 
@@ -198,24 +813,47 @@ def send_data_p2p(ip, port, data):
     s.sendall(data)
     s.close()
 
-def receive_data_p2p(port, buffer_size=4096):
+def receive_data_p2p(port, buffer_size=4096, timeout=None, max_bytes=MAX_RECEPCION_MEMORIA,
+                     ruta_salida=None, spool=None):
     """
     Recibe datos de un peer escuchando en un puerto TCP.
-    Devuelve los datos recibidos.
+    Devuelve los datos recibidos (como máximo max_bytes en memoria).
+    Si se indica ruta_salida, los datos se escriben por bloques en el spool
+    (con sus cuotas) en lugar de acumularse en RAM y se devuelve el número de bytes.
     """
     s = socket.socket()
-    s.bind(("0.0.0.0", port))
-    s.listen(1)
-    conn, addr = s.accept()
-    data = b""
-    while True:
-        chunk = conn.recv(buffer_size)
-        if not chunk:
-            break
-        data += chunk
-    conn.close()
-    s.close()
-    return data
+    s.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        s.bind(("0.0.0.0", port))
+        s.listen(1)
+        s.settimeout(timeout)
+        conn, addr = s.accept()
+        try:
+            conn.settimeout(timeout)
+            if ruta_salida:
+                total = 0
+                with (spool or ReceptorSpool()).abrir(ruta_salida, addr[0]) as f:
+                    while True:
+                        chunk = conn.recv(buffer_size)
+                        if not chunk:
+                            break
+                        f.write(chunk)
+                        total += len(chunk)
+                    f.confirmar()
+                return total
+            data = bytearray()
+            while True:
+                chunk = conn.recv(buffer_size)
+                if not chunk:
+                    break
+                if max_bytes is not None and len(data) + len(chunk) > max_bytes:
+                    raise CuotaExcedida(f"Se superó el máximo de {max_bytes} bytes en memoria")
+                data += chunk
+            return bytes(data)
+        finally:
+            conn.close()
+    finally:
+        s.close()
 
 if __name__ == "__main__":
     from titansend.cli import main
@@ -3,21 +3,71 @@ Generación optimizada de códigos QR para TitanSend
 - Compresión de datos antes de generar QR
 - Fragmentación automática para archivos grandes
 - Parámetros optimizados para máxima capacidad
+- Lectura real de QR (pyzbar u OpenCV) desde imágenes, directorios de
+  frames o vídeo, en paralelo y con reensamblado incremental
+- Modo fuente (códigos LT): secuencia de frames, GIF animado o vídeo que se
+  reconstruye con cualquier subconjunto suficiente de frames
+- Paridad Reed-Solomon: k fragmentos de datos + m de paridad; se puede
+  perder cualquier m de ellos
+- Perfiles de escáner (pantalla, impreso, webcam): versión, corrección y
+  tamaño de fragmento elegidos para minimizar el tiempo de captura
 """
 import os
+import time
 import zlib
 import json
+import shutil
+import struct
+import tempfile
+import itertools
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import qrcode
 from qrcode.constants import ERROR_CORRECT_L
 from colorama import Fore, Style
 
+try:
+    from .codigo_lt import CodificadorLT, DecodificadorLT, desempaquetar_simbolo, CABECERA_SIMBOLO, MAGIA_LT
+    from . import reed_solomon
+    from . import optimizador_qr
+except ImportError:
+    from codigo_lt import CodificadorLT, DecodificadorLT, desempaquetar_simbolo, CABECERA_SIMBOLO, MAGIA_LT
+    import reed_solomon
+    import optimizador_qr
+
+try:
+    from PIL import Image, ImageSequence
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+# Decodificadores opcionales: pyzbar (necesita la librería zbar del sistema) y OpenCV como alternativa
+try:
+    from pyzbar import pyzbar
+    PYZBAR_AVAILABLE = PIL_AVAILABLE
+except ImportError:
+    PYZBAR_AVAILABLE = False
+
+try:
+    import cv2
+    import numpy as np
+    CV2_AVAILABLE = True
+except ImportError:
+    CV2_AVAILABLE = False
+
+EXTENSIONES_IMAGEN = ('.png', '.jpg', '.jpeg', '.bmp', '.gif', '.tif', '.tiff', '.webp')
+REDUNDANCIA_FUENTE = 2.0  # Símbolos LT generados por cada bloque de datos en el modo fuente
+DURACION_FRAME_MS = 250   # Tiempo en pantalla de cada frame del GIF o vídeo
+EXTENSIONES_VIDEO = ('.mp4', '.avi', '.mkv', '.mov', '.webm')
+MODULOS_MIN_OPENCV = 6  # Píxeles por módulo que necesita OpenCV para localizar un QR denso
+
 # Configuración optimizada para máxima capacidad
 QR_CONFIG = {
     'version': 40,  # Máximo tamaño (177x177 módulos)
     'error_correction': ERROR_CORRECT_L,  # 7% de corrección de errores (máxima capacidad)
     'box_size': 2,  # Tamaño de cada módulo
     'border': 1,  # Borde mínimo
-    'max_data_bytes': 2956  # Capacidad máxima en bytes para QR v40 con L
+    'max_data_bytes': 2953  # Capacidad máxima en bytes para QR v40 con L (2956 codewords menos la cabecera del modo byte)
 }
 
 def comprimir_datos(datos):
@@ -28,180 +78,616 @@ def descomprimir_datos(datos_comprimidos):
     """Descomprime datos usando zlib"""
     return zlib.decompress(datos_comprimidos)
 
-def calcular_fragmentos(datos, max_bytes=QR_CONFIG['max_data_bytes']):
-    """Calcula cuántos fragmentos QR se necesitan"""
-    datos_comprimidos = comprimir_datos(datos)
-    return (len(datos_comprimidos) + max_bytes - 1) // max_bytes
+# Cabecera binaria de cada fragmento de un envío múltiple (13 bytes, big-endian):
+#   magia u8 | fragmento u16 (desde 1) | total u16 | id u32 | crc32 u32
+# El id de transferencia es el CRC32 de todos los datos comprimidos: identifica
+# el envío y verifica el resultado; el crc32 es el de los datos del fragmento.
+# La magia no coincide con el primer byte de un flujo zlib (0x78, QR único) ni
+# con '{' (fragmentos antiguos con metadatos JSON).
+CABECERA_FRAGMENTO = struct.Struct('>BHHII')
+MAGIA_FRAGMENTO = 0xA5
+MAX_FRAGMENTOS = 0xFFFF
 
-def generar_qr_optimizado(datos, ruta_salida, fragmento_num=1, total_fragmentos=1):
-    """Genera un código QR optimizado con metadatos de fragmentación"""
-    datos_comprimidos = comprimir_datos(datos)
-    
-    # Si es un solo fragmento
-    if total_fragmentos == 1:
-        qr_data = datos_comprimidos
-    else:
-        # Dividir en fragmentos y añadir metadatos
-        max_bytes = QR_CONFIG['max_data_bytes'] - 50  # Reservar espacio para metadatos
-        start_idx = (fragmento_num - 1) * max_bytes
-        end_idx = min(start_idx + max_bytes, len(datos_comprimidos))
-        fragmento_data = datos_comprimidos[start_idx:end_idx]
-        
-        # Metadatos del fragmento
-        metadata = {
-            'fragmento': fragmento_num,
-            'total': total_fragmentos,
-            'tamaño_original': len(datos),
-            'tamaño_comprimido': len(datos_comprimidos),
-            'checksum': zlib.crc32(datos_comprimidos) & 0xffffffff
+
+def capacidad_fragmento(max_bytes=QR_CONFIG['max_data_bytes']):
+    """Bytes de datos comprimidos que caben en cada fragmento de un envío múltiple"""
+    return max_bytes - CABECERA_FRAGMENTO.size
+
+def calcular_fragmentos(datos, max_bytes=QR_CONFIG['max_data_bytes'], comprimidos=None):
+    """Calcula cuántos fragmentos QR se necesitan (con `comprimidos` no se vuelve a comprimir)"""
+    datos_comprimidos = comprimidos if comprimidos is not None else comprimir_datos(datos)
+    if len(datos_comprimidos) <= max_bytes:
+        return 1
+    capacidad = capacidad_fragmento(max_bytes)
+    return (len(datos_comprimidos) + capacidad - 1) // capacidad
+
+def empaquetar_fragmento(fragmento, total, id_transferencia, datos):
+    """Cabecera binaria + datos de un fragmento"""
+    return CABECERA_FRAGMENTO.pack(MAGIA_FRAGMENTO, fragmento, total, id_transferencia,
+                                   zlib.crc32(datos) & 0xffffffff) + datos
+
+def desempaquetar_contenido(contenido):
+    """
+    Interpreta el contenido de un QR. Devuelve {'tipo': 'fragmento',
+    'metadata': {fragmento, total, id, crc32}, 'datos'}, {'tipo': 'lt',
+    'metadata': {id, longitud, bloque, semilla}, 'datos'}, {'tipo': 'rs',
+    'metadata': {indice, k, m, id, longitud}, 'datos'} o {'tipo': 'completo',
+    'datos'}. Acepta también fragmentos antiguos con metadatos JSON + b'|'.
+    Lanza ValueError si el fragmento está dañado.
+    """
+    if contenido[:1] == bytes([reed_solomon.MAGIA_RS]) and len(contenido) >= reed_solomon.CABECERA_PARTE.size:
+        metadata = reed_solomon.desempaquetar_parte(contenido)
+        return {'tipo': 'rs', 'metadata': metadata, 'datos': metadata.pop('datos')}
+    if contenido[:1] == bytes([MAGIA_LT]) and len(contenido) >= CABECERA_SIMBOLO.size:
+        metadata = desempaquetar_simbolo(contenido)
+        return {'tipo': 'lt', 'metadata': metadata, 'datos': metadata.pop('datos')}
+    if len(contenido) >= CABECERA_FRAGMENTO.size and contenido[0] == MAGIA_FRAGMENTO:
+        _, fragmento, total, id_transferencia, crc = CABECERA_FRAGMENTO.unpack_from(contenido)
+        datos = contenido[CABECERA_FRAGMENTO.size:]
+        if not 1 <= fragmento <= total:
+            raise ValueError(f"Cabecera de fragmento inválida: {fragmento}/{total}")
+        if zlib.crc32(datos) & 0xffffffff != crc:
+            raise ValueError(f"Fragmento {fragmento}/{total} dañado: CRC32 no coincide")
+        return {
+            'tipo': 'fragmento',
+            'metadata': {'fragmento': fragmento, 'total': total, 'id': id_transferencia, 'crc32': crc},
+            'datos': datos
         }
-        
-        # Codificar metadatos + datos
-        qr_data = json.dumps(metadata).encode() + b'|' + fragmento_data
-    
-    # Generar QR optimizado
+    if contenido[:1] == b'{' and b'|' in contenido:
+        # Formato anterior: JSON con el checksum de todo el envío, sin CRC por fragmento
+        metadata_str, datos = contenido.split(b'|', 1)
+        metadata = json.loads(metadata_str.decode())
+        metadata['id'] = metadata['checksum']
+        return {'tipo': 'fragmento', 'metadata': metadata, 'datos': datos}
+    return {'tipo': 'completo', 'datos': contenido}
+
+def preparar_fragmentos(datos, max_bytes=QR_CONFIG['max_data_bytes'], comprimidos=None, paridad=0):
+    """
+    Comprime los datos una sola vez (o usa `comprimidos`) y devuelve el
+    contenido de cada QR: los datos comprimidos si caben en uno, o
+    cabecera binaria + fragmento si no. Con paridad=m se añaden m
+    fragmentos Reed-Solomon (por cada grupo de hasta 256 - m) y se puede
+    perder cualquier m de ellos.
+    """
+    datos_comprimidos = comprimidos if comprimidos is not None else comprimir_datos(datos)
+    if paridad:
+        capacidad = max_bytes - reed_solomon.CABECERA_PARTE.size
+        return reed_solomon.dividir(datos_comprimidos, max(1, -(-len(datos_comprimidos) // capacidad)), paridad)
+    total = calcular_fragmentos(datos, max_bytes, datos_comprimidos)
+    if total == 1:
+        return [datos_comprimidos]
+    if total > MAX_FRAGMENTOS:
+        raise ValueError(f"Los datos necesitan {total} fragmentos; el máximo es {MAX_FRAGMENTOS}")
+    capacidad = capacidad_fragmento(max_bytes)
+    id_transferencia = zlib.crc32(datos_comprimidos) & 0xffffffff
+    return [empaquetar_fragmento(i + 1, total, id_transferencia, datos_comprimidos[i * capacidad:(i + 1) * capacidad])
+            for i in range(total)]
+
+def nombre_fragmento(ruta_salida, fragmento_num, total_fragmentos):
+    """Nombre del archivo de imagen de un fragmento"""
+    if total_fragmentos == 1:
+        return ruta_salida
+    base, ext = os.path.splitext(ruta_salida)
+    return f"{base}_parte_{fragmento_num:02d}_de_{total_fragmentos:02d}{ext}"
+
+def configuracion_qr(tamano, perfil=None, cabecera=CABECERA_FRAGMENTO.size, paridad=0, fragmentado=False):
+    """
+    Configuración de QR (mismas claves que QR_CONFIG) para `tamano` bytes
+    comprimidos. Sin perfil, QR_CONFIG; con un perfil de escáner
+    ('pantalla', 'impreso', 'webcam'), la que optimizador_qr estima más
+    rápida de capturar.
+    """
+    if perfil is None:
+        return dict(QR_CONFIG)
+    opcion = optimizador_qr.optimizar(tamano, perfil, cabecera=cabecera, paridad=paridad, fragmentado=fragmentado)
+    if opcion is None:
+        return dict(QR_CONFIG)
+    print(f"📐 Perfil {perfil}: QR versión {opcion['version']} ({optimizador_qr.modulos(opcion['version'])} módulos), "
+          f"corrección {opcion['nivel']}, {opcion['max_data_bytes']} bytes por QR, ~{opcion['segundos']:.0f} s de captura")
+    return {
+        'version': opcion['version'],
+        'error_correction': opcion['error_correction'],
+        'box_size': opcion['box_size'],
+        'border': QR_CONFIG['border'],
+        'max_data_bytes': opcion['max_data_bytes'],
+    }
+
+def renderizar_qr(contenido, filename, config=QR_CONFIG):
+    """Dibuja y guarda un QR con la configuración indicada (función de módulo: se ejecuta en el pool de procesos)"""
     qr = qrcode.QRCode(
-        version=QR_CONFIG['version'],
-        error_correction=QR_CONFIG['error_correction'],
-        box_size=QR_CONFIG['box_size'],
-        border=QR_CONFIG['border']
+        version=config['version'],
+        error_correction=config['error_correction'],
+        box_size=config['box_size'],
+        border=config['border']
     )
-    qr.add_data(qr_data)
-    qr.make(fit=True)
-    
-    # Crear imagen
+    qr.add_data(contenido)
+    # Versión fija: si el contenido no cabe, DataOverflowError en vez de pasar a otra versión
+    qr.make(fit=False)
     img = qr.make_image(fill_color="black", back_color="white")
-    
-    # Guardar con nombre descriptivo
-    if total_fragmentos == 1:
-        filename = ruta_salida
-    else:
-        base, ext = os.path.splitext(ruta_salida)
-        filename = f"{base}_parte_{fragmento_num:02d}_de_{total_fragmentos:02d}{ext}"
-    
     img.save(filename)
     return filename
 
-def generar_qr_multiple(datos, ruta_base):
-    """Genera múltiples códigos QR para archivos grandes"""
-    total_fragmentos = calcular_fragmentos(datos)
+def generar_qr_optimizado(datos, ruta_salida, fragmento_num=1, total_fragmentos=1, contenidos=None,
+                          config=QR_CONFIG):
+    """
+    Genera un código QR optimizado con metadatos de fragmentación.
+    `contenidos` son los de preparar_fragmentos(datos, config['max_data_bytes']):
+    al generar varios fragmentos sueltos se preparan una vez y se pasan en
+    cada llamada; sin ellos, cada llamada vuelve a comprimir los datos.
+    Para generar todos los fragmentos de un archivo usa generar_qr_multiple.
+    """
+    if contenidos is None:
+        contenidos = preparar_fragmentos(datos, config['max_data_bytes'])
+    if len(contenidos) != total_fragmentos:
+        raise ValueError(f"Los datos ocupan {len(contenidos)} fragmentos, no {total_fragmentos}")
+    return renderizar_qr(contenidos[fragmento_num - 1], nombre_fragmento(ruta_salida, fragmento_num, total_fragmentos),
+                         config)
+
+def generar_qr_multiple(datos, ruta_base, procesos=None, paridad=0, perfil=None):
+    """
+    Genera múltiples códigos QR para archivos grandes. Los datos se
+    comprimen y fragmentan una vez; las imágenes se dibujan en paralelo en
+    un pool de `procesos` procesos (por defecto, uno por núcleo; 1 = en serie).
+    Con paridad=m se añaden m QR de paridad Reed-Solomon. Con `perfil` se
+    eligen versión, corrección y tamaño de fragmento para ese escáner.
+    """
+    datos_comprimidos = comprimir_datos(datos)
+    cabecera = reed_solomon.CABECERA_PARTE.size if paridad else CABECERA_FRAGMENTO.size
+    config = configuracion_qr(len(datos_comprimidos), perfil, cabecera=cabecera, paridad=paridad)
+    contenidos = preparar_fragmentos(datos, config['max_data_bytes'], comprimidos=datos_comprimidos, paridad=paridad)
+    total_fragmentos = len(contenidos)
+    tamano_comprimido = len(datos_comprimidos)
+    nombres = [nombre_fragmento(ruta_base, i, total_fragmentos) for i in range(1, total_fragmentos + 1)]
     
     if total_fragmentos == 1:
         # Archivo pequeño, un solo QR
-        filename = generar_qr_optimizado(datos, ruta_base, 1, 1)
+        filename = renderizar_qr(contenidos[0], nombres[0], config)
         print(f"✅ Código QR generado: {filename}")
         print(f"📊 Tamaño original: {len(datos)} bytes")
-        print(f"📊 Tamaño comprimido: {len(comprimir_datos(datos))} bytes")
+        print(f"📊 Tamaño comprimido: {tamano_comprimido} bytes")
         return [filename]
+    
+    # Archivo grande, múltiples QR
+    print(f"📦 Archivo grande detectado. Generando {total_fragmentos} códigos QR...")
+    procesos = min(procesos or os.cpu_count() or 1, total_fragmentos)
+    if procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            generados = pool.map(renderizar_qr, contenidos, nombres, itertools.repeat(config),
+                                 chunksize=max(1, total_fragmentos // (procesos * 4)))
+            archivos_generados = []
+            for i, filename in enumerate(generados, 1):
+                archivos_generados.append(filename)
+                print(f"✅ QR {i}/{total_fragmentos}: {filename}")
     else:
-        # Archivo grande, múltiples QR
-        print(f"📦 Archivo grande detectado. Generando {total_fragmentos} códigos QR...")
         archivos_generados = []
-        
-        for i in range(1, total_fragmentos + 1):
-            filename = generar_qr_optimizado(datos, ruta_base, i, total_fragmentos)
-            archivos_generados.append(filename)
+        for i, (contenido, filename) in enumerate(zip(contenidos, nombres), 1):
+            archivos_generados.append(renderizar_qr(contenido, filename, config))
             print(f"✅ QR {i}/{total_fragmentos}: {filename}")
-        
-        print(f"📊 Tamaño original: {len(datos)} bytes")
-        print(f"📊 Tamaño comprimido: {len(comprimir_datos(datos))} bytes")
-        print(f"📊 Fragmentos generados: {total_fragmentos}")
-        return archivos_generados
+    
+    print(f"📊 Tamaño original: {len(datos)} bytes")
+    print(f"📊 Tamaño comprimido: {tamano_comprimido} bytes")
+    print(f"📊 Fragmentos generados: {total_fragmentos}")
+    if paridad:
+        print(f"📊 Paridad: se puede perder cualquier {paridad} de ellos (por cada grupo de hasta {256 - paridad})")
+    return archivos_generados
+
+def preparar_simbolos(datos, max_bytes=QR_CONFIG['max_data_bytes'], redundancia=REDUNDANCIA_FUENTE,
+                      cantidad=None, inicio=0, comprimidos=None):
+    """
+    Comprime los datos (salvo que se pasen ya comprimidos) y devuelve
+    `cantidad` símbolos LT (por defecto redundancia × bloques) listos para
+    meter cada uno en un QR.
+    """
+    datos_comprimidos = comprimidos if comprimidos is not None else comprimir_datos(datos)
+    codificador = CodificadorLT(datos_comprimidos, max_bytes - CABECERA_SIMBOLO.size)
+    if cantidad is None:
+        cantidad = max(codificador.k + 2, int(codificador.k * redundancia + 0.5))
+    return list(codificador.flujo(inicio=inicio, cantidad=cantidad))
+
+def _unir_frames(imagenes, ruta_salida, duracion_ms, config=QR_CONFIG):
+    """Une los PNG de los frames (dibujados con `config`) en un GIF animado en bucle o en un vídeo (OpenCV)"""
+    if ruta_salida.lower().endswith('.gif'):
+        frames = [Image.open(imagen).convert('1') for imagen in imagenes]
+        frames[0].save(ruta_salida, save_all=True, append_images=frames[1:], duration=duracion_ms, loop=0)
+        return
+    primero = cv2.imread(imagenes[0])
+    # Módulos de varios píxeles: la compresión del vídeo no emborrona los bordes
+    lado = optimizador_qr.modulos(config['version']) + 2 * config['border']
+    factor = max(1, -(-MODULOS_MIN_OPENCV * lado // primero.shape[0]))
+    alto, ancho = primero.shape[0] * factor, primero.shape[1] * factor
+    codec = cv2.VideoWriter_fourcc(*('mp4v' if ruta_salida.lower().endswith('.mp4') else 'MJPG'))
+    video = cv2.VideoWriter(ruta_salida, codec, 1000.0 / duracion_ms, (ancho, alto))
+    try:
+        for imagen in imagenes:
+            video.write(cv2.resize(cv2.imread(imagen), (ancho, alto), interpolation=cv2.INTER_NEAREST))
+    finally:
+        video.release()
+
+def generar_qr_fuente(datos, ruta_salida, redundancia=REDUNDANCIA_FUENTE, cantidad=None, procesos=None,
+                      duracion_ms=DURACION_FRAME_MS, perfil=None):
+    """
+    Modo fuente: genera una secuencia de QR con símbolos LT. El receptor
+    reconstruye el archivo con cualquier subconjunto de frames algo mayor que
+    el número de bloques, sin importar cuáles se perdieron.
+    La secuencia es finita: `cantidad` símbolos o, por defecto, `redundancia`
+    por bloque; el GIF repite esos mismos frames en bucle.
+    Con ruta .gif se genera un GIF animado en bucle; con .mp4/.avi, un vídeo
+    (requiere OpenCV); con cualquier otra, un PNG por frame. Con `perfil`
+    se eligen versión, corrección y tamaño de símbolo para ese escáner.
+    Devuelve la lista de archivos generados.
+    """
+    datos_comprimidos = comprimir_datos(datos)
+    config = configuracion_qr(len(datos_comprimidos), perfil, cabecera=CABECERA_SIMBOLO.size, fragmentado=True)
+    contenidos = preparar_simbolos(datos, config['max_data_bytes'], redundancia=redundancia, cantidad=cantidad,
+                                   comprimidos=datos_comprimidos)
+    cabecera = desempaquetar_simbolo(contenidos[0])
+    bloques = max(1, -(-cabecera['longitud'] // cabecera['bloque']))
+    extension = os.path.splitext(ruta_salida)[1].lower()
+    animado = extension == '.gif' or extension in EXTENSIONES_VIDEO
+    if extension in EXTENSIONES_VIDEO and not CV2_AVAILABLE:
+        print("❌ Generar vídeo requiere opencv-python. Usa una ruta .gif o .png")
+        return []
+    directorio = tempfile.mkdtemp() if animado else None
+    base = os.path.join(directorio, 'frame.png') if animado else ruta_salida
+    nombres = [nombre_simbolo(base, i) for i in range(1, len(contenidos) + 1)]
+
+    print(f"🌊 Modo fuente: {len(contenidos)} frames para {bloques} bloques (se reconstruye con ~{bloques})")
+    procesos = min(procesos or os.cpu_count() or 1, len(contenidos))
+    try:
+        if procesos > 1:
+            with ProcessPoolExecutor(max_workers=procesos) as pool:
+                list(pool.map(renderizar_qr, contenidos, nombres, itertools.repeat(config),
+                              chunksize=max(1, len(contenidos) // (procesos * 4))))
+        else:
+            for contenido, nombre in zip(contenidos, nombres):
+                renderizar_qr(contenido, nombre, config)
+        if not animado:
+            print(f"✅ {len(nombres)} frames generados: {nombres[0]} ... {nombres[-1]}")
+            return nombres
+        _unir_frames(nombres, ruta_salida, duracion_ms, config)
+        print(f"✅ {'GIF animado' if extension == '.gif' else 'Vídeo'} generado: {ruta_salida} "
+              f"({len(nombres)} frames, {duracion_ms} ms por frame)")
+        return [ruta_salida]
+    finally:
+        if directorio:
+            shutil.rmtree(directorio, ignore_errors=True)
+
+def nombre_simbolo(ruta_salida, numero):
+    """Nombre del archivo de imagen de un frame del modo fuente"""
+    base, ext = os.path.splitext(ruta_salida)
+    return f"{base}_lt_{numero:05d}{ext or '.png'}"
+
+def _candidatos_bytes(dato):
+    """
+    zbar y OpenCV entregan los QR binarios convertidos a texto (ISO-8859-1 o
+    Shift-JIS a UTF-8); se prueban los bytes tal cual y deshaciendo esa conversión.
+    """
+    if isinstance(dato, str):
+        texto, originales = dato, [dato.encode('utf-8')]
+    else:
+        originales = [dato]
+        try:
+            texto = dato.decode('utf-8')
+        except UnicodeDecodeError:
+            return originales
+    candidatos = []
+    for codificacion in ('latin-1', 'shift_jis'):
+        try:
+            candidatos.append(texto.encode(codificacion))
+        except UnicodeEncodeError:
+            pass
+    return candidatos + originales
+
+def contenido_valido(contenido):
+    """True si el contenido es un fragmento o símbolo íntegro o el inicio de un flujo zlib válido"""
+    try:
+        if desempaquetar_contenido(contenido)['tipo'] != 'completo':
+            return True
+        zlib.decompressobj().decompress(contenido, 64)
+        return True
+    except (ValueError, KeyError, zlib.error):
+        return False
+
+def _decodificar_crudo(imagen):
+    """Lista de datos (bytes o str) de los QR de una imagen (ruta, imagen de PIL o array de OpenCV)"""
+    if PYZBAR_AVAILABLE:
+        if isinstance(imagen, str):
+            imagen = Image.open(imagen)
+        elif CV2_AVAILABLE and getattr(imagen, 'ndim', 2) == 3:
+            imagen = cv2.cvtColor(imagen, cv2.COLOR_BGR2GRAY)
+        return [s.data for s in pyzbar.decode(imagen, symbols=[pyzbar.ZBarSymbol.QRCODE])]
+    if CV2_AVAILABLE:
+        if isinstance(imagen, str):
+            imagen = cv2.imread(imagen)
+            if imagen is None:
+                raise ValueError("Imagen ilegible")
+        elif PIL_AVAILABLE and isinstance(imagen, Image.Image):
+            imagen = np.asarray(imagen.convert('L'))
+        # OpenCV no localiza módulos de 2 píxeles: se amplía sin interpolar
+        factor = -(-MODULOS_MIN_OPENCV * 177 // min(imagen.shape[:2]))
+        if factor > 1:
+            imagen = cv2.resize(imagen, None, fx=factor, fy=factor, interpolation=cv2.INTER_NEAREST)
+        detectores = [cv2.QRCodeDetector()]
+        if hasattr(cv2, 'QRCodeDetectorAruco'):
+            # Localiza códigos densos en los que el detector clásico falla
+            detectores.append(cv2.QRCodeDetectorAruco())
+        for detector in detectores:
+            if hasattr(detector, 'detectAndDecodeBytesMulti'):
+                # La variante de texto corta los datos binarios en el primer byte nulo
+                ok, datos, _, _ = detector.detectAndDecodeBytesMulti(imagen)
+            else:
+                ok, datos, _, _ = detector.detectAndDecodeMulti(imagen)
+            datos = [d for d in datos if d] if ok else []
+            if datos:
+                return datos
+        return []
+    raise RuntimeError("No hay decodificador QR. Instala pyzbar (y la librería zbar) u opencv-python")
+
+def decodificar_imagen(imagen, validar=True):
+    """
+    Decodifica los QR de una imagen (ruta o frame) y devuelve el contenido
+    binario de los que son válidos. Con validar=False devuelve los datos de
+    cualquier QR (sin formato de TitanSend). Función de módulo: se ejecuta en el pool.
+    """
+    contenidos = []
+    for dato in _decodificar_crudo(imagen):
+        candidatos = _candidatos_bytes(dato)
+        if not validar:
+            contenidos.append(candidatos[0])
+            continue
+        for candidato in candidatos:
+            if contenido_valido(candidato):
+                contenidos.append(candidato)
+                break
+    return contenidos
+
+def _decodificar_frame(decodificador, frame):
+    try:
+        return decodificador(frame)
+    except RuntimeError:
+        raise
+    except Exception as e:
+        print(f"⚠️  Frame ilegible ({frame if isinstance(frame, str) else 'vídeo'}): {e}")
+        return []
+
+def iterar_frames(origen):
+    """
+    Frames a decodificar: una imagen, las imágenes de un directorio (volcado
+    de frames, en orden), los frames de un GIF animado o, con OpenCV, los de
+    un vídeo. Admite una ruta o una lista de rutas.
+    """
+    if not isinstance(origen, str):
+        for ruta in origen:
+            yield from iterar_frames(ruta)
+        return
+    if os.path.isdir(origen):
+        for nombre in sorted(os.listdir(origen)):
+            if nombre.lower().endswith(EXTENSIONES_IMAGEN):
+                yield from iterar_frames(os.path.join(origen, nombre))
+    elif origen.lower().endswith('.gif') and PIL_AVAILABLE:
+        with Image.open(origen) as gif:
+            for frame in ImageSequence.Iterator(gif):
+                yield frame.convert('L')
+    elif origen.lower().endswith(EXTENSIONES_VIDEO):
+        if not CV2_AVAILABLE:
+            raise RuntimeError("Leer vídeo requiere opencv-python")
+        captura = cv2.VideoCapture(origen)
+        try:
+            while True:
+                ok, frame = captura.read()
+                if not ok:
+                    break
+                yield frame
+        finally:
+            captura.release()
+    else:
+        yield origen
+
+class Reensamblador:
+    """
+    Reensamblado incremental: recibe contenidos de QR en cualquier orden,
+    descarta duplicados y fragmentos de otros envíos y sabe cuándo está completo.
+    Los símbolos del modo fuente se entregan a un DecodificadorLT.
+    """
+
+    def __init__(self):
+        self.fragmentos = {}
+        self.metadata = None
+        self.completo_unico = None  # Datos comprimidos de un envío de un solo QR
+        self.lt = None              # Decodificador del modo fuente
+        self.rs = None              # Reensamblador de fragmentos con paridad
+        self.duplicados = 0
+
+    def agregar(self, contenido):
+        """Añade un contenido de QR. Devuelve True si aporta un fragmento o símbolo nuevo."""
+        resultado = desempaquetar_contenido(contenido)
+        if resultado['tipo'] == 'lt':
+            if self.metadata is not None or self.completo_unico is not None:
+                return False
+            self.lt = self.lt or DecodificadorLT()
+            nuevo = self.lt.agregar(contenido)
+            if not nuevo and self.lt.id == resultado['metadata']['id']:
+                self.duplicados += 1
+            return nuevo
+        if resultado['tipo'] == 'rs':
+            if self.metadata is not None or self.completo_unico is not None or self.lt is not None:
+                return False
+            self.rs = self.rs or reed_solomon.ReensambladorRS()
+            nuevo = self.rs.agregar(contenido)
+            if not nuevo and self.rs.cabecera[2] == resultado['metadata']['id']:
+                self.duplicados += 1
+            return nuevo
+        if self.lt is not None or self.rs is not None:
+            return False
+        if resultado['tipo'] == 'completo':
+            if self.completo_unico is not None or self.metadata is not None:
+                self.duplicados += 1
+                return False
+            self.completo_unico = resultado['datos']
+            return True
+        metadata = resultado['metadata']
+        if self.metadata and metadata['id'] != self.metadata['id']:
+            return False
+        self.metadata = self.metadata or metadata
+        if metadata['fragmento'] in self.fragmentos:
+            self.duplicados += 1
+            return False
+        self.fragmentos[metadata['fragmento']] = resultado['datos']
+        return True
+
+    @property
+    def completo(self):
+        if self.completo_unico is not None:
+            return True
+        if self.lt is not None:
+            return self.lt.completo
+        if self.rs is not None:
+            return self.rs.completo
+        return self.metadata is not None and len(self.fragmentos) == self.metadata['total']
+
+    @property
+    def recibidos(self):
+        """Fragmentos o símbolos distintos recibidos"""
+        if self.lt is not None:
+            return self.lt.recibidos
+        if self.rs is not None:
+            return len(self.rs.fragmentos)
+        return len(self.fragmentos) or int(self.completo_unico is not None)
+
+    def faltantes(self):
+        """Números de fragmento que faltan (None si aún no se sabe, en modo fuente o con paridad)"""
+        if self.completo_unico is not None:
+            return set()
+        if self.metadata is None:
+            return None
+        return set(range(1, self.metadata['total'] + 1)) - set(self.fragmentos)
+
+    def resultado(self):
+        """Datos originales. Lanza ValueError si faltan fragmentos o no cuadra el checksum."""
+        if self.completo_unico is not None:
+            return descomprimir_datos(self.completo_unico)
+        if self.lt is not None:
+            return descomprimir_datos(self.lt.resultado())
+        if self.rs is not None:
+            return descomprimir_datos(self.rs.resultado())
+        if not self.completo:
+            raise ValueError(f"Fragmentos faltantes: {self.faltantes()}")
+        datos_comprimidos = b''.join(self.fragmentos[i] for i in range(1, self.metadata['total'] + 1))
+        # El id de transferencia es el CRC32 de todos los datos comprimidos
+        if zlib.crc32(datos_comprimidos) & 0xffffffff != self.metadata['id']:
+            raise ValueError("Error de integridad: checksum no coincide")
+        return descomprimir_datos(datos_comprimidos)
+
+def decodificar_frames(origen, procesos=None, decodificador=decodificar_imagen, al_progresar=None):
+    """
+    Decodifica en paralelo los frames de `origen` (ver iterar_frames) y los va
+    reensamblando; se detiene en cuanto el envío está completo.
+    Devuelve el Reensamblador y las estadísticas: frames, fragmentos,
+    segundos y fragmentos_por_segundo. al_progresar(reensamblador) se llama
+    con cada fragmento nuevo.
+    """
+    reensamblador = Reensamblador()
+    procesos = procesos or os.cpu_count() or 1
+    frames = 0
+    inicio = time.perf_counter()
+
+    def consumir(contenidos):
+        for contenido in contenidos:
+            if reensamblador.agregar(contenido) and al_progresar:
+                al_progresar(reensamblador)
+
+    if procesos > 1:
+        with ProcessPoolExecutor(max_workers=procesos) as pool:
+            # Como mucho 2 frames por proceso en vuelo: un vídeo no se carga entero en memoria
+            pendientes = deque()
+            for frame in iterar_frames(origen):
+                frames += 1
+                pendientes.append(pool.submit(_decodificar_frame, decodificador, frame))
+                while len(pendientes) >= procesos * 2 or (pendientes and pendientes[0].done()):
+                    consumir(pendientes.popleft().result())
+                if reensamblador.completo:
+                    break
+            for futuro in pendientes:
+                if reensamblador.completo:
+                    futuro.cancel()
+                else:
+                    consumir(futuro.result())
+    else:
+        for frame in iterar_frames(origen):
+            frames += 1
+            consumir(_decodificar_frame(decodificador, frame))
+            if reensamblador.completo:
+                break
+
+    segundos = time.perf_counter() - inicio
+    recibidos = reensamblador.recibidos
+    return reensamblador, {
+        'frames': frames,
+        'fragmentos': recibidos,
+        'duplicados': reensamblador.duplicados,
+        'segundos': segundos,
+        'fragmentos_por_segundo': recibidos / segundos if segundos > 0 else 0.0,
+    }
 
 def leer_qr_optimizado(ruta_qr):
     """Lee un código QR optimizado"""
     try:
-        # Leer imagen QR
-        img = qrcode.make(ruta_qr)
-        qr = qrcode.QRCode()
-        qr.add_data(img)
-        qr.make()
-        
-        # Extraer datos
-        qr_data = qr.get_data()
-        if not qr_data:
+        contenidos = decodificar_imagen(ruta_qr)
+        if not contenidos:
             raise ValueError("No se pudieron extraer datos del QR")
-        
-        # Verificar si es un fragmento
-        if b'|' in qr_data:
-            # Es un fragmento con metadatos
-            metadata_str, fragmento_data = qr_data.split(b'|', 1)
-            metadata = json.loads(metadata_str.decode())
-            return {
-                'tipo': 'fragmento',
-                'metadata': metadata,
-                'datos': fragmento_data
-            }
-        else:
-            # Es un QR completo
-            return {
-                'tipo': 'completo',
-                'datos': qr_data
-            }
+        return desempaquetar_contenido(contenidos[0])
     except Exception as e:
         raise ValueError(f"Error leyendo QR: {e}")
 
-def reconstruir_archivo_multiple_qr(rutas_qr, ruta_salida):
-    """Reconstruye un archivo desde múltiples códigos QR"""
-    fragmentos = {}
-    metadata = None
-    
-    print(f"🔍 Leyendo {len(rutas_qr)} códigos QR...")
-    
-    for ruta in rutas_qr:
-        try:
-            resultado = leer_qr_optimizado(ruta)
-            if resultado['tipo'] == 'fragmento':
-                fragmentos[resultado['metadata']['fragmento']] = resultado['datos']
-                metadata = resultado['metadata']
-            else:
-                # Es un QR completo
-                datos_comprimidos = resultado['datos']
-                datos_originales = descomprimir_datos(datos_comprimidos)
-                with open(ruta_salida, 'wb') as f:
-                    f.write(datos_originales)
-                print(f"✅ Archivo reconstruido: {ruta_salida}")
-                return True
-        except Exception as e:
-            print(f"❌ Error leyendo {ruta}: {e}")
-            return False
-    
-    # Reconstruir desde fragmentos
-    if not fragmentos or not metadata:
-        print("❌ No se pudieron leer los fragmentos correctamente")
-        return False
-    
-    # Verificar que tengamos todos los fragmentos
-    fragmentos_esperados = set(range(1, metadata['total'] + 1))
-    fragmentos_obtenidos = set(fragmentos.keys())
-    
-    if fragmentos_esperados != fragmentos_obtenidos:
-        print(f"❌ Fragmentos faltantes: {fragmentos_esperados - fragmentos_obtenidos}")
+def reconstruir_archivo_multiple_qr(rutas_qr, ruta_salida, procesos=None):
+    """
+    Reconstruye un archivo desde múltiples códigos QR. `rutas_qr` puede
+    incluir imágenes, directorios de imágenes o frames y vídeos.
+    """
+    if isinstance(rutas_qr, str):
+        rutas_qr = [rutas_qr]
+    print(f"🔍 Leyendo códigos QR de {len(rutas_qr)} origen(es)...")
+
+    def progreso(reensamblador):
+        if reensamblador.lt:
+            print(f"✅ Símbolo {reensamblador.lt.recibidos}: {reensamblador.lt.resueltos}/{reensamblador.lt.k} bloques")
+        elif reensamblador.rs:
+            print(f"✅ Fragmento {len(reensamblador.rs.fragmentos)} (faltan al menos {reensamblador.rs.faltan()})")
+        elif reensamblador.metadata:
+            print(f"✅ Fragmento {len(reensamblador.fragmentos)}/{reensamblador.metadata['total']}")
+
+    try:
+        reensamblador, estadisticas = decodificar_frames(rutas_qr, procesos=procesos, al_progresar=progreso)
+    except RuntimeError as e:
+        print(f"❌ {e}")
         return False
-    
-    # Reconstruir datos comprimidos
-    datos_comprimidos = b''
-    for i in range(1, metadata['total'] + 1):
-        datos_comprimidos += fragmentos[i]
-    
-    # Verificar checksum
-    checksum_calculado = zlib.crc32(datos_comprimidos) & 0xffffffff
-    if checksum_calculado != metadata['checksum']:
-        print("❌ Error de integridad: checksum no coincide")
+
+    if not reensamblador.completo:
+        faltantes = reensamblador.faltantes()
+        if reensamblador.lt:
+            print(f"❌ Símbolos insuficientes: {reensamblador.lt.resueltos}/{reensamblador.lt.k} bloques "
+                  f"con {reensamblador.lt.recibidos} símbolos. Captura más frames.")
+        elif reensamblador.rs:
+            print(f"❌ Faltan al menos {reensamblador.rs.faltan()} fragmentos (de datos o de paridad)")
+        elif faltantes is None:
+            print("❌ No se pudieron leer los fragmentos correctamente")
+        else:
+            print(f"❌ Fragmentos faltantes: {sorted(faltantes)}")
         return False
-    
-    # Descomprimir y guardar
+
     try:
-        datos_originales = descomprimir_datos(datos_comprimidos)
-        with open(ruta_salida, 'wb') as f:
-            f.write(datos_originales)
-        print(f"✅ Archivo reconstruido: {ruta_salida}")
-        print(f"📊 Tamaño original: {metadata['tamaño_original']} bytes")
-        print(f"📊 Fragmentos utilizados: {metadata['total']}")
-        return True
-    except Exception as e:
-        print(f"❌ Error descomprimiendo: {e}")
+        datos_originales = reensamblador.resultado()
+    except (ValueError, zlib.error) as e:
+        print(f"❌ {e}")
         return False
+    with open(ruta_salida, 'wb') as f:
+        f.write(datos_originales)
+    print(f"✅ Archivo reconstruido: {ruta_salida}")
+    print(f"📊 Tamaño original: {len(datos_originales)} bytes")
+    print(f"📊 Fragmentos utilizados: {estadisticas['fragmentos']} de {estadisticas['frames']} frames "
+          f"({estadisticas['duplicados']} duplicados)")
+    print(f"📊 Velocidad: {estadisticas['fragmentos_por_segundo']:.1f} fragmentos/s")
+    return True
 
 def generar_qr_simple(datos, ruta_salida):
     """Función simple para compatibilidad con el código existente"""
@@ -222,10 +708,15 @@ if __name__ == "__main__":
     
     gen = subparsers.add_parser('generate', help='Generar QR optimizado')
     gen.add_argument('file', help='Archivo a convertir en QR')
-    gen.add_argument('output', help='Ruta base para los QR generados')
+    gen.add_argument('output', help='Ruta base para los QR generados (.gif o .mp4 en modo fuente)')
+    gen.add_argument('--fuente', action='store_true', help='Modo fuente: frames LT tolerantes a pérdidas')
+    gen.add_argument('--paridad', type=int, default=0, help='QR de paridad Reed-Solomon (se puede perder cualquiera de ese número)')
+    gen.add_argument('--redundancia', type=float, default=REDUNDANCIA_FUENTE, help='Frames por bloque en modo fuente')
+    gen.add_argument('--perfil', choices=sorted(optimizador_qr.PERFILES_ESCANER),
+                     help='Ajustar versión y corrección al escáner (por defecto, QR v40-L)')
     
     read = subparsers.add_parser('read', help='Leer QR y reconstruir archivo')
-    read.add_argument('qr_files', nargs='+', help='Archivos QR a leer')
+    read.add_argument('qr_files', nargs='+', help='Imágenes QR, directorios de frames o vídeos a leer')
     read.add_argument('output', help='Archivo de salida')
     
     args = parser.parse_args()
@@ -233,7 +724,10 @@ if __name__ == "__main__":
     if args.cmd == 'generate':
         with open(args.file, 'rb') as f:
             datos = f.read()
-        generar_qr_multiple(datos, args.output)
+        if args.fuente:
+            generar_qr_fuente(datos, args.output, redundancia=args.redundancia, perfil=args.perfil)
+        else:
+            generar_qr_multiple(datos, args.output, paridad=args.paridad, perfil=args.perfil)
     elif args.cmd == 'read':
         reconstruir_archivo_multiple_qr(args.qr_files, args.output)
     else:
@@ -1,18 +1,104 @@
+import io
+import os
+import json
+import stat
+import time
+import hashlib
+import threading
+import itertools
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
+TOR_PROXY = 'socks5h://127.0.0.1:9050'
+CHUNK_SUBIDA = 4 * 1024 * 1024  # Tamaño de cada trozo de una subida por partes
+# Prefijo por proceso de las credenciales de aislamiento (no comparte circuitos con otros procesos)
+_SESION_AISLAMIENTO = os.urandom(4).hex()
+_aislamientos = itertools.count()
 
-def send_data_tor(url, data, timeout=30):
+
+def _proxies(proxy=TOR_PROXY, aislamiento=None):
+    """
+    Diccionario de proxies para requests. Con `aislamiento`, usa credenciales
+    SOCKS propias: Tor (IsolateSOCKSAuth, activo por defecto) lleva cada par
+    usuario/contraseña por un circuito distinto.
+    """
+    if not proxy:
+        return None
+    if aislamiento is not None:
+        esquema, resto = proxy.split('://', 1)
+        proxy = f"{esquema}://titansend-{_SESION_AISLAMIENTO}-{aislamiento}:x@{resto}"
+    return {'http': proxy, 'https': proxy}
+
+
+class ClienteTor:
+    """
+    Cliente HTTP sobre Tor que reutiliza conexiones (keep-alive) entre
+    peticiones al mismo servicio onion, con pool configurable y reintentos
+    con backoff exponencial ante fallos de conexión y respuestas 502/503/504.
+    Los cuerpos pueden ser bytes, archivos abiertos o generadores: los dos
+    últimos se envían en streaming sin cargarlos en memoria.
+    """
+
+    def __init__(self, proxy=TOR_PROXY, pool=10, reintentos=3, backoff=0.5, timeout=30, aislamiento=None):
+        self.timeout = timeout
+        self.sesion = requests.Session()
+        # Los errores de conexión se reintentan en cualquier método (la petición no llegó a enviarse);
+        # los de lectura y los códigos de estado, solo en métodos idempotentes
+        reintento = Retry(total=reintentos, connect=reintentos, read=reintentos, status=reintentos,
+                          backoff_factor=backoff, status_forcelist=(502, 503, 504),
+                          respect_retry_after_header=True, raise_on_status=False)
+        adaptador = HTTPAdapter(pool_connections=pool, pool_maxsize=pool, max_retries=reintento)
+        self.sesion.mount('http://', adaptador)
+        self.sesion.mount('https://', adaptador)
+        self.sesion.proxies = _proxies(proxy, aislamiento) or {}
+
+    def peticion(self, metodo, url, timeout=None, **kwargs):
+        """Petición genérica con el timeout del cliente por defecto."""
+        return self.sesion.request(metodo, url, timeout=timeout or self.timeout, **kwargs)
+
+    def enviar(self, url, data, headers=None, timeout=None):
+        """POST de `data` (bytes, archivo o iterable de bytes)."""
+        return self.peticion('POST', url, data=data, headers=headers, timeout=timeout)
+
+    def recibir(self, url, headers=None, timeout=None, stream=False):
+        """GET; con stream=True el cuerpo se lee bajo demanda (iter_content)."""
+        return self.peticion('GET', url, headers=headers, timeout=timeout, stream=stream)
+
+    def cerrar(self):
+        self.sesion.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.cerrar()
+
+
+_cliente = None
+_cliente_lock = threading.Lock()
+
+
+def cliente_por_defecto():
+    """Cliente compartido por send_data_tor/receive_data_tor (conexiones reutilizadas)."""
+    global _cliente
+    with _cliente_lock:
+        if _cliente is None:
+            _cliente = ClienteTor(aislamiento=next(_aislamientos))
+        return _cliente
+
+
+def send_data_tor(url, data, timeout=30, headers=None, cliente=None):
     """
     Envía datos a través de la red Tor usando un proxy SOCKS5 local.
     El usuario debe tener el servicio Tor corriendo en 127.0.0.1:9050.
+    `data` puede ser bytes, un archivo abierto o un iterable de bytes.
     Devuelve el contenido de la respuesta o None si hay error.
     """
-    proxies = {
-        'http': 'socks5h://127.0.0.1:9050',
-        'https': 'socks5h://127.0.0.1:9050'
-    }
+    cliente = cliente or cliente_por_defecto()
     try:
-        response = requests.post(url, data=data, proxies=proxies, timeout=timeout)
+        response = cliente.enviar(url, data, headers=headers, timeout=timeout)
         response.raise_for_status()
         print(f"[Tor] Datos enviados correctamente a {url} (status {response.status_code})")
         return response.content
@@ -20,20 +106,387 @@ def send_data_tor(url, data, timeout=30):
         print(f"[Tor] Error enviando datos a {url}: {e}")
         return None
 
-def receive_data_tor(url, timeout=30):
+def receive_data_tor(url, timeout=30, headers=None, return_response_info=False, cliente=None):
     """
     Recibe datos a través de la red Tor usando un proxy SOCKS5 local.
-    Devuelve el contenido de la respuesta o None si hay error.
+    Devuelve el contenido de la respuesta o None si hay error. Con
+    return_response_info=True devuelve (contenido, info) con el código HTTP,
+    el Content-Type y, si falla, el cuerpo de error del servidor.
     """
-    proxies = {
-        'http': 'socks5h://127.0.0.1:9050',
-        'https': 'socks5h://127.0.0.1:9050'
-    }
+    cliente = cliente or cliente_por_defecto()
+    info = {}
+    contenido = None
     try:
-        response = requests.get(url, proxies=proxies, timeout=timeout)
-        response.raise_for_status()
-        print(f"[Tor] Datos recibidos correctamente de {url} (status {response.status_code})")
-        return response.content
+        with cliente.recibir(url, headers=headers, timeout=timeout, stream=True) as response:
+            info = {'status_code': response.status_code, 'content_type': response.headers.get('Content-Type')}
+            if response.status_code >= 400:
+                info['error_content'] = response.text
+            response.raise_for_status()
+            contenido = b''.join(response.iter_content(chunk_size=64 * 1024))
+        print(f"[Tor] Datos recibidos correctamente de {url} (status {info['status_code']})")
     except requests.RequestException as e:
         print(f"[Tor] Error recibiendo datos de {url}: {e}")
-        return None 
\ No newline at end of file
+    return (contenido, info) if return_response_info else contenido
+
+
+BLOQUE_STREAM = 256 * 1024  # Bytes por lectura/escritura en las transferencias en streaming
+
+
+def _avisar(progreso, transferidos, total, verbo):
+    """progreso=True imprime; si es un callable, recibe (bytes transferidos, total o None)."""
+    if callable(progreso):
+        progreso(transferidos, total)
+    elif progreso:
+        print(f"[Tor] {verbo} {transferidos}/{total if total is not None else '?'} bytes...")
+
+
+class _LectorContado:
+    """
+    Envuelve un archivo para usarlo como cuerpo de la petición: cada read()
+    actualiza el hash y el progreso. Con __len__, requests envía
+    Content-Length y http.client lee el archivo por bloques (de al menos
+    `bloque` bytes, para no informar del progreso cada pocos KB).
+    """
+
+    def __init__(self, f, total, hash_, progreso, bloque=BLOQUE_STREAM):
+        self.f = f
+        self.bloque = bloque
+        self.total = total
+        self.hash = hash_
+        self.progreso = progreso
+        self.enviados = 0
+
+    def __len__(self):
+        return self.total
+
+    def read(self, n=-1):
+        trozo = self.f.read(max(n, self.bloque) if n is not None and n >= 0 else self.bloque)
+        if trozo:
+            self.hash.update(trozo)
+            self.enviados += len(trozo)
+            _avisar(self.progreso, self.enviados, self.total, 'Enviados')
+        return trozo
+
+
+def _generador_contado(f, hash_, contador, progreso, bloque):
+    """Cuerpo en chunked para archivos de tamaño desconocido (tuberías, sockets)."""
+    for trozo in iter(lambda: f.read(bloque), b''):
+        hash_.update(trozo)
+        contador[0] += len(trozo)
+        _avisar(progreso, contador[0], None, 'Enviados')
+        yield trozo
+
+
+def _tamano_restante(f):
+    """Bytes que quedan por leer de un archivo regular o None (tuberías, sockets, BytesIO...)."""
+    try:
+        st = os.fstat(f.fileno())
+        return st.st_size - f.tell() if stat.S_ISREG(st.st_mode) else None
+    except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+        return None
+
+
+def enviar_archivo_tor(url, origen, timeout=30, headers=None, progreso=False, bloque=BLOQUE_STREAM, cliente=None):
+    """
+    Envía un archivo por Tor en streaming, sin cargarlo en memoria.
+    `origen` es una ruta o un archivo abierto en binario (se envía desde su
+    posición actual). Si el tamaño se conoce se manda con Content-Length; si
+    no, como cuerpo chunked generado por bloques. El SHA-256 se calcula a la
+    vez que se envían los bytes.
+    Devuelve {'contenido', 'status_code', 'bytes', 'sha256'} o None si hay error.
+    """
+    cliente = cliente or cliente_por_defecto()
+    hash_ = hashlib.sha256()
+    f = open(origen, 'rb') if isinstance(origen, (str, os.PathLike)) else origen
+    try:
+        total = _tamano_restante(f)
+        if total is not None:
+            cuerpo = _LectorContado(f, total, hash_, progreso, bloque)
+            contador = None
+        else:
+            contador = [0]
+            cuerpo = _generador_contado(f, hash_, contador, progreso, bloque)
+        response = cliente.enviar(url, cuerpo, headers=headers, timeout=timeout)
+        response.raise_for_status()
+        enviados = contador[0] if contador is not None else cuerpo.enviados
+        print(f"[Tor] Archivo enviado correctamente a {url} ({enviados} bytes, status {response.status_code})")
+        return {'contenido': response.content, 'status_code': response.status_code,
+                'bytes': enviados, 'sha256': hash_.hexdigest()}
+    except requests.RequestException as e:
+        print(f"[Tor] Error enviando archivo a {url}: {e}")
+        return None
+    finally:
+        if f is not origen:
+            f.close()
+
+
+def _guardar_respuesta(response, destino, progreso=False, bloque=BLOQUE_STREAM, sha256=None):
+    """
+    Vuelca el cuerpo de una respuesta en streaming a `destino` (ruta o
+    archivo abierto) calculando el SHA-256. Con una ruta escribe en
+    `destino`.part y solo renombra si la descarga está completa y la suma
+    coincide. Lanza RequestException si no es así.
+    """
+    if response.status_code >= 400:
+        print(f"[Tor] El servidor respondió {response.status_code}: {response.text[:200]}")
+    response.raise_for_status()
+    es_ruta = isinstance(destino, (str, os.PathLike))
+    temporal = f"{os.fspath(destino)}.part" if es_ruta else None
+    longitud = response.headers.get('Content-Length')
+    total = int(longitud) if longitud and longitud.isdigit() else None
+    hash_ = hashlib.sha256()
+    recibidos = 0
+    try:
+        f = open(temporal, 'wb') if es_ruta else destino
+        try:
+            for trozo in response.iter_content(chunk_size=bloque):
+                f.write(trozo)
+                hash_.update(trozo)
+                recibidos += len(trozo)
+                _avisar(progreso, recibidos, total, 'Recibidos')
+            if es_ruta:
+                f.flush()
+                os.fsync(f.fileno())
+        finally:
+            if es_ruta:
+                f.close()
+        if total is not None and recibidos != total:
+            raise requests.RequestException(f"Descarga incompleta: {recibidos} de {total} bytes")
+        if sha256 and hash_.hexdigest() != sha256.lower():
+            raise requests.RequestException("La suma SHA-256 no coincide")
+        if es_ruta:
+            os.replace(temporal, destino)
+    except BaseException:
+        if temporal and os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    return {'status_code': response.status_code, 'content_type': response.headers.get('Content-Type'),
+            'bytes': recibidos, 'sha256': hash_.hexdigest()}
+
+
+def recibir_archivo_tor(url, destino, timeout=30, headers=None, progreso=False, bloque=BLOQUE_STREAM,
+                        sha256=None, cliente=None):
+    """
+    Descarga por Tor directamente a disco con iter_content, calculando el
+    SHA-256 mientras llegan los bytes. `destino` es una ruta (se escribe en
+    `destino`.part y se renombra al terminar, así nunca queda un archivo a
+    medias con el nombre final) o un archivo abierto en binario.
+    Con `sha256`, si la suma no coincide se descarta la descarga.
+    Devuelve {'status_code', 'content_type', 'bytes', 'sha256'} o None si hay error.
+    """
+    cliente = cliente or cliente_por_defecto()
+    try:
+        with cliente.recibir(url, headers=headers, timeout=timeout, stream=True) as response:
+            info = _guardar_respuesta(response, destino, progreso, bloque, sha256)
+        print(f"[Tor] Archivo recibido correctamente de {url} ({info['bytes']} bytes)")
+        return info
+    except (requests.RequestException, OSError) as e:
+        print(f"[Tor] Error recibiendo archivo de {url}: {e}")
+        return None
+
+
+def descargar_archivo_tor(url, destino, circuitos=4, tamano_trozo=CHUNK_SUBIDA, reintentos=5, backoff=1.0,
+                          timeout=60, headers=None, progreso=False, sha256=None, proxy=TOR_PROXY):
+    """
+    Descarga un archivo repartiéndolo en rangos (Range) que se piden en
+    paralelo por `circuitos` circuitos Tor aislados, de modo que el caudal
+    no queda limitado por un único camino de relays. Cada rango se reintenta
+    con backoff exponencial. Si el servidor no admite rangos (p. ej. una
+    descarga de un solo uso), se guarda la respuesta completa por un circuito.
+    Devuelve {'status_code', 'bytes', 'sha256', 'circuitos'} o None si hay error.
+    """
+    cabeceras = dict(headers or {})
+    temporal = f"{destino}.part"
+    control = ClienteTor(proxy, pool=1, timeout=timeout, aislamiento=next(_aislamientos))
+    clientes = []
+    try:
+        with control.recibir(url, headers={**cabeceras, 'Range': 'bytes=0-0'}, stream=True) as response:
+            rango = response.headers.get('Content-Range', '')
+            vacio = response.status_code == 416 and rango == 'bytes */0'
+            if not vacio and (response.status_code != 206 or '/' not in rango or rango.endswith('/*')):
+                # Sin soporte de rangos: esta misma respuesta trae el archivo entero
+                info = _guardar_respuesta(response, destino, progreso, sha256=sha256)
+                info['circuitos'] = 1
+                print(f"[Tor] Archivo recibido de {url} por un solo circuito ({info['bytes']} bytes)")
+                return info
+            tamano = int(rango.rsplit('/', 1)[1])
+            validador = response.headers.get('ETag') or response.headers.get('Last-Modified')
+        if validador:
+            # Si el archivo cambia en el servidor entre rangos, responde 200 y el rango falla
+            cabeceras['If-Range'] = validador
+        with open(temporal, 'wb') as f:
+            f.truncate(tamano)
+
+        trozos = [(inicio, min(inicio + tamano_trozo, tamano)) for inicio in range(0, tamano, tamano_trozo)]
+        local = threading.local()
+        lock = threading.Lock()
+        recibidos = [0]
+
+        def bajar_trozo(trozo):
+            if not hasattr(local, 'cliente'):
+                local.cliente = ClienteTor(proxy, pool=1, reintentos=0, timeout=timeout,
+                                           aislamiento=next(_aislamientos))
+                with lock:
+                    clientes.append(local.cliente)
+            inicio, fin = trozo
+            for intento in range(reintentos + 1):
+                escritos = 0
+                try:
+                    with local.cliente.recibir(url, headers={**cabeceras, 'Range': f"bytes={inicio}-{fin - 1}"},
+                                               stream=True) as r:
+                        if r.status_code != 206 or not r.headers.get('Content-Range', '').startswith(f"bytes {inicio}-"):
+                            print(f"[Tor] Rango {inicio}-{fin} rechazado (status {r.status_code})")
+                            return False
+                        with open(temporal, 'r+b') as f:
+                            f.seek(inicio)
+                            for bloque in r.iter_content(chunk_size=BLOQUE_STREAM):
+                                f.write(bloque[:fin - inicio - escritos])
+                                escritos += len(bloque)
+                    if escritos < fin - inicio:
+                        raise requests.RequestException(f"Rango {inicio}-{fin} incompleto: {escritos} bytes")
+                    with lock:
+                        recibidos[0] += fin - inicio
+                        _avisar(progreso, recibidos[0], tamano, 'Recibidos')
+                    return True
+                except requests.RequestException as e:
+                    if intento == reintentos:
+                        print(f"[Tor] Rango {inicio}-{fin} falló tras {reintentos + 1} intentos: {e}")
+                        return False
+                time.sleep(backoff * (2 ** intento))
+            return False
+
+        with ThreadPoolExecutor(max_workers=max(1, circuitos)) as pool:
+            resultados = list(pool.map(bajar_trozo, trozos))
+        if not all(resultados):
+            print(f"[Tor] Descarga incompleta: {resultados.count(False)} rangos fallidos")
+            os.remove(temporal)
+            return None
+        suma = _sha256_archivo(temporal)
+        if sha256 and suma != sha256.lower():
+            print(f"[Tor] Error recibiendo archivo de {url}: la suma SHA-256 no coincide")
+            os.remove(temporal)
+            return None
+        os.replace(temporal, destino)
+        print(f"[Tor] Archivo recibido de {url} por {len(clientes)} circuitos ({tamano} bytes, {len(trozos)} rangos)")
+        return {'status_code': 206, 'bytes': tamano, 'sha256': suma, 'circuitos': len(clientes)}
+    except (requests.RequestException, OSError, ValueError) as e:
+        print(f"[Tor] Error en la descarga por rangos de {url}: {e}")
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        return None
+    finally:
+        control.cerrar()
+        for cliente in clientes:
+            cliente.cerrar()
+
+
+def _huecos(rangos, tamano, tamano_trozo):
+    """Trozos [inicio, fin) que faltan por subir dados los rangos ya recibidos."""
+    trozos = []
+    posicion = 0
+    for a, b in rangos + [(tamano, tamano)]:
+        for inicio in range(posicion, a, tamano_trozo):
+            trozos.append((inicio, min(inicio + tamano_trozo, a)))
+        posicion = max(posicion, b)
+    return trozos
+
+
+def _rangos_de_cabecera(valor):
+    return [tuple(int(x) for x in r.split('-')) for r in valor.split(',') if r]
+
+
+def _sha256_archivo(ruta):
+    h = hashlib.sha256()
+    with open(ruta, 'rb') as f:
+        for bloque in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(bloque)
+    return h.hexdigest()
+
+
+def subir_archivo_tor(url_base, ruta, tamano_trozo=CHUNK_SUBIDA, paralelos=4, reintentos=5, backoff=1.0,
+                      timeout=60, token=None, proxy=TOR_PROXY):
+    """
+    Sube un archivo con la API de subidas por partes del servidor TitanSend
+    (`url_base`/uploads). Los trozos se envían en paralelo, cada hilo por su
+    propio circuito Tor, y cada trozo se reintenta con backoff exponencial.
+    La URL de la subida se guarda en `ruta`.subida.json: si la subida falla,
+    volver a llamar a la función solo envía los rangos que faltan.
+    Devuelve el JSON de la respuesta final o None si hay error.
+    """
+    url_base = url_base.rstrip('/')
+    tamano = os.path.getsize(ruta)
+    ruta_reanudacion = ruta + '.subida.json'
+    cabeceras = {'Authorization': f"Bearer {token}"} if token else {}
+    control = ClienteTor(proxy, pool=1, timeout=timeout, aislamiento=next(_aislamientos))
+    clientes = []
+    try:
+        url_subida, rangos = None, []
+        try:
+            with open(ruta_reanudacion, 'r') as f:
+                previo = json.load(f)
+            if previo.get('tamano') == tamano and previo.get('mtime') == os.path.getmtime(ruta):
+                r = control.peticion('HEAD', previo['url'], headers=cabeceras)
+                if r.status_code == 200:
+                    url_subida = previo['url']
+                    rangos = _rangos_de_cabecera(r.headers.get('Upload-Ranges', ''))
+                    print(f"[Tor] Reanudando subida: {r.headers.get('Upload-Offset')} bytes contiguos ya en el servidor")
+        except (FileNotFoundError, ValueError, KeyError):
+            pass
+        if url_subida is None:
+            r = control.peticion('POST', f"{url_base}/uploads", headers={**cabeceras, 'Upload-Length': str(tamano)})
+            r.raise_for_status()
+            url_subida = requests.compat.urljoin(url_base + '/', r.headers['Location'])
+            with open(ruta_reanudacion, 'w') as f:
+                json.dump({'url': url_subida, 'tamano': tamano, 'mtime': os.path.getmtime(ruta)}, f)
+
+        trozos = _huecos(rangos, tamano, tamano_trozo)
+        local = threading.local()
+        lock = threading.Lock()
+
+        def subir_trozo(trozo):
+            if not hasattr(local, 'cliente'):
+                # Reintentos propios por trozo: el cliente no reintenta por su cuenta
+                local.cliente = ClienteTor(proxy, pool=1, reintentos=0, timeout=timeout,
+                                           aislamiento=next(_aislamientos))
+                with lock:
+                    clientes.append(local.cliente)
+            inicio, fin = trozo
+            for intento in range(reintentos + 1):
+                try:
+                    with open(ruta, 'rb') as f:
+                        f.seek(inicio)
+                        datos = f.read(fin - inicio)
+                    r = local.cliente.peticion('PATCH', url_subida, data=datos,
+                                               headers={**cabeceras, 'Upload-Offset': str(inicio)})
+                    if r.status_code in (204, 200):
+                        return True
+                    if r.status_code in (401, 403, 404, 409):
+                        print(f"[Tor] Trozo {inicio}-{fin} rechazado (status {r.status_code})")
+                        return False
+                    r.raise_for_status()
+                except requests.RequestException as e:
+                    if intento == reintentos:
+                        print(f"[Tor] Trozo {inicio}-{fin} falló tras {reintentos + 1} intentos: {e}")
+                        return False
+                time.sleep(backoff * (2 ** intento))
+            return False
+
+        with ThreadPoolExecutor(max_workers=max(1, paralelos)) as pool:
+            resultados = list(pool.map(subir_trozo, trozos))
+        if not all(resultados):
+            print(f"[Tor] Subida incompleta: {resultados.count(False)} trozos fallidos. Vuelve a intentarlo para reanudar.")
+            return None
+
+        r = control.peticion('POST', f"{url_subida}/finalizar",
+                             headers={**cabeceras, 'Upload-Checksum': f"sha256 {_sha256_archivo(ruta)}"})
+        r.raise_for_status()
+        os.remove(ruta_reanudacion)
+        print(f"[Tor] Archivo subido por partes a {url_base} ({tamano} bytes, {len(trozos)} trozos)")
+        return r.json()
+    except requests.RequestException as e:
+        print(f"[Tor] Error en la subida por partes a {url_base}: {e}")
+        return None
+    finally:
+        control.cerrar()
+        for cliente in clientes:
+            cliente.cerrar()